@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Process / szál autotuner az extraction poolhoz
+
+A MediaPipe és az OpenCV processzenként saját belső szálkészletet indít, így
+sok magos gépen a Pool(processes=cpu_count()) túlterheli a CPU-t. Ez a modul
+néhány mintavideón lemér több (worker process szám, cv2.setNumThreads)
+kombinációt, és a legtöbb frame/s-t adót elmenti egy config fájlba, amit a
+dataset_processor_multithread.py a következő futásoknál használ.
+
+A --compare-modes a végrehajtási módokat veti össze (frame/s és összes csúcs memória):
+process pool (P x 1), szál pool a fő processben (0 x T) és hibrid (P x T), ahol minden
+szálnak saját FaceLandmarkere van (video_supervisor.run_supervised / run_threaded).
+
+Használat:
+    python dataset_processor_multithread.py --autotune
+    python autotune.py --sample-videos 16
+    python autotune.py --compare-modes 8x1 0x8 2x4
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import multiprocessing as mp
+from multiprocessing import Pool, cpu_count
+
+import cv2
+
+from frame_processor import detect_raw, create_landmarker
+from dataset_io import iter_corpus_videos
+from video_stream import VideoFrameReader
+from video_supervisor import run_supervised, run_threaded
+from cost_estimate import peak_rss_bytes
+
+# -------------------- Beállítások --------------------
+VIDEO_BASE = "D:/MestInt/datasets/gridcorpus/video"
+ALIGN_BASE = "D:/MestInt/datasets/gridcorpus/align"
+MODEL_PATH = "face_landmarker.task"
+AUTOTUNE_CONFIG = "autotune.json"
+
+# cv2.setNumThreads értékek: 0 = OpenCV szálak kikapcsolva, -1 = OpenCV alapértelmezés
+CV2_THREAD_CANDIDATES = [0, 1, 2, -1]
+
+
+def process_candidates(max_processes=None):
+    """Worker szám jelöltek: 1, 2, 4, ... és a cpu_count()."""
+    max_processes = max_processes or cpu_count()
+    candidates = []
+    n = 1
+    while n < max_processes:
+        candidates.append(n)
+        n *= 2
+    candidates.append(max_processes)
+    return candidates
+
+
+def sample_videos(video_base, align_base, num_videos, seed=0):
+    """Véletlen (de fix seed-del reprodukálható) videó minta a corpusból."""
+    videos = [video_path for _, _, video_path, _ in
+              iter_corpus_videos(video_base, align_base, verbose=False)]
+    random.Random(seed).shuffle(videos)
+    return videos[:num_videos]
+
+
+def init_worker_threads(cv2_threads):
+    """Pool initializer: az OpenCV belső szálainak beállítása a worker processben."""
+    if cv2_threads is not None:
+        cv2.setNumThreads(cv2_threads)
+
+
+_bench_landmarker = None
+
+
+def _init_bench_worker(model_path, cv2_threads):
+    global _bench_landmarker
+    init_worker_threads(cv2_threads)
+    _bench_landmarker = create_landmarker(model_path)
+
+
+def _decode_and_detect(video_path, landmarker):
+    # Ugyanaz a munka, mint az extractorban: dekódolás + detect minden frame-en
+    frames = 0
+    with VideoFrameReader(video_path) as reader:
+        for _, frame in reader:
+            detect_raw(frame, landmarker)
+            frames += 1
+    return frames
+
+
+def _bench_video(video_path):
+    return _decode_and_detect(video_path, _bench_landmarker)
+
+
+def benchmark_config(videos, processes, cv2_threads, model_path=MODEL_PATH):
+    """
+    Egy konfiguráció lemérése.
+
+    Returns:
+        dict: {"processes", "cv2_threads", "frames", "seconds", "fps"}
+    """
+    with Pool(processes=processes, initializer=_init_bench_worker,
+              initargs=(model_path, cv2_threads)) as pool:
+        # A modell betöltését nem mérjük: minden worker egyszer már dolgozott
+        pool.map(_bench_video, videos[:processes])
+        start = time.perf_counter()
+        frames = sum(pool.map(_bench_video, videos, chunksize=1))
+        seconds = time.perf_counter() - start
+    return {
+        "processes": processes,
+        "cv2_threads": cv2_threads,
+        "frames": frames,
+        "seconds": round(seconds, 3),
+        "fps": round(frames / seconds, 2) if seconds > 0 else 0.0,
+    }
+
+
+def run_autotune(video_base=VIDEO_BASE, align_base=ALIGN_BASE, model_path=MODEL_PATH,
+                 config_path=AUTOTUNE_CONFIG, num_videos=None, processes=None, cv2_threads=None, seed=0):
+    """
+    Végigméri a jelölt konfigurációkat és elmenti a leggyorsabbat.
+
+    Returns:
+        dict: a mentett config
+    """
+    processes = processes or process_candidates()
+    cv2_threads = cv2_threads if cv2_threads is not None else CV2_THREAD_CANDIDATES
+    # Legalább annyi videó kell, hogy a legnagyobb pool minden workere kapjon kettőt
+    num_videos = num_videos or 2 * max(processes)
+    videos = sample_videos(video_base, align_base, num_videos, seed=seed)
+    if not videos:
+        raise RuntimeError(f"Nem található videó: {video_base}")
+
+    print(f"\n⏱️  Autotune: {len(videos)} mintavideó, "
+          f"{len(processes)} x {len(cv2_threads)} konfiguráció")
+    results = []
+    for n in processes:
+        for threads in cv2_threads:
+            result = benchmark_config(videos, n, threads, model_path=model_path)
+            results.append(result)
+            print(f"   processes={n:3d}  cv2_threads={threads:3d}  ->  {result['fps']:8.1f} frame/s")
+
+    best = max(results, key=lambda r: r["fps"])
+    config = {
+        "processes": best["processes"],
+        "cv2_threads": best["cv2_threads"],
+        "fps": best["fps"],
+        "cpu_count": cpu_count(),
+        "model_path": model_path,
+        "sample_videos": len(videos),
+        "results": results,
+    }
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+    print(f"\n✅ Legjobb: processes={best['processes']}, cv2_threads={best['cv2_threads']} "
+          f"({best['fps']:.1f} frame/s) -> {config_path}")
+    return config
+
+
+def mode_candidates(cpus=None):
+    """Alapértelmezett (processes, threads) módok: process pool, szál pool, és két hibrid."""
+    cpus = cpus or cpu_count()
+    modes = [(cpus, 1), (0, cpus)]
+    for processes in (cpus // 2, 2):
+        if processes > 1 and cpus // processes > 1 and (processes, cpus // processes) not in modes:
+            modes.append((processes, cpus // processes))
+    return modes
+
+
+def parse_mode(text):
+    """ "2x4" -> (2, 4); 0 process = szál pool a fő processben."""
+    processes, threads = (int(n) for n in text.lower().split("x"))
+    if processes < 0 or threads < 1:
+        raise ValueError(text)
+    return processes, threads
+
+
+def _init_mode_worker(model_path, cv2_threads):
+    # Szálas módban minden szál ezt hívja: szálanként saját landmarker
+    init_worker_threads(cv2_threads)
+    return create_landmarker(model_path)
+
+
+def _mode_video(landmarker, video_path):
+    frames = _decode_and_detect(video_path, landmarker)
+    return {"frames": frames, "pid": os.getpid(), "peak_rss": peak_rss_bytes()}
+
+
+def _mode_driver(result_queue, videos, processes, threads, cv2_threads, model_path):
+    started = time.perf_counter()
+    if processes == 0:
+        report = run_threaded(videos, _init_mode_worker, _mode_video, threads,
+                              init_args=(model_path, cv2_threads), max_retries=0)
+    else:
+        report = run_supervised(videos, _init_mode_worker, _mode_video, processes,
+                                init_args=(model_path, cv2_threads), max_retries=0, threads_per_worker=threads)
+    seconds = time.perf_counter() - started
+    # Processenként a legnagyobb jelentett csúcs; a driver (fő process) a sajátját adja hozzá
+    peaks = {}
+    for result in report.results.values():
+        peaks[result["pid"]] = max(peaks.get(result["pid"], 0), result["peak_rss"] or 0)
+    peaks[os.getpid()] = max(peaks.get(os.getpid(), 0), peak_rss_bytes() or 0)
+    frames = sum(result["frames"] for result in report.results.values())
+    result_queue.put({"frames": frames, "seconds": seconds, "failed": len(report.failures),
+                      "peak_rss": sum(peaks.values()), "processes_measured": len(peaks)})
+
+
+def benchmark_mode(videos, processes, threads, cv2_threads=None, model_path=MODEL_PATH):
+    """
+    Egy végrehajtási mód lemérése egy friss driver processben (így a csúcs memória nem
+    keveredik a korábbi mérésekével). A worker indítás (model betöltés) is benne van az időben:
+    ez is a process / szál választás költsége.
+
+    Returns:
+        dict: {"processes", "threads", "landmarkers", "frames", "seconds", "fps", "peak_rss", ...}
+    """
+    result_queue = mp.Queue()
+    driver = mp.Process(target=_mode_driver,
+                        args=(result_queue, videos, processes, threads, cv2_threads, model_path))
+    driver.start()
+    result = None
+    while result is None:
+        try:
+            result = result_queue.get(timeout=1)
+        except Exception:
+            if not driver.is_alive():
+                raise RuntimeError(f"A {processes}x{threads} mérés leállt (exit code {driver.exitcode})")
+    driver.join()
+    seconds = result["seconds"]
+    return dict(result, processes=processes, threads=threads, landmarkers=max(processes, 1) * threads,
+                seconds=round(seconds, 3), fps=round(result["frames"] / seconds, 2) if seconds > 0 else 0.0)
+
+
+def run_mode_benchmark(video_base=VIDEO_BASE, align_base=ALIGN_BASE, model_path=MODEL_PATH, modes=None,
+                       num_videos=None, cv2_threads=None, seed=0):
+    """
+    Process pool vs szál pool vs hibrid: frame/s és az összes process csúcs memóriája.
+
+    Returns:
+        list: módonkénti benchmark_mode eredmények
+    """
+    modes = modes or mode_candidates()
+    num_videos = num_videos or 2 * max(max(processes, 1) * threads for processes, threads in modes)
+    videos = sample_videos(video_base, align_base, num_videos, seed=seed)
+    if not videos:
+        raise RuntimeError(f"Nem található videó: {video_base}")
+
+    print(f"\n⏱️  Végrehajtási módok: {len(videos)} mintavideó, {len(modes)} mód")
+    results = []
+    for processes, threads in modes:
+        result = benchmark_mode(videos, processes, threads, cv2_threads=cv2_threads, model_path=model_path)
+        results.append(result)
+        label = f"{processes}x{threads}" + (" (fő process)" if processes == 0 else "")
+        peak_mb = result["peak_rss"] / 2**20
+        print(f"   {label:<16} {result['fps']:8.1f} frame/s   "
+              f"{peak_mb:8.0f} MB csúcs ({peak_mb / result['landmarkers']:.0f} MB / landmarker)"
+              + (f"   ❌ {result['failed']} hibás videó" if result["failed"] else ""))
+
+    # A process pool (P x 1) az összevetés alapja
+    baseline = next((r for r in results if r["processes"] and r["threads"] == 1), None)
+    if baseline:
+        print(f"\n   A {baseline['processes']}x1 process poolhoz képest:")
+        for result in results:
+            if result is baseline:
+                continue
+            print(f"   {result['processes']}x{result['threads']:<14} "
+                  f"{result['fps'] / baseline['fps']:6.2f}x frame/s, "
+                  f"{result['peak_rss'] / baseline['peak_rss']:6.2f}x memória")
+    return results
+
+
+def load_autotune_config(config_path=AUTOTUNE_CONFIG):
+    """
+    A mentett autotune config, vagy None ha nincs / másik gépen (más CPU számmal) készült.
+    """
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if config.get("cpu_count") != cpu_count():
+        print(f"⚠️  {config_path} egy {config.get('cpu_count')} magos gépen készült, figyelmen kívül hagyva")
+        return None
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker process / OpenCV szál autotuner")
+    parser.add_argument("--video-base", default=VIDEO_BASE)
+    parser.add_argument("--align-base", default=ALIGN_BASE)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--config", default=AUTOTUNE_CONFIG)
+    parser.add_argument("--sample-videos", type=int, default=None)
+    parser.add_argument("--processes", type=int, nargs="+", default=None)
+    parser.add_argument("--cv2-threads", type=int, nargs="+", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare-modes", nargs="*", default=None, metavar="PxT",
+                        help="Process pool / szál pool / hibrid összevetése (pl. 8x1 0x8 2x4; "
+                             "üresen: alapértelmezett módok)")
+    args = parser.parse_args()
+
+    if args.compare_modes is not None:
+        try:
+            modes = [parse_mode(mode) for mode in args.compare_modes]
+        except ValueError:
+            parser.error("--compare-modes: PROCESSES x THREADS, pl. 2x4 (0x4 = szál pool a fő processben)")
+        cv2_threads = args.cv2_threads[0] if args.cv2_threads else None
+        run_mode_benchmark(args.video_base, args.align_base, args.model, modes or None,
+                           num_videos=args.sample_videos, cv2_threads=cv2_threads, seed=args.seed)
+        raise SystemExit(0)
+
+    run_autotune(args.video_base, args.align_base, args.model, args.config,
+                 num_videos=args.sample_videos, processes=args.processes,
+                 cv2_threads=args.cv2_threads, seed=args.seed)
@@ -0,0 +1,276 @@
+# columnar_dataset.py
+# Oszlopos (columnar) dataset formátum: part-XXXXX/<oszlop>.npy + manifest.json
+#
+# A CSV-vel ellentétben itt minden oszlop fix alakú numerikus tömb (float32/int32),
+# így a részek memória-mappelve (np.load(mmap_mode='r')) olvashatók, és csak a
+# szükséges oszlopokat kell betölteni.
+
+import os
+import json
+import numpy as np
+
+from frame_processor import (
+    MOUTH_OUTER_POINTS_INDICES, MOUTH_INNER_POINTS_INDICES, BLEND_SHAPE_NAMES,
+    MOUTH_BLEND_SHAPE_NAMES, EYES_BLEND_SHAPE_NAMES, BROW_BLEND_SHAPE_NAMES,
+    FACE_SHAPE_BLEND_SHAPE_NAMES
+)
+from mouth_features import MOUTH_FEATURE_NAMES, columnar_mouth_features
+from dataset_io import KEY_COLUMNS, CSV_HEADER, OutputSelection
+
+MANIFEST_FILE = "manifest.json"
+FORMAT_NAME = "mouth_columnar"
+FORMAT_VERSION = 1
+
+NUM_LANDMARKS = 478
+
+# Blend shape oszlopok: oszlopnév -> a tömb második tengelyének nevei
+BLEND_SHAPE_COLUMNS = {
+    "blend_shapes": BLEND_SHAPE_NAMES,
+    "mouth_blend_shapes": MOUTH_BLEND_SHAPE_NAMES,
+    "eyes_blend_shapes": EYES_BLEND_SHAPE_NAMES,
+    "brow_blend_shapes": BROW_BLEND_SHAPE_NAMES,
+    "face_shape_blend_shapes": FACE_SHAPE_BLEND_SHAPE_NAMES,
+}
+
+# Oszlopnév -> (dtype, egy sor alakja). A sorrend megegyezik a CSV_HEADER-rel,
+# csak a mouth_center_x / mouth_center_y egy (2,) oszlopban van.
+COLUMN_SPECS = {
+    "speaker": ("U", ()),
+    "video": ("U", ()),
+    "frame_idx": ("int32", ()),
+    "word": ("U", ()),
+    "mouth_center": ("int32", (2,)),
+    "outer_lip_relative_points": ("float32", (len(MOUTH_OUTER_POINTS_INDICES), 2)),
+    "inner_lip_relative_points": ("float32", (len(MOUTH_INNER_POINTS_INDICES), 2)),
+    "blend_shapes": ("float32", (len(BLEND_SHAPE_NAMES),)),
+    "mouth_blend_shapes": ("float32", (len(MOUTH_BLEND_SHAPE_NAMES),)),
+    "eyes_blend_shapes": ("float32", (len(EYES_BLEND_SHAPE_NAMES),)),
+    "brow_blend_shapes": ("float32", (len(BROW_BLEND_SHAPE_NAMES),)),
+    "face_shape_blend_shapes": ("float32", (len(FACE_SHAPE_BLEND_SHAPE_NAMES),)),
+    "3d_landmarks": ("float32", (NUM_LANDMARKS, 3)),
+    "pixel_landmarks": ("float32", (NUM_LANDMARKS, 2)),
+    "relative_landmarks": ("float32", (NUM_LANDMARKS, 2)),
+    "face_center_pixel": ("float32", (2,)),
+    "face_center_3d": ("float32", (3,)),
+}
+
+
+# Származtatott oszlopok (nem a mouth_data-ból, hanem a többi oszlopból számolva)
+DERIVED_COLUMN_SPECS = {
+    "mouth_features": ("float32", (len(MOUTH_FEATURE_NAMES),)),
+}
+
+
+def selection_columns(selection=None):
+    """
+    OutputSelection -> oszlopos oszlopnevek (a mouth_center_x / _y egy mouth_center oszlop).
+    """
+    if selection is None:
+        return list(COLUMN_SPECS)
+    wanted = {"mouth_center" if name.startswith("mouth_center_") else name for name in selection.columns}
+    return [name for name in COLUMN_SPECS if name in KEY_COLUMNS or name in wanted]
+
+
+def column_shape(name, landmark_indices=None):
+    """Egy sor alakja; a landmark oszlopoké a megtartott pontok számától függ."""
+    shape = (DERIVED_COLUMN_SPECS.get(name) or COLUMN_SPECS[name])[1]
+    if landmark_indices is not None and shape[:1] == (NUM_LANDMARKS,):
+        shape = (len(landmark_indices),) + shape[1:]
+    return shape
+
+
+def records_to_columns(records, selection=None):
+    """
+    (speaker, video, frame_idx, word, mouth_data) rekordok listájából oszlopos tömböket készít.
+
+    Args:
+        selection: OutputSelection - csak a kiválasztott oszlopok készülnek el
+
+    Returns:
+        dict: oszlopnév -> numpy tömb (az első tengely a sorok száma)
+    """
+    names = selection_columns(selection)
+    landmark_indices = selection.landmark_indices if selection is not None else None
+    columns = {name: [] for name in names}
+    value_names = [name for name in names if name not in KEY_COLUMNS]
+    for speaker, video_file, frame_idx, word, mouth_data in records:
+        columns["speaker"].append(speaker)
+        columns["video"].append(video_file)
+        columns["frame_idx"].append(frame_idx)
+        columns["word"].append(word)
+        for name in value_names:
+            value = mouth_data[name]
+            if name in BLEND_SHAPE_COLUMNS:
+                value = [value.get(key, 0.0) for key in BLEND_SHAPE_COLUMNS[name]]
+            columns[name].append(value)
+
+    arrays = {}
+    for name in names:
+        dtype = COLUMN_SPECS[name][0]
+        if dtype == "U":
+            arrays[name] = np.array(columns[name], dtype=str)
+        else:
+            shape = column_shape(name, landmark_indices)
+            arrays[name] = np.asarray(columns[name], dtype=dtype).reshape((-1,) + shape)
+    return arrays
+
+
+class ColumnarWriter:
+    """
+    Oszlopos dataset író. A sorokat chunk_rows méretű részekben (part) írja ki,
+    a manifest.json a close() hívásakor készül el.
+    """
+
+    def __init__(self, output_dir, chunk_rows=50000, columns=None, with_mouth_features=False,
+                 landmark_indices=None, parts=None):
+        self.output_dir = output_dir
+        self.chunk_rows = chunk_rows
+        self.landmark_indices = landmark_indices
+        self.columns = list(columns) if columns is not None else list(COLUMN_SPECS)
+        if with_mouth_features and "mouth_features" not in self.columns:
+            self.columns.append("mouth_features")
+        self.selection = self._record_selection()
+        self._previous_row = None
+        # Egy félbeszakadt írás folytatásakor a már kész partok (lásd csv_to_columnar.py)
+        self.parts = list(parts) if parts else []
+        self.total_rows = sum(part["rows"] for part in self.parts)
+        self._shapes = {}
+        self._pending = []
+        self._pending_arrays = []
+        self._pending_array_rows = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _record_selection(self):
+        """
+        Az append()-elt rekordok oszlopokká alakításához az író oszlopai / landmark pontjai
+        OutputSelection-ként (None = minden oszlop). A mouth_features a landmark oszlopokból készül.
+        """
+        wanted = set(self.columns)
+        if "mouth_features" in wanted:
+            wanted.update(("pixel_landmarks", "3d_landmarks"))
+        columns = [name for name in CSV_HEADER[4:]
+                   if name in wanted or (name.startswith("mouth_center_") and "mouth_center" in wanted)]
+        if columns == CSV_HEADER[4:] and self.landmark_indices is None:
+            return None
+        return OutputSelection(columns, None, self.landmark_indices)
+
+    def append(self, speaker, video_file, frame_idx, word, mouth_data):
+        """Egy feldolgozott frame hozzáadása (pufferelve)."""
+        self._pending.append((speaker, video_file, frame_idx, word, mouth_data))
+        if len(self._pending) >= self.chunk_rows:
+            self.flush()
+
+    def append_columns(self, arrays):
+        """
+        Már oszlopos formájú sorok hozzáadása (pufferelve, chunk_rows méretű partokba).
+        """
+        self._pending_arrays.append(arrays)
+        self._pending_array_rows += len(arrays["frame_idx"])
+        if self._pending_array_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """A pufferelt sorok kiírása egy új partba."""
+        if self._pending:
+            records, self._pending = self._pending, []
+            self._pending_arrays.append(records_to_columns(records, self.selection))
+            self._pending_array_rows += len(records)
+        if not self._pending_arrays:
+            return
+        pending, self._pending_arrays = self._pending_arrays, []
+        self._pending_array_rows = 0
+        if len(pending) == 1:
+            self.write_chunk(pending[0])
+        else:
+            self.write_chunk({name: np.concatenate([arrays[name] for arrays in pending])
+                              for name in pending[0]})
+
+    def write_chunk(self, arrays):
+        """
+        Már oszlopos formájú adat kiírása egy új partba.
+
+        Args:
+            arrays (dict): oszlopnév -> numpy tömb, azonos sorszámmal.
+        """
+        num_rows = len(arrays["frame_idx"])
+        if num_rows == 0:
+            return
+        if "mouth_features" in self.columns and "mouth_features" not in arrays:
+            # Az előző part utolsó sora kell, ha egy klip átnyúlik a part határon
+            arrays = dict(arrays)
+            arrays["mouth_features"] = columnar_mouth_features(arrays, previous=self._previous_row)
+            self._previous_row = {name: np.asarray(arrays[name][-1:]) for name in
+                                  ("speaker", "video", "frame_idx", "pixel_landmarks", "3d_landmarks")}
+        part_name = f"part-{len(self.parts):05d}"
+        part_dir = os.path.join(self.output_dir, part_name)
+        os.makedirs(part_dir, exist_ok=True)
+        for name in self.columns:
+            np.save(os.path.join(part_dir, f"{name}.npy"), arrays[name])
+            self._shapes.setdefault(name, tuple(np.shape(arrays[name])[1:]))
+        self.parts.append({"name": part_name, "rows": int(num_rows)})
+        self.total_rows += int(num_rows)
+
+    def close(self, extra=None):
+        """A maradék sorok kiírása és a manifest elkészítése."""
+        self.flush()
+        specs = {**COLUMN_SPECS, **DERIVED_COLUMN_SPECS}
+        manifest = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "columns": {
+                name: {"dtype": specs[name][0],
+                       "shape": list(self._shapes.get(name) or column_shape(name, self.landmark_indices))}
+                for name in self.columns
+            },
+            **({"landmark_indices": self.landmark_indices} if self.landmark_indices is not None else {}),
+            "blend_shape_names": {
+                name: names for name, names in BLEND_SHAPE_COLUMNS.items() if name in self.columns
+            },
+            "parts": self.parts,
+            **({"mouth_feature_names": MOUTH_FEATURE_NAMES} if "mouth_features" in self.columns else {}),
+            "total_rows": self.total_rows,
+        }
+        if extra:
+            manifest.update(extra)
+        tmp_path = os.path.join(self.output_dir, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.output_dir, MANIFEST_FILE))
+        return manifest
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+def read_manifest(dataset_dir):
+    """Beolvassa egy oszlopos dataset manifest.json fájlját."""
+    with open(os.path.join(dataset_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_part(dataset_dir, part_name, columns=None, mmap=True):
+    """
+    Egy part betöltése. mmap=True esetén a numerikus oszlopok memória-mappelt nézetek.
+    """
+    part_dir = os.path.join(dataset_dir, part_name)
+    if columns is None:
+        columns = [name[:-4] for name in os.listdir(part_dir) if name.endswith(".npy")]
+    arrays = {}
+    for name in columns:
+        arrays[name] = np.load(os.path.join(part_dir, f"{name}.npy"),
+                               mmap_mode="r" if mmap else None)
+    return arrays
+
+
+def iter_columnar_chunks(dataset_dir, columns=None, mmap=True):
+    """
+    Végigmegy az oszlopos dataset partjain.
+    Yield: dict oszlopnév -> tömb (partonként)
+    """
+    manifest = read_manifest(dataset_dir)
+    for part in manifest["parts"]:
+        yield load_part(dataset_dir, part["name"], columns=columns, mmap=mmap)
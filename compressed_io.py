@@ -0,0 +1,255 @@
+# compressed_io.py
+# Tömörített (gzip / zstd) dataset kimenet háttérszálas írással + átlátszó olvasás
+#
+# A BackgroundWriter a hívó (inferencia) ciklusból csak sorokat / byte blokkokat tesz egy
+# korlátos queue-ba; a CSV formázást, a tömörítést és a lemezre írást egy külön szál végzi,
+# nagy pufferelt blokkokban. A queue korlátos, így lassú lemeznél a hívó vár, a memória nem nő.
+# Az olvasók (open_text_input) a fájl első byte-jai alapján ismerik fel a tömörítést.
+
+import io
+import os
+import csv
+import gzip
+import time
+import queue
+import threading
+
+# Opcionális zstd backend (pip install zstandard); nélküle csak gzip / tömörítetlen
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from dataset_io import CSV_DELIMITER
+
+COMPRESSIONS = ["none", "gzip", "zstd"]
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+# Fájl eleji "magic" byte-ok
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# A háttérszál pufferje (ennyi byte gyűlik össze egy írás / tömörítés előtt) és a queue mérete
+WRITE_BUFFER_BYTES = 8 * 1024 * 1024
+QUEUE_SIZE = 64
+# Ennyi sort gyűjt a hívó, mielőtt egy csomagban a queue-ba teszi
+ROWS_PER_BATCH = 256
+
+
+def compressed_path(path, compression):
+    """mouth_data.csv + gzip -> mouth_data.csv.gz (ha még nincs rajta a végződés)."""
+    suffix = COMPRESSION_SUFFIXES.get(compression or "none", "")
+    return path if not suffix or path.endswith(suffix) else path + suffix
+
+
+def strip_compression_suffix(path):
+    """mouth_data.csv.gz -> mouth_data.csv"""
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def resolve_input_path(path):
+    """
+    Egy (esetleg tömörítve írt) dataset fájl tényleges útvonala:
+    ha a megadott nem létezik, a .gz / .zst változatát keressük.
+    """
+    if os.path.exists(path):
+        return path
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+
+def detect_compression(path):
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if magic == _ZSTD_MAGIC:
+        return "zstd"
+    return "none"
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise ImportError("zstd tömörítéshez telepítsd: pip install zstandard")
+
+
+def open_binary_input(path):
+    """Byte stream egy tömörített vagy tömörítetlen fájlból (a tömörítés a tartalomból derül ki)."""
+    compression = detect_compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        _require_zstd()
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, "rb")
+
+
+def open_text_input(path):
+    """Szöveges (utf-8, newline="") olvasás, a csv.reader-nek átadható; tömörítve is."""
+    if detect_compression(path) == "none":
+        return open(path, "r", encoding="utf-8", newline="")
+    return io.TextIOWrapper(open_binary_input(path), encoding="utf-8", newline="")
+
+
+def open_binary_output(path, compression=None, level=None, threads=0):
+    """
+    Byte stream írásra. level: tömörítési szint (alapból DEFAULT_LEVELS);
+    threads: zstd worker szálak (0 = egy szál, -1 = annyi, ahány mag); a gzip mindig egy szálon tömörít.
+    """
+    compression = compression or "none"
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Ismeretlen tömörítés: {compression} ({', '.join(COMPRESSIONS)})")
+    level = DEFAULT_LEVELS.get(compression) if level is None else level
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=level)
+    if compression == "zstd":
+        _require_zstd()
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+        return compressor.stream_writer(open(path, "wb"), closefd=True)
+    return open(path, "wb")
+
+
+class _CountingWriter(io.RawIOBase):
+    """A tömörítés előtti (nyers) byte-ok számlálása."""
+
+    def __init__(self, target):
+        self.target = target
+        self.bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.target.write(data)
+        self.bytes += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.target.close()
+        super().close()
+
+
+class BackgroundWriter:
+    """
+    CSV sorok / nyers byte blokkok írása egy háttérszálon (opcionálisan tömörítve).
+
+    A writerow() / write() a hívó szálán csak egy korlátos queue-ba tesz; ha a szál nem győzi,
+    a hívó vár (blocked_s). A szálon keletkező hibát a következő hívás (vagy a close) dobja tovább.
+    A close() után a stats: {"bytes_written", "bytes_on_disk", "ratio", "blocked_s", "seconds"}.
+    """
+
+    def __init__(self, path, compression=None, level=None, threads=0, delimiter=CSV_DELIMITER,
+                 queue_size=QUEUE_SIZE, buffer_bytes=WRITE_BUFFER_BYTES, rows_per_batch=ROWS_PER_BATCH):
+        self.path = path
+        self.compression = compression or "none"
+        self.stats = None
+        self._counter = _CountingWriter(open_binary_output(path, compression, level, threads))
+        self._buffered = io.BufferedWriter(self._counter, buffer_size=buffer_bytes)
+        self._text = io.TextIOWrapper(self._buffered, encoding="utf-8", newline="")
+        self._csv = csv.writer(self._text, delimiter=delimiter)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._rows = []
+        self._rows_per_batch = rows_per_batch
+        self._error = None
+        self._blocked = 0.0
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="dataset-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue
+            kind, payload = item
+            try:
+                if kind == "rows":
+                    self._csv.writerows(payload)
+                else:
+                    # A szöveges réteg pufferét előbb kiírjuk, hogy a sorrend megmaradjon
+                    self._text.flush()
+                    self._buffered.write(payload)
+            except BaseException as e:
+                self._error = e
+
+    def _put(self, item):
+        if self._error is not None:
+            raise self._error
+        started = time.perf_counter()
+        self._queue.put(item)
+        self._blocked += time.perf_counter() - started
+
+    def writerow(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self._rows_per_batch:
+            self._put(("rows", self._rows))
+            self._rows = []
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def write(self, data):
+        """Nyers (már CSV formátumú, utf-8) byte blokk, pl. egy másik CSV tartalma."""
+        if self._rows:
+            self._put(("rows", self._rows))
+            self._rows = []
+        self._put(("bytes", bytes(data)))
+
+    def close(self):
+        if self.stats is not None:
+            return self.stats
+        if self._thread.is_alive():
+            if self._rows and self._error is None:
+                self._queue.put(("rows", self._rows))
+                self._rows = []
+            self._queue.put(None)
+            self._thread.join()
+        try:
+            if self._error is None:
+                self._text.close()
+        finally:
+            if not self._counter.closed:
+                self._counter.close()
+        if self._error is not None:
+            raise self._error
+        on_disk = os.path.getsize(self.path)
+        self.stats = {
+            "bytes_written": self._counter.bytes,
+            "bytes_on_disk": on_disk,
+            "ratio": self._counter.bytes / on_disk if on_disk else 1.0,
+            "blocked_s": round(self._blocked, 3),
+            "seconds": round(time.perf_counter() - self._started, 3),
+        }
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Hiba esetén is leállítjuk a szálat és lezárjuk a fájlt, de az eredeti hiba megy tovább
+            try:
+                self.close()
+            except BaseException:
+                pass
+        return False
+
+
+def format_write_stats(stats, compression="none"):
+    """Pl. "1234.5 MB -> 210.3 MB (gzip, 5.87x), a hívó 0.4s-ot várt az írásra" """
+    text = f"{stats['bytes_written'] / 1e6:.1f} MB"
+    if compression != "none":
+        text += f" -> {stats['bytes_on_disk'] / 1e6:.1f} MB ({compression}, {stats['ratio']:.2f}x)"
+    return text + f", a hívó {stats['blocked_s']:.1f}s-ot várt az írásra"
@@ -0,0 +1,198 @@
+# corpus_archive.py
+# A GRID corpus olvasása közvetlenül a speakerenkénti tar / zip archívumokból (kicsomagolás nélkül)
+#
+# A corpus bejárás (dataset_io.iter_speaker_videos) a VIDEO_BASE / ALIGN_BASE alatt a speaker
+# mappák helyett <speaker>.tar / .zip / ... archívumokat is elfogad (pl. s1.tar, s1.mpg_vcd.zip).
+# Egy archívum tagjai egyszer, processzenként listázódnak (ArchiveIndex); egy tag útvonala
+# "<archívum>::<tag>" alakú, ezt a readerek (video_stream), az align olvasás és a tár hash
+# ugyanúgy kapják, mint egy sima fájl útvonalát, így a feldolgozás ugyanúgy szétosztható.
+#
+# Az .align fájlok a memóriából olvasódnak. A videó byte-jai Linuxon egy memfd-be (memória,
+# nincs lemez / inode) kerülnek, ezt a /proc/self/fd/N útvonalon az OpenCV / ffmpeg is megnyitja;
+# ahol nincs memfd (Windows / macOS), egy helyi temp fájlba, ami a reader lezárásakor törlődik.
+#
+# Tömörítetlen tar-ban és zip-ben a tagok közvetlenül (seek) olvashatók; tömörített tar-ban
+# (.tar.gz, ...) minden olvasás az archívum elejétől tömörít ki, ezért az lassú.
+
+import io
+import os
+import tarfile
+import zipfile
+import tempfile
+import threading
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip")
+# "<archívum>::<tag>" - a tag útvonal elválasztója
+MEMBER_SEPARATOR = "::"
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_speaker_archives = {}
+
+
+def is_archive_file(path):
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def archive_speaker(path):
+    """s1.tar / s1.mpg_vcd.zip -> s1"""
+    return os.path.basename(path).split(".")[0]
+
+
+def list_archive_speakers(base, refresh=False):
+    """
+    A base alatti speaker archívumok: {speaker: archívum útvonal} (az első találat nyer).
+    Processzenként és base-enként egyszer listázva (hálózati meghajtón ne videónként legyen
+    könyvtár listázás); refresh=True újraolvassa (pl. a corpus bejárás elején).
+    """
+    key = (os.getpid(), base)
+    with _indexes_lock:
+        archives = None if refresh else _speaker_archives.get(key)
+    if archives is None:
+        archives = {}
+        if os.path.isdir(base):
+            for name in sorted(os.listdir(base)):
+                path = os.path.join(base, name)
+                if os.path.isfile(path) and is_archive_file(name):
+                    archives.setdefault(archive_speaker(name), path)
+        with _indexes_lock:
+            _speaker_archives[key] = archives
+    return dict(archives)
+
+
+def find_speaker_archive(base, speaker):
+    key = (os.getpid(), base)
+    with _indexes_lock:
+        archives = _speaker_archives.get(key)
+    return (archives if archives is not None else list_archive_speakers(base)).get(speaker)
+
+
+def member_path(archive_path, name):
+    return f"{archive_path}{MEMBER_SEPARATOR}{name}"
+
+
+def is_member_path(path):
+    return MEMBER_SEPARATOR in str(path)
+
+
+def split_member_path(path):
+    """"<archívum>::<tag>" -> (archívum, tag); sima fájlra (path, None)."""
+    archive_path, separator, name = str(path).partition(MEMBER_SEPARATOR)
+    return (archive_path, name) if separator else (path, None)
+
+
+class ArchiveIndex:
+    """
+    Egy tar / zip archívum tagjainak indexe (egyszeri listázás).
+
+    tar: {tag: (adat offset, méret)} - tömörítetlen tar-ból közvetlen seek + read, szálbiztosan
+    zip: {tag: ZipInfo} - egy megosztott ZipFile-ból, lock alatt
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._handle = None
+        if zipfile.is_zipfile(path):
+            self.kind = "zip"
+            self._handle = zipfile.ZipFile(path)
+            self.members = {info.filename: info for info in self._handle.infolist() if not info.is_dir()}
+        else:
+            self.kind = "tar"
+            with tarfile.open(path, "r:*") as tar:
+                self.members = {info.name: (info.offset_data, info.size) for info in tar if info.isfile()}
+            # Tömörített tar-ban nincs közvetlen seek, a tagokat a tarfile olvassa ki
+            self.compressed = not path.lower().endswith(".tar")
+            if self.compressed:
+                self._handle = tarfile.open(path, "r:*")
+        self.by_basename = {}
+        for name in sorted(self.members):
+            self.by_basename.setdefault(os.path.basename(name), name)
+
+    def find(self, basename):
+        """A basename nevű tag teljes neve (az archívumon belüli mappától függetlenül), vagy None."""
+        return self.by_basename.get(basename)
+
+    def read(self, name):
+        if self.kind == "zip":
+            with self._lock:
+                return self._handle.read(self.members[name])
+        if self.compressed:
+            with self._lock:
+                return self._handle.extractfile(name).read()
+        offset, size = self.members[name]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+
+def open_archive(path):
+    """
+    Processzenként egyszer felépített ArchiveIndex (a worker processek az első használatkor építik;
+    fork után a szülő nyitott fájlja nem használható, mert a fájl pozíció közös lenne).
+    """
+    key = (os.getpid(), path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = ArchiveIndex(path)
+        return _indexes[key]
+
+
+def read_member(path):
+    """Egy "<archívum>::<tag>" útvonal tartalma (bytes)."""
+    archive_path, name = split_member_path(path)
+    return open_archive(archive_path).read(name)
+
+
+def open_input(path):
+    """Bináris olvasás: sima fájl, vagy archívum tag (memóriából)."""
+    if is_member_path(path):
+        return io.BytesIO(read_member(path))
+    return open(path, "rb")
+
+
+def open_text(path):
+    """Szöveges olvasás (pl. .align): sima fájl, vagy archívum tag (memóriából)."""
+    if is_member_path(path):
+        return io.StringIO(read_member(path).decode("utf-8"))
+    return open(path, "r")
+
+
+class MemberFile:
+    """
+    Egy archívum tag megnyitható útvonalként (az OpenCV / ffmpeg fájl útvonalat vár).
+
+    Linuxon memfd (csak memória): .path = /proc/self/fd/N, és .fds = (N,), amit egy
+    subprocess-nek pass_fds-ként kell átadni. memfd nélkül egy helyi temp fájl, ami a close()-kor törlődik.
+    """
+
+    def __init__(self, path):
+        data = read_member(path)
+        self.fds = ()
+        self._temp_path = None
+        if hasattr(os, "memfd_create"):
+            fd = os.memfd_create("grid-member")
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            self.fds = (fd,)
+            self.path = f"/proc/self/fd/{fd}"
+        else:
+            fd, self._temp_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1])
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            self.path = self._temp_path
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = ()
+        if self._temp_path is not None:
+            os.remove(self._temp_path)
+            self._temp_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,313 @@
+# cost_estimate.py
+# Teljes corpus extrakció költségbecslése (--estimate): idő, lemezhely, memória
+#
+# 1. A corpus bejárása úgy, ahogy a feldolgozás (iter_corpus_videos); videónként a frame
+#    szám és az fps a konténer metaadataiból, az align fájlból a szóhoz rendelt frame-ek
+#    száma - inferencia nélkül.
+# 2. Egy kis véletlen videó mintán a teljes pipeline lefut (dataset_processor_multithread
+#    --estimate), a beállított worker számmal.
+# 3. A minta mért értékeiből (mp / frame, detektálási arány, byte / sor, worker memória)
+#    vetítünk a teljes corpusra, speakerenként is.
+# A becslés a kimenet mellé kerül (<csv>.estimate.json); egy valós futás a végén a saját
+# mért értékeit (<csv>.run_stats.json) ezzel veti össze.
+
+import os
+import sys
+import gzip
+import json
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from dataset_io import parse_align_file
+from columnar_dataset import COLUMN_SPECS, selection_columns, column_shape
+from compressed_io import zstandard, strip_compression_suffix, DEFAULT_LEVELS
+
+# Opcionális memória mérés: psutil (Windows peak working set), különben resource (Unix)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ESTIMATE_SUFFIX = ".estimate.json"
+RUN_STATS_SUFFIX = ".run_stats.json"
+
+
+def estimate_path(output_csv):
+    return os.path.splitext(strip_compression_suffix(output_csv))[0] + ESTIMATE_SUFFIX
+
+
+def run_stats_path(output_csv):
+    return os.path.splitext(strip_compression_suffix(output_csv))[0] + RUN_STATS_SUFFIX
+
+
+def output_format(compression):
+    """A --compression értékhez tartozó kimeneti formátum neve (a becslés output_bytes kulcsa)."""
+    return {"gzip": "csv.gz", "zstd": "csv.zst"}.get(compression or "none", "csv")
+
+
+def dir_size(path):
+    if not path or not os.path.isdir(path):
+        return 0
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def peak_rss_bytes():
+    """Az aktuális process csúcs memóriája byte-ban (None, ha nem mérhető)."""
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return int(getattr(info, "peak_wset", 0) or info.rss)
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linuxon KB, macOS-en byte
+        return int(peak if sys.platform == "darwin" else peak * 1024)
+    return None
+
+
+def children_peak_rss_bytes():
+    """A legnagyobb (már befejeződött) gyerek process csúcs memóriája (Unix; különben None)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return int(peak if sys.platform == "darwin" else peak * 1024) or None
+
+
+# -------------------- Corpus számlálás (inferencia nélkül) --------------------
+def aligned_frame_count(word_list, frame_count, fps):
+    """Azon frame-ek száma, amelyekhez az align fájl szót rendel (find_word_for_frame != None)."""
+    if frame_count <= 0 or fps <= 0 or not word_list:
+        return 0
+    times = np.arange(frame_count) / fps
+    starts = np.array([start for _, start, _ in word_list])
+    ends = np.array([end for _, _, end in word_list])
+    return int(np.any((times[:, None] >= starts) & (times[:, None] <= ends), axis=1).sum())
+
+
+def _count_video(task):
+    # Lusta import: a becslő modul mediapipe nélkül is betölthető (video_stream -> frame_processor)
+    from video_stream import VideoFrameReader
+    speaker, video_file, video_path, align_path = task[:4]
+    # A VideoFrameReader archívum tagot is megnyit (corpus_archive)
+    with VideoFrameReader(video_path) as reader:
+        frames = max(reader.frame_count, 0)
+        fps = reader.fps or 0.0
+    aligned = aligned_frame_count(parse_align_file(align_path, sample_rate=25000), frames, fps)
+    return {"speaker": speaker, "video": video_file, "frames": frames, "aligned_frames": aligned}
+
+
+def count_corpus(tasks, processes=1):
+    """
+    Videónkénti frame / align számok a konténer metaadataiból.
+
+    Returns:
+        list: [{"speaker", "video", "frames", "aligned_frames"}, ...] a tasks sorrendjében
+    """
+    if processes <= 1 or len(tasks) < 2 * processes:
+        return [_count_video(task) for task in tasks]
+    with Pool(processes=processes) as pool:
+        return pool.map(_count_video, tasks, chunksize=64)
+
+
+# -------------------- Minta mérések --------------------
+def compressed_sizes(paths, level=None):
+    """A minta CSV-k tömörített mérete (gzip, és zstd, ha telepítve van)."""
+    data = b"".join(open(path, "rb").read() for path in paths)
+    sizes = {"csv.gz": len(gzip.compress(data, compresslevel=DEFAULT_LEVELS["gzip"] if level is None else level))}
+    if zstandard is not None:
+        zstd_level = DEFAULT_LEVELS["zstd"] if level is None else level
+        sizes["csv.zst"] = len(zstandard.ZstdCompressor(level=zstd_level).compress(data))
+    return sizes
+
+
+def columnar_row_bytes(selection, string_lengths):
+    """Egy sor mérete az oszlopos formátumban (a szöveg oszlopok a mintában mért leghosszabb értékkel)."""
+    landmark_indices = selection.landmark_indices if selection is not None else None
+    total = 0
+    for name in selection_columns(selection):
+        dtype = COLUMN_SPECS[name][0]
+        if dtype == "U":
+            total += 4 * string_lengths.get(name, 1)
+        else:
+            total += np.dtype(dtype).itemsize * int(np.prod(column_shape(name, landmark_indices), dtype=np.int64))
+    return total
+
+
+def measure_sample(sample_videos, results, part_paths, store_bytes, wall_s, processes, selection,
+                   merge_stats=None, compression_level=None, crop_row_bytes=0):
+    """
+    A minta futás mért értékei.
+
+    Args:
+        sample_videos: a minta videók count_corpus rekordjai
+        results: videónkénti eredmények ({"rows", "seconds", "peak_rss", ...}), a sikeresek
+        part_paths: a minta temp CSV-i
+        store_bytes: a minta nyers tárának mérete
+        wall_s: a minta futás falióra ideje a beállított worker számmal
+        merge_stats: a minta CSV-k összefűzésének BackgroundWriter statisztikája (a beállított tömörítéssel)
+        crop_row_bytes: --mouth-crops esetén egy sor kivágásának mérete (a .crops.npy mellékfájl)
+    """
+    frames = sum(video["frames"] for video in sample_videos)
+    aligned = sum(video["aligned_frames"] for video in sample_videos)
+    rows = sum(result["rows"] for result in results)
+    csv_bytes = sum(os.path.getsize(path) for path in part_paths)
+    string_lengths = {"speaker": max((len(v["speaker"]) for v in sample_videos), default=1),
+                      "video": max((len(v["video"]) for v in sample_videos), default=1),
+                      "word": 8}
+    worker_seconds = sum(result["seconds"] for result in results)
+    worker_peaks = [result["peak_rss"] for result in results if result.get("peak_rss")]
+    return {
+        "videos": len(sample_videos),
+        "frames": frames,
+        "aligned_frames": aligned,
+        "rows": rows,
+        "wall_s": round(wall_s, 3),
+        "worker_seconds_per_frame": worker_seconds / max(frames, 1),
+        # Worker indítás (model betöltés) és ütemezés: ami a falióra időből nem a videókra ment
+        "startup_s": max(wall_s - worker_seconds / max(processes, 1), 0.0),
+        "detection_rate": rows / aligned if aligned else 0.0,
+        "bytes_per_row": {
+            "csv": csv_bytes / max(rows, 1),
+            **{name: size / max(rows, 1) for name, size in compressed_sizes(part_paths, compression_level).items()},
+            "columnar": columnar_row_bytes(selection, string_lengths),
+            **({"crops.npy": crop_row_bytes} if crop_row_bytes else {}),
+        },
+        "raw_store_bytes_per_frame": store_bytes / max(frames, 1),
+        "merge_seconds_per_byte": (merge_stats["seconds"] / max(merge_stats["bytes_written"], 1)
+                                   if merge_stats else 0.0),
+        "worker_peak_rss": max(worker_peaks) if worker_peaks else None,
+        "main_peak_rss": peak_rss_bytes(),
+    }
+
+
+# -------------------- Vetítés --------------------
+def project_estimate(videos, sample, processes, settings=None, threads=1):
+    """
+    A minta mérések vetítése az összes (hátralévő) videóra.
+    processes x threads landmarker fut párhuzamosan; processes == 0: szál pool a fő processben.
+
+    Returns:
+        dict: totals, speakerenkénti bontás, minta, beállítások
+    """
+    per_frame = sample["worker_seconds_per_frame"]
+    workers = max(processes, 1) * threads
+    speakers = {}
+    for video in videos:
+        entry = speakers.setdefault(video["speaker"], {"videos": 0, "frames": 0, "aligned_frames": 0})
+        entry["videos"] += 1
+        entry["frames"] += video["frames"]
+        entry["aligned_frames"] += video["aligned_frames"]
+    for entry in speakers.values():
+        entry["rows"] = int(round(entry["aligned_frames"] * sample["detection_rate"]))
+        entry["csv_bytes"] = int(entry["rows"] * sample["bytes_per_row"]["csv"])
+        # A speakerenkénti idő egy worker ideje; a teljes falióra a worker számmal osztva
+        entry["worker_seconds"] = entry["frames"] * per_frame
+
+    frames = sum(entry["frames"] for entry in speakers.values())
+    rows = sum(entry["rows"] for entry in speakers.values())
+    worker_peak = sample["worker_peak_rss"]
+    main_peak = sample["main_peak_rss"]
+    totals = {
+        "videos": len(videos),
+        "frames": frames,
+        "aligned_frames": sum(entry["aligned_frames"] for entry in speakers.values()),
+        "rows": rows,
+        "wall_s": frames * per_frame / workers + sample["startup_s"],
+        "merge_s": rows * sample["bytes_per_row"]["csv"] * sample["merge_seconds_per_byte"],
+        "output_bytes": {name: int(rows * size) for name, size in sample["bytes_per_row"].items()},
+        "raw_store_bytes": int(frames * sample["raw_store_bytes_per_frame"]),
+        # A temp CSV-k a merge végéig mind a lemezen vannak: csúcsban kb. a CSV kétszerese kell
+        "peak_disk_bytes": int(2 * rows * sample["bytes_per_row"]["csv"]),
+        # Worker processenként a saját csúcs (benne a szálai); fő processben futva az maga a fő process
+        "peak_memory_bytes": (None if not worker_peak else max(main_peak or 0, worker_peak) if processes == 0
+                              else (main_peak or 0) + processes * worker_peak),
+    }
+    return {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "processes": processes, "threads": threads,
+            "settings": settings or {},
+            "totals": totals, "speakers": dict(sorted(speakers.items())), "sample": sample}
+
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(size) < 1024 or unit == "TB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.1f}mp"
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}ó {rest // 60:02d}p" if hours else f"{rest // 60}p {rest % 60:02d}mp"
+
+
+def print_estimate(estimate):
+    totals, sample, processes = estimate["totals"], estimate["sample"], estimate["processes"]
+    threads = estimate.get("threads", 1)
+    label = f"{processes} process" + (f" x {threads} szál" if threads > 1 else "") if processes else f"{threads} szál"
+    print(f"\n{'='*70}")
+    print(f"🧮 Becslés: {totals['videos']} videó, {totals['frames']} frame "
+          f"({totals['aligned_frames']} szóhoz rendelt), {label}")
+    print(f"{'='*70}")
+    print(f"   Minta: {sample['videos']} videó, {sample['frames']} frame, {sample['wall_s']:.1f}s, "
+          f"{1000 * sample['worker_seconds_per_frame']:.1f} ms/frame/worker, "
+          f"detektálás {100 * sample['detection_rate']:.1f}%")
+    print(f"\n   {'speaker':<10}{'videó':>7}{'frame':>10}{'sor':>10}{'CSV':>12}{'idő (1 worker)':>16}")
+    for speaker, entry in estimate["speakers"].items():
+        print(f"   {speaker:<10}{entry['videos']:>7}{entry['frames']:>10}{entry['rows']:>10}"
+              f"{_format_bytes(entry['csv_bytes']):>12}{_format_duration(entry['worker_seconds']):>16}")
+    print(f"\n   ⏱️  Várható idő: {_format_duration(totals['wall_s'])} ({label}) "
+          f"+ merge {_format_duration(totals['merge_s'])}")
+    print(f"   📄 Várható sorok: {totals['rows']}")
+    print("   💾 Kimenet: "
+          + ", ".join(f"{name} {_format_bytes(size)}" for name, size in totals["output_bytes"].items())
+          + f"; nyers tár {_format_bytes(totals['raw_store_bytes'])}")
+    print(f"   💽 Csúcs lemezigény (temp CSV-k + merge): ~{_format_bytes(totals['peak_disk_bytes'])}")
+    if totals["peak_memory_bytes"]:
+        print(f"   🧠 Csúcs memória: ~{_format_bytes(totals['peak_memory_bytes'])} "
+              + (f"({processes} x {_format_bytes(sample['worker_peak_rss'])} worker + fő process)" if processes
+                 else "(egyetlen process)"))
+
+
+# -------------------- Összevetés valós futással --------------------
+def load_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_json(path, data):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def compare_with_run(estimate, run_stats):
+    """
+    Becslés vs valós futás: {mennyiség: (becsült, valós, relatív eltérés)}.
+    Csak az azonos videó számú és beállítású (ugyanarra a feladatra szóló) becslés összevethető.
+    """
+    totals = estimate["totals"]
+    pairs = {
+        "wall_s": (totals["wall_s"], run_stats["wall_s"]),
+        "merge_s": (totals.get("merge_s"), run_stats.get("merge_s")),
+        "rows": (totals["rows"], run_stats["rows"]),
+        "output_bytes": (totals["output_bytes"].get(run_stats["format"]), run_stats["output_bytes"]),
+    }
+    if totals.get("peak_memory_bytes") and run_stats.get("peak_memory_bytes"):
+        pairs["peak_memory_bytes"] = (totals["peak_memory_bytes"], run_stats["peak_memory_bytes"])
+    return {name: (estimated, actual, (estimated - actual) / actual if actual else None)
+            for name, (estimated, actual) in pairs.items() if estimated is not None and actual is not None}
+
+
+def print_comparison(comparison, title):
+    print(f"\n📐 {title}")
+    for name, (estimated, actual, error) in comparison.items():
+        show = _format_duration if name.endswith("_s") else (_format_bytes if name.endswith("bytes") else str)
+        print(f"   {name:<18} becsült {show(estimated):>12}   valós {show(actual):>12}"
+              + (f"   ({100 * error:+.1f}%)" if error is not None else ""))
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Régi mouth_data.csv -> oszlopos (columnar) dataset migráció, újrafeldolgozás nélkül
+
+A több GB-os, ';'-vel elválasztott, JSON cellás CSV-t fix sorszámú chunkokban
+olvassuk (memória-mappelve), a JSON oszlopokat worker processek alakítják
+float32 tömbökké, a chunkok sorrendben part-XXXXX könyvtárakba kerülnek.
+A számtömb cellák közvetlenül egy előre lefoglalt float32 tömbbe parse-olódnak (nincs
+soronként Python float lista), a feldolgozás alatt álló chunkok összmérete pedig byte-ban
+korlátos (--max-in-flight-mb), így a memóriát a chunk méret korlátozza, nem a fájl mérete.
+
+Közben sor indexet építünk (minden adatsor byte offsetje). Minden kiírt chunk
+után a migration_state.json-be kerül, meddig jutottunk, így egy megszakadt
+konverzió az utolsó kész chunktól folytatódik. A végén az index a CSV mellé
+kerül (<csv>.rowidx.npy), amit pl. az extract_sample is használ.
+
+Használat:
+    python csv_to_columnar.py mouth_data.csv mouth_columnar/
+    python csv_to_columnar.py mouth_data.csv mouth_columnar/ --chunk-rows 2000 --workers 8 --max-in-flight-mb 512
+    python csv_to_columnar.py mouth_data.csv mouth_columnar/ --restart   # elölről
+"""
+
+import os
+import csv
+import json
+import mmap
+import shutil
+import argparse
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from dataset_io import CSV_DELIMITER, CSV_HEADER, KEY_COLUMNS, row_index_path
+from columnar_dataset import COLUMN_SPECS, BLEND_SHAPE_COLUMNS, ColumnarWriter, read_manifest, load_part
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+STATE_FILE = "migration_state.json"
+OFFSETS_DIR = "_row_offsets"
+SCAN_BLOCK_BYTES = 16 * 1024 * 1024
+# Sorok chunkonként (= partonként); egy teljes sor ~70 KB szöveg, ~13 KB float32
+CHUNK_ROWS = 5000
+# A workereknek kiadott, még ki nem írt chunkok forrás byte-jainak felső határa
+MAX_IN_FLIGHT_BYTES = 1024 * 1024 * 1024
+# JSON számtömb cella -> vesszővel elválasztott számok (a zárójelek szóközzé válnak)
+_BRACKETS = str.maketrans("[]", "  ")
+
+
+def header_columns(header):
+    """
+    A CSV fejlécéből az oszlopos dataset oszlopai (a --columns-szal írt CSV-kben nem mind van meg).
+    """
+    columns = []
+    for name in COLUMN_SPECS:
+        if name == "mouth_center":
+            if "mouth_center_x" in header and "mouth_center_y" in header:
+                columns.append(name)
+        elif name in header:
+            columns.append(name)
+    missing = [name for name in KEY_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"Hiányzó kulcs oszlopok a CSV-ben: {', '.join(missing)}")
+    return columns
+
+
+def iter_row_chunks(data, start, end, chunk_rows, block_bytes=SCAN_BLOCK_BYTES):
+    """
+    Sorhatárok keresése a memória-mappelt fájlban, chunk_rows soronként.
+    A JSON cellákban nincs sortörés, így a b"\\n" mindig sorhatár.
+
+    Yield:
+        numpy.ndarray: a chunk sorainak kezdő offsetjei + a chunk vége (chunk_rows + 1 elem, az utolsó chunk rövidebb)
+    """
+    pending = [np.array([start], dtype=np.int64)]
+    pending_rows = 0
+    pos = start
+    while pos < end:
+        block_end = min(pos + block_bytes, end)
+        # Minden \n utáni pozíció egy új sor eleje
+        block = np.frombuffer(data[pos:block_end], dtype=np.uint8)
+        starts = np.flatnonzero(block == 10).astype(np.int64) + pos + 1
+        pending.append(starts)
+        pending_rows += len(starts)
+        pos = block_end
+        while pending_rows >= chunk_rows:
+            offsets = np.concatenate(pending)
+            yield offsets[:chunk_rows + 1]
+            pending = [offsets[chunk_rows:]]
+            pending_rows = len(offsets) - chunk_rows - 1
+    offsets = np.concatenate(pending)
+    if offsets[-1] < end:
+        # Az utolsó sor végén nincs sortörés
+        offsets = np.append(offsets, end)
+    if len(offsets) > 1:
+        yield offsets
+
+
+def _parse_json_column(cells, name):
+    """
+    Egy JSON oszlop cellái -> előre lefoglalt tömb. A számtömb cellák (landmarkok) soronként
+    np.fromstring-gel, Python float objektumok nélkül kerülnek a helyükre; a blend shape
+    dict-ek kicsik, azok soronként JSON-ként.
+    """
+    dtype, shape = COLUMN_SPECS[name]
+    if name in BLEND_SHAPE_COLUMNS:
+        keys = BLEND_SHAPE_COLUMNS[name]
+        out = np.empty((len(cells), len(keys)), dtype=dtype)
+        for i, cell in enumerate(cells):
+            values = _json_loads(cell)
+            out[i] = [values.get(key, 0.0) for key in keys]
+        return out
+    if not cells:
+        return np.empty((0,) + shape, dtype=dtype)
+    # A landmark oszlopok pontszáma a --landmarks részhalmaztól függ: az első sorból
+    first = np.fromstring(cells[0].translate(_BRACKETS), dtype=dtype, sep=",")
+    inner = int(np.prod(shape[1:])) if len(shape) > 1 else 1
+    out = np.empty((len(cells), first.size), dtype=dtype)
+    out[0] = first
+    for i in range(1, len(cells)):
+        out[i] = np.fromstring(cells[i].translate(_BRACKETS), dtype=dtype, sep=",")
+    return out.reshape((len(cells), first.size // inner) + shape[1:])
+
+
+def _parse_chunk(task):
+    """Worker: egy chunk byte tartománya -> oszlopos tömbök."""
+    source_path, start, end, header, columns = task
+    with open(source_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        lines = data[start:end].split(b"\n")
+    # Soronkénti dekódolás: egy StringIO a teljes chunkot 4 byte / karakterrel is tartaná
+    rows = [row for row in csv.reader((line.decode("utf-8") for line in lines), delimiter=CSV_DELIMITER) if row]
+    del lines
+    position = {name: i for i, name in enumerate(header)}
+
+    arrays = {}
+    for name in columns:
+        if name == "mouth_center":
+            arrays[name] = np.array([[int(row[position["mouth_center_x"]]), int(row[position["mouth_center_y"]])]
+                                     for row in rows], dtype=np.int32).reshape(-1, 2)
+        elif COLUMN_SPECS[name][0] == "U":
+            arrays[name] = np.array([row[position[name]] for row in rows], dtype=str)
+        elif name == "frame_idx":
+            arrays[name] = np.array([int(row[position[name]]) for row in rows], dtype=np.int32)
+        else:
+            arrays[name] = _parse_json_column([row[position[name]] for row in rows], name)
+    return arrays
+
+
+def read_csv_header(source_path):
+    with open(source_path, "r", encoding="utf-8-sig", newline="") as f:
+        return next(csv.reader(f, delimiter=CSV_DELIMITER), [])
+
+
+def iter_source_chunks(source, chunk_rows, required=()):
+    """
+    Egy CSV vagy oszlopos dataset chunkjai (picklelhető leírók, a workerek töltik be őket).
+    Oszlopos dataset: ("columnar", dataset, part, start, end); CSV: ("csv", path, start_byte, end_byte, header)
+
+    Args:
+        required: CSV esetén ezeknek az oszlopoknak szerepelniük kell a fejlécben
+    """
+    if os.path.isdir(source):
+        for part in read_manifest(source)["parts"]:
+            for start in range(0, part["rows"], chunk_rows):
+                yield ("columnar", source, part["name"], start, min(start + chunk_rows, part["rows"]))
+        return
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header_end = data.find(b"\n") + 1
+        header = next(csv.reader([data[:header_end].decode("utf-8-sig")], delimiter=CSV_DELIMITER))
+        missing = [name for name in required if name not in header]
+        if missing:
+            raise ValueError(f"Hiányzó oszlopok a CSV-ben: {', '.join(missing)}")
+        for offsets in iter_row_chunks(data, header_end, len(data), chunk_rows):
+            yield ("csv", source, int(offsets[0]), int(offsets[-1]), header)
+
+
+def load_source_chunk(chunk, columns):
+    """Worker: egy iter_source_chunks leíró -> oszlopnév -> tömb (csak a kért oszlopok)."""
+    if chunk[0] == "columnar":
+        _, dataset_dir, part_name, start, end = chunk
+        arrays = load_part(dataset_dir, part_name, columns=columns)
+        return {name: np.asarray(arrays[name][start:end]) for name in arrays}
+    _, source_path, start, end, header = chunk
+    return _parse_chunk((source_path, start, end, header, columns))
+
+
+def _source_signature(source_path):
+    stat = os.stat(source_path)
+    return {"source": os.path.abspath(source_path), "source_size": stat.st_size,
+            "source_mtime": int(stat.st_mtime)}
+
+
+def _write_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _load_state(output_dir, signature, chunk_rows):
+    """A korábbi, félbeszakadt migráció állapota, ha ugyanarra a forrásra és chunk méretre szól."""
+    path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if any(state.get(key) != value for key, value in signature.items()) or state["chunk_rows"] != chunk_rows:
+        raise ValueError(f"A {path} egy másik forrásfájlhoz vagy chunk mérethez tartozik "
+                         f"(--restart az újrakezdéshez)")
+    return state
+
+
+def _save_row_index(source_path, output_dir, offset_files, source_size):
+    offsets = [np.load(os.path.join(output_dir, OFFSETS_DIR, name)) for name in offset_files]
+    index = np.concatenate(offsets + [np.array([source_size], dtype=np.int64)])
+    path = row_index_path(source_path)
+    try:
+        np.save(path, index)
+    except OSError as e:
+        # A load_row_index (extract_sample) csak a CSV mellett keresi, máshová menteni nincs értelme
+        print(f"⚠️  A sor index nem menthető a CSV mellé ({path}: {e}); "
+              f"az extract_sample véletlen offsetekkel mintavételez")
+        return None
+    return path
+
+
+def migrate_csv(source_path, output_dir, chunk_rows=CHUNK_ROWS, workers=None, prefetch=None, restart=False,
+                max_in_flight_bytes=MAX_IN_FLIGHT_BYTES):
+    """
+    Régi mouth_data.csv konvertálása oszlopos datasetté, chunkonként, folytatható módon.
+    Egyszerre legfeljebb prefetch chunk és max_in_flight_bytes forrás byte van feldolgozás alatt
+    (legalább egy chunk mindig).
+
+    Returns:
+        dict: a kész manifest
+    """
+    workers = workers or cpu_count()
+    prefetch = prefetch or 2 * workers
+    signature = _source_signature(source_path)
+    if restart and os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(source_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header_end = data.find(b"\n") + 1
+        header = next(csv.reader([data[:header_end].decode("utf-8-sig")], delimiter=CSV_DELIMITER))
+        columns = header_columns(header)
+
+        state = _load_state(output_dir, signature, chunk_rows)
+        if state is None:
+            state = dict(signature, chunk_rows=chunk_rows, header=header, next_offset=header_end,
+                         parts=[], offset_files=[], complete=False)
+            _write_state(output_dir, state)
+        elif state["complete"]:
+            print(f"✅ Már kész: {output_dir}")
+            with open(os.path.join(output_dir, "manifest.json"), "r", encoding="utf-8") as mf:
+                return json.load(mf)
+        else:
+            print(f"↩️  Folytatás: {len(state['parts'])} kész chunk, "
+                  f"{sum(p['rows'] for p in state['parts'])} sor, offset {state['next_offset']}")
+
+        print(f"\n🔄 {source_path} -> {output_dir} "
+              f"({signature['source_size'] / 1e9:.2f} GB, {chunk_rows} sor / chunk, {workers} process)")
+        if [name for name in CSV_HEADER if name not in header]:
+            print(f"   Oszlopok: {', '.join(columns)}")
+
+        os.makedirs(os.path.join(output_dir, OFFSETS_DIR), exist_ok=True)
+        writer = ColumnarWriter(output_dir, chunk_rows=chunk_rows, columns=columns, parts=state["parts"])
+        chunks = iter_row_chunks(data, state["next_offset"], len(data), chunk_rows)
+
+        def commit(offsets, arrays):
+            # Előbb a part, utána az állapot: egy félbehagyott part a folytatáskor felülíródik
+            writer.write_chunk(arrays)
+            offsets_name = f"chunk-{len(state['offset_files']):05d}.npy"
+            np.save(os.path.join(output_dir, OFFSETS_DIR, offsets_name), offsets[:-1])
+            state["parts"] = writer.parts
+            state["offset_files"].append(offsets_name)
+            state["next_offset"] = int(offsets[-1])
+            _write_state(output_dir, state)
+            print(f"   ✓ {writer.parts[-1]['name']}: {writer.total_rows} sor "
+                  f"({100 * state['next_offset'] / max(len(data), 1):.1f}%)")
+
+        with Pool(processes=workers) as pool:
+            pending = deque()
+            in_flight = 0
+            for offsets in chunks:
+                size = int(offsets[-1] - offsets[0])
+                while pending and (len(pending) >= prefetch or in_flight + size > max_in_flight_bytes):
+                    done_offsets, result = pending.popleft()
+                    in_flight -= int(done_offsets[-1] - done_offsets[0])
+                    commit(done_offsets, result.get())
+                task = (source_path, int(offsets[0]), int(offsets[-1]), header, columns)
+                pending.append((offsets, pool.apply_async(_parse_chunk, (task,))))
+                in_flight += size
+            while pending:
+                offsets, result = pending.popleft()
+                commit(offsets, result.get())
+
+    manifest = writer.close(extra={"source": os.path.basename(source_path)})
+    index_path = _save_row_index(source_path, output_dir, state["offset_files"], signature["source_size"])
+    shutil.rmtree(os.path.join(output_dir, OFFSETS_DIR), ignore_errors=True)
+    state["complete"] = True
+    state["offset_files"] = []
+    _write_state(output_dir, state)
+    print(f"\n✅ Migráció kész: {manifest['total_rows']} sor, {len(manifest['parts'])} part"
+          + (f", sor index: {index_path}" if index_path else ""))
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Régi mouth_data.csv -> oszlopos dataset (folytatható)")
+    parser.add_argument("source", help="A régi ';'-es mouth_data.csv")
+    parser.add_argument("output", help="Kimeneti oszlopos dataset könyvtár")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Sorok száma chunkonként (= partonként)")
+    parser.add_argument("--workers", type=int, default=None, help="JSON parse worker processek (alapból cpu_count)")
+    parser.add_argument("--prefetch", type=int, default=None,
+                        help="Egyszerre feldolgozás alatt álló chunkok (alapból 2 x workers)")
+    parser.add_argument("--max-in-flight-mb", type=float, default=MAX_IN_FLIGHT_BYTES / 1024 / 1024,
+                        help="A feldolgozás alatt álló chunkok forrás méretének felső határa (MB)")
+    parser.add_argument("--restart", action="store_true", help="A korábbi félkész kimenet törlése, újrakezdés")
+    args = parser.parse_args()
+
+    try:
+        migrate_csv(args.source, args.output, chunk_rows=args.chunk_rows, workers=args.workers,
+                    prefetch=args.prefetch, restart=args.restart,
+                    max_in_flight_bytes=int(args.max_in_flight_mb * 1024 * 1024))
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
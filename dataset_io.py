@@ -0,0 +1,343 @@
+# dataset_io.py
+# Közös segédfüggvények a dataset előállításához: align fájlok, corpus bejárás, CSV sorok
+
+import os
+import json
+from functools import lru_cache
+from collections import namedtuple
+
+import numpy as np
+
+from corpus_archive import (
+    list_archive_speakers, find_speaker_archive, open_archive, member_path, open_text
+)
+
+# Opcionális gyors JSON backend a CSV íráshoz (ha nincs telepítve, a stdlib formázás fut)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# A mouth_data.csv oszlopai (mindkét processor és az export ugyanezt írja)
+CSV_HEADER = [
+    "speaker", "video", "frame_idx", "word",
+    "mouth_center_x", "mouth_center_y",
+    "outer_lip_relative_points", "inner_lip_relative_points",
+    "blend_shapes", "mouth_blend_shapes",
+    "eyes_blend_shapes", "brow_blend_shapes", "face_shape_blend_shapes",
+    "3d_landmarks", "pixel_landmarks", "relative_landmarks",
+    "face_center_pixel", "face_center_3d"
+]
+
+# A JSON-ként tárolt oszlopok (mouth_data kulcsok, a CSV_HEADER sorrendjében)
+JSON_COLUMNS = CSV_HEADER[6:]
+
+CSV_DELIMITER = ';'
+
+# Tizedesjegyek a gyors CSV íráshoz (mouth_data_to_csv_row(decimals=...)):
+# normalizált koordináták / blend shape-ek 5, pixel értékek 2 tizedes
+DEFAULT_CSV_DECIMALS = {
+    "outer_lip_relative_points": 2, "inner_lip_relative_points": 2,
+    "blend_shapes": 5, "mouth_blend_shapes": 5, "eyes_blend_shapes": 5,
+    "brow_blend_shapes": 5, "face_shape_blend_shapes": 5,
+    "3d_landmarks": 5, "pixel_landmarks": 2, "relative_landmarks": 2,
+    "face_center_pixel": 2, "face_center_3d": 5,
+}
+
+# Mindig kiírt azonosító oszlopok
+KEY_COLUMNS = CSV_HEADER[:4]
+
+# Előre definiált oszlop csoportok a --columns opcióhoz (oszlopnevekkel keverhetők)
+FEATURE_SETS = {
+    "all": CSV_HEADER[4:],
+    "lips": ["mouth_center_x", "mouth_center_y", "outer_lip_relative_points", "inner_lip_relative_points"],
+    "blend": ["blend_shapes", "mouth_blend_shapes", "eyes_blend_shapes",
+              "brow_blend_shapes", "face_shape_blend_shapes"],
+    "mouth": ["mouth_center_x", "mouth_center_y", "outer_lip_relative_points",
+              "inner_lip_relative_points", "mouth_blend_shapes"],
+    "landmarks": ["3d_landmarks", "pixel_landmarks", "relative_landmarks"],
+    "face_center": ["face_center_pixel", "face_center_3d"],
+}
+
+# A blend shape-eket igénylő oszlopok (ha egyik sincs kiválasztva, a landmarker ki se számolja őket)
+BLEND_SHAPE_CSV_COLUMNS = FEATURE_SETS["blend"]
+
+# Kimeneti oszlopválasztás:
+#   columns: a KEY_COLUMNS utáni CSV oszlopok (CSV_HEADER sorrendben)
+#   fields: a build_mouth_data által kiszámolandó mouth_data kulcsok (None = mind)
+#   landmark_indices: a landmark oszlopokba kerülő pontok indexei (None = mind a 478)
+OutputSelection = namedtuple("OutputSelection", ["columns", "fields", "landmark_indices"])
+
+
+def make_output_selection(columns_spec=None, landmark_indices=None):
+    """
+    A --columns opció feldolgozása.
+
+    Args:
+        columns_spec: vesszővel elválasztott oszlopnevek és/vagy FEATURE_SETS nevek
+                      (pl. "mouth,3d_landmarks"); None = minden oszlop
+        landmark_indices: a landmark oszlopokban megtartott pontok (None = mind)
+
+    Returns:
+        OutputSelection
+    """
+    if columns_spec is None:
+        columns = CSV_HEADER[4:]
+    else:
+        wanted = set()
+        for name in (n.strip() for n in columns_spec.split(",")):
+            if not name:
+                continue
+            if name in FEATURE_SETS:
+                wanted.update(FEATURE_SETS[name])
+            elif name in CSV_HEADER[4:]:
+                wanted.add(name)
+            elif name not in KEY_COLUMNS:
+                raise ValueError(f"Ismeretlen oszlop vagy csoport: {name} "
+                                 f"(csoportok: {', '.join(FEATURE_SETS)})")
+        columns = [name for name in CSV_HEADER[4:] if name in wanted]
+    fields = None
+    if columns != CSV_HEADER[4:] or landmark_indices is not None:
+        fields = {"mouth_center" if name.startswith("mouth_center_") else name for name in columns}
+    if landmark_indices is not None:
+        landmark_indices = sorted(set(int(i) for i in landmark_indices))
+    return OutputSelection(columns, fields, landmark_indices)
+
+
+def selection_needs_blend_shapes(selection):
+    return selection is None or any(name in BLEND_SHAPE_CSV_COLUMNS for name in selection.columns)
+
+
+def csv_header(selection=None):
+    """A kimeneti CSV fejléce az oszlopválasztás szerint."""
+    return CSV_HEADER if selection is None else KEY_COLUMNS + selection.columns
+
+VIDEO_EXTENSIONS = (".mpg", ".mp4")
+
+# Sor index egy CSV mellett: <csv>.rowidx.npy, int64 byte offsetek (minden adatsor eleje + a fájl mérete)
+ROW_INDEX_SUFFIX = ".rowidx.npy"
+
+
+def parse_align_file(align_path, sample_rate=25000):
+    """
+    Betölti az align fájlt és listát ad vissza: [(word, start_time_s, end_time_s), ...]
+    Az align fájlban a GRID corpus mintaszámokat tartalmaz (nem másodperceket),
+    ezért konvertálni kell a sample_rate alapján.
+    """
+    word_list = []
+    # Az align_path archívum tag is lehet ("<archívum>::<tag>"), ekkor a memóriából olvassuk
+    with open_text(align_path) as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) >= 3:
+                start_sample = float(parts[0])
+                end_sample = float(parts[1])
+                word = parts[2]
+                # Átváltás másodpercre:
+                start_time_s = start_sample / sample_rate
+                end_time_s = end_sample / sample_rate
+                word_list.append((word, start_time_s, end_time_s))
+    return word_list
+
+
+def find_word_for_frame(word_list, frame_idx, fps):
+    """
+    Szó meghatározása az aktuális frame idő alapján (None, ha egyik szóhoz sem tartozik).
+    """
+    current_time = frame_idx / fps
+    for word, start_time, end_time in word_list:
+        if start_time <= current_time <= end_time:
+            return word
+    return None
+
+
+def speaker_paths(video_base, align_base, speaker):
+    """
+    A GRID könyvtárszerkezet: VIDEO_BASE/sX/sX/*.mpg és ALIGN_BASE/sX/align/*.align
+    """
+    speaker_video_path = os.path.join(video_base, speaker, speaker)
+    speaker_align_path = os.path.join(align_base, speaker, "align")
+    return speaker_video_path, speaker_align_path
+
+
+def list_speakers(video_base):
+    """
+    A VIDEO_BASE alatti speakerek rendezett listája: speaker mappák és <speaker>.tar / .zip archívumok.
+    """
+    speakers = {s for s in os.listdir(video_base) if os.path.isdir(os.path.join(video_base, s))}
+    return sorted(speakers | set(list_archive_speakers(video_base, refresh=True)))
+
+
+def find_align_path(align_base, speaker, video_file):
+    """
+    Egy videó align fájlja: ALIGN_BASE/sX/align/<név>.align, vagy ha az nincs, a
+    ALIGN_BASE/sX.tar (zip, ...) archívum <név>.align tagja. None, ha sehol sincs.
+    """
+    align_file_name = os.path.splitext(video_file)[0] + ".align"
+    align_path = os.path.join(align_base, speaker, "align", align_file_name)
+    if os.path.exists(align_path):
+        return align_path
+    archive_path = find_speaker_archive(align_base, speaker)
+    if archive_path is not None:
+        name = open_archive(archive_path).find(align_file_name)
+        if name is not None:
+            return member_path(archive_path, name)
+    return None
+
+
+def find_video_path(video_base, speaker, video_file):
+    """Egy videó útvonala (mappából vagy a speaker archívumából), vagy None."""
+    if os.path.basename(video_file) != video_file:
+        return None
+    video_path = os.path.join(video_base, speaker, speaker, video_file)
+    if os.path.isfile(video_path):
+        return video_path
+    archive_path = find_speaker_archive(video_base, speaker)
+    if archive_path is not None:
+        name = open_archive(archive_path).find(video_file)
+        if name is not None:
+            return member_path(archive_path, name)
+    return None
+
+
+def _list_speaker_videos(video_base, speaker):
+    """[(video_file, video_path)] a speaker mappájából, vagy ha nincs, az archívumából (név szerint rendezve)."""
+    speaker_video_path = os.path.join(video_base, speaker, speaker)
+    if os.path.isdir(speaker_video_path):
+        return [(video_file, os.path.join(speaker_video_path, video_file))
+                for video_file in sorted(os.listdir(speaker_video_path))]
+    archive_path = find_speaker_archive(video_base, speaker)
+    if archive_path is None:
+        return []
+    index = open_archive(archive_path)
+    return [(video_file, member_path(archive_path, index.by_basename[video_file]))
+            for video_file in sorted(index.by_basename)]
+
+
+def iter_speaker_videos(video_base, align_base, speaker, verbose=True):
+    """
+    Egy speaker videóit járja be úgy, ahogy a process_speaker.
+    Yield: (video_file, video_path, align_path) - a hiányzó align fájlú videókat kihagyja.
+    A video_path / align_path archívum tag is lehet ("<archívum>::<tag>", lásd corpus_archive).
+    """
+    for video_file, video_path in _list_speaker_videos(video_base, speaker):
+        if not video_file.lower().endswith(VIDEO_EXTENSIONS):
+            continue
+
+        align_path = find_align_path(align_base, speaker, video_file)
+        if align_path is None:
+            if verbose:
+                print(f"[{speaker}] Missing align file for {video_file}, skipping...")
+            continue
+
+        yield video_file, video_path, align_path
+
+
+def iter_corpus_videos(video_base, align_base, speakers=None, verbose=True):
+    """
+    A teljes corpus bejárása.
+    Yield: (speaker, video_file, video_path, align_path)
+    """
+    if speakers is None:
+        speakers = list_speakers(video_base)
+    for speaker in speakers:
+        for video_file, video_path, align_path in iter_speaker_videos(
+                video_base, align_base, speaker, verbose=verbose):
+            yield speaker, video_file, video_path, align_path
+
+
+@lru_cache(maxsize=256)
+def _array_format(shape, decimals):
+    """Printf minta egy adott alakú tömb JSON listájához, pl. (2,) -> "[%.2f,%.2f]"."""
+    item = f"%.{decimals}f"
+    for size in reversed(shape):
+        item = "[" + ",".join([item] * size) + "]"
+    return item
+
+
+@lru_cache(maxsize=64)
+def _dict_format(keys, decimals):
+    """Printf minta egy blend shape dict JSON objektumához (fix kulcssorrenddel)."""
+    return "{" + ",".join(f'"{key}":%.{decimals}f' for key in keys) + "}"
+
+
+def format_json_value(value, decimals):
+    """
+    Egy mouth_data mező kompakt JSON szövege fix tizedesjegyekkel.
+    json.loads-szal ugyanúgy olvasható, mint a json.dumps kimenete, de gyorsabb és rövidebb.
+
+    Args:
+        value: numpy tömb / (beágyazott) lista vagy {név: érték} dict
+        decimals: tizedesjegyek száma
+    """
+    if isinstance(value, dict):
+        if orjson is not None:
+            return orjson.dumps({key: round(float(v), decimals) for key, v in value.items()}).decode()
+        return _dict_format(tuple(value), decimals) % tuple(value.values())
+    array = np.asarray(value, dtype=np.float64)
+    if not np.isfinite(array).all():
+        # NaN / inf: a printf formázás nem JSON-kompatibilis, marad a stdlib
+        return json.dumps(np.round(array, decimals).tolist(), separators=(',', ':'))
+    if orjson is not None:
+        return orjson.dumps(np.round(array, decimals), option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return _array_format(array.shape, decimals) % tuple(array.ravel().tolist())
+
+
+def mouth_data_to_csv_row(speaker, video_file, frame_idx, word, mouth_data, selection=None, decimals=None,
+                          separators=(',', ':')):
+    """
+    Egy feldolgozott frame CSV sora (a CSV_HEADER sorrendjében, vagy csak a kiválasztott oszlopok).
+
+    decimals: None = json.dumps teljes pontossággal (régi kimenet); int = minden oszlopra
+              ennyi tizedes; dict = oszlopnév -> tizedes (pl. DEFAULT_CSV_DECIMALS).
+    separators: a json.dumps elválasztói decimals=None esetén (a dataset_processor.py a json
+                alapértelmezését, (", ", ": ")-t írja, a többi író a tömör alakot).
+    """
+    if decimals is not None:
+        columns = selection.columns if selection is not None else CSV_HEADER[4:]
+        row = [speaker, video_file, frame_idx, word]
+        for column in columns:
+            if column == "mouth_center_x":
+                row.append(int(mouth_data["mouth_center"][0]))
+            elif column == "mouth_center_y":
+                row.append(int(mouth_data["mouth_center"][1]))
+            else:
+                places = decimals if isinstance(decimals, int) else decimals.get(column, 5)
+                row.append(format_json_value(mouth_data[column], places))
+        return row
+    if selection is not None:
+        row = [speaker, video_file, frame_idx, word]
+        for column in selection.columns:
+            if column == "mouth_center_x":
+                row.append(mouth_data["mouth_center"][0])
+            elif column == "mouth_center_y":
+                row.append(mouth_data["mouth_center"][1])
+            else:
+                row.append(json.dumps(mouth_data[column], separators=separators))
+        return row
+    return [
+        speaker,
+        video_file,
+        frame_idx,
+        word,
+        mouth_data["mouth_center"][0],
+        mouth_data["mouth_center"][1],
+    ] + [json.dumps(mouth_data[column], separators=separators) for column in JSON_COLUMNS]
+
+
+def row_index_path(csv_path):
+    return csv_path + ROW_INDEX_SUFFIX
+
+
+def load_row_index(csv_path, mmap=True):
+    """
+    A CSV sor indexe (adatsorok kezdő byte offsetjei + a fájl mérete), vagy None,
+    ha nincs index, vagy már nem egyezik a fájllal (a CSV azóta megváltozott).
+    """
+    path = row_index_path(csv_path)
+    if not os.path.exists(path):
+        return None
+    offsets = np.load(path, mmap_mode="r" if mmap else None)
+    if len(offsets) == 0 or int(offsets[-1]) != os.path.getsize(csv_path):
+        return None
+    return offsets
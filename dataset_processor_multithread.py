@@ -1,13 +1,40 @@
 import os
-import cv2
 import csv
 import json
-import numpy as np
-import mediapipe as mp
-from mediapipe.tasks import python
+import time
+import queue
+import random
+import shutil
+import tempfile
+import argparse
+import threading
 from mediapipe.tasks.python import vision
-from multiprocessing import Pool, cpu_count
-from frame_processor import process_frame_full_mouth
+from multiprocessing import cpu_count
+from concurrent.futures import Future
+from frame_processor import create_landmarker_options, AdaptiveDetector, DETECTION_PATHS, resolve_landmark_indices
+from dataset_io import (
+    CSV_DELIMITER, CSV_HEADER, FEATURE_SETS, DEFAULT_CSV_DECIMALS, parse_align_file, iter_corpus_videos, list_speakers,
+    mouth_data_to_csv_row, make_output_selection, selection_needs_blend_shapes, csv_header
+)
+from video_stream import iter_video_records, iter_video_crops, DECODER_BACKENDS
+from autotune import run_autotune, load_autotune_config, init_worker_threads
+from landmarker_profile import PROFILE_PATH, load_profile, default_profile, profile_label
+from video_supervisor import run_supervised, run_threaded, write_failure_report
+from sharding import (
+    load_or_build_plan, shard_videos_by_speaker, shard_output_path, write_shard_manifest
+)
+from raw_store import RawResultStore, RawVideoRecorder, lookup_store_key, rebuild_video_records, cached_file_sha256
+from feature_stats import FeatureStats, stat_columns, state_path, merge_state_files
+from compressed_io import COMPRESSIONS, BackgroundWriter, compressed_path, format_write_stats
+from mouth_crops import (
+    CROP_COLORS, CROP_SCALE, MouthCropRecorder, make_crop_spec, crop_shape, crop_row_bytes, crops_path,
+    part_crops_path, write_part_crops, part_crops_complete, open_crops_writer, write_crops_meta, npy_header
+)
+from cost_estimate import (
+    count_corpus, measure_sample, project_estimate, print_estimate, compare_with_run, print_comparison,
+    estimate_path, run_stats_path, load_json, save_json, output_format, dir_size, peak_rss_bytes,
+    children_peak_rss_bytes
+)
 
 # -------------------- Beállítások --------------------
 VIDEO_BASE = "D:/MestInt/datasets/gridcorpus/video"
@@ -15,6 +42,41 @@ ALIGN_BASE = "D:/MestInt/datasets/gridcorpus/align"
 OUTPUT_CSV = "D:/MestInt/word_tomoutmap/mouth_data.csv"
 TEMP_DIR = "D:/MestInt/word_tomoutmap/temp"
 MODEL_PATH = "face_landmarker.task"
+# Modell fájl + landmarker beállítások profilja (ha létezik, a MODEL_PATH helyett ezt használjuk;
+# a model_benchmark.py --select írja, lásd landmarker_profile.py)
+LANDMARKER_PROFILE = PROFILE_PATH
+# Nyers landmarker kimenetek tára (None = kikapcsolva). Ha egy videó már benne van,
+# nem futtatjuk rá újra a MediaPipe-ot; a dataset a tárból is újraépíthető (raw_store.py export).
+RAW_STORE_DIR = "D:/MestInt/word_tomoutmap/raw_store"
+# A --autotune által mentett process / OpenCV szál beállítás (ha létezik, ezt használjuk)
+AUTOTUNE_CONFIG = "autotune.json"
+# Végrehajtás: PROCESSES worker process (None = autotune / cpu_count, 0 = nincs, a fő processben futunk),
+# mindegyikben THREADS_PER_PROCESS szál saját FaceLandmarkerrel. Egy process = egy interpreter +
+# NumPy + OpenCV + MediaPipe + model példány; a szálak ezeken osztoznak, így kevesebb RAM kell.
+PROCESSES = None
+THREADS_PER_PROCESS = 1
+# Videónkénti felügyelet: falióra timeout, újrapróbálások, worker újraindítás N videó után
+VIDEO_TIMEOUT_S = 600
+MAX_RETRIES = 2
+MAX_TASKS_PER_CHILD = 200
+# Adaptív felbontás: előző arc környéke / kicsinyített frame, natív (+ kontrasztjavított) csak tévesztéskor
+ADAPTIVE_DETECTION = False
+# Dekóder: "opencv" (BGR + cvtColor), "ffmpeg" (ffmpeg pipe) vagy "pyav" - az utóbbiak közvetlenül RGB-t adnak
+DECODER = "opencv"
+# Jellemző statisztikák (átlag, szórás, kvantilisek) a workerekben, videónként; a merge-nél
+# összevonva a kimenet mellé kerülnek (<csv>.stats.npz, python feature_stats.py summary ...)
+FEATURE_STATS = True
+# A végső CSV tömörítése: None / "gzip" / "zstd" (.gz / .zst végződéssel); szint None = alapértelmezett,
+# szálak: zstd tömörítő szálak. Az írás (és tömörítés) háttérszálon fut, a temp CSV-k tömörítetlenek.
+COMPRESSION = None
+COMPRESSION_LEVEL = None
+COMPRESSION_THREADS = 0
+# Száj ROI kivágások minden kiírt sorhoz (None = nincs; pl. 88 -> 88x88), ugyanabból a dekódolásból;
+# a kimenet mellé <csv>.crops.npy kerül (uint8, soronként a CSV-vel egyezően), lásd mouth_crops.py
+MOUTH_CROP_SIZE = None
+MOUTH_CROP_COLOR = "gray"
+# --estimate: ennyi véletlen videón fut le a teljes pipeline a költségbecsléshez
+ESTIMATE_VIDEOS = 24
 
 os.makedirs("D:/MestInt/datasets/gridcorpus", exist_ok=True)
 os.makedirs(TEMP_DIR, exist_ok=True)
@@ -33,185 +95,789 @@ if not os.path.exists(MODEL_PATH):
         print(url)
         exit(1)
 
-# -------------------- Segédfüggvény --------------------
-def parse_align_file(align_path, sample_rate=25000):
-    """
-    Betölti az align fájlt és listát ad vissza: [(word, start_time_s, end_time_s), ...]
-    Az align fájlban a GRID corpus mintaszámokat tartalmaz (nem másodperceket),
-    ezért konvertálni kell a sample_rate alapján.
-    """
-    word_list = []
-    with open(align_path, "r") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) >= 3:
-                start_sample = float(parts[0])
-                end_sample = float(parts[1])
-                word = parts[2]
-                # Átváltás másodpercre:
-                start_time_s = start_sample / sample_rate
-                end_time_s = end_sample / sample_rate
-                word_list.append((word, start_time_s, end_time_s))
-    return word_list
-
-# -------------------- Speaker feldolgozó függvény --------------------
-def process_speaker(speaker):
-    """
-    Feldolgoz egy speakert és a saját temp CSV-jébe írja az adatokat.
-    """
-    from mediapipe.tasks import python
-    from mediapipe.tasks.python import vision
-    
-    # Minden process saját FaceLandmarker objektumot hoz létre
-    options = vision.FaceLandmarkerOptions(
-        base_options=python.BaseOptions(model_asset_path=MODEL_PATH),
-        running_mode=vision.RunningMode.IMAGE,
-        output_face_blendshapes=True
-    )
-    
+# -------------------- Videó feldolgozó függvények --------------------
+def init_video_worker(cv2_threads=None, adaptive=False, selection=None, csv_decimals=None, decoder=DECODER,
+                      stats_columns=None, crop_spec=None, profile=None, shared_writer=False,
+                      raw_store_dir=RAW_STORE_DIR):
+    """
+    Worker process inicializálása: minden process saját FaceLandmarker objektumot hoz létre.
+    selection: OutputSelection (--columns / --landmarks); ha nem kell blend shape, a landmarker sem számolja.
+    csv_decimals: gyors, fix tizedesjegyű CSV írás (None = json.dumps teljes pontossággal)
+    decoder: video_stream.DECODER_BACKENDS egyike
+    stats_columns: ezekről az oszlopokról videónkénti statisztika készül (None = nincs)
+    crop_spec: MouthCropSpec, ha minden sorhoz száj kivágás is kell (None = nincs)
+    profile: LandmarkerProfile (modell fájl + beállítások; None = MODEL_PATH alapbeállításokkal)
+    shared_writer: szálas mód; a temp CSV-ket a process egyetlen író szála (PartWriter) írja
+    raw_store_dir: a nyers kimenetek tára (None = nincs; a --estimate egy ideiglenes tárat ad)
+    """
+    init_worker_threads(cv2_threads)
+    profile = profile or default_profile(MODEL_PATH)
+    options = create_landmarker_options(profile.model_path,
+                                        output_face_blendshapes=selection_needs_blend_shapes(selection),
+                                        **profile.options)
     landmarker = vision.FaceLandmarker.create_from_options(options)
-    
-    speaker_video_path = os.path.join(VIDEO_BASE, speaker)
-    speaker_video_path = os.path.join(speaker_video_path, speaker)
+    return {
+        "model_path": profile.model_path,
+        "options": options,
+        "landmarker": AdaptiveDetector(landmarker) if adaptive else landmarker,
+        "store": RawResultStore(raw_store_dir) if raw_store_dir else None,
+        "selection": selection,
+        "csv_decimals": csv_decimals,
+        "decoder": decoder,
+        "stats_columns": stats_columns,
+        "crop_spec": crop_spec,
+        "part_writer": shared_part_writer() if shared_writer else None,
+    }
 
-    speaker_align_path = os.path.join(ALIGN_BASE, speaker)
-    speaker_align_path = os.path.join(speaker_align_path, "align")
 
-    print(f"[{speaker}] Processing started...")
-    print(f"[{speaker}] speaker_video_path: {speaker_video_path}")
-    print(f"[{speaker}] speaker_align_path: {speaker_align_path}")
+def video_part_path(temp_dir, speaker, video_file):
+    """Egy videó ideiglenes CSV-je (a merge ezekből fűzi össze a kimenetet)."""
+    return os.path.join(temp_dir, speaker, f"{video_file}.csv")
 
-    if not os.path.isdir(speaker_video_path):
-        print(f"[{speaker}] Video path not found, skipping...")
-        return
 
-    # Ideiglenes CSV fájl ehhez a speakerhez
-    temp_csv = os.path.join(TEMP_DIR, f"{speaker}.csv")
-    
-    with open(temp_csv, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile, delimiter=';')
-        
-        for video_file in sorted(os.listdir(speaker_video_path)):
-            if not video_file.lower().endswith((".mpg", ".mp4")):
-                continue
+def video_stats_path(temp_dir, speaker, video_file):
+    """Egy videó statisztika részállapota a temp CSV mellett."""
+    return state_path(video_part_path(temp_dir, speaker, video_file))
 
-            video_path = os.path.join(speaker_video_path, video_file)
-            align_file_name = os.path.splitext(video_file)[0] + ".align"
-            align_path = os.path.join(speaker_align_path, align_file_name)
 
-            if not os.path.exists(align_path):
-                print(f"[{speaker}] Missing align file for {video_file}, skipping...")
-                continue
+# A temp mappa részeit író beállítások; folytatáskor csak ezekkel egyező részek kerülhetnek a kimenetbe
+PART_SETTINGS_FILE = "part_settings.json"
+
 
-            # Betöltjük a transzkripciót
-            word_list = parse_align_file(align_path, sample_rate=25000)
+def part_settings(selection, csv_decimals, crop_spec, profile, adaptive, decoder):
+    """A temp CSV-k (és kivágások) tartalmát meghatározó beállítások, JSON-kompatibilisen."""
+    return {"header": csv_header(selection), "csv_decimals": csv_decimals,
+            "mouth_crops": list(crop_spec) if crop_spec else None,
+            "model_sha256": cached_file_sha256(profile.model_path), "landmarker_options": profile.options,
+            "adaptive": adaptive, "decoder": decoder}
 
-            # Videó feldolgozása
-            cap = cv2.VideoCapture(video_path)
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_idx = 0
 
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
+def discard_stale_parts(temp_dir, tasks, settings):
+    """
+    Egy korábbi futás temp részei más beállításokkal (--columns / --landmarks, --csv-decimals,
+    --mouth-crops / --crop-*, landmarker profil, ...) készülhettek; a merge ezeket ellenőrzés nélkül
+    fűzné a mostani fejléc alá. Eltérő vagy ismeretlen beállítás esetén a részek törlődnek
+    (a nyers tárból olcsón újraépülnek), majd a mostani beállítások kerülnek a sidecar-ba.
+    """
+    settings_path = os.path.join(temp_dir, PART_SETTINGS_FILE)
+    if load_json(settings_path) != settings:
+        stale = 0
+        for speaker, video_file, _, _, _ in tasks:
+            part_csv = video_part_path(temp_dir, speaker, video_file)
+            stale += os.path.exists(part_csv)
+            for path in (part_csv, part_crops_path(part_csv), video_stats_path(temp_dir, speaker, video_file)):
+                if os.path.exists(path):
+                    os.remove(path)
+        if stale:
+            print(f"⚠️  {stale} kész temp rész más beállításokkal készült, újra feldolgozzuk ({temp_dir})")
+    save_json(settings_path, settings)
 
-                mouth_data = process_frame_full_mouth(frame, landmarker)
-                if mouth_data is None:
-                    frame_idx += 1
-                    continue
 
-                # Szó meghatározása az aktuális frame idő alapján
-                current_time = frame_idx / fps
-                word_for_frame = None
-                for word, start_time, end_time in word_list:
-                    if start_time <= current_time <= end_time:
-                        word_for_frame = word
-                        break
+def count_part_rows(part_csv):
+    with open(part_csv, "r", encoding="utf-8", newline="") as f:
+        return sum(1 for _ in csv.reader(f, delimiter=CSV_DELIMITER))
 
-                if word_for_frame is None:
-                    frame_idx += 1
-                    continue
 
-                # Mentés CSV-be
-                writer.writerow([
-                    speaker,
-                    video_file,
-                    frame_idx,
-                    word_for_frame,
-                    mouth_data["mouth_center"][0],
-                    mouth_data["mouth_center"][1],
-                    json.dumps(mouth_data["outer_lip_relative_points"], separators=(',', ':')),
-                    json.dumps(mouth_data["inner_lip_relative_points"], separators=(',', ':')),
-                    json.dumps(mouth_data["blend_shapes"], separators=(',', ':')),
-                    json.dumps(mouth_data["mouth_blend_shapes"], separators=(',', ':')),
-                    json.dumps(mouth_data["eyes_blend_shapes"], separators=(',', ':')),
-                    json.dumps(mouth_data["brow_blend_shapes"], separators=(',', ':')),
-                    json.dumps(mouth_data["face_shape_blend_shapes"], separators=(',', ':')),
-                    json.dumps(mouth_data["3d_landmarks"], separators=(',', ':')),
-                    json.dumps(mouth_data["pixel_landmarks"], separators=(',', ':')),
-                    json.dumps(mouth_data["relative_landmarks"], separators=(',', ':')),
-                    json.dumps(mouth_data["face_center_pixel"], separators=(',', ':')),
-                    json.dumps(mouth_data["face_center_3d"], separators=(',', ':'))
-                ])
-
-                frame_idx += 1
-
-            cap.release()
+def process_video(context, task):
+    """
+    Feldolgoz egy videót és a saját temp CSV-jébe írja az adatokat.
+    A temp CSV atomikusan (rename) jön létre, így félbeszakadt videó nem kerül a kimenetbe.
+
+    Returns:
+        dict: {"rows": kiírt sorok száma, "detection": adaptív detektálás számlálói vagy None}
+    """
+    speaker, video_file, video_path, align_path, temp_dir = task
+    landmarker, options, store = context["landmarker"], context["options"], context["store"]
+    selection, decimals = context["selection"], context["csv_decimals"]
+    as_arrays = decimals is not None
+    crop_spec = context["crop_spec"]
+
+    # Betöltjük a transzkripciót
+    word_list = parse_align_file(align_path, sample_rate=25000)
+    adaptive = isinstance(landmarker, AdaptiveDetector)
+    detection = None
+
+    # Ha a nyers kimenet már a tárban van, inferencia nélkül újraépítjük
+    store_key, stored_hit = (lookup_store_key(store, video_path, context["model_path"], options,
+                                              extra=store_key_extra(landmarker, context["decoder"]))
+                             if store is not None else (None, False))
+    if stored_hit:
+        stored = store.load(store_key)
+        records = rebuild_video_records(stored, speaker, video_file, word_list,
+                                        selection=selection, as_arrays=as_arrays)
+        crop_recorder = None
+        if crop_spec is not None:
+            # A tárból nincs frame: a kivágásokhoz ez az egyetlen (inferencia nélküli) dekódolás
+            crop_recorder = MouthCropRecorder(crop_spec)
+            for crop in iter_video_crops(video_path, stored["landmarks"], [record[2] for record in records],
+                                         crop_spec, decoder=context["decoder"]):
+                crop_recorder.add(crop)
+        rows = write_video_part(temp_dir, speaker, video_file, records, selection, decimals,
+                                context["stats_columns"], context["part_writer"], crop_recorder)
+        print(f"[{speaker}]  Reused {video_file} from raw store")
+    else:
+        # Videó feldolgozása
+        recorder = RawVideoRecorder() if store is not None else None
+        crop_recorder = MouthCropRecorder(crop_spec) if crop_spec is not None else None
+        records = iter_video_records(speaker, video_file, video_path, word_list, landmarker,
+                                     recorder=recorder, selection=selection, as_arrays=as_arrays,
+                                     decoder=context["decoder"], crop_recorder=crop_recorder)
+        rows = write_video_part(temp_dir, speaker, video_file, records, selection, decimals,
+                                context["stats_columns"], context["part_writer"], crop_recorder)
+        if recorder is not None:
+            store.save(store_key, recorder)
+        if adaptive:
+            detection = dict(landmarker.stats)
+            print(f"[{speaker}]  Processed {video_file} "
+                  f"({', '.join(f'{path}: {detection[path]}' for path in DETECTION_PATHS)})")
+        else:
             print(f"[{speaker}]  Processed {video_file}")
-    
-    # FaceLandmarker felszabadítása
-    landmarker.close()
-    
-    print(f"[{speaker}] Completed all videos!")
-    return speaker
+
+    if store is not None:
+        store.register_source(store_key, speaker, video_file)
+    return {"rows": rows, "detection": detection}
+
+
+def store_key_extra(landmarker, decoder):
+    """
+    A tár kulcsába kerülő extra beállítások: adaptív detektálás, nem alapértelmezett dekóder
+    (más dekóder minimálisan más pixeleket adhat). Alapbeállításokkal None, a régi kulcsok maradnak.
+    """
+    extra = dict(landmarker.settings()) if isinstance(landmarker, AdaptiveDetector) else {}
+    if decoder != "opencv":
+        extra["decoder"] = decoder
+    return extra or None
+
+
+class PartWriter:
+    """
+    Szálas módban a process egyetlen író szála. A worker szálak a videó sorait a saját
+    pufferükbe gyűjtik, és a kész videót adják át (submit); a temp CSV írása, a statisztika
+    mentése és az atomikus rename itt történik. A submit egy Future-t ad: a worker csak akkor
+    jelenti késznek a videót, ha a temp CSV-je már a lemezen van.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="part-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, part_csv, rows, stats=None, stats_path=None, crops=None):
+        future = Future()
+        self._queue.put((part_csv, rows, stats, stats_path, crops, future))
+        return future
+
+    def _run(self):
+        while True:
+            part_csv, rows, stats, stats_path, crops, future = self._queue.get()
+            tmp_csv = f"{part_csv}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_csv, "w", encoding="utf-8", newline="") as f:
+                    csv.writer(f, delimiter=CSV_DELIMITER).writerows(rows)
+                if stats is not None:
+                    stats.save(stats_path)
+                if crops is not None:
+                    write_part_crops(part_csv, crops)
+                os.replace(tmp_csv, part_csv)
+            except BaseException as e:
+                if os.path.exists(tmp_csv):
+                    os.remove(tmp_csv)
+                future.set_exception(e)
+            else:
+                future.set_result(len(rows))
+
+
+_part_writer = None
+_part_writer_lock = threading.Lock()
+
+
+def shared_part_writer():
+    """A process PartWriter-e (az első hívás indítja el)."""
+    global _part_writer
+    with _part_writer_lock:
+        if _part_writer is None:
+            _part_writer = PartWriter()
+        return _part_writer
+
+
+def write_video_part(temp_dir, speaker, video_file, records, selection=None, decimals=None,
+                     stats_columns=None, part_writer=None, crop_recorder=None):
+    """
+    Egy videó rekordjainak kiírása a temp CSV-jébe.
+    A temp CSV atomikusan (rename) jön létre, így félbeszakadt videó nem kerül a kimenetbe.
+    stats_columns esetén a videó statisztika részállapota a CSV előtt kerül mellé,
+    így minden kész temp CSV-nek van statisztikája.
+    part_writer (szálas mód): a sorok a hívó szál pufferébe kerülnek, a kiírást a PartWriter végzi.
+    crop_recorder: a rekordok bejárása közben töltődő MouthCropRecorder; a kivágások a statisztikával
+    együtt, a CSV előtt kerülnek a temp CSV mellé.
+
+    Returns:
+        int: kiírt sorok száma
+    """
+    part_csv = video_part_path(temp_dir, speaker, video_file)
+    os.makedirs(os.path.dirname(part_csv), exist_ok=True)
+    if part_writer is not None:
+        buffered = []
+        collected = [] if stats_columns else None
+        for record in records:
+            buffered.append(mouth_data_to_csv_row(*record, selection=selection, decimals=decimals))
+            if collected is not None:
+                collected.append(record)
+        stats = None
+        if collected is not None:
+            stats = FeatureStats(stats_columns)
+            stats.update_records(collected)
+        crops = crop_recorder.to_array() if crop_recorder is not None else None
+        return part_writer.submit(part_csv, buffered, stats, video_stats_path(temp_dir, speaker, video_file),
+                                  crops).result()
+
+    tmp_csv = f"{part_csv}.{os.getpid()}.tmp"
+    collected = [] if stats_columns else None
+    rows = 0
+    try:
+        # A CSV formázás és az írás háttérszálon megy, a ciklus közben már a következő frame-et dolgozza fel
+        with BackgroundWriter(tmp_csv) as writer:
+            for record in records:
+                # Mentés CSV-be
+                writer.writerow(mouth_data_to_csv_row(*record, selection=selection, decimals=decimals))
+                if collected is not None:
+                    collected.append(record)
+                rows += 1
+        if collected is not None:
+            stats = FeatureStats(stats_columns)
+            stats.update_records(collected)
+            stats.save(video_stats_path(temp_dir, speaker, video_file))
+        if crop_recorder is not None:
+            write_part_crops(part_csv, crop_recorder.to_array())
+    except BaseException:
+        # A félkész temp CSV nem maradhat ott
+        os.remove(tmp_csv)
+        raise
+    os.replace(tmp_csv, part_csv)
+    return rows
+
+
+def process_video_ring(context, task, recorder):
+    """
+    Ring módban (frame_ring.py) a fő process ide kapja egy videó összes nyers kimenetét:
+    ugyanúgy a tárból ismert újraépítéssel készülnek a sorok, mint a tárolt videóknál.
+    """
+    speaker, video_file, video_path, align_path, temp_dir = task
+    store, store_key = context["store"], context["store_keys"][(speaker, video_file)]
+    word_list = parse_align_file(align_path, sample_rate=25000)
+    records = rebuild_video_records(recorder.to_arrays(), speaker, video_file, word_list,
+                                    selection=context["selection"], as_arrays=context["csv_decimals"] is not None)
+    rows = write_video_part(temp_dir, speaker, video_file, records, context["selection"], context["csv_decimals"],
+                            context["stats_columns"])
+    if store is not None:
+        store.save(store_key, recorder)
+        store.register_source(store_key, speaker, video_file)
+    print(f"[{speaker}]  Processed {video_file} (ring)")
+    return {"rows": rows, "detection": None}
+
+
+def run_ring(tasks, ring, num_slots, selection, csv_decimals, decoder=DECODER, stats_columns=None, profile=None):
+    """
+    --ring mód: a tárban már meglévő videók újraépítése itt, a többi a frame_ring pipeline-on megy.
+    Nincs videónkénti timeout / újrapróbálás; egy leállt process után a hátralévő videók hibásak.
+    """
+    from frame_ring import run_ring_pipeline, print_ring_metrics
+    decoders, workers = ring
+    profile = profile or default_profile(MODEL_PATH)
+    landmarker_kwargs = {"output_face_blendshapes": selection_needs_blend_shapes(selection), **profile.options}
+    options = create_landmarker_options(profile.model_path, **landmarker_kwargs)
+    context = {"store": RawResultStore(RAW_STORE_DIR) if RAW_STORE_DIR else None,
+               "selection": selection, "csv_decimals": csv_decimals, "stats_columns": stats_columns,
+               "store_keys": {}}
+
+    pending = []
+    reused = {}
+    for task_id, task in enumerate(tasks):
+        speaker, video_file, video_path, align_path, temp_dir = task
+        store_key, stored_hit = (lookup_store_key(context["store"], video_path, profile.model_path, options,
+                                                  extra=store_key_extra(None, decoder))
+                                 if context["store"] is not None else (None, False))
+        context["store_keys"][(speaker, video_file)] = store_key
+        if stored_hit:
+            records = rebuild_video_records(context["store"].load(store_key), speaker, video_file,
+                                            parse_align_file(align_path, sample_rate=25000),
+                                            selection=selection, as_arrays=csv_decimals is not None)
+            reused[task_id] = {"rows": write_video_part(temp_dir, speaker, video_file, records,
+                                                        selection, csv_decimals, stats_columns),
+                               "detection": None}
+            context["store"].register_source(store_key, speaker, video_file)
+            print(f"[{speaker}]  Reused {video_file} from raw store")
+        else:
+            pending.append(task_id)
+
+    print(f"🔁 Ring mode: {decoders} decoder(s), {workers} inference worker(s), {len(pending)} videos")
+    report, metrics = run_ring_pipeline(
+        [tasks[task_id] for task_id in pending], lambda task: task[2], profile.model_path,
+        lambda task, recorder: process_video_ring(context, task, recorder),
+        decoders=decoders, workers=workers, num_slots=num_slots,
+        landmarker_kwargs=landmarker_kwargs, decoder=decoder)
+    print_ring_metrics(metrics)
+
+    # A ring a saját (pending) sorszámait adja vissza: vissza a tasks indexeire
+    report.results = {**reused, **{pending[i]: result for i, result in report.results.items()}}
+    report.failures = {pending[i]: failure for i, failure in report.failures.items()}
+    report.attempts = {pending[i]: attempts for i, attempts in report.attempts.items()}
+    return report
+
+
+def estimate_video(context, task):
+    """--estimate: process_video, plusz a videó ideje és a worker addigi csúcs memóriája."""
+    started = time.perf_counter()
+    result = process_video(context, task)
+    result["seconds"] = time.perf_counter() - started
+    result["peak_rss"] = peak_rss_bytes()
+    return result
+
+
+def run_estimate(todo, num_processes, init_args, output_csv, sample_videos=ESTIMATE_VIDEOS, seed=0,
+                 selection=None, compression=None, compression_level=None, compression_threads=0,
+                 timeout=None, settings=None, threads=1, crop_spec=None):
+    """
+    Költségbecslés a teljes (hátralévő) feldolgozásra, a kimenet írása nélkül.
+
+    1. Frame / align számok minden videóra a konténer metaadataiból (inferencia nélkül).
+    2. sample_videos véletlen videón a teljes pipeline (ideiglenes temp mappába és nyers tárba,
+       a beállított process / szál számmal), majd a minta CSV-k összefűzése a beállított tömörítéssel.
+    3. Vetítés a teljes corpusra; mentés <csv>.estimate.json-ba, összevetés egy korábbi valós futással.
+    """
+    print(f"🔢 Frame számok: {len(todo)} videó (konténer metaadatok + align fájlok)...")
+    videos = count_corpus(todo, max(num_processes, 1))
+
+    sample_ids = sorted(random.Random(seed).sample(range(len(todo)), min(sample_videos, len(todo))))
+    work_dir = tempfile.mkdtemp(prefix="estimate-", dir=TEMP_DIR)
+    store_dir = os.path.join(work_dir, "raw_store") if RAW_STORE_DIR else None
+    sample_tasks = [todo[i][:4] + (work_dir,) for i in sample_ids]
+    print(f"🧪 Minta futás: {len(sample_tasks)} videó, {execution_label(num_processes, threads)}...")
+    try:
+        started = time.perf_counter()
+        report = run_videos(sample_tasks, init_args, num_processes, threads,
+                            worker_fn=estimate_video, timeout=timeout, max_retries=0, raw_store_dir=store_dir)
+        wall_s = time.perf_counter() - started
+        if not report.results:
+            print("❌ Egyetlen minta videó sem sikerült, nincs mit vetíteni")
+            return None
+        done = sorted(report.results)
+        part_paths = [video_part_path(work_dir, *sample_tasks[i][:2]) for i in done]
+
+        # Az összefűzés (és tömörítés) sebessége a beállított formátummal
+        merged_path = compressed_path(os.path.join(work_dir, "merged.csv"), compression)
+        with BackgroundWriter(merged_path, compression=compression, level=compression_level,
+                              threads=compression_threads) as writer:
+            for part_csv in part_paths:
+                with open(part_csv, "rb") as infile:
+                    writer.write(infile.read())
+
+        sample = measure_sample([videos[sample_ids[i]] for i in done], [report.results[i] for i in done],
+                                part_paths, dir_size(store_dir), wall_s, max(num_processes, 1) * threads, selection,
+                                merge_stats=writer.stats, compression_level=compression_level,
+                                crop_row_bytes=crop_row_bytes(crop_spec) if crop_spec else 0)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if report.failures:
+        print(f"⚠️  {len(report.failures)} minta videó sikertelen, "
+              f"a becslés a többi {len(done)} alapján készül")
+
+    estimate = project_estimate(videos, sample, num_processes, settings, threads=threads)
+    print_estimate(estimate)
+    save_json(estimate_path(output_csv), estimate)
+    print(f"\n💾 Becslés: {estimate_path(output_csv)}")
+
+    # Ha ugyanerre a feladatra már volt valós futás, a becslés pontossága is látszik
+    run_stats = load_json(run_stats_path(output_csv))
+    if run_stats and run_stats.get("videos") == len(todo) and run_stats.get("settings") == settings:
+        print_comparison(compare_with_run(estimate, run_stats),
+                         f"Összevetés a korábbi valós futással ({run_stats['finished']})")
+    return estimate
+
+
+def run_videos(tasks, init_args, processes, threads=1, worker_fn=process_video, timeout=None,
+               max_retries=MAX_RETRIES, max_tasks_per_child=None, quarantine_path=None,
+               raw_store_dir=RAW_STORE_DIR):
+    """
+    A videók feldolgozása a választott végrehajtási módban:
+    processes > 0, threads == 1: felügyelt process pool (videónként egy landmarker process)
+    processes > 0, threads > 1: hibrid, processes x threads landmarker
+    processes == 0: szál pool a fő processben (timeout nélkül)
+    init_args: init_video_worker argumentumai a shared_writer előttig (a shared_writer itt dől el).
+    """
+    init_args = tuple(init_args) + (processes == 0 or threads > 1, raw_store_dir)
+    if processes == 0:
+        return run_threaded(tasks, init_video_worker, worker_fn, threads, init_args=init_args,
+                            max_retries=max_retries, quarantine_path=quarantine_path,
+                            describe=describe_video_task)
+    return run_supervised(tasks, init_video_worker, worker_fn, processes, init_args=init_args,
+                          timeout=timeout, max_retries=max_retries, max_tasks_per_child=max_tasks_per_child,
+                          quarantine_path=quarantine_path, describe=describe_video_task,
+                          threads_per_worker=threads)
+
+
+def execution_label(processes, threads):
+    if processes == 0:
+        return f"{threads} landmarker thread(s) in the main process"
+    if threads > 1:
+        return f"{processes} processes x {threads} landmarker threads"
+    return f"{processes} processes"
+
+
+def describe_video_task(task):
+    speaker, video_file, video_path = task[:3]
+    return {"speaker": speaker, "video": video_file, "video_path": video_path}
+
+
+def load_video_list(path):
+    """
+    Videó lista beolvasása újrafuttatáshoz: a failed_videos JSON riport,
+    vagy soronként egy "speaker/video" bejegyzés.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return {(v["speaker"], v["video"]) for v in json.load(f)["failed_videos"]}
+        return {tuple(line.strip().split("/", 1)) for line in f if line.strip()}
 
 # -------------------- Fő feldolgozás --------------------
 if __name__ == "__main__":
-    # Speaker-ek listája
-    speakers = sorted([s for s in os.listdir(VIDEO_BASE) 
-                      if os.path.isdir(os.path.join(VIDEO_BASE, s))])
+    parser = argparse.ArgumentParser(description="GRID corpus -> mouth_data.csv (multiprocess)")
+    parser.add_argument("--num-shards", type=int, default=1,
+                        help="Hány gépre/shardra osztjuk a corpust (videónként, frame szám szerint)")
+    parser.add_argument("--shard-index", type=int, default=0, help="Melyik shardot dolgozza fel ez a futás")
+    parser.add_argument("--shard-plan", default=None,
+                        help="Előre elkészített kiosztási terv (python sharding.py plan)")
+    parser.add_argument("--autotune", action="store_true",
+                        help="Worker process / OpenCV szál szám kimérése mintavideókon, mentés az AUTOTUNE_CONFIG-ba")
+    parser.add_argument("--video-timeout", type=float, default=VIDEO_TIMEOUT_S,
+                        help="Videónkénti időkorlát másodpercben (0 = nincs)")
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES,
+                        help="Hibás / lefagyott videó újrapróbálása friss workerben ennyiszer")
+    parser.add_argument("--max-tasks-per-child", type=int, default=MAX_TASKS_PER_CHILD,
+                        help="Worker process újraindítása ennyi videó után (0 = soha)")
+    parser.add_argument("--videos-from", default=None,
+                        help="Csak ezeket a videókat dolgozza fel (failed_videos JSON vagy speaker/video lista)")
+    parser.add_argument("--output", default=None, help="Kimeneti CSV (alapból OUTPUT_CSV)")
+    parser.add_argument("--adaptive", action="store_true", default=ADAPTIVE_DETECTION,
+                        help="Adaptív felbontású detektálás (ROI / kicsinyített frame, natív csak tévesztéskor)")
+    parser.add_argument("--columns", default=None,
+                        help="Csak ezek az oszlopok / csoportok készülnek el, pl. mouth,3d_landmarks "
+                             f"(csoportok: {', '.join(FEATURE_SETS)})")
+    parser.add_argument("--landmarks", default=None,
+                        help="A landmark oszlopokban megtartott pontok: lips, lips_jaw vagy indexek (alapból mind a 478)")
+    parser.add_argument("--fast-csv", action="store_true",
+                        help="Gyors CSV írás fix tizedesjegyekkel (5 normalizált, 2 pixel), json.loads-kompatibilis")
+    parser.add_argument("--decoder", choices=DECODER_BACKENDS, default=DECODER,
+                        help="Videó dekóder: opencv (BGR), ffmpeg (pipe) vagy pyav - az utóbbiak közvetlenül RGB-t adnak")
+    parser.add_argument("--ring", default=None, metavar="DECODERS:WORKERS",
+                        help="Külön decoder és inferencia processek shared memory ring bufferrel (pl. 2:6)")
+    parser.add_argument("--ring-slots", type=int, default=None,
+                        help="Ring slotok száma (alapból 4 x inferencia worker)")
+    parser.add_argument("--csv-decimals", type=int, default=None,
+                        help="--fast-csv: minden JSON oszlop ennyi tizedessel")
+    parser.add_argument("--no-stats", action="store_true", default=not FEATURE_STATS,
+                        help="Ne készüljön jellemző statisztika (<csv>.stats.npz)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=COMPRESSION or "none",
+                        help="A kimeneti CSV tömörítése (.gz / .zst végződéssel, az olvasók felismerik)")
+    parser.add_argument("--compression-level", type=int, default=COMPRESSION_LEVEL,
+                        help="Tömörítési szint (gzip 1-9, alapból 6; zstd 1-22, alapból 3)")
+    parser.add_argument("--compression-threads", type=int, default=COMPRESSION_THREADS,
+                        help="zstd tömörítő szálak (0 = egy, -1 = minden mag); a gzip egy szálon fut")
+    parser.add_argument("--mouth-crops", type=int, default=MOUTH_CROP_SIZE, metavar="SIZE",
+                        help="Száj ROI kivágás minden sorhoz (SIZE x SIZE, uint8) -> <csv>.crops.npy")
+    parser.add_argument("--crop-color", choices=CROP_COLORS, default=MOUTH_CROP_COLOR,
+                        help="A kivágások színe (gray: 1 csatorna, rgb: 3)")
+    parser.add_argument("--crop-scale", type=float, default=CROP_SCALE,
+                        help="A kivágás oldala a szájszélesség hányszorosa")
+    parser.add_argument("--processes", type=int, default=PROCESSES,
+                        help="Worker processek száma (alapból autotune / CPU szám; 0 = szál pool a fő processben)")
+    parser.add_argument("--threads", type=int, default=THREADS_PER_PROCESS,
+                        help="Landmarker szálak processenként (> 1: hibrid mód, kevesebb RAM / landmarker)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="Csak költségbecslés: frame számok + minta futás, vetített idő / méret / memória")
+    parser.add_argument("--estimate-videos", type=int, default=ESTIMATE_VIDEOS,
+                        help="--estimate: ennyi véletlen videón fut a teljes pipeline")
+    parser.add_argument("--seed", type=int, default=0, help="--estimate: a minta videók véletlen seedje")
+    parser.add_argument("--profile", default=LANDMARKER_PROFILE,
+                        help="Landmarker profil (modell fájl + beállítások, lásd model_benchmark.py --select); "
+                             "ha nem létezik, a MODEL_PATH alapbeállításokkal")
+    args = parser.parse_args()
+
+    try:
+        profile = load_profile(args.profile, MODEL_PATH)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.autotune:
+        run_autotune(VIDEO_BASE, ALIGN_BASE, profile.model_path, AUTOTUNE_CONFIG)
+        raise SystemExit(0)
+
+    if not 0 <= args.shard_index < args.num_shards:
+        parser.error("--shard-index must be in [0, --num-shards)")
+    ring = None
+    if args.ring:
+        try:
+            ring = tuple(int(n) for n in args.ring.split(":"))
+        except ValueError:
+            ring = ()
+        if len(ring) != 2 or min(ring) < 1:
+            parser.error("--ring must be DECODERS:WORKERS, e.g. 2:6")
+        if args.adaptive:
+            parser.error("--ring cannot be combined with --adaptive")
+        if args.estimate:
+            parser.error("--ring cannot be combined with --estimate")
+        if args.processes is not None or args.threads != 1:
+            parser.error("--ring cannot be combined with --processes / --threads")
+        if args.mouth_crops:
+            parser.error("--ring cannot be combined with --mouth-crops (a ring a frame-eket nem adja tovább)")
+    if args.threads < 1 or (args.processes is not None and args.processes < 0):
+        parser.error("--threads must be >= 1 and --processes >= 0")
+
+    csv_decimals = args.csv_decimals if args.csv_decimals is not None else (
+        DEFAULT_CSV_DECIMALS if args.fast_csv else None)
+    selection = None
+    if args.columns or args.landmarks:
+        try:
+            selection = make_output_selection(args.columns, resolve_landmark_indices(args.landmarks))
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Columns: {', '.join(csv_header(selection))}"
+              + (f" ({len(selection.landmark_indices)} landmarks)" if selection.landmark_indices else ""))
+
+    crop_spec = None
+    if args.mouth_crops:
+        try:
+            crop_spec = make_crop_spec(args.mouth_crops, args.crop_color, args.crop_scale)
+        except ValueError as e:
+            parser.error(str(e))
+
+    stats_columns = None if args.no_stats else (stat_columns(selection.columns if selection else CSV_HEADER)
+                                                 or None)
+
+    sharded = args.num_shards > 1
+    base_output_csv = args.output or OUTPUT_CSV
+    output_csv = base_output_csv
+    temp_dir = TEMP_DIR
+    selected = None
+
+    if sharded:
+        plan = load_or_build_plan(args.shard_plan, VIDEO_BASE, ALIGN_BASE, args.num_shards)
+        shard_videos = shard_videos_by_speaker(plan, args.shard_index)
+        speakers = sorted(shard_videos)
+        selected = {(speaker, video_file) for speaker in shard_videos for video_file in shard_videos[speaker]}
+        output_csv = shard_output_path(base_output_csv, args.shard_index, args.num_shards)
+        # Külön temp mappa shardonként, így több shard futhat ugyanabban a könyvtárban
+        temp_dir = os.path.join(TEMP_DIR, f"shard-{args.shard_index:05d}")
+        print(f"Shard {args.shard_index}/{args.num_shards}: "
+              f"{len(selected)} videos, "
+              f"{plan['shards'][args.shard_index]['frames']} frames (plan {plan['fingerprint']})")
+    else:
+        # Speaker-ek listája
+        speakers = list_speakers(VIDEO_BASE)
+
+    if args.videos_from:
+        rerun = load_video_list(args.videos_from)
+        selected = rerun if selected is None else selected & rerun
+        speakers = sorted({speaker for speaker, _ in selected})
+
+    os.makedirs(temp_dir, exist_ok=True)
+    tasks = [(speaker, video_file, video_path, align_path, temp_dir)
+             for speaker, video_file, video_path, align_path in
+             iter_corpus_videos(VIDEO_BASE, ALIGN_BASE, speakers=speakers)
+             if selected is None or (speaker, video_file) in selected]
+    discard_stale_parts(temp_dir, tasks,
+                        part_settings(selection, csv_decimals, crop_spec, profile, args.adaptive, args.decoder))
+
+    # Egy korábbi, félbeszakadt futás kész videóit nem számoljuk újra
+    video_rows = {}
+    todo = []
+    for task in tasks:
+        part_csv = video_part_path(temp_dir, task[0], task[1])
+        if os.path.exists(part_csv):
+            rows = count_part_rows(part_csv)
+            # Kivágások nélkül (vagy más kivágás mérettel) kész videót újra kell futtatni
+            if crop_spec is not None and not part_crops_complete(part_csv, rows, crop_spec):
+                todo.append(task)
+                continue
+            video_rows[(task[0], task[1])] = rows
+        else:
+            todo.append(task)
     
-    print(f"Found {len(speakers)} speakers to process")
-    print(f"Using {cpu_count()} CPU cores")
+    # Autotune eredmény (ha van), különben minden magra egy process
+    tuned = load_autotune_config(AUTOTUNE_CONFIG)
+    num_processes = args.processes if args.processes is not None else (tuned["processes"] if tuned else cpu_count())
+    cv2_threads = tuned["cv2_threads"] if tuned else None
     
-    # Párhuzamos feldolgozás
-    with Pool(processes=cpu_count()) as pool:
-        pool.map(process_speaker, speakers)
+    print(f"Found {len(speakers)} speakers, {len(tasks)} videos to process"
+          + (f" ({len(tasks) - len(todo)} already done)" if len(todo) < len(tasks) else ""))
+    print(f"Using {execution_label(num_processes, args.threads)} on {cpu_count()} CPU cores"
+          + (f" (autotuned, cv2 threads: {cv2_threads})" if tuned else ""))
+    
+    init_args = (cv2_threads, args.adaptive, selection, csv_decimals, args.decoder, stats_columns, crop_spec, profile)
+    # A becslés és a valós futás csak azonos beállításokkal vethető össze
+    run_settings = {"processes": num_processes, "threads": args.threads, "columns": csv_header(selection),
+                    "landmarker": profile_label(profile),
+                    "csv_decimals": csv_decimals,
+                    "decoder": args.decoder, "adaptive": args.adaptive, "compression": args.compression,
+                    "mouth_crops": list(crop_spec) if crop_spec else None}
+    if args.estimate:
+        if not todo:
+            print("Nincs hátralévő videó, nincs mit becsülni")
+        else:
+            run_estimate(todo, num_processes, init_args, output_csv, sample_videos=args.estimate_videos,
+                         seed=args.seed, selection=selection, compression=args.compression,
+                         compression_level=args.compression_level, compression_threads=args.compression_threads,
+                         timeout=args.video_timeout or None, settings=run_settings, threads=args.threads,
+                         crop_spec=crop_spec)
+        raise SystemExit(0)
+
+    # Párhuzamos feldolgozás, videónként felügyelve
+    run_started = time.perf_counter()
+    quarantine_path = os.path.splitext(output_csv)[0] + ".quarantine.jsonl"
+    if ring:
+        report = run_ring(todo, ring, args.ring_slots, selection, csv_decimals, decoder=args.decoder,
+                          stats_columns=stats_columns, profile=profile)
+    else:
+        report = run_videos(
+            todo, init_args, num_processes, args.threads,
+            timeout=args.video_timeout or None, max_retries=args.max_retries,
+            max_tasks_per_child=args.max_tasks_per_child or None, quarantine_path=quarantine_path
+        )
+    processing_s = time.perf_counter() - run_started
+    detection_stats = {}
+    for task_id, result in report.results.items():
+        video_rows[(todo[task_id][0], todo[task_id][1])] = result["rows"]
+        if result["detection"] is not None:
+            detection_stats[f"{todo[task_id][0]}/{todo[task_id][1]}"] = result["detection"]
     
     print("\n🔗 Merging all temporary CSV files...")
+    merge_started = time.perf_counter()
     
-    # Összefűzzük az ideiglenes CSV-ket
-    with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as outfile:
-        writer = csv.writer(outfile, delimiter=';')
+    # Összefűzzük az ideiglenes CSV-ket (a sikertelen videók kimaradnak)
+    stats_parts = []
+    output_path = compressed_path(output_csv, args.compression)
+    # A kivágás tömb sorszáma előre kell (.npy fejléc): a kész temp CSV-k sorainak összege
+    crop_writer = None
+    if crop_spec is not None:
+        crop_rows = sum(video_rows.get((speaker, video_file), 0) for speaker, video_file, _, _, _ in tasks
+                        if os.path.exists(video_part_path(temp_dir, speaker, video_file)))
+        crop_writer = open_crops_writer(output_csv, crop_rows, crop_spec)
+    with BackgroundWriter(output_path, compression=args.compression, level=args.compression_level,
+                          threads=args.compression_threads) as writer:
         
         # Fejléc írása
-        writer.writerow([
-            "speaker", "video", "frame_idx", "word",
-            "mouth_center_x", "mouth_center_y",
-            "outer_lip_relative_points", "inner_lip_relative_points",
-            "blend_shapes", "mouth_blend_shapes",
-            "eyes_blend_shapes", "brow_blend_shapes", "face_shape_blend_shapes",
-            "3d_landmarks", "pixel_landmarks", "relative_landmarks",
-            "face_center_pixel", "face_center_3d"
-        ])
+        writer.writerow(csv_header(selection))
         
-        # Minden speaker temp CSV-jét beolvassuk
-        for speaker in speakers:
-            temp_csv = os.path.join(TEMP_DIR, f"{speaker}.csv")
-            if os.path.exists(temp_csv):
-                with open(temp_csv, "r", encoding="utf-8") as infile:
-                    reader = csv.reader(infile, delimiter=';')
-                    for row in reader:
-                        writer.writerow(row)
-                # Töröljük a temp fájlt
-                os.remove(temp_csv)
-                print(f"Merged {speaker}")
+        # Minden videó temp CSV-jét beolvassuk (ugyanaz a formátum, így soronkénti parse nélkül másoljuk)
+        for speaker, video_file, _, _, _ in tasks:
+            part_csv = video_part_path(temp_dir, speaker, video_file)
+            if not os.path.exists(part_csv):
+                continue
+            with open(part_csv, "rb") as infile:
+                writer.write(infile.read())
+            if crop_writer is not None:
+                with open(part_crops_path(part_csv), "rb") as infile:
+                    crop_writer.write(infile.read())
+                os.remove(part_crops_path(part_csv))
+            # Töröljük a temp fájlt
+            os.remove(part_csv)
+            stats_part = video_stats_path(temp_dir, speaker, video_file)
+            if os.path.exists(stats_part):
+                stats_parts.append(stats_part)
+        print(f"Merged {len(video_rows)} videos")
+    merge_s = time.perf_counter() - merge_started
+    print(f"💾 {output_path}: {format_write_stats(writer.stats, args.compression)}")
+    if crop_writer is not None:
+        crop_stats = crop_writer.close()
+        expected = len(npy_header((crop_rows,) + crop_shape(crop_spec))) + crop_rows * crop_row_bytes(crop_spec)
+        if crop_stats["bytes_written"] != expected:
+            raise RuntimeError(f"A kivágás tömb mérete eltér a CSV sorszámától: {crop_stats['bytes_written']} "
+                               f"!= {expected} byte ({crops_path(output_csv)})")
+        write_crops_meta(output_csv, crop_rows, crop_spec)
+        print(f"🖼️  Mouth crops: {crop_rows} x {'x'.join(map(str, crop_shape(crop_spec)))} {crop_spec.color} "
+              f"-> {crops_path(output_csv)} ({crop_stats['bytes_on_disk'] / 1e6:.1f} MB)")
+
+    # A (nem folytatott) futás mért értékei; ha volt erre a feladatra --estimate, összevetjük vele
+    if todo and not ring and len(todo) == len(tasks):
+        children_peak = children_peak_rss_bytes()
+        run_stats = {
+            "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "videos": len(todo),
+            "settings": run_settings,
+            "wall_s": round(processing_s, 3),
+            "merge_s": round(merge_s, 3),
+            "rows": sum(result["rows"] for result in report.results.values()),
+            "format": output_format(args.compression),
+            "output_bytes": writer.stats["bytes_on_disk"],
+            "peak_memory_bytes": (peak_rss_bytes() if num_processes == 0 else
+                                  (peak_rss_bytes() or 0) + num_processes * children_peak if children_peak else None),
+        }
+        save_json(run_stats_path(output_csv), run_stats)
+        estimate = load_json(estimate_path(output_csv))
+        if estimate and estimate["totals"]["videos"] == len(todo) and estimate["settings"] == run_settings:
+            print_comparison(compare_with_run(estimate, run_stats),
+                             f"Becslés ({estimate['created']}) vs valós futás")
+
+    # A videónkénti statisztika részállapotok összevonása
+    if stats_columns:
+        stats = merge_state_files(stats_parts) or FeatureStats(stats_columns)
+        stats.save(state_path(output_csv))
+        for stats_part in stats_parts:
+            os.remove(stats_part)
+        missing = len(video_rows) - len(stats_parts)
+        print(f"📈 Feature stats: {stats.rows} rows -> {state_path(output_csv)}"
+              + (f" ({missing} videos without stats)" if missing > 0 else ""))
+
+    # Adaptív detektálás: videónkénti számlálók + összesítés
+    if detection_stats:
+        totals = {key: sum(stats[key] for stats in detection_stats.values())
+                  for key in next(iter(detection_stats.values()))}
+        stats_path = os.path.splitext(output_csv)[0] + ".detection_stats.json"
+        with open(stats_path, "w", encoding="utf-8") as f:
+            json.dump({"totals": totals, "videos": detection_stats}, f, indent=2)
+        frames = totals["frames"] or 1
+        print(f"🎯 Detection paths ({totals['frames']} frames, "
+              f"{totals['detect_calls'] / frames:.2f} detect calls/frame): "
+              + ", ".join(f"{path} {100 * totals[path] / frames:.1f}%" for path in DETECTION_PATHS)
+              + f" -> {stats_path}")
+
+    if sharded:
+        write_shard_manifest(base_output_csv, plan, args.shard_index,
+                             [(speaker, video_file, rows)
+                              for (speaker, video_file), rows in sorted(video_rows.items())])
+        print(f"✅ Shard {args.shard_index} kész: {output_path}")
+
+    # Záró riport a sikertelen videókról
+    if report.failures:
+        failed_path = os.path.splitext(output_csv)[0] + ".failed_videos.json"
+        failed = write_failure_report(report, todo, failed_path, describe_video_task)
+        print(f"\n❌ {len(failed)} videó sikertelen (karantén: {quarantine_path})")
+        for video in failed:
+            print(f"   {video['speaker']}/{video['video']} ({video['kind']}, {video['attempts']} próbálkozás)")
+        print(f"   Újrafuttatás: python dataset_processor_multithread.py --videos-from {failed_path} "
+              f"--output <új_kimenet.csv>")
+    if report.retried:
+        print(f"⚠️  {report.retried} újrapróbálás, {report.workers_started} worker indítás")
     
-    # Temp mappa törlése
+    # Temp mappa törlése (a leállított workerek félkész .tmp fájljaival együtt)
+    for speaker in speakers:
+        speaker_temp_dir = os.path.join(temp_dir, speaker)
+        if not os.path.isdir(speaker_temp_dir):
+            continue
+        for name in os.listdir(speaker_temp_dir):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(speaker_temp_dir, name))
+        try:
+            os.rmdir(speaker_temp_dir)
+        except OSError:
+            pass
+    # Minden rész összefűzve: a beállítás sidecar-ra sincs már szükség
+    if os.path.exists(os.path.join(temp_dir, PART_SETTINGS_FILE)):
+        os.remove(os.path.join(temp_dir, PART_SETTINGS_FILE))
     try:
-        os.rmdir(TEMP_DIR)
-    except:
+        os.rmdir(temp_dir)
+    except OSError:
         pass
-    
 
+    if report.failures:
+        raise SystemExit(2)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Csak dekódolás benchmark: a videó dekóder backendek összevetése helyi klipeken
+
+Minden backendnél azt mérjük, mennyi idő alatt lesz a frame-ből a landmarkernek
+átadható RGB kép: opencv esetén read() + cvtColor(BGR2RGB), ffmpeg / pyav esetén
+a közvetlenül RGB24-ben érkező frame. Inferencia nem fut.
+Az első videón a backendek pixel eltérését is kiírjuk az opencv-hez képest
+(a különböző YUV -> RGB konverzió miatt néhány szürkeárnyalatnyi eltérés várható).
+
+Használat:
+    python decode_benchmark.py --sample-videos 16
+    python decode_benchmark.py --backends opencv,ffmpeg --threads 0,1,4 --size 180x144
+"""
+
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from autotune import sample_videos
+from video_stream import DECODER_BACKENDS, open_video
+
+# -------------------- Beállítások --------------------
+VIDEO_BASE = "D:/MestInt/datasets/gridcorpus/video"
+ALIGN_BASE = "D:/MestInt/datasets/gridcorpus/align"
+
+
+def _rgb_frames(video_path, backend, size=None, threads=0):
+    # opencv: BGR frame + színkonverzió (+ átméretezés), ahogy a landmarker előtt kellene
+    if backend == "opencv":
+        with open_video(video_path, "opencv") as reader:
+            for _, frame in reader:
+                if size is not None:
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    else:
+        with open_video(video_path, backend, size=size, threads=threads) as reader:
+            for _, frame in reader:
+                yield frame
+
+
+def benchmark_backend(videos, backend, size=None, threads=0):
+    """
+    Returns:
+        dict: {"frames", "seconds", "fps"}
+    """
+    frames = 0
+    started = time.perf_counter()
+    for video_path in videos:
+        for _ in _rgb_frames(video_path, backend, size=size, threads=threads):
+            frames += 1
+    seconds = time.perf_counter() - started
+    return {"frames": frames, "seconds": round(seconds, 3), "fps": round(frames / seconds, 1) if seconds else 0.0}
+
+
+def pixel_difference(video_path, backend, size=None):
+    """Átlagos / maximális abszolút pixel eltérés az opencv dekódoláshoz képest (frame szám eltérés esetén None)."""
+    reference = [frame.copy() for frame in _rgb_frames(video_path, "opencv", size=size)]
+    frames = [frame.copy() for frame in _rgb_frames(video_path, backend, size=size)]
+    if len(frames) != len(reference):
+        return None
+    diffs = [np.abs(a.astype(np.int16) - b.astype(np.int16)) for a, b in zip(reference, frames)]
+    return {"mean": float(np.mean([d.mean() for d in diffs])) if diffs else 0.0,
+            "max": int(max((d.max() for d in diffs), default=0))}
+
+
+def parse_size(spec):
+    if spec is None:
+        return None
+    width, _, height = spec.lower().partition("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Videó dekóder backendek benchmarkja (inferencia nélkül)")
+    parser.add_argument("--video-base", default=VIDEO_BASE)
+    parser.add_argument("--align-base", default=ALIGN_BASE)
+    parser.add_argument("--sample-videos", type=int, default=8, help="Mintavideók száma")
+    parser.add_argument("--backends", default=",".join(DECODER_BACKENDS),
+                        help="Vesszővel elválasztott backendek")
+    parser.add_argument("--threads", default="0",
+                        help="ffmpeg / pyav dekóder szálak, vesszővel több érték (0 = automatikus)")
+    parser.add_argument("--size", default=None, help="Cél felbontás, pl. 180x144 (alapból natív)")
+    parser.add_argument("--repeat", type=int, default=2, help="Ismétlések (a legjobb számít, az első melegít)")
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    videos = sample_videos(args.video_base, args.align_base, args.sample_videos)
+    if not videos:
+        parser.error(f"Nincs videó: {args.video_base}")
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    thread_counts = [int(n) for n in args.threads.split(",")]
+
+    print(f"\n⏱️  Dekódolás benchmark: {len(videos)} videó"
+          + (f", cél felbontás {size[0]}x{size[1]}" if size else ""))
+    results = []
+    for backend in backends:
+        for threads in ([0] if backend == "opencv" else thread_counts):
+            label = backend if backend == "opencv" else f"{backend} (threads={threads})"
+            try:
+                runs = [benchmark_backend(videos, backend, size=size, threads=threads) for _ in range(args.repeat)]
+            except (ImportError, OSError, ValueError) as e:
+                print(f"   {label:<24} ❌ {e}")
+                continue
+            best = max(runs, key=lambda run: run["fps"])
+            results.append((label, backend, best))
+            print(f"   {label:<24} {best['frames']:7d} frame  {best['seconds']:7.2f}s  {best['fps']:9.1f} frame/s")
+
+    baseline = next((best for _, backend, best in results if backend == "opencv"), None)
+    if baseline and len(results) > 1:
+        print(f"\n📊 Az opencv (read + cvtColor) {baseline['fps']:.1f} frame/s-éhez képest:")
+        for label, backend, best in results:
+            if backend == "opencv":
+                continue
+            difference = pixel_difference(videos[0], backend, size=size)
+            detail = ("frame szám eltér!" if difference is None
+                      else f"pixel eltérés átlag {difference['mean']:.2f}, max {difference['max']}")
+            print(f"   {label:<24} {best['fps'] / baseline['fps']:5.2f}x  ({detail})")
@@ -2,89 +2,49 @@
 Frame adat kinyerés és HTML export
 Egy konkrét frame-et kiinyerünk a videóból, exportáljuk a blend shape értékeket,
 és létrehozunk egy HTML oldalt amely a 3D modellen megmutatja az arcállást
+(a frame_server.py-ből kiszolgálva a viewer a teljes corpust böngészi, újragenerálás nélkül)
 """
 
 import os
-import cv2
 import json
-import numpy as np
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
-from mediapipe import Image, ImageFormat
-from frame_processor import process_frame_full_mouth
+from frame_processor import process_frame_full_mouth, create_landmarker
+from landmarker_profile import PROFILE_PATH, load_profile
+from dataset_io import parse_align_file, find_word_for_frame, list_speakers, iter_speaker_videos
+from video_stream import VideoFrameReader
 
 # -------------------- Beállítások --------------------
 VIDEO_BASE = "D:/MestInt/datasets/gridcorpus/video"
 ALIGN_BASE = "D:/MestInt/datasets/gridcorpus/align"
 MODEL_PATH = "face_landmarker.task"
+# Modell fájl + landmarker beállítások (ha létezik, a MODEL_PATH helyett; lásd model_benchmark.py)
+LANDMARKER_PROFILE = PROFILE_PATH
 
 # -------------------- FaceLandmarker inicializálása --------------------
-options = vision.FaceLandmarkerOptions(
-    base_options=python.BaseOptions(model_asset_path=MODEL_PATH),
-    running_mode=vision.RunningMode.IMAGE,
-    output_face_blendshapes=True
-)
-landmarker = vision.FaceLandmarker.create_from_options(options)
-
-def parse_align_file(align_path, sample_rate=25000):
-    """Betölti az align fájlt"""
-    word_list = []
-    with open(align_path, "r") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) >= 3:
-                start_sample = float(parts[0])
-                end_sample = float(parts[1])
-                word = parts[2]
-                start_time_s = start_sample / sample_rate
-                end_time_s = end_sample / sample_rate
-                word_list.append((word, start_time_s, end_time_s))
-    return word_list
+PROFILE = load_profile(LANDMARKER_PROFILE, MODEL_PATH)
+landmarker = create_landmarker(PROFILE.model_path, **PROFILE.options)
 
 def extract_first_non_sil_frame():
     """Lekéri az első nem-sil frame adatait"""
     
-    speakers = sorted([s for s in os.listdir(VIDEO_BASE) 
-                      if os.path.isdir(os.path.join(VIDEO_BASE, s))])
-    
-    speaker = speakers[0]
-    speaker_video_path = os.path.join(VIDEO_BASE, speaker, speaker)
-    speaker_align_path = os.path.join(ALIGN_BASE, speaker, "align")
-    
-    videos = sorted([v for v in os.listdir(speaker_video_path) 
-                    if v.lower().endswith((".mpg", ".mp4"))])
-    
-    video_file = videos[0]
-    video_path = os.path.join(speaker_video_path, video_file)
-    align_file_name = os.path.splitext(video_file)[0] + ".align"
-    align_path = os.path.join(speaker_align_path, align_file_name)
+    # Speaker mappák vagy <speaker>.tar / .zip archívumok (lásd corpus_archive)
+    speaker = list_speakers(VIDEO_BASE)[0]
+    video_file, video_path, align_path = next(iter_speaker_videos(VIDEO_BASE, ALIGN_BASE, speaker))
     
     word_list = parse_align_file(align_path)
     
     # Video betöltése
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    reader = VideoFrameReader(video_path)
+    fps = reader.fps
     
-    frame_idx = 0
-    found_frame = False
     frame_data = None
     
     print(f"\n{'='*80}")
     print(f"🔍 Első nem-sil frame keresése...")
     print(f"{'='*80}\n")
     
-    while not found_frame:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
+    for frame_idx, frame in reader:
         current_time = frame_idx / fps
-        word_for_frame = None
-        
-        for word, start_time, end_time in word_list:
-            if start_time <= current_time <= end_time:
-                word_for_frame = word
-                break
+        word_for_frame = find_word_for_frame(word_list, frame_idx, fps)
         
         if word_for_frame is not None and word_for_frame != "sil":
             mouth_data = process_frame_full_mouth(frame, landmarker)
@@ -99,7 +59,6 @@ def extract_first_non_sil_frame():
                     "timestamp": current_time,
                     "mouth_data": mouth_data
                 }
-                found_frame = True
                 
                 print(f"✅ Megtalálva!")
                 print(f"   Frame: #{frame_idx}")
@@ -108,10 +67,9 @@ def extract_first_non_sil_frame():
                 print(f"   FPS: {fps}")
                 print(f"   Speaker: {speaker}")
                 print(f"   Video: {video_file}\n")
-        
-        frame_idx += 1
+                break
     
-    cap.release()
+    reader.release()
     return frame_data
 
 def create_html_viewer(frame_data, output_file="viewer.html"):
@@ -262,6 +220,19 @@ def create_html_viewer(frame_data, output_file="viewer.html"):
             cursor: pointer;
         }}
         
+        .control-item select {{
+            width: 100%;
+            padding: 4px;
+            background: rgba(255, 255, 255, 0.1);
+            color: #fff;
+            border: 1px solid rgba(255, 255, 255, 0.2);
+            border-radius: 4px;
+        }}
+        
+        .control-item option {{
+            background: #333;
+        }}
+        
         button {{
             width: 100%;
             padding: 10px;
@@ -301,11 +272,27 @@ def create_html_viewer(frame_data, output_file="viewer.html"):
         <h2>🎭 Arcállásfelvétel</h2>
         
         <div class="frame-info">
-            <div><label>Frame:</label> #{frame_data['frame_idx']}</div>
-            <div><label>Szó:</label> <span style="color: #667eea; font-size: 14px; font-weight: bold;">{frame_data['word']}</span></div>
-            <div><label>Idő:</label> {frame_data['timestamp']:.3f}s</div>
-            <div><label>Speaker:</label> {frame_data['speaker']}</div>
-            <div><label>Videó:</label> {frame_data['video']}</div>
+            <div><label>Frame:</label> <span id="infoFrame">#{frame_data['frame_idx']}</span></div>
+            <div><label>Szó:</label> <span id="infoWord" style="color: #667eea; font-size: 14px; font-weight: bold;">{frame_data['word']}</span></div>
+            <div><label>Idő:</label> <span id="infoTime">{frame_data['timestamp']:.3f}s</span></div>
+            <div><label>Speaker:</label> <span id="infoSpeaker">{frame_data['speaker']}</span></div>
+            <div><label>Videó:</label> <span id="infoVideo">{frame_data['video']}</span></div>
+        </div>
+        
+        <div id="corpusBrowser" style="display: none;">
+            <h3>🎞️ Korpusz böngésző</h3>
+            <div class="control-item">
+                <label>Speaker</label>
+                <select id="speakerSelect"></select>
+            </div>
+            <div class="control-item">
+                <label>Videó</label>
+                <select id="videoSelect"></select>
+            </div>
+            <div class="control-item">
+                <label>Frame <span id="frameLabel"></span></label>
+                <input type="range" id="frameSlider" min="0" max="0" value="0" step="1">
+            </div>
         </div>
         
         <h3>📊 Aktív Arcállások</h3>
@@ -350,9 +337,12 @@ def create_html_viewer(frame_data, output_file="viewer.html"):
         import {{ RoomEnvironment }} from 'three/addons/environments/RoomEnvironment.js';
 
         let scene, camera, renderer, mesh, controls;
+        let headMesh = null;
+        let clip = null;
         
         const BLEND_SHAPES = {blend_shapes_json};
         const ACTIVE_SHAPES = {active_shapes_json};
+        const FRAME_INFO = {frame_info_json};
         
         console.log("🎯 Blend Shapes betöltve:", BLEND_SHAPES);
         console.log("✅ Aktív Arcállások:", ACTIVE_SHAPES);
@@ -396,6 +386,8 @@ def create_html_viewer(frame_data, output_file="viewer.html"):
                 if (head && head.morphTargetInfluences) {{
                     applyBlendShapes(head, BLEND_SHAPES);
                     createBlendShapeControls(head);
+                    headMesh = head;
+                    if (clip) showFrame(parseInt(document.getElementById('frameSlider').value));
                 }}
             }});
 
@@ -434,11 +426,11 @@ def create_html_viewer(frame_data, output_file="viewer.html"):
             console.log(`✅ {{appliedCount}} arcállás alkalmazva!`);
         }}
 
-        function createBlendShapeControls(head) {{
+        function createBlendShapeControls(head, shapes = ACTIVE_SHAPES) {{
             const listDiv = document.getElementById('blendShapesList');
             listDiv.innerHTML = '';
 
-            const shapeEntries = Object.entries(ACTIVE_SHAPES)
+            const shapeEntries = Object.entries(shapes)
                 .sort((a, b) => b[1] - a[1])
                 .slice(0, 15);  // Top 15
 
@@ -523,7 +515,86 @@ def create_html_viewer(frame_data, output_file="viewer.html"):
             location.reload();
         }};
 
+        // -------------------- Frame szerver (python frame_server.py) --------------------
+        // Ha az oldalt a frame_server.py szolgálja ki, a corpus újragenerálás nélkül böngészhető;
+        // fájlként megnyitva a fenti beégetett frame látszik.
+        async function fetchJSON(url) {{
+            const response = await fetch(url);
+            const payload = await response.json();
+            if (!response.ok) throw new Error(payload.error || response.status);
+            return payload;
+        }}
+
+        async function initCorpusBrowser() {{
+            let speakers;
+            try {{
+                speakers = (await fetchJSON('/api/speakers')).speakers;
+            }} catch (e) {{
+                console.log("ℹ️ Nincs frame szerver, a beégetett frame látszik");
+                return;
+            }}
+            document.getElementById('corpusBrowser').style.display = 'block';
+            const speakerSelect = document.getElementById('speakerSelect');
+            speakers.forEach(({{ speaker, videos, cached }}) => {{
+                speakerSelect.add(new Option(`${{speaker}} (${{cached}}/${{videos}})`, speaker));
+            }});
+            speakerSelect.value = FRAME_INFO.speaker;
+            speakerSelect.addEventListener('change', () => loadVideos(speakerSelect.value));
+            document.getElementById('videoSelect').addEventListener('change', (e) => {{
+                loadClip(speakerSelect.value, e.target.value, 0);
+            }});
+            document.getElementById('frameSlider').addEventListener('input', (e) => {{
+                showFrame(parseInt(e.target.value));
+            }});
+            await loadVideos(speakerSelect.value || speakers[0].speaker, FRAME_INFO.video, FRAME_INFO.frame_idx);
+        }}
+
+        async function loadVideos(speaker, selected = null, frameIdx = 0) {{
+            const videos = (await fetchJSON(`/api/videos?speaker=${{encodeURIComponent(speaker)}}`)).videos;
+            const videoSelect = document.getElementById('videoSelect');
+            videoSelect.innerHTML = '';
+            // ⏳ = még nincs a tárban, az első megnyitáskor a szerver kinyeri
+            videos.forEach(({{ video, cached }}) => videoSelect.add(new Option(video + (cached ? '' : ' ⏳'), video)));
+            const found = videos.some(({{ video }}) => video === selected);
+            videoSelect.value = found ? selected : videos[0].video;
+            await loadClip(speaker, videoSelect.value, found ? frameIdx : 0);
+        }}
+
+        async function loadClip(speaker, video, frameIdx = 0) {{
+            const label = document.getElementById('frameLabel');
+            label.textContent = '(betöltés...)';
+            // Egy kérés a teljes klipre, a csúszka utána helyben lépked
+            const params = new URLSearchParams({{ speaker, video, fields: 'blend_shapes,detected' }});
+            try {{
+                clip = await fetchJSON(`/api/frames?${{params}}`);
+            }} catch (e) {{
+                label.textContent = `(❌ ${{e.message}})`;
+                return;
+            }}
+            const slider = document.getElementById('frameSlider');
+            slider.max = clip.frame_count - 1;
+            slider.value = Math.min(frameIdx, clip.frame_count - 1);
+            showFrame(parseInt(slider.value));
+        }}
+
+        function showFrame(frameIdx) {{
+            const frame = clip.frames[frameIdx];
+            document.getElementById('infoFrame').textContent = `#${{frameIdx}}`;
+            document.getElementById('infoWord').textContent = frame.word || '-';
+            document.getElementById('infoTime').textContent = `${{(frameIdx / clip.fps).toFixed(3)}}s`;
+            document.getElementById('infoSpeaker').textContent = clip.speaker;
+            document.getElementById('infoVideo').textContent = clip.video;
+            document.getElementById('frameLabel').textContent =
+                `#${{frameIdx}} / ${{clip.frame_count - 1}}` + (frame.detected ? '' : ' (nincs arc)');
+            if (headMesh && frame.detected) {{
+                applyBlendShapes(headMesh, frame.blend_shapes);
+                const active = Object.fromEntries(Object.entries(frame.blend_shapes).filter(([, v]) => v > 0.01));
+                createBlendShapeControls(headMesh, active);
+            }}
+        }}
+
         init();
+        initCorpusBrowser();
     </script>
 </body>
 </html>
@@ -1,73 +1,267 @@
 #!/usr/bin/env python3
 """
-mouth_data.csv első 1000 sorát kimenteni sample-ként
-DEBUG és validáláshoz
+mouth_data.csv mintavételezése DEBUG és validáláshoz
+
+Módok:
+    uniform  - egyenletes véletlen minta (alapértelmezett)
+    speaker  - speakerenként kiegyensúlyozott véletlen minta
+    word     - szavanként kiegyensúlyozott véletlen minta
+    head     - az első N sor (a régi viselkedés)
+
+A véletlen módok nem olvassák végig a fájlt: ha van sor index (<csv>.rowidx.npy,
+pl. a csv_to_columnar.py vagy a --build-index készíti), abból választunk sorokat,
+különben véletlen byte offsetekre ugrunk és a következő sor elejére igazítunk.
+A rétegzéshez csak a jelölt sorok elejét (speaker;video;frame_idx;word) olvassuk be.
+
+Tömörített bemenet (.csv.gz / .csv.zst) nem seekelhető: ilyenkor két streamelt menet fut,
+az első a sorok kulcsait gyűjti (csak a sor elejéből), a második kiírja a kiválasztott sorokat.
+
+Használat:
+    python extract_sample.py mouth_data.csv --mode speaker --rows 1000 --seed 0
 """
 
+import os
 import csv
 import sys
+import time
+import argparse
+import numpy as np
+
+from dataset_io import CSV_DELIMITER, load_row_index, row_index_path
+from compressed_io import detect_compression, open_binary_input, open_text_input, resolve_input_path
+
+SAMPLE_MODES = ["uniform", "speaker", "word", "head"]
+
+# Ennyiszer több jelölt sort nézünk meg a rétegzett módokban
+OVERSAMPLE = 8
+# A sor elejéből ennyi byte elég a speaker / video / frame_idx / word mezőkhöz
+ROW_PREFIX_BYTES = 256
+
+
+def build_row_index(input_csv, block_bytes=16 * 1024 * 1024):
+    """
+    Sor index építése egy teljes (vektorizált) végigolvasással: adatsorok kezdő offsetjei + fájlméret.
+    Egyszer kell lefuttatni, utána minden mintavétel ezt használja.
+    """
+    size = os.path.getsize(input_csv)
+    data = np.memmap(input_csv, dtype=np.uint8, mode="r")
+    starts = []
+    for pos in range(0, size, block_bytes):
+        starts.append(np.flatnonzero(data[pos:pos + block_bytes] == 10).astype(np.int64) + pos + 1)
+    del data
+    offsets = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+    # Az első \n utáni sor az első adatsor (a fejléc kimarad); a fájl végi \n nem kezd új sort
+    offsets = offsets[offsets < size]
+    index = np.concatenate([offsets, [size]]).astype(np.int64)
+    np.save(row_index_path(input_csv), index)
+    return index
+
+
+def _row_key(prefix, mode):
+    fields = prefix.split(CSV_DELIMITER.encode(), 4)
+    if len(fields) < 4:
+        return None
+    return fields[0] if mode == "speaker" else fields[3]
+
+
+def _random_row_starts(f, size, data_start, count, rng):
+    """
+    Véletlen sor kezdetek index nélkül: véletlen byte offset -> az első, ott vagy utána kezdődő sor.
+    Egy sort az előtte álló sor hosszával arányosan választunk (a sorhossz közel állandó); az első
+    sor elé egy vele egyező hosszú sávot teszünk, így az sem ritkább / gyakoribb a többinél.
+    Az utolsó sor kezdete utáni offsethez nincs sor: ilyenkor új offsetet húzunk.
+    """
+    f.seek(data_start)
+    first_row_bytes = len(f.readline())
+    starts = set()
+    # Ugyanarra a sorra / az utolsó sor utánra eső offseteket pótoljuk (kis fájlon nem mindig jön ki a kért szám)
+    for _ in range(8):
+        for pos in rng.integers(data_start - first_row_bytes + 1, size, size=count - len(starts)):
+            if pos <= data_start:
+                starts.add(data_start)
+                continue
+            f.seek(int(pos) - 1)
+            f.readline()
+            start = f.tell()
+            if start < size:
+                starts.add(start)
+        if len(starts) >= count:
+            break
+    return sorted(starts)
+
+
+def choose_rows(f, size, data_start, sample_rows, mode, seed, index=None, oversample=OVERSAMPLE):
+    """
+    A mintába kerülő sorok kezdő offsetjei (fájl sorrendben).
+    """
+    rng = np.random.default_rng(seed)
+    num_candidates = sample_rows if mode == "uniform" else sample_rows * oversample
+    if index is not None:
+        num_rows = len(index) - 1
+        picks = rng.choice(num_rows, size=min(num_candidates, num_rows), replace=False)
+        candidates = [int(index[i]) for i in picks]
+    else:
+        candidates = _random_row_starts(f, size, data_start, num_candidates, rng)
+        rng.shuffle(candidates)
+
+    if mode == "uniform":
+        return sorted(candidates[:sample_rows])
+
+    # Rétegzés: jelöltek csoportosítása speaker / szó szerint, majd körbeforgó választás
+    strata = {}
+    for start in candidates:
+        f.seek(start)
+        key = _row_key(f.read(ROW_PREFIX_BYTES), mode)
+        if key is not None:
+            strata.setdefault(key, []).append(start)
+    return sorted(_round_robin(strata, sample_rows, rng))
+
+
+def _round_robin(strata, sample_rows, rng):
+    keys = sorted(strata)
+    rng.shuffle(keys)
+    chosen = []
+    while len(chosen) < sample_rows and any(strata[key] for key in keys):
+        for key in keys:
+            if strata[key] and len(chosen) < sample_rows:
+                chosen.append(strata[key].pop())
+    return chosen
+
+
+def choose_stream_rows(input_csv, sample_rows, mode, seed):
+    """
+    Tömörített bemenet első menete: a mintába kerülő adatsorok sorszámai (rendezve).
+    Csak a sorok elejét nézzük, a memóriában sorszámok vannak, nem sorok.
+    """
+    rng = np.random.default_rng(seed)
+    strata = {}
+    num_rows = 0
+    with open_binary_input(input_csv) as infile:
+        infile.readline()
+        for num_rows, line in enumerate(infile, 1):
+            if mode != "uniform":
+                key = _row_key(line[:ROW_PREFIX_BYTES], mode)
+                if key is not None:
+                    strata.setdefault(key, []).append(num_rows - 1)
+    if mode == "uniform":
+        return np.sort(rng.choice(num_rows, size=min(sample_rows, num_rows), replace=False))
+    for rows in strata.values():
+        rng.shuffle(rows)
+    return np.sort(np.array(_round_robin(strata, sample_rows, rng), dtype=np.int64))
+
 
 def extract_sample(input_csv="mouth_data.csv",
                    output_csv="mouth_data_sample_1000.csv",
-                   sample_rows=1000):
+                   sample_rows=1000, mode="uniform", seed=0, build_index=False):
     """
-    CSV első N sorát kimenteni
+    Minta kimentése a CSV-ből (a sorokat változatlanul másolja, ';' elválasztóval).
+    A bemenet tömörített (.gz / .zst) is lehet, a kimenet tömörítetlen CSV.
     """
-    
+    input_csv = resolve_input_path(input_csv)
+
     print(f"\n📊 Sample CSV exportálás")
     print(f"   Input: {input_csv}")
     print(f"   Output: {output_csv}")
-    print(f"   Sorok: {sample_rows}")
-    
+    print(f"   Sorok: {sample_rows} ({mode}, seed={seed})")
+
     try:
-        with open(input_csv, 'r', encoding='utf-8') as infile, \
-             open(output_csv, 'w', encoding='utf-8', newline='') as outfile:
-            
-            reader = csv.reader(infile)
-            writer = csv.writer(outfile)
-            
-            # Header
-            header = next(reader, None)
-            if header is None:
-                print("❌ Hiba: CSV nincs header!")
-                return False
-            
-            writer.writerow(header)
-            print(f"\n✅ Header kimentve ({len(header)} oszlop)")
-            print(f"   Oszlopok: {', '.join(header[:5])}...")
-            
-            # Sorok
-            row_count = 0
-            for row in reader:
-                if row_count >= sample_rows:
-                    break
-                writer.writerow(row)
-                row_count += 1
-                
-                if (row_count + 1) % 100 == 0:
-                    print(f"   ✓ {row_count} sor feldolgozva...")
-            
-            print(f"\n✅ Kész! {row_count} sor kimentve")
-            print(f"   Output: {output_csv}")
-            print(f"   Méret: {row_count} × {len(header)} (row × column)")
-            
-            return True
-        
+        started = time.perf_counter()
+        compressed = os.path.exists(input_csv) and detect_compression(input_csv) != "none"
+        if mode == "head":
+            with open_text_input(input_csv) as infile, \
+                 open(output_csv, 'w', encoding='utf-8', newline='') as outfile:
+                reader = csv.reader(infile, delimiter=CSV_DELIMITER)
+                writer = csv.writer(outfile, delimiter=CSV_DELIMITER)
+
+                # Header
+                header = next(reader, None)
+                if header is None:
+                    print("❌ Hiba: CSV nincs header!")
+                    return False
+                writer.writerow(header)
+
+                # Sorok
+                row_count = 0
+                for row in reader:
+                    if row_count >= sample_rows:
+                        break
+                    writer.writerow(row)
+                    row_count += 1
+        elif compressed:
+            print(f"   Tömörített bemenet ({detect_compression(input_csv)}): két streamelt menet")
+            chosen = choose_stream_rows(input_csv, sample_rows, mode, seed)
+            with open_binary_input(input_csv) as infile, open(output_csv, 'wb') as outfile:
+                header_line = infile.readline()
+                if not header_line.strip():
+                    print("❌ Hiba: CSV nincs header!")
+                    return False
+                header = next(csv.reader([header_line.decode('utf-8-sig')], delimiter=CSV_DELIMITER))
+                outfile.write(header_line)
+                position = 0
+                for row_number, line in enumerate(infile):
+                    if position == len(chosen):
+                        break
+                    if row_number == chosen[position]:
+                        outfile.write(line if line.endswith(b"\n") else line + b"\r\n")
+                        position += 1
+                row_count = len(chosen)
+        else:
+            index = build_row_index(input_csv) if build_index else load_row_index(input_csv)
+            print(f"   Sor index: {'van (' + str(len(index) - 1) + ' sor)' if index is not None else 'nincs, véletlen offsetek'}")
+            if index is None and mode != "uniform":
+                # Jelöltenként a véletlen offsettől a következő sor elejéig olvasunk (átlag fél sor)
+                print(f"   ⚠️  Rétegzett minta index nélkül: {sample_rows * OVERSAMPLE} jelölt sor igazítása, "
+                      f"nagy fájlon lassú - futtasd egyszer --build-index-szel")
+            size = os.path.getsize(input_csv)
+            with open(input_csv, 'rb') as infile, open(output_csv, 'wb') as outfile:
+                header_line = infile.readline()
+                if not header_line.strip():
+                    print("❌ Hiba: CSV nincs header!")
+                    return False
+                header = next(csv.reader([header_line.decode('utf-8-sig')], delimiter=CSV_DELIMITER))
+                outfile.write(header_line)
+
+                starts = choose_rows(infile, size, infile.tell(), sample_rows, mode, seed, index=index)
+                for start in starts:
+                    infile.seek(start)
+                    line = infile.readline()
+                    outfile.write(line if line.endswith(b"\n") else line + b"\r\n")
+                row_count = len(starts)
+
+        print(f"\n✅ Header kimentve ({len(header)} oszlop)")
+        print(f"   Oszlopok: {', '.join(header[:5])}...")
+        print(f"\n✅ Kész! {row_count} sor kimentve ({time.perf_counter() - started:.2f}s)")
+        print(f"   Output: {output_csv}")
+        print(f"   Méret: {row_count} × {len(header)} (row × column)")
+
+        return True
+
     except Exception as e:
         print(f"\n❌ Hiba: {e}")
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="mouth_data.csv mintavételezése")
+    parser.add_argument("input", nargs="?", default="mouth_data.csv")
+    parser.add_argument("--output", default="mouth_data_sample_1000.csv")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--mode", choices=SAMPLE_MODES, default="uniform")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--build-index", action="store_true",
+                        help="Sor index építése (egyszeri teljes végigolvasás), a további mintavételek ezt használják")
+    args = parser.parse_args()
+
     print("\n" + "="*70)
     print("🔍 MOUTH_DATA SAMPLE EXPORT")
     print("="*70)
-    
-    success = extract_sample()
-    
+
+    success = extract_sample(args.input, args.output, args.rows, mode=args.mode,
+                             seed=args.seed, build_index=args.build_index)
+
     if success:
         print("\n" + "="*70)
         print("✅ Sample CSV sikeresen létrehozva!")
-        print("   Most megnyithatod Excelben: mouth_data_sample_1000.csv")
+        print(f"   Most megnyithatod Excelben: {args.output}")
         print("="*70 + "\n")
     else:
         print("\n❌ Hiba az exportálás során!\n")
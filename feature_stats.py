@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Összefésülhető, streamelt jellemző statisztikák (normalizáláshoz és összesítéshez)
+
+Jellemzőnként (blend shape-ek, ajak pontok, oszlopos datasetnél a mouth_features is)
+globálisan, szavanként és speakerenként:
+    - darabszám, átlag, szórás, min, max: Welford / Chan részállapotok
+    - kvantilisek: relatív hibájú logaritmikus bucket sketch (DDSketch jellegű)
+
+Minden részállapot (worker, videó, chunk, shard, gép) összevonható (merge), az
+összevonás asszociatív, így a sorrend nem számít. A teljes CSV-t nem kell memóriába
+tölteni, és nem kell külön menet sem: a dataset_processor_multithread a workerekben
+videónként számolja, és a kimenet mellé menti (<csv>.stats.npz).
+
+Használat:
+    python feature_stats.py compute mouth_data.csv --output stats.json       # utólag, párhuzamosan
+    python feature_stats.py compute shard0.csv shard1.csv mouth_columnar/ --state all.stats.npz
+    python feature_stats.py merge node*/mouth_data.stats.npz --output stats.json
+    python feature_stats.py summary mouth_data.stats.npz --output stats.json
+"""
+
+import os
+import csv
+import json
+import argparse
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from dataset_io import make_output_selection
+from columnar_dataset import BLEND_SHAPE_COLUMNS, COLUMN_SPECS, read_manifest, records_to_columns
+from csv_to_columnar import iter_source_chunks, load_source_chunk, read_csv_header
+from compressed_io import strip_compression_suffix
+from mouth_features import MOUTH_FEATURE_NAMES
+
+STATS_FILE = "stats.json"
+STATE_SUFFIX = ".stats.npz"
+
+# A statisztikába kerülő oszlopok (ami a forrásban megvan belőlük)
+STAT_COLUMNS = ["blend_shapes", "mouth_blend_shapes", "outer_lip_relative_points",
+                "inner_lip_relative_points", "mouth_features"]
+
+# Sketch: ennyi relatív hiba a kvantiliseken; ennél kisebb abszolút értékek a 0 bucketbe esnek
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 1e-4
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+GLOBAL_GROUP = "all"
+
+# Sketch kulcs: dimenzió << _DIM_SHIFT | (előjeles bucket kód + _CODE_OFFSET); a kulcsok sorrendje
+# dimenzión belül az értékek sorrendje
+_DIM_SHIFT = 22
+_CODE_OFFSET = 1 << 21
+
+
+def stat_columns(available):
+    """
+    A forrás oszlopaiból a statisztikázott oszlopok. A mouth_blend_shapes a blend_shapes része,
+    csak akkor kell külön, ha a teljes blend_shapes nincs meg (pl. --columns mouth).
+    """
+    columns = [name for name in STAT_COLUMNS if name in available]
+    if "blend_shapes" in columns and "mouth_blend_shapes" in columns:
+        columns.remove("mouth_blend_shapes")
+    return columns
+
+
+def feature_names(columns):
+    """Oszlopok -> jellemzőnevek, pl. blend_shapes.jawOpen, outer_lip_relative_points.3.x"""
+    names = []
+    for column in columns:
+        if column in BLEND_SHAPE_COLUMNS:
+            names += [f"{column}.{name}" for name in BLEND_SHAPE_COLUMNS[column]]
+        elif column == "mouth_features":
+            names += [f"{column}.{name}" for name in MOUTH_FEATURE_NAMES]
+        else:
+            points = COLUMN_SPECS[column][1][0]
+            names += [f"{column}.{i}.{axis}" for i in range(points) for axis in "xy"]
+    return names
+
+
+def feature_matrix(arrays, columns):
+    """Oszlopos tömbök -> (sorok, jellemzők) float64 mátrix a feature_names sorrendjében."""
+    rows = len(arrays[columns[0]])
+    return np.concatenate([np.asarray(arrays[name], dtype=np.float64).reshape(rows, -1) for name in columns],
+                          axis=1)
+
+
+class RunningMoments:
+    """
+    Dimenziónkénti darabszám, átlag, M2 (négyzetes eltérés összeg), min, max.
+    Batch-enként számolunk, a batch-et Chan képletével vonjuk össze (Welford általánosítása),
+    így a merge ugyanaz a művelet, mint az update.
+    """
+
+    def __init__(self, dim):
+        self.count = 0
+        self.mean = np.zeros(dim)
+        self.m2 = np.zeros(dim)
+        self.min = np.full(dim, np.inf)
+        self.max = np.full(dim, -np.inf)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        batch = RunningMoments(values.shape[1])
+        batch.count = len(values)
+        batch.mean = values.mean(axis=0)
+        batch.m2 = ((values - batch.mean) ** 2).sum(axis=0)
+        batch.min = values.min(axis=0)
+        batch.max = values.max(axis=0)
+        self.merge(batch)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / total)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (self.count * other.count / total)
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.count = total
+
+    def variance(self, ddof=0):
+        if self.count <= ddof:
+            return np.full(len(self.mean), np.nan)
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof=0):
+        return np.sqrt(self.variance(ddof))
+
+
+class QuantileSketch:
+    """
+    Dimenziónkénti logaritmikus bucket számlálók: az |x| >= min_value értékek a
+    (gamma^(i-1), gamma^i] bucketekbe esnek, gamma = (1 + a) / (1 - a), így minden
+    kvantilis becslés relatív hibája legfeljebb a (relative_accuracy); a kisebb
+    abszolút értékek a 0 bucketbe kerülnek. A merge a számlálók összeadása (pontos).
+    """
+
+    def __init__(self, dim, relative_accuracy=RELATIVE_ACCURACY, min_value=MIN_VALUE):
+        self.dim = dim
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self._gamma)
+        self._min_index = int(np.ceil(np.log(min_value) / self._log_gamma))
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _codes(self, values):
+        # 0: a 0 bucket; +-i: az i-edik bucket a min_value-tól (pozitív / negatív értékek)
+        magnitude = np.abs(values)
+        nonzero = magnitude >= self.min_value
+        index = np.zeros(values.shape, dtype=np.int64)
+        index[nonzero] = np.ceil(np.log(magnitude[nonzero]) / self._log_gamma).astype(np.int64) \
+            - self._min_index + 1
+        return np.where(values < 0, -index, index)
+
+    def _code_values(self, codes):
+        index = np.abs(codes) + self._min_index - 1
+        values = 2 * self._gamma ** index.astype(np.float64) / (self._gamma + 1)
+        return np.where(codes == 0, 0.0, np.sign(codes) * values)
+
+    def _add(self, keys, counts):
+        keys, inverse = np.unique(np.concatenate([self.keys, keys]), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]),
+                                  minlength=len(keys)).astype(np.int64)
+        self.keys = keys
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        keys = (np.arange(self.dim, dtype=np.int64) << _DIM_SHIFT) + self._codes(values) + _CODE_OFFSET
+        keys, counts = np.unique(keys.ravel(), return_counts=True)
+        self._add(keys, counts)
+
+    def merge(self, other):
+        if (other.dim, other.relative_accuracy, other.min_value) != (self.dim, self.relative_accuracy,
+                                                                      self.min_value):
+            raise ValueError("Eltérő paraméterű sketch-ek nem vonhatók össze")
+        if len(other.keys):
+            self._add(other.keys, other.counts)
+
+    def quantiles(self, qs):
+        """Returns: (len(qs), dim) becslések (NaN, ahol nincs adat)."""
+        qs = np.asarray(qs, dtype=np.float64)
+        result = np.full((len(qs), self.dim), np.nan)
+        dims = self.keys >> _DIM_SHIFT
+        bounds = np.searchsorted(dims, np.arange(self.dim + 1))
+        values = self._code_values((self.keys & ((1 << _DIM_SHIFT) - 1)) - _CODE_OFFSET)
+        for dim in range(self.dim):
+            start, end = bounds[dim], bounds[dim + 1]
+            if start == end:
+                continue
+            cumulative = np.cumsum(self.counts[start:end])
+            ranks = qs * (cumulative[-1] - 1)
+            result[:, dim] = values[start:end][np.searchsorted(cumulative, ranks, side="right")]
+        return result
+
+
+class FeatureStats:
+    """
+    Globális, szavankénti és speakerenkénti momentumok + kvantilis sketch-ek.
+    A részállapotok merge-gel összevonhatók, save / load-dal .npz-be menthetők.
+    """
+
+    def __init__(self, columns, relative_accuracy=RELATIVE_ACCURACY, min_value=MIN_VALUE):
+        self.columns = list(columns)
+        self.features = feature_names(self.columns)
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.groups = {}
+        self.skipped_rows = 0
+
+    def _group(self, name):
+        if name not in self.groups:
+            dim = len(self.features)
+            self.groups[name] = (RunningMoments(dim), QuantileSketch(dim, self.relative_accuracy, self.min_value))
+        return self.groups[name]
+
+    def _update_group(self, name, values):
+        moments, sketch = self._group(name)
+        moments.update(values)
+        sketch.update(values)
+
+    def update(self, arrays):
+        """
+        Args:
+            arrays: oszlopnév -> tömb (word, speaker + self.columns), pl. egy oszlopos chunk
+        """
+        values = feature_matrix(arrays, self.columns)
+        finite = np.isfinite(values).all(axis=1)
+        self.skipped_rows += int(len(values) - finite.sum())
+        values = values[finite]
+        self._update_group(GLOBAL_GROUP, values)
+        for prefix, column in (("word", "word"), ("speaker", "speaker")):
+            labels, inverse = np.unique(np.asarray(arrays[column], dtype=str)[finite], return_inverse=True)
+            order = np.argsort(inverse, kind="stable")
+            for label, rows in zip(labels.tolist(),
+                                   np.split(order, np.cumsum(np.bincount(inverse, minlength=len(labels)))[:-1])):
+                self._update_group(f"{prefix}/{label}", values[rows])
+
+    def update_records(self, records):
+        """(speaker, video, frame_idx, word, mouth_data) rekordok (pl. egy videó) hozzáadása."""
+        if records:
+            self.update(records_to_columns(records, make_output_selection(",".join(self.columns))))
+
+    def merge(self, other):
+        if other.features != self.features:
+            raise ValueError("Eltérő jellemzőkkel készült statisztikák nem vonhatók össze")
+        for name, (moments, sketch) in other.groups.items():
+            own_moments, own_sketch = self._group(name)
+            own_moments.merge(moments)
+            own_sketch.merge(sketch)
+        self.skipped_rows += other.skipped_rows
+        return self
+
+    @property
+    def rows(self):
+        return self.groups[GLOBAL_GROUP][0].count if GLOBAL_GROUP in self.groups else 0
+
+    def save(self, path):
+        """Összefésülhető állapot mentése (.npz, atomikusan)."""
+        names = sorted(self.groups)
+        sketches = [self.groups[name][1] for name in names]
+        moments = [self.groups[name][0] for name in names]
+        dim = len(self.features)
+        stacked = lambda attr: np.array([getattr(m, attr) for m in moments]).reshape(len(names), dim)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, columns=np.array(self.columns, dtype=str), groups=np.array(names, dtype=str),
+                     params=np.array([self.relative_accuracy, self.min_value]),
+                     skipped_rows=np.array(self.skipped_rows),
+                     count=np.array([m.count for m in moments], dtype=np.int64),
+                     mean=stacked("mean"), m2=stacked("m2"), min=stacked("min"), max=stacked("max"),
+                     sketch_keys=np.concatenate([s.keys for s in sketches] or [np.zeros(0, np.int64)]),
+                     sketch_counts=np.concatenate([s.counts for s in sketches] or [np.zeros(0, np.int64)]),
+                     sketch_sizes=np.array([len(s.keys) for s in sketches], dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            relative_accuracy, min_value = data["params"].tolist()
+            stats = cls(data["columns"].tolist(), relative_accuracy=relative_accuracy, min_value=min_value)
+            stats.skipped_rows = int(data["skipped_rows"])
+            offsets = np.concatenate([[0], np.cumsum(data["sketch_sizes"])])
+            for i, name in enumerate(data["groups"].tolist()):
+                moments, sketch = stats._group(name)
+                moments.count = int(data["count"][i])
+                moments.mean, moments.m2 = data["mean"][i], data["m2"][i]
+                moments.min, moments.max = data["min"][i], data["max"][i]
+                sketch.keys = data["sketch_keys"][offsets[i]:offsets[i + 1]]
+                sketch.counts = data["sketch_counts"][offsets[i]:offsets[i + 1]]
+        return stats
+
+    def _group_summary(self, name, quantiles, decimals):
+        moments, sketch = self.groups[name]
+        # A sketch becslése nem lóghat ki a pontos min / max közül
+        estimates = np.clip(sketch.quantiles(quantiles), moments.min, moments.max)
+        as_list = lambda array: [None if not np.isfinite(v) else round(float(v), decimals) for v in array]
+        return {
+            "count": moments.count,
+            "mean": as_list(moments.mean),
+            "std": as_list(moments.std()),
+            "min": as_list(moments.min),
+            "max": as_list(moments.max),
+            "quantiles": {f"p{round(100 * q):02d}": as_list(row) for q, row in zip(quantiles, estimates)},
+        }
+
+    def summary(self, quantiles=QUANTILES, decimals=6):
+        """A stats.json tartalma: jellemzőnként listák a features sorrendjében."""
+        groups = {prefix: {} for prefix in ("word", "speaker")}
+        for name in sorted(self.groups):
+            if name != GLOBAL_GROUP:
+                prefix, label = name.split("/", 1)
+                groups[prefix][label] = self._group_summary(name, quantiles, decimals)
+        return {
+            "features": self.features,
+            "rows": self.rows,
+            "skipped_rows": self.skipped_rows,
+            "relative_accuracy": self.relative_accuracy,
+            "global": self._group_summary(GLOBAL_GROUP, quantiles, decimals) if self.rows else None,
+            "words": groups["word"],
+            "speakers": groups["speaker"],
+        }
+
+    def write_summary(self, path, **kwargs):
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.summary(**kwargs), f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+
+def state_path(output_csv):
+    """mouth_data.csv (vagy mouth_data.csv.gz) -> mouth_data.stats.npz"""
+    return os.path.splitext(strip_compression_suffix(output_csv))[0] + STATE_SUFFIX
+
+
+def merge_state_files(paths):
+    """Több mentett részállapot összevonása (None, ha egy sincs)."""
+    merged = None
+    for path in paths:
+        stats = FeatureStats.load(path)
+        merged = stats if merged is None else merged.merge(stats)
+    return merged
+
+
+# -------------------- Utólagos számítás CSV / oszlopos forrásokon --------------------
+def source_columns(source):
+    if os.path.isdir(source):
+        return list(read_manifest(source)["columns"])
+    return read_csv_header(source)
+
+
+def _chunk_stats(task):
+    """Worker: egy chunk részállapota."""
+    chunk, columns = task
+    stats = FeatureStats(columns)
+    stats.update(load_source_chunk(chunk, ["speaker", "word"] + columns))
+    return stats
+
+
+def compute_stats(sources, chunk_rows=20000, workers=None, prefetch=None):
+    """
+    Statisztika több forrásból (CSV-k / oszlopos datasetek, pl. shardok), chunkonként párhuzamosan.
+    A memóriahasználatot a chunk méret és a prefetch korlátozza.
+    """
+    workers = workers or cpu_count()
+    prefetch = prefetch or 2 * workers
+    columns = None
+    for source in sources:
+        available = stat_columns(source_columns(source))
+        if columns is not None and available != columns:
+            raise ValueError(f"A források oszlopai eltérnek: {source}")
+        columns = available
+    if not columns:
+        raise ValueError(f"Nincs statisztikázható oszlop ({', '.join(STAT_COLUMNS)})")
+
+    stats = FeatureStats(columns)
+    with Pool(processes=workers) as pool:
+        pending = deque()
+        for source in sources:
+            print(f"📈 {source}")
+            for chunk in iter_source_chunks(source, chunk_rows, required=["speaker", "word"] + columns):
+                pending.append(pool.apply_async(_chunk_stats, ((chunk, columns),)))
+                if len(pending) >= prefetch:
+                    stats.merge(pending.popleft().get())
+        while pending:
+            stats.merge(pending.popleft().get())
+    return stats
+
+
+def print_stats(stats, top=8):
+    summary = stats.summary()
+    print(f"\n📊 {summary['rows']} sor, {len(summary['features'])} jellemző, "
+          f"{len(summary['words'])} szó, {len(summary['speakers'])} speaker"
+          + (f" ({summary['skipped_rows']} nem véges sor kihagyva)" if summary["skipped_rows"] else ""))
+    if not summary["global"]:
+        return
+    print(f"   A {top} legnagyobb szórású jellemző:")
+    std = np.array([v if v is not None else 0.0 for v in summary["global"]["std"]])
+    for i in np.argsort(std)[::-1][:top]:
+        g = summary["global"]
+        print(f"   {summary['features'][i]:<42} átlag {g['mean'][i]:9.4f}  szórás {g['std'][i]:9.4f}  "
+              f"p05..p95 {g['quantiles']['p05'][i]:9.4f} .. {g['quantiles']['p95'][i]:9.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Összefésülhető jellemző statisztikák (átlag, szórás, kvantilisek)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compute_parser = subparsers.add_parser("compute", help="Statisztika CSV / oszlopos forrásokból")
+    compute_parser.add_argument("sources", nargs="+", help="mouth_data.csv-k vagy oszlopos dataset könyvtárak")
+    compute_parser.add_argument("--chunk-rows", type=int, default=20000)
+    compute_parser.add_argument("--workers", type=int, default=None, help="Worker processek (alapból cpu_count)")
+    compute_parser.add_argument("--prefetch", type=int, default=None)
+
+    merge_parser = subparsers.add_parser("merge", help="Részállapotok (.stats.npz) összevonása")
+    merge_parser.add_argument("states", nargs="+")
+
+    summary_parser = subparsers.add_parser("summary", help="stats.json egy mentett állapotból")
+    summary_parser.add_argument("state")
+
+    for sub in (compute_parser, merge_parser, summary_parser):
+        sub.add_argument("--output", default=STATS_FILE, help="Összesítő JSON (alapból stats.json)")
+    for sub in (compute_parser, merge_parser):
+        sub.add_argument("--state", default=None, help="Az összevont állapot mentése (.stats.npz)")
+    args = parser.parse_args()
+
+    csv.field_size_limit(1 << 30)
+    try:
+        if args.command == "compute":
+            stats = compute_stats(args.sources, chunk_rows=args.chunk_rows, workers=args.workers,
+                                  prefetch=args.prefetch)
+        elif args.command == "merge":
+            stats = merge_state_files(args.states)
+        else:
+            stats = FeatureStats.load(args.state)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+    if getattr(args, "state", None) and args.command != "summary":
+        stats.save(args.state)
+        print(f"💾 Állapot: {args.state}")
+    stats.write_summary(args.output)
+    print_stats(stats)
+    print(f"\n✅ {args.output}")
@@ -16,20 +16,118 @@ MOUTH_INNER_POINTS_INDICES = [
     78, 191, 80, 81, 82, 13, 312, 311, 310, 415, 308, 324, 318, 402, 14, 178, 88, 95
 ]
 
-def process_frame_full_mouth(image, landmarker):
+# Az arckontúr alsó íve (állkapocs) jobb arccsonttól bal arccsontig
+JAW_CONTOUR_INDICES = [
+    454, 323, 361, 288, 397, 365, 379, 378, 400, 377, 152, 148, 176, 149, 150, 136, 172, 58, 132, 93, 234
+]
+
+# Landmark részhalmazok a landmark oszlopokhoz (--landmarks), a teljes 478 pont helyett
+LANDMARK_SUBSETS = {
+    "lips": sorted(set(MOUTH_OUTER_POINTS_INDICES + MOUTH_INNER_POINTS_INDICES)),
+    "lips_jaw": sorted(set(MOUTH_OUTER_POINTS_INDICES + MOUTH_INNER_POINTS_INDICES + JAW_CONTOUR_INDICES)),
+}
+
+# A Face Landmarker által visszaadott 52 blend shape (a modell kimeneti sorrendjében)
+BLEND_SHAPE_NAMES = [
+    '_neutral', 'browDownLeft', 'browDownRight', 'browInnerUp', 'browOuterUpLeft',
+    'browOuterUpRight', 'cheekPuff', 'cheekSquintLeft', 'cheekSquintRight',
+    'eyeBlinkLeft', 'eyeBlinkRight', 'eyeLookDownLeft', 'eyeLookDownRight',
+    'eyeLookInLeft', 'eyeLookInRight', 'eyeLookOutLeft', 'eyeLookOutRight',
+    'eyeLookUpLeft', 'eyeLookUpRight', 'eyeSquintLeft', 'eyeSquintRight',
+    'eyeWideLeft', 'eyeWideRight', 'jawForward', 'jawLeft', 'jawOpen', 'jawRight',
+    'mouthClose', 'mouthDimpleLeft', 'mouthDimpleRight', 'mouthFrownLeft',
+    'mouthFrownRight', 'mouthFunnel', 'mouthLeft', 'mouthLowerDownLeft',
+    'mouthLowerDownRight', 'mouthPressLeft', 'mouthPressRight', 'mouthPucker',
+    'mouthRight', 'mouthRollLower', 'mouthRollUpper', 'mouthShrugLower',
+    'mouthShrugUpper', 'mouthSmileLeft', 'mouthSmileRight', 'mouthStretchLeft',
+    'mouthStretchRight', 'mouthUpperUpLeft', 'mouthUpperUpRight', 'noseSneerLeft',
+    'noseSneerRight'
+]
+
+# Blend shape csoportok (a dataset oszlopai ezek alapján készülnek)
+MOUTH_BLEND_SHAPE_NAMES = [
+    'mouthOpen', 'mouthRight', 'mouthLeft', 'mouthFunnel',
+    'mouthPucker', 'jawOpen', 'mouthClose', 'mouthSmileLeft',
+    'mouthSmileRight', 'mouthUpperUpLeft', 'mouthUpperUpRight'
+]
+EYES_BLEND_SHAPE_NAMES = [
+    'eyeBlinkLeft', 'eyeBlinkRight', 'eyeLookUpLeft', 'eyeLookUpRight',
+    'eyeLookDownLeft', 'eyeLookDownRight', 'eyeLookInLeft', 'eyeLookInRight',
+    'eyeLookOutLeft', 'eyeLookOutRight', 'eyeWideLeft', 'eyeWideRight',
+    'eyeSquintLeft', 'eyeSquintRight'
+]
+BROW_BLEND_SHAPE_NAMES = [
+    'browDownLeft', 'browDownRight', 'browInnerUp', 'browOuterUpLeft', 'browOuterUpRight'
+]
+FACE_SHAPE_BLEND_SHAPE_NAMES = [
+    'cheekPuff', 'cheekSquintLeft', 'cheekSquintRight', 'cheekRaiseLeft', 'cheekRaiseRight',
+    'noseSneerLeft', 'noseSneerRight', 'jawForward', 'jawLeft', 'jawRight'
+]
+
+def resolve_landmark_indices(spec):
     """
-    Feldolgoz egyetlen képkockát MediaPipe Face Landmarker Task API-val,
-    kinyerve a teljes 3D arc modell adatait és blend shape paramétereit.
-    
+    --landmarks érték -> index lista: LANDMARK_SUBSETS név, vagy vesszővel elválasztott
+    indexek / nevek keveréke (pl. "lips_jaw,1,4"). None vagy "all" = mind a 478 pont (None).
+    """
+    if spec is None or spec == "all":
+        return None
+    indices = set()
+    for item in (i.strip() for i in spec.split(",")):
+        if not item:
+            continue
+        if item in LANDMARK_SUBSETS:
+            indices.update(LANDMARK_SUBSETS[item])
+        elif item.isdigit() and int(item) < 478:
+            indices.add(int(item))
+        else:
+            raise ValueError(f"Ismeretlen landmark részhalmaz vagy index: {item} "
+                             f"(részhalmazok: {', '.join(LANDMARK_SUBSETS)})")
+    return sorted(indices)
+
+
+def create_landmarker_options(model_path, running_mode=vision.RunningMode.IMAGE,
+                              output_face_blendshapes=True, result_callback=None, **profile_options):
+    """
+    A FaceLandmarker beállításai, ahogy az összes extractor használja.
+    result_callback: csak LIVE_STREAM módban, (result, output_image, timestamp_ms) (lásd live_stream.py)
+    profile_options: num_faces / min_*_confidence (landmarker_profile.PROFILE_OPTIONS);
+                     a None értékűek a MediaPipe alapértelmezését kapják
+    """
+    return vision.FaceLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=model_path),
+        running_mode=running_mode,
+        output_face_blendshapes=output_face_blendshapes,
+        result_callback=result_callback,
+        **{key: value for key, value in profile_options.items() if value is not None}
+    )
+
+
+def create_landmarker(model_path, **kwargs):
+    """
+    Új FaceLandmarker példány (processzenként / szálanként egy kell).
+    """
+    return vision.FaceLandmarker.create_from_options(create_landmarker_options(model_path, **kwargs))
+
+
+def detect_raw(image, landmarker, rgb=False):
+    """
+    Lefuttatja a Face Landmarkert egy képkockán, és csak a nyers kimenetet adja vissza.
+
     Args:
         image (numpy.ndarray): A feldolgozandó kép (BGR formátumban).
-        landmarker: Az előre inicializált MediaPipe FaceLandmarker objektum.
+        landmarker: Az előre inicializált MediaPipe FaceLandmarker objektum
+                    (vagy AdaptiveDetector, ekkor az adaptív felbontású detektálás fut).
+        rgb (bool): A kép már RGB (ffmpeg / pyav dekóder), a színkonverzió elmarad.
 
     Returns:
-        dict: Egy dictionary a száj adataival és blend shape paramétereivel, vagy None, ha nem talált arcot.
+        tuple: (landmark_array (478 x 3 normalizált pont), blend_shape_values dict),
+               vagy None, ha nem talált arcot.
     """
-    # Kép konvertálása MediaPipe Image objektummá
-    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if isinstance(landmarker, AdaptiveDetector):
+        return landmarker.detect_raw(image, rgb=rgb)
+
+    # Kép konvertálása MediaPipe Image objektummá (a kivágások miatt folytonos memóriába)
+    rgb_image = np.ascontiguousarray(image) if rgb else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     mp_image = Image(image_format=ImageFormat.SRGB, data=rgb_image)
     
     # Feldolgozás
@@ -39,6 +137,14 @@ def process_frame_full_mouth(image, landmarker):
         print(f"Hiba a face detection során: {e}")
         return None
 
+    return result_to_raw(result)
+
+
+def result_to_raw(result):
+    """
+    Egy FaceLandmarkerResult -> (landmark_array, blend_shape_values), vagy None, ha nincs arc.
+    (A LIVE_STREAM mód async callbackje is ezt használja.)
+    """
     if not result.face_landmarks:
         return None
 
@@ -46,89 +152,261 @@ def process_frame_full_mouth(image, landmarker):
     landmarks = result.face_landmarks[0]
     landmark_array = np.array([[lm.x, lm.y, lm.z] for lm in landmarks])
 
-    # Képpont koordináták (pixel értékek)
-    image_height, image_width = image.shape[:2]
-    pixel_coords = landmark_array[:, :2] * np.array([image_width, image_height])
-
-    # Külső és belső ajak pontjainak kinyerése
-    outer_mouth_coords = pixel_coords[MOUTH_OUTER_POINTS_INDICES]
-    inner_mouth_coords = pixel_coords[MOUTH_INNER_POINTS_INDICES]
-
-    # Szájközéppont számítása
-    all_mouth_coords = np.concatenate([outer_mouth_coords, inner_mouth_coords])
-    mouth_center = np.mean(all_mouth_coords, axis=0).astype(int)
-
-    # Relatív pozíciók kiszámítása
-    relative_outer_mouth_points = outer_mouth_coords - mouth_center
-    relative_inner_mouth_points = inner_mouth_coords - mouth_center
-
-    # ========== BLEND SHAPES ==========
     blend_shape_values = {}
     
     if result.face_blendshapes and len(result.face_blendshapes) > 0:
         for blend_shape in result.face_blendshapes[0]:
             blend_shape_values[blend_shape.category_name] = blend_shape.score
+
+    return landmark_array, blend_shape_values
+
+
+def enhance_image(image, rgb=False):
+    """
+    Kontrasztjavítás sötét / alulexponált képkockákhoz: CLAHE a LAB világosság csatornán.
+    A kimenet színsorrendje a bemenetével egyezik (BGR, vagy rgb=True esetén RGB).
+    """
+    lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB if rgb else cv2.COLOR_BGR2LAB)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    lab[:, :, 0] = clahe.apply(lab[:, :, 0])
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2RGB if rgb else cv2.COLOR_LAB2BGR)
+
+
+# Az adaptív detektálás útvonalai (a számlálók kulcsai)
+DETECTION_PATHS = ["roi", "downscaled", "full", "enhanced", "miss"]
+
+
+class AdaptiveDetector:
+    """
+    Adaptív felbontású detektálás egy FaceLandmarker köré.
+
+    Sorrend frame-enként, az első elfogadható találatnál megáll:
+        1. roi:        az előző frame arcának környéke (kivágás), ha volt arc
+        2. downscaled: a teljes frame kicsinyítve (scale)
+        3. full:       a teljes frame natív felbontásban
+        4. enhanced:   natív felbontás CLAHE kontrasztjavítással (enhance=True esetén, és csak ha az
+                       utolsó enhance_window frame valamelyikén volt arc; a videó eleje is ide számít)
+    A MediaPipe nem ad arc konfidenciát, ezért a gyenge találatot geometriából ítéljük meg:
+    ha a landmarkok a kivágás széléhez érnek, vagy az arc túl kicsi (min_face_px, mindig natív
+    pixelben mérve, a kicsinyített képen is), jön a következő lépés. A kimenet mindig a teljes frame-hez normalizált landmark tömb,
+    így a build_mouth_data változatlanul használható.
+
+        detector = AdaptiveDetector(create_landmarker(MODEL_PATH))
+        raw = detect_raw(frame, detector)
+        print(detector.stats)
+    """
+
+    def __init__(self, landmarker, scale=0.5, roi_margin=0.3, min_face_px=96, edge_margin=0.02, enhance=True,
+                 enhance_window=5):
+        self.landmarker = landmarker
+        self.scale = scale
+        self.roi_margin = roi_margin
+        self.min_face_px = min_face_px
+        self.edge_margin = edge_margin
+        self.enhance = enhance
+        self.enhance_window = enhance_window
+        self.start_video()
+
+    def settings(self):
+        """Az eredményt befolyásoló beállítások (a raw_store kulcsához)."""
+        return {
+            "adaptive": True, "scale": self.scale, "roi_margin": self.roi_margin,
+            "min_face_px": self.min_face_px, "edge_margin": self.edge_margin, "enhance": self.enhance,
+            "enhance_window": self.enhance_window,
+        }
+
+    def start_video(self):
+        """Új videó: a követett arc doboz és a számlálók nullázása."""
+        self.stats = {"frames": 0, "detect_calls": 0, **{path: 0 for path in DETECTION_PATHS}}
+        self.last_path = None
+        self._last_box = None
+        # Ennyi frame óta nem volt arc (0 a videó elején, így egy sötét videó eleje is kap kontrasztjavítást)
+        self._frames_since_face = 0
+
+    def _plausible(self, landmark_array, width, height, check_edges):
+        # width / height: a landmarkok normalizálásának alapja natív pixelben (kivágás vagy teljes frame)
+        x = landmark_array[:, 0]
+        y = landmark_array[:, 1]
+        if (y.max() - y.min()) * height < self.min_face_px:
+            return False
+        if check_edges:
+            m = self.edge_margin
+            if x.min() < m or y.min() < m or x.max() > 1 - m or y.max() > 1 - m:
+                return False
+        return True
+
+    def _try(self, image, rgb):
+        self.stats["detect_calls"] += 1
+        return detect_raw(image, self.landmarker, rgb=rgb)
+
+    def _accept(self, path, raw):
+        self.stats[path] += 1
+        self.last_path = path
+        if raw is None:
+            self._last_box = None
+            self._frames_since_face += 1
+            return None
+        self._frames_since_face = 0
+        landmark_array = raw[0]
+        self._last_box = (landmark_array[:, 0].min(), landmark_array[:, 1].min(),
+                          landmark_array[:, 0].max(), landmark_array[:, 1].max())
+        return raw
+
+    def detect_raw(self, image, rgb=False):
+        self.stats["frames"] += 1
+        height, width = image.shape[:2]
+
+        # 1. Az előző arc környéke
+        if self._last_box is not None:
+            x0, y0, x1, y1 = self._last_box
+            mx = (x1 - x0) * self.roi_margin
+            my = (y1 - y0) * self.roi_margin
+            left = max(int((x0 - mx) * width), 0)
+            top = max(int((y0 - my) * height), 0)
+            right = min(int(np.ceil((x1 + mx) * width)), width)
+            bottom = min(int(np.ceil((y1 + my) * height)), height)
+            if right - left > 1 and bottom - top > 1:
+                raw = self._try(image[top:bottom, left:right], rgb)
+                if raw is not None and self._plausible(raw[0], right - left, bottom - top,
+                                                       check_edges=True):
+                    # Kivágás -> teljes frame normalizált koordináták (z a szélességgel skálázódik)
+                    roi_width, roi_height = right - left, bottom - top
+                    landmark_array = raw[0].copy()
+                    landmark_array[:, 0] = (landmark_array[:, 0] * roi_width + left) / width
+                    landmark_array[:, 1] = (landmark_array[:, 1] * roi_height + top) / height
+                    landmark_array[:, 2] = landmark_array[:, 2] * roi_width / width
+                    return self._accept("roi", (landmark_array, raw[1]))
+
+        # 2. Kicsinyített teljes frame (a normalizált koordináták nem változnak)
+        if self.scale < 1.0:
+            small = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            raw = self._try(small, rgb)
+            # A normalizált koordináták a natív frame-re is érvényesek: az arc méret natív pixelben
+            if raw is not None and self._plausible(raw[0], width, height, check_edges=False):
+                return self._accept("downscaled", raw)
+
+        # 3. Natív felbontás
+        raw = self._try(image, rgb)
+        if raw is not None:
+            return self._accept("full", raw)
+
+        # 4. Kontrasztjavított natív felbontás (tartósan arc nélküli szakaszon nem érdemes)
+        if self.enhance and self._frames_since_face < self.enhance_window:
+            raw = self._try(enhance_image(image, rgb=rgb), rgb)
+            if raw is not None:
+                return self._accept("enhanced", raw)
+
+        return self._accept("miss", None)
+
+
+def build_mouth_data(landmark_array, blend_shape_values, image_width, image_height,
+                     fields=None, landmark_indices=None, as_arrays=False):
+    """
+    A nyers landmarker kimenetből (normalizált landmarkok + blend shape-ek)
+    előállítja a dataset összes származtatott mezőjét. Nem futtat inferenciát,
+    így a nyers tárból (raw_store) is újra lehet számolni a kimenetet.
+
+    Args:
+        landmark_array (numpy.ndarray): 478 x 3 normalizált landmark.
+        blend_shape_values (dict): Blend shape név -> érték.
+        image_width (int): A képkocka szélessége pixelben.
+        image_height (int): A képkocka magassága pixelben.
+        fields (set): Csak ezeket a kulcsokat számolja ki (None = mind). A kihagyott
+                      mezők (pl. a 478 pontos pixel / relatív landmarkok) számítása elmarad.
+        landmark_indices (list): A landmark mezőkbe csak ezek a pontok kerülnek (None = mind).
+        as_arrays (bool): A mezők numpy tömbként maradnak (.tolist() nélkül), a gyors
+                          CSV íráshoz (dataset_io.format_json_value).
+
+    Returns:
+        dict: Ugyanaz a struktúra, amit a process_frame_full_mouth ad vissza.
+    """
+    landmark_array = np.asarray(landmark_array, dtype=np.float64)
+    want = (lambda key: True) if fields is None else fields.__contains__
+    out = (lambda array: array) if as_arrays else (lambda array: array.tolist())
+    image_size = np.array([image_width, image_height])
+    lip_indices = MOUTH_OUTER_POINTS_INDICES + MOUTH_INNER_POINTS_INDICES
+    output_data = {}
+
+    # ========== SZÁJ SPECIFIKUS ADATOK ==========
+    if any(want(key) for key in ("mouth_center", "outer_lip_pixel_points", "outer_lip_relative_points",
+                                 "inner_lip_pixel_points", "inner_lip_relative_points")):
+        # Külső és belső ajak pontjainak kinyerése (képpont koordináták)
+        outer_mouth_coords = landmark_array[MOUTH_OUTER_POINTS_INDICES, :2] * image_size
+        inner_mouth_coords = landmark_array[MOUTH_INNER_POINTS_INDICES, :2] * image_size
+
+        # Szájközéppont számítása
+        all_mouth_coords = np.concatenate([outer_mouth_coords, inner_mouth_coords])
+        mouth_center = np.mean(all_mouth_coords, axis=0).astype(int)
+
+        if want("mouth_center"):
+            output_data["mouth_center"] = out(mouth_center)
+        if want("mouth_center_3d"):
+            output_data["mouth_center_3d"] = out(np.mean(landmark_array[lip_indices], axis=0))
+        if want("outer_lip_pixel_points"):
+            output_data["outer_lip_pixel_points"] = out(outer_mouth_coords)
+        # Relatív pozíciók kiszámítása
+        if want("outer_lip_relative_points"):
+            output_data["outer_lip_relative_points"] = out(outer_mouth_coords - mouth_center)
+        if want("inner_lip_pixel_points"):
+            output_data["inner_lip_pixel_points"] = out(inner_mouth_coords)
+        if want("inner_lip_relative_points"):
+            output_data["inner_lip_relative_points"] = out(inner_mouth_coords - mouth_center)
+    elif want("mouth_center_3d"):
+        output_data["mouth_center_3d"] = out(np.mean(landmark_array[lip_indices], axis=0))
+
+    # ========== BLEND SHAPES ==========
+    if want("blend_shapes"):
+        output_data["blend_shapes"] = blend_shape_values
+    # Szájmozgási specifikus, szem, szemöldök és arcforma (arccsontok, orcák, stb.) blend shape-ek
+    for key, names in (("mouth_blend_shapes", MOUTH_BLEND_SHAPE_NAMES),
+                       ("eyes_blend_shapes", EYES_BLEND_SHAPE_NAMES),
+                       ("brow_blend_shapes", BROW_BLEND_SHAPE_NAMES),
+                       ("face_shape_blend_shapes", FACE_SHAPE_BLEND_SHAPE_NAMES)):
+        if want(key):
+            output_data[key] = {name: blend_shape_values.get(name, 0.0) for name in names}
+
+    # ========== TELJES ARC MODELL ==========
+    selected = landmark_array if landmark_indices is None else landmark_array[landmark_indices]
+    if want("3d_landmarks"):
+        output_data["3d_landmarks"] = out(selected)  # 478 (vagy a részhalmaz) x 3D pont
+    if want("pixel_landmarks") or want("relative_landmarks"):
+        pixel_coords = selected[:, :2] * image_size
+        if want("pixel_landmarks"):
+            output_data["pixel_landmarks"] = out(pixel_coords)  # 2D pontok (pixel koordináták)
+    if any(want(key) for key in ("relative_landmarks", "face_center_pixel", "face_center_3d")):
+        # Normalizálás az arc középpontjához (arc centroidja, mindig mind a 478 pontból)
+        face_center = np.mean(landmark_array, axis=0)
+        face_center_pixel = face_center[:2] * image_size
+        if want("relative_landmarks"):
+            # Landmark relatív pozíciók az arc központjához képest
+            output_data["relative_landmarks"] = out(pixel_coords - face_center_pixel)
+        if want("face_center_pixel"):
+            output_data["face_center_pixel"] = out(face_center_pixel)
+        if want("face_center_3d"):
+            output_data["face_center_3d"] = out(face_center)
+
+    return output_data
+
+
+def process_frame_full_mouth(image, landmarker, fields=None, landmark_indices=None, rgb=False):
+    """
+    Feldolgoz egyetlen képkockát MediaPipe Face Landmarker Task API-val,
+    kinyerve a teljes 3D arc modell adatait és blend shape paramétereit.
     
-    # Szájmozgási specifikus blend shape-ek
-    mouth_blend_shapes = {
-        key: blend_shape_values.get(key, 0.0)
-        for key in ['mouthOpen', 'mouthRight', 'mouthLeft', 'mouthFunnel', 
-                    'mouthPucker', 'jawOpen', 'mouthClose', 'mouthSmileLeft', 
-                    'mouthSmileRight', 'mouthUpperUpLeft', 'mouthUpperUpRight']
-    }
-    
-    # Szemek blend shapes
-    eyes_blend_shapes = {
-        key: blend_shape_values.get(key, 0.0)
-        for key in ['eyeBlinkLeft', 'eyeBlinkRight', 'eyeLookUpLeft', 'eyeLookUpRight',
-                    'eyeLookDownLeft', 'eyeLookDownRight', 'eyeLookInLeft', 'eyeLookInRight',
-                    'eyeLookOutLeft', 'eyeLookOutRight', 'eyeWideLeft', 'eyeWideRight',
-                    'eyeSquintLeft', 'eyeSquintRight']
-    }
-    
-    # Szemöldök blend shapes
-    brow_blend_shapes = {
-        key: blend_shape_values.get(key, 0.0)
-        for key in ['browDownLeft', 'browDownRight', 'browInnerUp', 'browOuterUpLeft', 'browOuterUpRight']
-    }
-    
-    # Arc formája (arccsontok, orcák, stb.)
-    face_shape_blend_shapes = {
-        key: blend_shape_values.get(key, 0.0)
-        for key in ['cheekPuff', 'cheekSquintLeft', 'cheekSquintRight', 'cheekRaiseLeft', 'cheekRaiseRight',
-                    'noseSneerLeft', 'noseSneerRight', 'jawForward', 'jawLeft', 'jawRight']
-    }
-    
-    # Normalizálás az arc középpontjához (arc centroidja)
-    face_center = np.mean(landmark_array, axis=0)
-    face_center_pixel = face_center[:2] * np.array([image_width, image_height])
-    
-    # Összes landmark relatív pozíciói az arc központjához képest
-    relative_landmarks_pixel = pixel_coords - face_center_pixel
-
-    # Adatok összegyűjtése a kimenethez
-    output_data = {
-        # ========== SZÁJ SPECIFIKUS ADATOK ==========
-        "mouth_center": mouth_center.tolist(),
-        "mouth_center_3d": np.mean(landmark_array[MOUTH_OUTER_POINTS_INDICES + MOUTH_INNER_POINTS_INDICES], axis=0).tolist(),
-        "outer_lip_pixel_points": outer_mouth_coords.tolist(),
-        "outer_lip_relative_points": relative_outer_mouth_points.tolist(),
-        "inner_lip_pixel_points": inner_mouth_coords.tolist(),
-        "inner_lip_relative_points": relative_inner_mouth_points.tolist(),
-        
-        # ========== BLEND SHAPES (ÖSSZES) ==========
-        "blend_shapes": blend_shape_values,
-        "mouth_blend_shapes": mouth_blend_shapes,
-        "eyes_blend_shapes": eyes_blend_shapes,
-        "brow_blend_shapes": brow_blend_shapes,
-        "face_shape_blend_shapes": face_shape_blend_shapes,
-        
-        # ========== TELJES ARC MODELL ==========
-        "3d_landmarks": landmark_array.tolist(),  # 478 x 3D pont
-        "pixel_landmarks": pixel_coords.tolist(),  # 478 x 2D pont (pixel koordináták)
-        "relative_landmarks": relative_landmarks_pixel.tolist(),  # 478 pont az arc centrumhoz képest normalizálva
-        "face_center_pixel": face_center_pixel.tolist(),
-        "face_center_3d": face_center.tolist()
-    }
-
-    return output_data
\ No newline at end of file
+    Args:
+        image (numpy.ndarray): A feldolgozandó kép (BGR formátumban).
+        landmarker: Az előre inicializált MediaPipe FaceLandmarker objektum.
+        fields, landmark_indices: lásd build_mouth_data (None = teljes kimenet).
+        rgb (bool): A kép már RGB (ffmpeg / pyav dekóder), a színkonverzió elmarad.
+
+    Returns:
+        dict: Egy dictionary a száj adataival és blend shape paramétereivel, vagy None, ha nem talált arcot.
+    """
+    raw = detect_raw(image, landmarker, rgb=rgb)
+    if raw is None:
+        return None
+
+    landmark_array, blend_shape_values = raw
+    image_height, image_width = image.shape[:2]
+    return build_mouth_data(landmark_array, blend_shape_values, image_width, image_height,
+                            fields=fields, landmark_indices=landmark_indices)
@@ -0,0 +1,338 @@
+# frame_ring.py
+# Dekódolás és inferencia szétválasztása: shared memory ring buffer a processek között
+#
+#   decoder processek ──(frame -> szabad slot)──> [ shared memory: N fix méretű slot ] ──> inferencia workerek
+#          ^                                                                                   │
+#          └────────────────────── slot visszaadása (free_queue) ◄─────────────────────────────┘
+#                                                                                              │
+#   fő process ◄──────── csak a kis eredmény tömbök (478x3 landmark + 52 blend shape) ─────────┘
+#
+# A decoder a frame-et egyszer másolja be egy szabad slotba, az inferencia worker NumPy nézetként
+# (másolás nélkül) olvassa. Ha nincs szabad slot, a decoder vár (az inferencia a szűk keresztmetszet),
+# ha nincs kész frame, az inferencia vár (a dekódolás a szűk keresztmetszet) - mindkettőt mérjük.
+# A decoder / inferencia processek aránya szabadon állítható (pl. 2 decoder : 6 worker).
+
+import time
+import queue
+import traceback
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_processor import detect_raw, create_landmarker, BLEND_SHAPE_NAMES
+from video_stream import VideoFrameReader, open_video
+from video_supervisor import SupervisorReport
+from raw_store import RawVideoRecorder
+
+
+def _attach(name):
+    # Python 3.13+: a csatolt blokkot ne a worker resource trackere szabadítsa fel
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class FrameRing:
+    """
+    num_slots darab, egyenként max_height x max_width x 3 byte-os slot egy shared memory blokkban.
+    A slotok tulajdonjogát a free_queue-n keringő slot indexek adják.
+    """
+
+    def __init__(self, num_slots, max_width, max_height, name=None):
+        self.num_slots = num_slots
+        self.slot_shape = (max_height, max_width, 3)
+        self.slot_bytes = max_height * max_width * 3
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=num_slots * self.slot_bytes)
+            self.owner = True
+        else:
+            self.shm = _attach(name)
+            self.owner = False
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def attach_args(self):
+        return (self.num_slots, self.slot_shape[1], self.slot_shape[0], self.name)
+
+    def view(self, slot, height, width):
+        """Egy slot frame-je NumPy nézetként (nincs másolás)."""
+        offset = slot * self.slot_bytes
+        return np.ndarray((height, width, 3), dtype=np.uint8, buffer=self.shm.buf,
+                          offset=offset)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _decoder_main(ring_args, decoder, task_queue, free_queue, work_queue, result_queue, occupied):
+    ring = FrameRing(*ring_args)
+    wait_s = 0.0
+    frames = 0
+    try:
+        while True:
+            item = task_queue.get()
+            if item is None:
+                break
+            task_id, video_path = item
+            try:
+                with open_video(video_path, decoder) as reader:
+                    rgb = reader.color == "rgb"
+                    result_queue.put(("video_start", task_id, (reader.width, reader.height, reader.fps)))
+                    frame_count = 0
+                    for frame_idx, frame in reader:
+                        height, width = frame.shape[:2]
+                        if height * width * 3 > ring.slot_bytes:
+                            raise ValueError(f"A frame ({width}x{height}) nagyobb a ring slotnál "
+                                             f"({ring.slot_shape[1]}x{ring.slot_shape[0]})")
+                        # Szabad slot (ha nincs, az inferencia a szűk keresztmetszet)
+                        started = time.perf_counter()
+                        slot = free_queue.get()
+                        wait_s += time.perf_counter() - started
+                        ring.view(slot, height, width)[:] = frame
+                        with occupied.get_lock():
+                            occupied.value += 1
+                        work_queue.put((task_id, frame_idx, slot, height, width, rgb))
+                        frame_count += 1
+                frames += frame_count
+                result_queue.put(("video_end", task_id, frame_count))
+            except Exception:
+                result_queue.put(("video_error", task_id, traceback.format_exc()))
+    finally:
+        result_queue.put(("stats", "decoder", {"frames": frames, "wait_s": wait_s}))
+        ring.close()
+
+
+def _inference_main(ring_args, model_path, landmarker_kwargs, work_queue, free_queue, result_queue, occupied):
+    ring = FrameRing(*ring_args)
+    landmarker = create_landmarker(model_path, **landmarker_kwargs)
+    wait_s = 0.0
+    frames = 0
+    try:
+        while True:
+            # Kész frame (ha nincs, a dekódolás a szűk keresztmetszet)
+            started = time.perf_counter()
+            item = work_queue.get()
+            wait_s += time.perf_counter() - started
+            if item is None:
+                break
+            task_id, frame_idx, slot, height, width, rgb = item
+            try:
+                raw = detect_raw(ring.view(slot, height, width), landmarker, rgb=rgb)
+            except Exception:
+                # Csak ez a videó hibás, a worker fut tovább a többi frame-mel
+                result_queue.put(("frame_error", task_id, (frame_idx, traceback.format_exc())))
+                continue
+            finally:
+                with occupied.get_lock():
+                    occupied.value -= 1
+                free_queue.put(slot)
+            frames += 1
+            if raw is None:
+                result_queue.put(("frame", task_id, (frame_idx, None, None)))
+            else:
+                landmark_array, blend_shape_values = raw
+                blend = np.array([blend_shape_values.get(name, np.nan) for name in BLEND_SHAPE_NAMES],
+                                 dtype=np.float32) if blend_shape_values else None
+                result_queue.put(("frame", task_id, (frame_idx, np.asarray(landmark_array, dtype=np.float32), blend)))
+    finally:
+        result_queue.put(("stats", "inference", {"frames": frames, "wait_s": wait_s}))
+        ring.close()
+
+
+def _frame_raw(landmarks, blend):
+    # A blend shape-ek a MediaPipe sorrendjében; a modell által nem adott nevek NaN-ként jönnek
+    if blend is None:
+        return landmarks, {}
+    return landmarks, {name: float(value) for name, value in zip(BLEND_SHAPE_NAMES, blend.tolist())
+                       if value == value}
+
+
+def run_ring_pipeline(tasks, video_path_of, model_path, on_video_done, decoders=1, workers=None,
+                      num_slots=None, max_width=None, max_height=None, landmarker_kwargs=None,
+                      decoder="opencv", poll_s=0.2, stall_timeout_s=600.0):
+    """
+    Videók feldolgozása külön decoder és inferencia processekkel, shared memory ring bufferen át.
+
+    Args:
+        tasks: feladatok listája
+        video_path_of: video_path_of(task) -> videó fájl
+        on_video_done: on_video_done(task, recorder) -> eredmény; a fő processben fut, amikor egy
+                       videó összes frame-je megjött (recorder: RawVideoRecorder, frame sorrendben)
+        decoders / workers: a decoder és az inferencia processek száma
+        num_slots: ring méret (alapból 4 slot inferencia workerenként)
+        max_width / max_height: a slot mérete (alapból az első videó frame mérete)
+        decoder: a decoder processek dekódere (video_stream.DECODER_BACKENDS)
+        stall_timeout_s: ha ennyi ideig egyetlen üzenet sem jön, a hátralévő videók hibásak (None = nincs)
+
+    Returns:
+        (SupervisorReport, metrics dict)
+    """
+    workers = workers or max(mp.cpu_count() - decoders, 1)
+    num_slots = num_slots or 4 * workers
+    landmarker_kwargs = landmarker_kwargs or {}
+    report = SupervisorReport()
+    metrics = {"decoders": decoders, "workers": workers, "num_slots": num_slots,
+               "occupancy_samples": 0, "occupancy_sum": 0, "occupancy_max": 0,
+               "ring_full_samples": 0, "ring_empty_samples": 0,
+               "decoder_wait_s": 0.0, "inference_wait_s": 0.0, "frames": 0}
+    if not tasks:
+        return report, metrics
+
+    if max_width is None or max_height is None:
+        with VideoFrameReader(video_path_of(tasks[0])) as reader:
+            max_width, max_height = reader.width, reader.height
+    ring = FrameRing(num_slots, max_width, max_height)
+    ring_args = ring.attach_args()
+
+    task_queue, free_queue, work_queue, result_queue = mp.Queue(), mp.Queue(), mp.Queue(), mp.Queue()
+    occupied = mp.Value("i", 0)
+    for slot in range(num_slots):
+        free_queue.put(slot)
+    for task_id, task in enumerate(tasks):
+        task_queue.put((task_id, video_path_of(task)))
+    for _ in range(decoders):
+        task_queue.put(None)
+
+    decoder_procs = [mp.Process(target=_decoder_main, daemon=True,
+                                args=(ring_args, decoder, task_queue, free_queue, work_queue, result_queue, occupied))
+                     for _ in range(decoders)]
+    worker_procs = [mp.Process(target=_inference_main, daemon=True,
+                               args=(ring_args, model_path, landmarker_kwargs, work_queue, free_queue,
+                                     result_queue, occupied))
+                    for _ in range(workers)]
+    for process in decoder_procs + worker_procs:
+        process.start()
+    report.workers_started = decoders + workers
+
+    videos = {}       # task_id -> {"info", "frames": {frame_idx: raw}, "expected"}
+    finished = set()
+    stats_pending = decoders + workers
+    started = time.perf_counter()
+    last_message = started
+
+    def video_entry(task_id):
+        # A decoder "video_start"-ja és a workerek "frame"-jei más processből jönnek, a sorrendjük
+        # a közös queue-n nem garantált: a bejegyzés az első üzenetre jön létre (kész videóra nem)
+        if task_id in finished:
+            return None
+        return videos.setdefault(task_id, {"info": None, "frames": {}, "expected": None})
+
+    def fail(task_id, kind, detail):
+        report.attempts[task_id] = report.attempts.get(task_id, 0) + 1
+        report.failures[task_id] = {"kind": kind, "attempts": 1, "error": detail,
+                                    "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+        videos.pop(task_id, None)
+        finished.add(task_id)
+        print(f"❌ {kind} ({video_path_of(tasks[task_id])})")
+
+    def finish(task_id):
+        video = videos.pop(task_id)
+        width, height, fps = video["info"]
+        recorder = RawVideoRecorder(width, height, fps)
+        for frame_idx in range(video["expected"]):
+            recorder.add(video["frames"].get(frame_idx))
+        finished.add(task_id)
+        try:
+            report.results[task_id] = on_video_done(tasks[task_id], recorder)
+        except Exception:
+            fail(task_id, "error", traceback.format_exc())
+
+    try:
+        while True:
+            try:
+                kind, key, payload = result_queue.get(timeout=poll_s)
+            except queue.Empty:
+                kind = None
+            now = time.perf_counter()
+            if kind is not None:
+                last_message = now
+
+            # Slot foglaltság mintavétel
+            occupancy = occupied.value
+            metrics["occupancy_samples"] += 1
+            metrics["occupancy_sum"] += occupancy
+            metrics["occupancy_max"] = max(metrics["occupancy_max"], occupancy)
+            metrics["ring_full_samples"] += occupancy >= num_slots
+            metrics["ring_empty_samples"] += occupancy == 0
+
+            video = video_entry(key) if kind in ("video_start", "frame", "video_end") else None
+            if kind == "video_start" and video is not None:
+                video["info"] = payload
+            elif kind == "frame" and video is not None:
+                frame_idx, landmarks, blend = payload
+                video["frames"][frame_idx] = None if landmarks is None else _frame_raw(landmarks, blend)
+            elif kind == "video_end" and video is not None:
+                video["expected"] = payload
+            elif kind == "video_error" and key not in finished:
+                fail(key, "error", payload)
+            elif kind == "frame_error" and key not in finished:
+                frame_idx, detail = payload
+                fail(key, "error", f"frame {frame_idx}:\n{detail}")
+            elif kind == "stats":
+                stats_pending -= 1
+                metrics[f"{key}_wait_s"] += payload["wait_s"]
+                if key == "inference":
+                    metrics["frames"] += payload["frames"]
+
+            for task_id in [t for t, v in videos.items()
+                            if v["info"] is not None and v["expected"] is not None
+                            and len(v["frames"]) >= v["expected"]]:
+                finish(task_id)
+
+            processes = decoder_procs + worker_procs
+            if len(finished) == len(tasks):
+                if stats_pending == 0 or not any(p.is_alive() for p in processes):
+                    break
+                # Minden videó kész: az inferencia workerek leállítása (a statisztikájukat még megvárjuk)
+                if not metrics.get("stopping"):
+                    metrics["stopping"] = True
+                    for _ in range(workers):
+                        work_queue.put(None)
+                continue
+
+            # Egy váratlanul leállt process után a slotjai elvesznek: a hátralévő videók hibásak
+            dead = [p for p in processes
+                    if not p.is_alive() and p.exitcode not in (0, None)]
+            if dead:
+                for task_id in range(len(tasks)):
+                    if task_id not in finished:
+                        fail(task_id, "crash", f"ring process exited with code {dead[0].exitcode}")
+                break
+
+            # Semmi nem jön (pl. egy elveszett frame miatt): a hátralévő videók hibásak, nem várunk örökké
+            if stall_timeout_s is not None and now - last_message > stall_timeout_s:
+                for task_id in range(len(tasks)):
+                    if task_id not in finished:
+                        fail(task_id, "timeout", f"no ring progress for {stall_timeout_s:.0f}s")
+                break
+    finally:
+        for process in decoder_procs + worker_procs:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        ring.close()
+
+    metrics.pop("stopping", None)
+    metrics["seconds"] = round(time.perf_counter() - started, 3)
+    return report, metrics
+
+
+def print_ring_metrics(metrics):
+    samples = max(metrics["occupancy_samples"], 1)
+    seconds = max(metrics.get("seconds", 0.0), 1e-9)
+    print(f"\n🔁 Ring: {metrics['decoders']} decoder : {metrics['workers']} inference, "
+          f"{metrics['num_slots']} slot, {metrics['frames']} frame, {metrics['frames'] / seconds:.1f} frame/s")
+    print(f"   Slot foglaltság: átlag {metrics['occupancy_sum'] / samples:.1f}, max {metrics['occupancy_max']}, "
+          f"tele {100 * metrics['ring_full_samples'] / samples:.0f}%, üres {100 * metrics['ring_empty_samples'] / samples:.0f}%")
+    print(f"   Várakozás: decoder (szabad slotra) {metrics['decoder_wait_s']:.1f}s, "
+          f"inferencia (frame-re) {metrics['inference_wait_s']:.1f}s")
+    if metrics["decoder_wait_s"] > metrics["inference_wait_s"]:
+        print("   -> az inferencia a szűk keresztmetszet (több inferencia worker kell)")
+    else:
+        print("   -> a dekódolás a szűk keresztmetszet (több decoder kell)")
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Helyi frame adat szerver a viewerhez (stdlib http.server, nincs extra függőség)
+
+A viewer.html így újragenerálás nélkül böngészi a corpust: a speaker / videó / frame
+választás után a blend shape-eket és landmarkokat innen kéri le. Az adatok forrása a nyers
+landmarker tár (raw_store): a videó kulcsa a modell fájl és a profil beállításai szerint (ugyanaz,
+amit az extractor alapbeállításokkal, blend shape-ekkel használna). Ha egy videó még nincs benne,
+a szerver lefuttatja rá a Face Landmarkert, és az eredményt a tárba is elmenti. --any-store-entry
+mellett a tár indexe (sources/<speaker>/<videó>.json) is elfogadott, bármilyen beállítással készült. A betöltött videók
+egy memóriában tartott, méret szerint korlátos LRU cache-be kerülnek, így egy klip
+frame-jein végiglépkedve nincs lemez olvasás.
+
+Végpontok (GET):
+    /api/speakers                                   - speakerek (videók száma, ebből a tárban)
+    /api/videos?speaker=s1                          - egy speaker videói (cached: benne van-e a tárban)
+    /api/words?speaker=s1[&video=bbaf2n.mpg]        - egy videó szavai frame tartománnyal / a speaker szókincse
+    /api/frames?speaker=s1&video=bbaf2n.mpg&start=0&end=75
+               [&fields=blend_shapes,landmarks,detected][&landmarks=lips][&format=json|bin]
+
+A format=bin válasz little-endian nyers tömbök egymás után, a fields sorrendjében:
+landmarks float32 (n, L, 3), blend_shapes float32 (n, B), detected uint8 (n); az alakok és a
+blend shape nevek az X-* fejlécekben vannak. Minden más útvonal statikus fájl a STATIC_DIR-ből
+(viewer.html, models/facecap.glb).
+
+Használat:
+    python frame_server.py                    # http://127.0.0.1:8765/viewer.html
+    python frame_server.py --port 9000 --cache-mb 1024 --no-extract
+    python frame_server.py --no-extract --any-store-entry   # a tárban lévő bármelyik kimenet
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict, Counter
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from frame_processor import create_landmarker, create_landmarker_options, resolve_landmark_indices
+from dataset_io import (
+    parse_align_file, find_word_for_frame, list_speakers, iter_speaker_videos, find_video_path, find_align_path
+)
+from raw_store import RawResultStore, RawVideoRecorder, compute_store_key
+from landmarker_profile import PROFILE_PATH, load_profile
+from video_stream import iter_video_records
+
+# -------------------- Beállítások --------------------
+VIDEO_BASE = "D:/MestInt/datasets/gridcorpus/video"
+ALIGN_BASE = "D:/MestInt/datasets/gridcorpus/align"
+RAW_STORE_DIR = "D:/MestInt/word_tomoutmap/raw_store"
+MODEL_PATH = "face_landmarker.task"
+# Modell fájl + landmarker beállítások az on-demand kinyeréshez (ha létezik; lásd landmarker_profile.py)
+LANDMARKER_PROFILE = PROFILE_PATH
+# A viewer.html és a models/ mappa helye
+STATIC_DIR = os.path.dirname(os.path.abspath(__file__))
+HOST = "127.0.0.1"
+PORT = 8765
+# A memóriában tartott videók összmérete (landmarkok + blend shape-ek)
+CACHE_MB = 512
+# Egyszerre ennyi on-demand kinyerés futhat (mindegyik saját FaceLandmarkerrel)
+EXTRACT_WORKERS = 1
+
+FRAME_FIELDS = ["landmarks", "blend_shapes", "detected"]
+DEFAULT_FIELDS = ["blend_shapes", "landmarks", "detected"]
+# A JSON válasz ennyi tizedesre kerekít (a bin formátum a tárolt float32 értékeket adja)
+JSON_DECIMALS = 5
+
+
+class RequestError(Exception):
+    """Hibás kérés (ismeretlen speaker / videó, rossz paraméter) -> HTTP status + üzenet."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class LRUCache:
+    """
+    Szálbiztos, byte méret szerint korlátos LRU cache (OrderedDict: a legrégebben használt elöl).
+    Egy elem mérete a sizeof(value) - az egyedül a limitnél nagyobb elem nem kerül be.
+    """
+
+    def __init__(self, max_bytes, sizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key][0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.bytes -= evicted_size
+
+    def stats(self):
+        with self._lock:
+            return {"items": len(self._items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+def clip_nbytes(clip):
+    return sum(value.nbytes for value in clip.values() if isinstance(value, np.ndarray))
+
+
+class FrameDataService:
+    """
+    A szerver HTTP-független része: corpus listázás, videónkénti nyers tömbök
+    (tár -> LRU cache, hiány esetén on-demand kinyerés) és frame tartomány kiválasztás.
+    """
+
+    def __init__(self, video_base=VIDEO_BASE, align_base=ALIGN_BASE, store_dir=RAW_STORE_DIR,
+                 model_path=MODEL_PATH, cache_mb=CACHE_MB, extract=True, extract_workers=EXTRACT_WORKERS,
+                 landmarker_options=None, any_store_entry=False):
+        self.video_base = video_base
+        self.align_base = align_base
+        self.store = RawResultStore(store_dir)
+        self.model_path = model_path
+        self.landmarker_options = dict(landmarker_options or {})
+        self.extract = extract
+        # A profiltól eltérő beállítással készült tár bejegyzés is jó (sources index)
+        self.any_store_entry = any_store_entry
+        self._options = None
+        self.cache = LRUCache(int(cache_mb * 1024 * 1024), clip_nbytes)
+        self.extracted = 0
+        self._video_locks = {}
+        self._locks_guard = threading.Lock()
+        self._extract_slots = threading.BoundedSemaphore(max(1, extract_workers))
+        self._landmarkers = []
+        self._landmarkers_guard = threading.Lock()
+
+    # -------------------- Corpus --------------------
+    def speakers(self):
+        if not os.path.isdir(self.video_base):
+            return []
+        return list_speakers(self.video_base)
+
+    def _videos(self, speaker):
+        """{video_file: (video_path, align_path)} - ismeretlen speakernél RequestError (404)."""
+        if speaker not in self.speakers():
+            raise RequestError(f"Ismeretlen speaker: {speaker}", status=404)
+        return {video_file: (video_path, align_path) for video_file, video_path, align_path
+                in iter_speaker_videos(self.video_base, self.align_base, speaker, verbose=False)}
+
+    def _video(self, speaker, video_file):
+        """(video_path, align_path) a speaker listázása nélkül (a frame kérések gyakoriak)."""
+        names_ok = all(name and os.path.basename(name) == name and name not in (".", "..")
+                       for name in (speaker, video_file))
+        video_path = find_video_path(self.video_base, speaker, video_file) if names_ok else None
+        align_path = find_align_path(self.align_base, speaker, video_file) if video_path else None
+        if align_path is None:
+            raise RequestError(f"Ismeretlen videó: {speaker}/{video_file}", status=404)
+        return video_path, align_path
+
+    def _stored_videos(self, speaker, videos):
+        """A speaker tárban lévő videói (a tár indexéből; --any-store-entry nélkül a profil kulcsával)."""
+        indexed = self.store.source_videos(speaker) & set(videos)
+        if self.any_store_entry:
+            return indexed
+        return {video_file for video_file in indexed if self.store.has(self._store_key(videos[video_file][0]))}
+
+    def list_speakers(self):
+        result = []
+        for speaker in self.speakers():
+            videos = self._videos(speaker)
+            cached = len(self._stored_videos(speaker, videos))
+            result.append({"speaker": speaker, "videos": len(videos), "cached": cached})
+        return result
+
+    def list_videos(self, speaker):
+        videos = self._videos(speaker)
+        cached = self._stored_videos(speaker, videos)
+        return [{"video": video_file, "cached": video_file in cached} for video_file in videos]
+
+    def video_words(self, speaker, video_file):
+        """A videó szavai időben és frame tartományban (a fps a tárból, ha már ott van, különben 25)."""
+        video_path, align_path = self._video(speaker, video_file)
+        clip = self._cached_clip(speaker, video_file, video_path)
+        fps = float(clip["fps"]) if clip is not None else 25.0
+        return [{"word": word, "start": start_s, "end": end_s,
+                 "start_frame": int(np.ceil(start_s * fps)), "end_frame": int(np.floor(end_s * fps))}
+                for word, start_s, end_s in parse_align_file(align_path)]
+
+    def speaker_words(self, speaker):
+        """A speaker szókincse előfordulás szerint csökkenő sorrendben."""
+        counts = Counter(word for _, align_path in self._videos(speaker).values()
+                         for word, _, _ in parse_align_file(align_path))
+        return [{"word": word, "count": count} for word, count in counts.most_common()]
+
+    # -------------------- Videónkénti nyers tömbök --------------------
+    def _video_lock(self, speaker, video_file):
+        with self._locks_guard:
+            return self._video_locks.setdefault((speaker, video_file), threading.Lock())
+
+    def _landmarker_options(self):
+        """Az on-demand kinyerés beállításai (IMAGE mód, blend shape-ekkel, a profil szerint)."""
+        if self._options is None:
+            self._options = create_landmarker_options(self.model_path, output_face_blendshapes=True,
+                                                      **self.landmarker_options)
+        return self._options
+
+    def _store_key(self, video_path):
+        return compute_store_key(video_path, self.model_path, self._landmarker_options(), store=self.store)
+
+    def _cached_clip(self, speaker, video_file, video_path):
+        clip = self.cache.get((speaker, video_file))
+        if clip is None:
+            key = self._store_key(video_path)
+            if not self.store.has(key):
+                key = self.store.source_key(speaker, video_file) if self.any_store_entry else None
+            if key is not None:
+                clip = self.store.load(key)
+                self.cache.put((speaker, video_file), clip)
+        return clip
+
+    def clip(self, speaker, video_file):
+        """
+        Egy videó nyers landmarker kimenete (RawVideoRecorder.to_arrays() alakban):
+        LRU cache -> tár index -> on-demand kinyerés (ha engedélyezett).
+        """
+        video_path, _ = self._video(speaker, video_file)
+        clip = self._cached_clip(speaker, video_file, video_path)
+        if clip is not None:
+            return clip
+        # Ugyanarra a videóra párhuzamos kérések: csak az első futtatja a landmarkert
+        with self._video_lock(speaker, video_file):
+            clip = self._cached_clip(speaker, video_file, video_path)
+            if clip is not None:
+                return clip
+            if not self.extract:
+                raise RequestError(f"{speaker}/{video_file} nincs a tárban (--no-extract)", status=404)
+            clip = self._extract(speaker, video_file, video_path)
+        self.cache.put((speaker, video_file), clip)
+        return clip
+
+    def _acquire_landmarker(self):
+        with self._landmarkers_guard:
+            if self._landmarkers:
+                return self._landmarkers.pop()
+        return create_landmarker(self.model_path, **self.landmarker_options)
+
+    def _release_landmarker(self, landmarker):
+        with self._landmarkers_guard:
+            self._landmarkers.append(landmarker)
+
+    def _extract(self, speaker, video_file, video_path):
+        """
+        A Face Landmarker futtatása egy videó összes frame-jére, az extractor beállításaival
+        (IMAGE mód, blend shape-ekkel, opencv dekóder, a profil modellje); az eredmény a tárba is bekerül.
+        """
+        key = self._store_key(video_path)
+        if not self.store.has(key):
+            with self._extract_slots:
+                started = time.perf_counter()
+                landmarker = self._acquire_landmarker()
+                try:
+                    recorder = RawVideoRecorder()
+                    # Üres szólista: nem készül mouth_data, csak a recorder kapja meg a frame-eket
+                    for _ in iter_video_records(speaker, video_file, video_path, [], landmarker, recorder=recorder):
+                        pass
+                finally:
+                    self._release_landmarker(landmarker)
+                self.store.save(key, recorder)
+                self.extracted += 1
+                print(f"🔍 {speaker}/{video_file}: {len(recorder.detected)} frame kinyerve "
+                      f"({time.perf_counter() - started:.1f}s)")
+        self.store.register_source(key, speaker, video_file)
+        return self.store.load(key)
+
+    # -------------------- Frame tartomány --------------------
+    def frames(self, speaker, video_file, start=None, end=None, fields=None, landmark_indices=None):
+        """
+        Frame tartomány [start, end) kiválasztott mezői.
+
+        Returns:
+            (meta, arrays): meta JSON-kompatibilis dict (fps, frame_size, frame_count, start, end,
+            blend_shape_names, landmark_indices, words), arrays: {mező: numpy tömb}
+        """
+        fields = fields or DEFAULT_FIELDS
+        unknown = [field for field in fields if field not in FRAME_FIELDS]
+        if unknown:
+            raise RequestError(f"Ismeretlen mező: {', '.join(unknown)} (választható: {', '.join(FRAME_FIELDS)})")
+        clip = self.clip(speaker, video_file)
+        frame_count = len(clip["detected"])
+        start = 0 if start is None else max(0, start)
+        end = frame_count if end is None else min(end, frame_count)
+        if start >= end:
+            raise RequestError(f"Üres frame tartomány: [{start}, {end}) ({frame_count} frame)")
+
+        arrays = {}
+        for field in fields:
+            values = clip[field][start:end]
+            if field == "landmarks" and landmark_indices is not None:
+                values = values[:, landmark_indices]
+            arrays[field] = values
+
+        _, align_path = self._video(speaker, video_file)
+        word_list = parse_align_file(align_path)
+        fps = float(clip["fps"])
+        meta = {
+            "speaker": speaker, "video": video_file, "fps": fps,
+            "frame_size": [int(v) for v in clip["frame_size"]], "frame_count": frame_count,
+            "start": start, "end": end,
+            "blend_shape_names": [str(name) for name in clip["blend_shape_names"]],
+            "landmark_indices": landmark_indices,
+            "words": [find_word_for_frame(word_list, frame_idx, fps) for frame_idx in range(start, end)],
+        }
+        return meta, arrays
+
+
+def frames_to_json(meta, arrays, decimals=JSON_DECIMALS):
+    """Frame-enkénti JSON: a blend shape-ek név -> érték dict-ként (ahogy a viewer alkalmazza)."""
+    names = meta["blend_shape_names"]
+    frames = []
+    for i, frame_idx in enumerate(range(meta["start"], meta["end"])):
+        frame = {"frame_idx": frame_idx, "word": meta["words"][i]}
+        if "detected" in arrays:
+            frame["detected"] = bool(arrays["detected"][i])
+        if "blend_shapes" in arrays:
+            frame["blend_shapes"] = dict(zip(names, np.round(arrays["blend_shapes"][i], decimals).tolist()))
+        if "landmarks" in arrays:
+            landmarks = arrays["landmarks"][i]
+            # A nem detektált frame-ek landmarkjai NaN-ok a tárban -> null
+            frame["landmarks"] = None if np.isnan(landmarks).any() else np.round(landmarks, decimals).tolist()
+        frames.append(frame)
+    return {**meta, "frames": frames}
+
+
+def frames_to_binary(meta, arrays):
+    """(body, headers): a mezők nyers little-endian tömbjei egymás után + az alakok fejlécekben."""
+    chunks, headers = [], {}
+    for field in FRAME_FIELDS:
+        if field not in arrays:
+            continue
+        values = arrays[field]
+        values = values.astype(np.uint8) if field == "detected" else values.astype("<f4")
+        chunks.append(np.ascontiguousarray(values).tobytes())
+        headers[f"X-Shape-{field.replace('_', '-').title()}"] = ",".join(str(n) for n in values.shape)
+    headers.update({
+        "X-Fields": ",".join(field for field in FRAME_FIELDS if field in arrays),
+        "X-Frame-Start": str(meta["start"]), "X-Frame-End": str(meta["end"]),
+        "X-Frame-Count": str(meta["frame_count"]), "X-Fps": str(meta["fps"]),
+        "X-Frame-Size": ",".join(str(v) for v in meta["frame_size"]),
+        "X-Blend-Shape-Names": ",".join(meta["blend_shape_names"]),
+    })
+    return b"".join(chunks), headers
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise RequestError(f"A(z) {name} paraméter egész szám kell legyen: {value}")
+
+
+class FrameRequestHandler(SimpleHTTPRequestHandler):
+    """/api/* -> FrameDataService, minden más statikus fájl a STATIC_DIR-ből."""
+
+    service = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=STATIC_DIR, **kwargs)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path in ("", "/"):
+            self.send_response(302)
+            self.send_header("Location", "/viewer.html")
+            self.end_headers()
+            return
+        if not url.path.startswith("/api/"):
+            return super().do_GET()
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            self._handle_api(url.path[len("/api/"):], params)
+        except RequestError as e:
+            self._send_json({"error": str(e)}, status=e.status)
+        except Exception as e:
+            self._send_json({"error": f"{type(e).__name__}: {e}"}, status=500)
+
+    def _require(self, params, name):
+        if not params.get(name):
+            raise RequestError(f"Hiányzó paraméter: {name}")
+        return params[name]
+
+    def _handle_api(self, endpoint, params):
+        service = self.service
+        if endpoint == "speakers":
+            self._send_json({"speakers": service.list_speakers()})
+        elif endpoint == "videos":
+            speaker = self._require(params, "speaker")
+            self._send_json({"speaker": speaker, "videos": service.list_videos(speaker)})
+        elif endpoint == "words":
+            speaker = self._require(params, "speaker")
+            if params.get("video"):
+                self._send_json({"speaker": speaker, "video": params["video"],
+                                 "words": service.video_words(speaker, params["video"])})
+            else:
+                self._send_json({"speaker": speaker, "words": service.speaker_words(speaker)})
+        elif endpoint == "frames":
+            fields = [f for f in params.get("fields", "").split(",") if f] or None
+            try:
+                landmark_indices = resolve_landmark_indices(params.get("landmarks"))
+            except ValueError as e:
+                raise RequestError(str(e))
+            meta, arrays = service.frames(self._require(params, "speaker"), self._require(params, "video"),
+                                          _int_param(params, "start"), _int_param(params, "end"),
+                                          fields, landmark_indices)
+            fmt = params.get("format", "json")
+            if fmt == "json":
+                self._send_json(frames_to_json(meta, arrays))
+            elif fmt == "bin":
+                body, headers = frames_to_binary(meta, arrays)
+                self._send_body(body, "application/octet-stream", headers=headers)
+            else:
+                raise RequestError(f"Ismeretlen formátum: {fmt} (json / bin)")
+        elif endpoint == "stats":
+            self._send_json({"cache": service.cache.stats(), "extracted": service.extracted})
+        else:
+            raise RequestError(f"Ismeretlen végpont: /api/{endpoint}", status=404)
+
+    def _send_json(self, payload, status=200):
+        self._send_body(json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                        "application/json; charset=utf-8", status=status)
+
+    def _send_body(self, body, content_type, status=200, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_request(self, code="-", size="-"):
+        # Csak az API hívások és a hibák kerülnek a konzolra (a statikus fájlok nem)
+        if self.path.startswith("/api/") or int(getattr(code, "value", code) if code != "-" else 0) >= 400:
+            super().log_request(code, size)
+
+
+def make_server(service, host=HOST, port=PORT):
+    handler = type("BoundFrameRequestHandler", (FrameRequestHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Helyi frame adat szerver a viewerhez")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--store", default=RAW_STORE_DIR, help="Nyers landmarker tár")
+    parser.add_argument("--cache-mb", type=float, default=CACHE_MB, help="Az LRU cache mérete (MB)")
+    parser.add_argument("--no-extract", action="store_true",
+                        help="Csak a tárban lévő videók; a hiányzókra nem fut a landmarker")
+    parser.add_argument("--extract-workers", type=int, default=EXTRACT_WORKERS,
+                        help="Egyszerre futó on-demand kinyerések száma")
+    parser.add_argument("--profile", default=LANDMARKER_PROFILE,
+                        help="Landmarker profil (modell + beállítások): a tárból csak ezzel készült "
+                             "kimenet töltődik be, és az on-demand kinyerés is ezt használja")
+    parser.add_argument("--any-store-entry", action="store_true",
+                        help="Ha a profilhoz nincs tár bejegyzés, a videóhoz feljegyzett bármelyik "
+                             "(más modell / beállítás / adaptív / dekóder) is jó")
+    args = parser.parse_args()
+
+    try:
+        profile = load_profile(args.profile, MODEL_PATH)
+    except ValueError as e:
+        parser.error(str(e))
+    service = FrameDataService(store_dir=args.store, model_path=profile.model_path, cache_mb=args.cache_mb,
+                               extract=not args.no_extract, extract_workers=args.extract_workers,
+                               landmarker_options=profile.options, any_store_entry=args.any_store_entry)
+    server = make_server(service, args.host, args.port)
+    print(f"🌐 Frame szerver: http://{args.host}:{args.port}/viewer.html "
+          f"(tár: {args.store}, cache: {args.cache_mb:g} MB, "
+          f"on-demand kinyerés: {'ki' if args.no_extract else 'be'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Leállítva")
+    finally:
+        server.server_close()
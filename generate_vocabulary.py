@@ -4,14 +4,19 @@ Dataset után futtatandó: szóvocabulárium generálása
 Használat: python generate_vocabulary.py
 """
 
+import os
 import json
 import csv
 import sys
 
+from dataset_io import CSV_DELIMITER
+from compressed_io import open_text_input, resolve_input_path
+
 def generate_vocabulary(csv_path="D:/MestInt/datasets/gridcorpus/mouth_data.csv", 
                        output_path="vocabulary.json"):
     """
     CSV-ből kinyeri az összes unique szót és statisztikákat
+    (a tömörített .csv.gz / .csv.zst kimenetet is olvassa)
     """
     
     try:
@@ -24,8 +29,10 @@ def generate_vocabulary(csv_path="D:/MestInt/datasets/gridcorpus/mouth_data.csv"
         print(f"   CSV: {csv_path}")
         
         # CSV betöltése és feldolgozása
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
+        csv_path = resolve_input_path(csv_path)
+        csv.field_size_limit(1 << 30)
+        with open_text_input(csv_path) as f:
+            reader = csv.DictReader(f, delimiter=CSV_DELIMITER)
             
             if reader.fieldnames is None:
                 print(f"❌ CSV header hiányzik!")
@@ -77,6 +84,13 @@ def generate_vocabulary(csv_path="D:/MestInt/datasets/gridcorpus/mouth_data.csv"
         print(f"   📈 Total frame-ek (sil nélkül): {vocab_data['total_frames']}")
         print(f"   👥 Speakerek: {vocab_data['total_speakers']} ({', '.join(vocab_data['speakers'])})")
         
+        # Ha az extrakció jellemző statisztikát is mentett (<csv>.stats.npz), a stats.json a vocabulary mellé kerül
+        from feature_stats import STATS_FILE, state_path, FeatureStats
+        if os.path.exists(state_path(csv_path)):
+            stats_path = os.path.join(os.path.dirname(output_path), STATS_FILE)
+            FeatureStats.load(state_path(csv_path)).write_summary(stats_path)
+            print(f"   📈 Jellemző statisztikák: {stats_path}")
+        
         print(f"\n📋 Top 15 leggyakoribb szó:")
         for i, (word, count) in enumerate(sorted(word_counts.items(), key=lambda x: x[1], reverse=True)[:15], 1):
             print(f"   {i:2d}. {word:15} {count:4d} frame")
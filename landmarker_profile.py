@@ -0,0 +1,103 @@
+# landmarker_profile.py
+# A Face Landmarker modell fájl és beállítások profilja (landmarker_profile.json)
+#
+# Az extractorok a beégetett face_landmarker.task helyett ebből veszik a modellt és a
+# landmarker beállításokat (ha a profil fájl létezik; különben a MODEL_PATH, alapbeállításokkal).
+# A profilt kézzel, vagy a model_benchmark.py --select / --write-profile írja:
+#
+#     {"name": "face_landmarker/low_conf", "model_path": "face_landmarker.task",
+#      "options": {"min_face_detection_confidence": 0.3, "min_face_presence_confidence": 0.3}}
+#
+# A blend shape-ek számolása nem a profil része: azt a kimeneti oszlopok (--columns) döntik el.
+# A modell fájl és a beállítások a nyers tár kulcsába is bekerülnek (raw_store.compute_store_key),
+# így profil váltás után a tárból nem egy másik modell eredménye épül újra.
+
+import os
+import json
+from collections import namedtuple
+
+PROFILE_PATH = "landmarker_profile.json"
+DEFAULT_MODEL_PATH = "face_landmarker.task"
+
+# A profilban megadható FaceLandmarkerOptions mezők és típusuk
+PROFILE_OPTIONS = {
+    "num_faces": int,
+    "min_face_detection_confidence": float,
+    "min_face_presence_confidence": float,
+    "min_tracking_confidence": float,
+}
+# A benchmark ezen felül a blend shape-ek nélküli futást is méri. A min_tracking_confidence-t
+# nem: az csak VIDEO / LIVE_STREAM módban (live_stream.py) számít, a benchmark IMAGE módban fut.
+BENCHMARK_OPTIONS = {**{key: kind for key, kind in PROFILE_OPTIONS.items() if key != "min_tracking_confidence"},
+                     "output_face_blendshapes": bool}
+
+LandmarkerProfile = namedtuple("LandmarkerProfile", "name model_path options")
+
+
+def default_profile(model_path=DEFAULT_MODEL_PATH):
+    return LandmarkerProfile(None, model_path, {})
+
+
+def _convert(key, value, types):
+    if key not in types:
+        raise ValueError(f"Ismeretlen landmarker beállítás: {key} (lehetséges: {', '.join(types)})")
+    kind = types[key]
+    if kind is bool and isinstance(value, str):
+        if value.lower() not in ("1", "0", "true", "false", "yes", "no"):
+            raise ValueError(f"{key}: true / false kell, nem {value}")
+        return value.lower() in ("1", "true", "yes")
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key}: {kind.__name__} kell, nem {value!r}")
+
+
+def validate_options(options, types=PROFILE_OPTIONS):
+    """A beállítások ellenőrzése és típusra alakítása (ismeretlen kulcs / rossz érték: ValueError)."""
+    return {key: _convert(key, value, types) for key, value in (options or {}).items()}
+
+
+def parse_options(text, types=BENCHMARK_OPTIONS):
+    """"min_face_detection_confidence=0.3,num_faces=1" -> dict (üres szöveg = alapbeállítások)."""
+    options = {}
+    for item in (i.strip() for i in (text or "").split(",")):
+        if not item:
+            continue
+        key, separator, value = item.partition("=")
+        if not separator:
+            raise ValueError(f"KULCS=ÉRTÉK kell, nem {item}")
+        options[key.strip()] = value.strip()
+    return validate_options(options, types)
+
+
+def load_profile(path=PROFILE_PATH, model_path=DEFAULT_MODEL_PATH, verbose=True):
+    """
+    A profil (LandmarkerProfile), vagy ha a fájl nem létezik, a model_path alapbeállításokkal.
+    Hibás profil (ismeretlen beállítás, hiányzó modell fájl): ValueError.
+    """
+    if not path or not os.path.exists(path):
+        return default_profile(model_path)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    profile = LandmarkerProfile(data.get("name"), data.get("model_path") or model_path,
+                                validate_options(data.get("options")))
+    if not os.path.exists(profile.model_path):
+        raise ValueError(f"{path}: a modell fájl nem található: {profile.model_path}")
+    if verbose:
+        print(f"🧩 Landmarker profil: {profile_label(profile)} ({path})")
+    return profile
+
+
+def save_profile(profile, path=PROFILE_PATH, benchmark=None):
+    """A profil mentése; benchmark: a kiválasztás mérési eredménye (csak tájékoztató)."""
+    data = {"name": profile.name, "model_path": profile.model_path,
+            "options": validate_options(profile.options)}
+    if benchmark is not None:
+        data["benchmark"] = benchmark
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def profile_label(profile):
+    options = ", ".join(f"{key}={value}" for key, value in sorted(profile.options.items()))
+    return f"{profile.name or os.path.basename(profile.model_path)}" + (f" [{options}]" if options else "")
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Alacsony késleltetésű élő szájkövetés (kamera / RTSP stream) - RunningMode.LIVE_STREAM
+
+Élő forrásnál az átbocsátás helyett a késleltetés számít: mindig a legfrissebb frame megy
+a landmarkerbe. A beolvasó szál egy egyhelyes "legutolsó frame" tárolóba ír (a fel nem dolgozott,
+elavult frame-et felülírja és eldobottnak számolja), az inferencia szál onnan veszi ki, és csak
+akkor küld új frame-et (detect_async), ha az előző eredménye megjött. Az async callback a
+process_frame_full_mouth-tal azonos utófeldolgozást (build_mouth_data) futtatja, az eredmény
+egy callbackbe és / vagy egy queue-ba kerül (LiveResult), a végén a végponttól végpontig
+(beolvasás -> eredmény) késleltetés percentilisei.
+
+Offline teszt: egy helyi videó valós idejű visszajátszása helyettesíti a kamerát (--replay).
+
+    tracker = LiveMouthTracker(MODEL_PATH, on_result=lambda r: print(r.frame_idx, r.latency_ms))
+    report = tracker.run(FileReplaySource("bbaf2n.mpg"))
+
+Használat:
+    python live_stream.py --replay D:/MestInt/datasets/gridcorpus/video/s1/s1/bbaf2n.mpg
+    python live_stream.py --camera 0 --duration 30
+    python live_stream.py --url rtsp://192.168.1.10/stream --print
+"""
+
+import time
+import queue
+import argparse
+import threading
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from mediapipe import Image, ImageFormat
+from mediapipe.tasks.python import vision
+
+from frame_processor import create_landmarker_options, result_to_raw, build_mouth_data, resolve_landmark_indices
+from dataset_io import FEATURE_SETS, make_output_selection, selection_needs_blend_shapes
+from video_stream import VideoFrameReader
+from landmarker_profile import PROFILE_PATH, load_profile
+
+# -------------------- Beállítások --------------------
+MODEL_PATH = "face_landmarker.task"
+# Modell fájl + landmarker beállítások (ha létezik, a MODEL_PATH helyett; lásd landmarker_profile.py)
+LANDMARKER_PROFILE = PROFILE_PATH
+# Ha egy frame eredménye ennyi idő alatt sem jön meg, elveszettnek tekintjük, és jöhet a következő
+RESULT_TIMEOUT_S = 5.0
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+
+# Egy élő eredmény: mouth_data None, ha a frame-en nem volt arc.
+# latency_ms = beolvasás -> eredmény, inference_ms = detect_async -> callback
+LiveResult = namedtuple("LiveResult", ["frame_idx", "timestamp_ms", "mouth_data", "latency_ms", "inference_ms"])
+
+
+class CameraSource:
+    """Kamera (index) vagy stream URL (RTSP / HTTP) cv2.VideoCapture-rel."""
+
+    def __init__(self, device):
+        self.device = device
+        self.cap = cv2.VideoCapture(device)
+        if not self.cap.isOpened():
+            raise IOError(f"Nem nyitható meg a forrás: {device}")
+        # A driver saját pufferében se álljanak sorba elavult frame-ek (ahol támogatott)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def read(self):
+        """A következő BGR frame, vagy None, ha a forrás véget ért."""
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def release(self):
+        self.cap.release()
+
+
+class FileReplaySource:
+    """
+    Helyi videó visszajátszása valós idejű ütemben (a kamera helyett, offline teszthez):
+    az i. frame legkorábban a start + i / fps időpontban adódik ki. speed: lejátszási sebesség szorzó.
+    """
+
+    def __init__(self, video_path, speed=1.0):
+        self.reader = VideoFrameReader(video_path)
+        self.fps = self.reader.fps or 25.0
+        self.speed = speed
+        self._frames = iter(self.reader)
+        self._started = None
+
+    def read(self):
+        item = next(self._frames, None)
+        if item is None:
+            return None
+        frame_idx, frame = item
+        now = time.perf_counter()
+        if self._started is None:
+            self._started = now
+        delay = self._started + frame_idx / (self.fps * self.speed) - now
+        if delay > 0:
+            time.sleep(delay)
+        return frame
+
+    def release(self):
+        self.reader.release()
+
+
+class LatestFrame:
+    """Egyhelyes tároló: az új frame felülírja a még fel nem dolgozottat (az eldobottnak számít)."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._condition:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def take(self):
+        """A legfrissebb frame (vár, ha nincs); None, ha a forrás lezárult és nincs több."""
+        with self._condition:
+            while self._item is None and not self._closed:
+                self._condition.wait()
+            item, self._item = self._item, None
+            return item
+
+
+def latency_report(latencies_ms, percentiles=LATENCY_PERCENTILES):
+    """{"p50": ..., "p90": ..., "mean": ..., "max": ...} ms-ban (üres listára {})."""
+    if not latencies_ms:
+        return {}
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    report = {f"p{p}": round(float(np.percentile(values, p)), 2) for p in percentiles}
+    report["mean"] = round(float(values.mean()), 2)
+    report["max"] = round(float(values.max()), 2)
+    return report
+
+
+class LiveMouthTracker:
+    """
+    LIVE_STREAM módú Face Landmarker a legfrissebb frame elvével.
+
+    on_result: callback(LiveResult) a MediaPipe callback szálán (legyen gyors), és / vagy
+    results: queue.Queue, amibe az eredmények kerülnek (tele queue-nál a legrégebbi kiesik).
+    fields / landmark_indices: a build_mouth_data kimenet szűkítése (lásd dataset_io.make_output_selection).
+    landmarker_options: num_faces / min_*_confidence (landmarker_profile), None = alapbeállítások
+    """
+
+    def __init__(self, model_path=MODEL_PATH, on_result=None, results=None, fields=None, landmark_indices=None,
+                 output_face_blendshapes=True, landmarker_options=None):
+        self.on_result = on_result
+        self.results = results
+        self.fields = fields
+        self.landmark_indices = landmark_indices
+        self.latencies_ms = []
+        self.inference_ms = []
+        self.stats = {"captured": 0, "processed": 0, "dropped": 0, "no_face": 0, "lost": 0, "errors": 0}
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Egyszerre egy frame van a landmarkerben; a callback engedi a következőt
+        self._in_flight = threading.Semaphore(1)
+        self._last_timestamp_ms = -1
+        options = create_landmarker_options(model_path, running_mode=vision.RunningMode.LIVE_STREAM,
+                                            output_face_blendshapes=output_face_blendshapes,
+                                            result_callback=self._on_landmarker_result,
+                                            **(landmarker_options or {}))
+        self.landmarker = vision.FaceLandmarker.create_from_options(options)
+
+    def _on_landmarker_result(self, result, output_image, timestamp_ms):
+        finished = time.perf_counter()
+        with self._lock:
+            pending = self._pending.pop(timestamp_ms, None)
+        if pending is None:
+            # Késve érkezett egy már elveszettnek tekintett frame eredménye (a helyét már újra kiosztottuk)
+            return
+        frame_idx, captured, submitted, width, height = pending
+        try:
+            raw = result_to_raw(result)
+            mouth_data = None
+            if raw is None:
+                self.stats["no_face"] += 1
+            else:
+                # Ugyanaz az utófeldolgozás, mint a process_frame_full_mouth-ban
+                mouth_data = build_mouth_data(raw[0], raw[1], width, height,
+                                              fields=self.fields, landmark_indices=self.landmark_indices)
+            published = time.perf_counter()
+            live_result = LiveResult(frame_idx, timestamp_ms, mouth_data,
+                                     (published - captured) * 1000, (finished - submitted) * 1000)
+            self.latencies_ms.append(live_result.latency_ms)
+            self.inference_ms.append(live_result.inference_ms)
+            self.stats["processed"] += 1
+            self._publish(live_result)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Hiba az élő eredmény feldolgozásakor (frame #{frame_idx}): {e}")
+        finally:
+            self._in_flight.release()
+
+    def _publish(self, live_result):
+        if self.on_result is not None:
+            self.on_result(live_result)
+        if self.results is not None:
+            while True:
+                try:
+                    self.results.put_nowait(live_result)
+                    break
+                except queue.Full:
+                    # A fogyasztó lemaradt: a legrégebbi eredmény esik ki
+                    try:
+                        self.results.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _capture(self, source, latest, stop, duration):
+        started = time.perf_counter()
+        frame_idx = 0
+        try:
+            while not stop.is_set():
+                if duration is not None and time.perf_counter() - started >= duration:
+                    break
+                frame = source.read()
+                if frame is None:
+                    break
+                latest.put((frame_idx, time.perf_counter(), frame))
+                frame_idx += 1
+        finally:
+            self.stats["captured"] = frame_idx
+            latest.close()
+
+    def _submit(self, frame_idx, captured, frame):
+        # A LIVE_STREAM mód szigorúan növekvő időbélyeget vár (ms, a beolvasás ideje)
+        timestamp_ms = max(int(captured * 1000), self._last_timestamp_ms + 1)
+        self._last_timestamp_ms = timestamp_ms
+        height, width = frame.shape[:2]
+        mp_image = Image(image_format=ImageFormat.SRGB, data=cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        with self._lock:
+            self._pending[timestamp_ms] = (frame_idx, captured, time.perf_counter(), width, height)
+        self.landmarker.detect_async(mp_image, timestamp_ms)
+
+    def _wait_in_flight(self):
+        if not self._in_flight.acquire(timeout=RESULT_TIMEOUT_S):
+            with self._lock:
+                self.stats["lost"] += len(self._pending)
+                self._pending.clear()
+            print(f"⚠️  Nem jött eredmény {RESULT_TIMEOUT_S:g}s alatt, a frame elveszettnek számít")
+
+    def run(self, source, duration=None):
+        """
+        A forrás feldolgozása a végéig (vagy duration másodpercig / Ctrl+C-ig).
+
+        Returns:
+            dict: stats (captured, processed, dropped, no_face, lost, errors), fps, latency_ms, inference_ms
+        """
+        latest = LatestFrame()
+        stop = threading.Event()
+        capture = threading.Thread(target=self._capture, args=(source, latest, stop, duration),
+                                   name="live-capture", daemon=True)
+        started = time.perf_counter()
+        capture.start()
+        holding = False
+        try:
+            while True:
+                # Csak ha az előző eredmény megjött: addig a beolvasó szál felülírja az elavult frame-et
+                self._wait_in_flight()
+                holding = True
+                item = latest.take()
+                if item is None:
+                    break
+                self._submit(*item)
+                holding = False
+        except KeyboardInterrupt:
+            print("\n⏹️  Leállítva")
+        finally:
+            stop.set()
+            capture.join()
+            # Az utolsó, még futó frame eredményének megvárása
+            if not holding:
+                self._wait_in_flight()
+            self._in_flight.release()
+            self.landmarker.close()
+            source.release()
+        elapsed = time.perf_counter() - started
+        self.stats["dropped"] = latest.dropped
+        return {
+            **self.stats,
+            "seconds": round(elapsed, 3),
+            "fps": round(self.stats["processed"] / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": latency_report(self.latencies_ms),
+            "inference_ms": latency_report(self.inference_ms),
+        }
+
+
+def print_report(report):
+    print(f"\n📊 {report['processed']} / {report['captured']} frame feldolgozva "
+          f"({report['fps']} fps, {report['dropped']} elavult frame eldobva, {report['no_face']} arc nélkül)")
+    for label, key in (("Végponttól végpontig", "latency_ms"), ("Inferencia", "inference_ms")):
+        values = report[key]
+        if values:
+            print(f"   ⏱️  {label}: " + ", ".join(f"{name} {value:.1f} ms" for name, value in values.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Élő szájkövetés (LIVE_STREAM, legfrissebb frame)")
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--camera", type=int, help="Kamera index")
+    source_group.add_argument("--url", help="Stream URL (RTSP / HTTP)")
+    source_group.add_argument("--replay", help="Helyi videó valós idejű visszajátszása (kamera helyett)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Visszajátszási sebesség szorzó (--replay)")
+    parser.add_argument("--duration", type=float, default=None, help="Legfeljebb ennyi másodpercig fut")
+    parser.add_argument("--profile", default=LANDMARKER_PROFILE,
+                        help="Landmarker profil (modell fájl + beállítások); ha nem létezik, a MODEL_PATH")
+    parser.add_argument("--model", default=None, help="Modell fájl (felülírja a profilét)")
+    parser.add_argument("--columns", default=None,
+                        help="Csak ezek az oszlopok / csoportok készülnek el, pl. mouth,3d_landmarks "
+                             f"(csoportok: {', '.join(FEATURE_SETS)})")
+    parser.add_argument("--landmarks", default=None,
+                        help="A landmark mezőkben megtartott pontok: lips, lips_jaw vagy indexek (alapból mind a 478)")
+    parser.add_argument("--print", action="store_true", help="Minden eredmény kiírása")
+    args = parser.parse_args()
+
+    selection = None
+    if args.columns or args.landmarks:
+        try:
+            selection = make_output_selection(args.columns, resolve_landmark_indices(args.landmarks))
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        profile = load_profile(args.profile, MODEL_PATH)
+    except ValueError as e:
+        parser.error(str(e))
+
+    def show(live_result):
+        mouth = live_result.mouth_data
+        jaw = mouth.get("mouth_blend_shapes", {}).get("jawOpen") if mouth else None
+        print(f"#{live_result.frame_idx:5d}  {live_result.latency_ms:6.1f} ms  "
+              + ("nincs arc" if mouth is None else f"jawOpen {jaw:.3f}" if jaw is not None else "arc"))
+
+    if args.replay:
+        source = FileReplaySource(args.replay, speed=args.speed)
+    else:
+        source = CameraSource(args.camera if args.camera is not None else args.url)
+    tracker = LiveMouthTracker(args.model or profile.model_path, on_result=show if args.print else None,
+                               fields=selection.fields if selection is not None else None,
+                               landmark_indices=selection.landmark_indices if selection is not None else None,
+                               output_face_blendshapes=selection_needs_blend_shapes(selection),
+                               landmarker_options=profile.options)
+    print_report(tracker.run(source, duration=args.duration))
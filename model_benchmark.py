@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Modell változatok sebesség / pontosság benchmarkja és a landmarker profil kiválasztása
+
+A helyben elérhető Face Landmarker modell fájlok (*.task) és landmarker beállítás készletek
+(detektálási / jelenléti / követési küszöbök, blend shape-ek nélkül, ...) minden kombinációja
+ugyanazokon a minta klipeken fut. A klipek egyszer dekódolódnak a memóriába (RGB), így a mért
+frame/s csak az inferencia; változatonként:
+    - frame/s (bemelegítés után, egy szálon)
+    - arc tévesztési arány (és a referenciához képest plusz tévesztések)
+    - ajak landmark eltérés a referenciától pixelben (átlag / p95 / max, a 40 ajak ponton,
+      csak a mindkettőben detektált frame-eken)
+    - száj blend shape eltérés a referenciától (átlagos / max abszolút eltérés)
+A referencia alapból az első változat (MODEL_PATH alapbeállításokkal), --reference-szel más is lehet.
+
+A --select a leggyorsabb, a küszöbökön belüli változatot menti landmarker profilként
+(landmarker_profile.json), amit az extractorok a beégetett modell helyett használnak;
+--write-profile NÉV egy adott változatot ment. A blend shape-ek nélküli változat csak mérés:
+a blend shape-eket az extractor a kimeneti oszlopok (--columns) alapján kapcsolja ki.
+
+Használat:
+    python model_benchmark.py --videos 8
+    python model_benchmark.py --models face_landmarker.task face_landmarker_v2.task \\
+        --option-set default: --option-set low_conf:min_face_detection_confidence=0.3
+    python model_benchmark.py --select --max-lip-px 1.0
+    python model_benchmark.py --write-profile face_landmarker/low_conf
+"""
+
+import os
+import glob
+import json
+import time
+import argparse
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from frame_processor import (
+    create_landmarker, detect_raw, LANDMARK_SUBSETS, BLEND_SHAPE_NAMES, MOUTH_BLEND_SHAPE_NAMES
+)
+from video_stream import VideoFrameReader
+from autotune import sample_videos
+from landmarker_profile import (
+    PROFILE_PATH, PROFILE_OPTIONS, LandmarkerProfile, parse_options, save_profile, profile_label
+)
+
+# -------------------- Beállítások --------------------
+VIDEO_BASE = "D:/MestInt/datasets/gridcorpus/video"
+ALIGN_BASE = "D:/MestInt/datasets/gridcorpus/align"
+MODEL_PATH = "face_landmarker.task"
+# Ebben a mappában minden *.task fájl jelölt (ha nincs --models)
+MODEL_DIR = "."
+NUM_VIDEOS = 8
+OUTPUT_JSON = "model_benchmark.json"
+# Változatonként ennyi frame bemelegítés (modell betöltés, első inferencia) a mérés előtt
+WARMUP_FRAMES = 5
+
+# Alapértelmezett beállítás készletek (--option-set NÉV:kulcs=érték,... felülírja)
+OPTION_SETS = {
+    "default": {},
+    "no_blend": {"output_face_blendshapes": False},
+    "low_conf": {"min_face_detection_confidence": 0.3, "min_face_presence_confidence": 0.3},
+    "high_conf": {"min_face_detection_confidence": 0.7, "min_face_presence_confidence": 0.7},
+}
+
+# --select küszöbök a referenciához képest
+MAX_EXTRA_MISS_RATE = 0.01
+MAX_LIP_P95_PX = 1.5
+MAX_BLEND_MAE = 0.05
+
+LIP_INDICES = LANDMARK_SUBSETS["lips"]
+# A modell kimenetében ténylegesen szereplő száj blend shape-ek (a mouthOpen származtatott)
+MOUTH_BLEND_SHAPES = [name for name in MOUTH_BLEND_SHAPE_NAMES if name in BLEND_SHAPE_NAMES]
+
+Variant = namedtuple("Variant", "name model_path options")
+
+
+def find_models(model_dir=MODEL_DIR, model_path=MODEL_PATH):
+    """A helyi *.task modell fájlok; a MODEL_PATH (ha létezik) az első, ez lesz a referencia."""
+    models = sorted(os.path.normpath(path) for path in glob.glob(os.path.join(model_dir, "*.task")))
+    if os.path.exists(model_path):
+        models = [model_path] + [m for m in models if os.path.abspath(m) != os.path.abspath(model_path)]
+    return models
+
+
+def parse_option_set(spec):
+    """"low_conf:min_face_detection_confidence=0.3" -> (név, beállítások); a puszta név az OPTION_SETS-ből."""
+    name, separator, options = spec.partition(":")
+    if not separator:
+        if name not in OPTION_SETS:
+            raise ValueError(f"Ismeretlen beállítás készlet: {name} (ismertek: {', '.join(OPTION_SETS)}; "
+                             f"egyéni: NÉV:kulcs=érték,...)")
+        return name, dict(OPTION_SETS[name])
+    return name, parse_options(options)
+
+
+def make_variants(model_paths, option_sets):
+    return [Variant(f"{os.path.splitext(os.path.basename(model_path))[0]}/{set_name}", model_path, options)
+            for model_path in model_paths for set_name, options in option_sets]
+
+
+def load_clips(video_paths):
+    """A minta klipek összes frame-je RGB-ben (a dekódolás így nem számít bele a frame/s-be)."""
+    clips = []
+    for video_path in video_paths:
+        with VideoFrameReader(video_path) as reader:
+            frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for _, frame in reader]
+        if frames:
+            clips.append((video_path, frames))
+    return clips
+
+
+def run_variant(variant, clips, warmup=WARMUP_FRAMES):
+    """
+    Egy változat futtatása a klipek összes frame-jén.
+
+    Returns:
+        dict: frames, seconds, fps, misses, landmarks (N x 478 x 3, tévesztésnél NaN),
+              blend_shapes (N x len(MOUTH_BLEND_SHAPES), NaN ha nincs arc / blend shape)
+    """
+    landmarker = create_landmarker(variant.model_path, **variant.options)
+    num_frames = sum(len(frames) for _, frames in clips)
+    landmarks = np.full((num_frames, 478, 3), np.nan, dtype=np.float32)
+    blend_shapes = np.full((num_frames, len(MOUTH_BLEND_SHAPES)), np.nan, dtype=np.float32)
+    try:
+        for _ in range(warmup):
+            detect_raw(clips[0][1][0], landmarker, rgb=True)
+        row = 0
+        started = time.perf_counter()
+        for _, frames in clips:
+            for frame in frames:
+                raw = detect_raw(frame, landmarker, rgb=True)
+                if raw is not None:
+                    landmarks[row] = raw[0]
+                    if raw[1]:
+                        blend_shapes[row] = [raw[1].get(name, np.nan) for name in MOUTH_BLEND_SHAPES]
+                row += 1
+        seconds = time.perf_counter() - started
+    finally:
+        landmarker.close()
+    misses = int(np.isnan(landmarks[:, 0, 0]).sum())
+    return {"frames": num_frames, "seconds": seconds, "fps": num_frames / seconds if seconds > 0 else 0.0,
+            "misses": misses, "landmarks": landmarks, "blend_shapes": blend_shapes}
+
+
+def frame_sizes(clips):
+    """Frame-enkénti (szélesség, magasság) a normalizált koordináták pixelre váltásához."""
+    return np.array([(frame.shape[1], frame.shape[0]) for _, frames in clips for frame in frames],
+                    dtype=np.float32)
+
+
+def compare_to_reference(result, reference, sizes):
+    """A változat eltérése a referenciától (JSON-kompatibilis dict, tömbök nélkül)."""
+    detected = ~np.isnan(result["landmarks"][:, 0, 0])
+    reference_detected = ~np.isnan(reference["landmarks"][:, 0, 0])
+    both = detected & reference_detected
+    summary = {
+        "frames": result["frames"],
+        "fps": round(result["fps"], 2),
+        "miss_rate": round(result["misses"] / max(result["frames"], 1), 4),
+        "extra_miss_rate": round(int((reference_detected & ~detected).sum()) / max(result["frames"], 1), 4),
+        "compared_frames": int(both.sum()),
+        "lip_mean_px": None, "lip_p95_px": None, "lip_max_px": None,
+        "blend_mae": None, "blend_max": None,
+    }
+    if both.any():
+        delta = (result["landmarks"][both][:, LIP_INDICES, :2]
+                 - reference["landmarks"][both][:, LIP_INDICES, :2]) * sizes[both][:, None, :]
+        errors = np.linalg.norm(delta, axis=2).ravel()
+        summary.update(lip_mean_px=round(float(errors.mean()), 3),
+                       lip_p95_px=round(float(np.percentile(errors, 95)), 3),
+                       lip_max_px=round(float(errors.max()), 3))
+    with_blend = (both & ~np.isnan(result["blend_shapes"]).any(axis=1)
+                  & ~np.isnan(reference["blend_shapes"]).any(axis=1))
+    if with_blend.any():
+        errors = np.abs(result["blend_shapes"][with_blend] - reference["blend_shapes"][with_blend])
+        summary.update(blend_mae=round(float(errors.mean()), 4), blend_max=round(float(errors.max()), 4))
+    return summary
+
+
+def run_benchmark(variants, clips, reference_name):
+    """A referencia fut először (a többi ehhez mérődik), utána a változatok a megadott sorrendben."""
+    sizes = frame_sizes(clips)
+    ordered = sorted(variants, key=lambda variant: variant.name != reference_name)
+    reference = None
+    summaries = {}
+    for variant in ordered:
+        print(f"▶️  {variant.name} ({profile_label(LandmarkerProfile(None, variant.model_path, variant.options))})")
+        result = run_variant(variant, clips)
+        if reference is None:
+            reference = result
+        summaries[variant.name] = {"model_path": variant.model_path, "options": variant.options,
+                                   **compare_to_reference(result, reference, sizes)}
+    return {variant.name: summaries[variant.name] for variant in variants}
+
+
+def _format(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def print_results(summaries, reference_name):
+    print("\n" + "=" * 96)
+    print(f"📊 MODELL BENCHMARK (referencia: {reference_name})")
+    print("=" * 96)
+    width = max(len(name) for name in summaries)
+    print(f"{'változat':<{width}}  {'frame/s':>8}  {'tévesztés':>9}  {'+tév.':>6}  "
+          f"{'ajak px':>8}  {'p95 px':>7}  {'blend MAE':>9}")
+    reference_fps = summaries[reference_name]["fps"]
+    for name, summary in summaries.items():
+        speedup = summary["fps"] / reference_fps if reference_fps else 0.0
+        print(f"{name:<{width}}  {summary['fps']:8.1f}  {summary['miss_rate']:9.2%}  "
+              f"{summary['extra_miss_rate']:6.2%}  {_format(summary['lip_mean_px'], '8.3f')}  "
+              f"{_format(summary['lip_p95_px'], '7.3f')}  {_format(summary['blend_mae'], '9.4f')}"
+              f"  ({speedup:.2f}x)")
+
+
+def select_variant(summaries, max_extra_miss=MAX_EXTRA_MISS_RATE, max_lip_p95=MAX_LIP_P95_PX,
+                   max_blend_mae=MAX_BLEND_MAE):
+    """
+    A leggyorsabb, a küszöbökön belüli változat neve (vagy None). Csak blend shape-ekkel futott
+    változat választható, mert a profil a blend shape-eket nem kapcsolja ki.
+    """
+    acceptable = [name for name, summary in summaries.items()
+                  if summary["options"].get("output_face_blendshapes", True)
+                  and summary["extra_miss_rate"] <= max_extra_miss
+                  and summary["lip_p95_px"] is not None and summary["lip_p95_px"] <= max_lip_p95
+                  and summary["blend_mae"] is not None and summary["blend_mae"] <= max_blend_mae]
+    return max(acceptable, key=lambda name: summaries[name]["fps"], default=None)
+
+
+def variant_profile(name, summary):
+    """Egy benchmark változat landmarker profilként (a blend shape kapcsoló nélkül)."""
+    options = {key: value for key, value in summary["options"].items() if key in PROFILE_OPTIONS}
+    return LandmarkerProfile(name, summary["model_path"], options)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Modell változatok sebesség / pontosság benchmarkja")
+    parser.add_argument("--video-base", default=VIDEO_BASE)
+    parser.add_argument("--align-base", default=ALIGN_BASE)
+    parser.add_argument("--models", nargs="+", default=None,
+                        help=f"Modell fájlok (alapból a {MODEL_DIR} mappa *.task fájljai, a {MODEL_PATH} elöl)")
+    parser.add_argument("--option-set", action="append", default=None, metavar="NÉV[:KULCS=ÉRTÉK,...]",
+                        help=f"Beállítás készlet (ismertek: {', '.join(OPTION_SETS)}; alapból mind); "
+                             "pl. low:min_face_detection_confidence=0.2,num_faces=1")
+    parser.add_argument("--videos", type=int, default=NUM_VIDEOS, help="Minta klipek száma")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reference", default=None,
+                        help="A referencia változat neve (modell/készlet; alapból az első)")
+    parser.add_argument("--output", default=OUTPUT_JSON, help="Az eredmények JSON fájlja")
+    parser.add_argument("--select", action="store_true",
+                        help="A leggyorsabb, a küszöbökön belüli változat mentése landmarker profilként")
+    parser.add_argument("--write-profile", default=None, metavar="NÉV",
+                        help="Ez a változat kerül a landmarker profilba")
+    parser.add_argument("--profile", default=PROFILE_PATH, help="A mentett landmarker profil fájl")
+    parser.add_argument("--max-extra-miss", type=float, default=MAX_EXTRA_MISS_RATE)
+    parser.add_argument("--max-lip-px", type=float, default=MAX_LIP_P95_PX,
+                        help="--select: az ajak landmark eltérés p95 felső határa (px)")
+    parser.add_argument("--max-blend-mae", type=float, default=MAX_BLEND_MAE)
+    args = parser.parse_args()
+
+    models = args.models or find_models()
+    if not models:
+        parser.error(f"Nincs modell fájl (*.task) a {MODEL_DIR} mappában; add meg: --models")
+    missing = [model for model in models if not os.path.exists(model)]
+    if missing:
+        parser.error(f"Nem található modell fájl: {', '.join(missing)}")
+    try:
+        option_sets = [parse_option_set(spec) for spec in (args.option_set or OPTION_SETS)]
+    except ValueError as e:
+        parser.error(str(e))
+    variants = make_variants(models, option_sets)
+    names = [variant.name for variant in variants]
+    if len(set(names)) != len(names):
+        parser.error("A változat nevek (modell/készlet) nem egyediek")
+    reference_name = args.reference or names[0]
+    for name in (reference_name, args.write_profile):
+        if name is not None and name not in names:
+            parser.error(f"Ismeretlen változat: {name} (változatok: {', '.join(names)})")
+    if args.select and args.write_profile:
+        parser.error("--select és --write-profile közül csak az egyik adható meg")
+    if args.write_profile and not variants[names.index(args.write_profile)].options.get(
+            "output_face_blendshapes", True):
+        parser.error("Blend shape-ek nélküli változat nem menthető profilként (azt a --columns dönti el)")
+
+    video_paths = sample_videos(args.video_base, args.align_base, args.videos, seed=args.seed)
+    if not video_paths:
+        parser.error("Nincs videó a corpusban")
+    clips = load_clips(video_paths)
+    print(f"🎞️  {len(clips)} klip, {sum(len(frames) for _, frames in clips)} frame, "
+          f"{len(variants)} változat ({len(models)} modell x {len(option_sets)} beállítás készlet)")
+
+    summaries = run_benchmark(variants, clips, reference_name)
+    print_results(summaries, reference_name)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"reference": reference_name, "videos": video_paths, "variants": summaries}, f, indent=2)
+    print(f"\n💾 Eredmények: {args.output}")
+
+    chosen = args.write_profile
+    if args.select:
+        chosen = select_variant(summaries, args.max_extra_miss, args.max_lip_px, args.max_blend_mae)
+        if chosen is None:
+            print("⚠️  Egyik változat sem fér bele a küszöbökbe, a profil nem változott")
+    if chosen is not None:
+        profile = variant_profile(chosen, summaries[chosen])
+        benchmark = {key: summaries[chosen][key] for key in
+                     ("fps", "miss_rate", "extra_miss_rate", "lip_p95_px", "blend_mae")}
+        save_profile(profile, args.profile, benchmark={"reference": reference_name, **benchmark})
+        print(f"🧩 Landmarker profil mentve: {profile_label(profile)} -> {args.profile}")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Száj ROI képkivágások a landmarkok mellé, ugyanabból a dekódolási menetből
+
+Az extractor (--mouth-crops 88) minden kiírt sorhoz egy fix méretű (size x size) kivágást
+készít: a középpontja a CSV mouth_center-e, az oldala a szájszélesség (61 - 291 sarokpontok)
+CROP_SCALE-szerese, így a száj mérete a kivágásokon közel állandó. A kivágások egyetlen
+összefüggő uint8 .npy tömbbe kerülnek (<csv>.crops.npy), amelynek i. sora a CSV i. adatsora:
+
+    crops = load_crops("mouth_data.csv")        # memória-mappelt (rows, 88, 88) vagy (rows, 88, 88, 3)
+
+Használat:
+    python mouth_crops.py info mouth_data.csv
+    python mouth_crops.py preview mouth_data.csv --rows 0:64 --output crops.png
+"""
+
+import io
+import os
+import json
+import argparse
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from frame_processor import MOUTH_OUTER_POINTS_INDICES, MOUTH_INNER_POINTS_INDICES
+from compressed_io import BackgroundWriter, strip_compression_suffix
+
+# -------------------- Beállítások --------------------
+CROP_SIZE = 88
+CROP_COLORS = ["gray", "rgb"]
+# A kivágás oldala = szájszélesség x CROP_SCALE (a száj körül legyen egy kis margó)
+CROP_SCALE = 1.6
+
+CROPS_SUFFIX = ".crops.npy"
+CROPS_META_SUFFIX = ".crops.json"
+# Egy videó kivágásai a temp CSV mellett (nyers uint8 byte-ok, fejléc nélkül)
+PART_CROPS_SUFFIX = ".crops"
+
+MouthCropSpec = namedtuple("MouthCropSpec", ["size", "color", "scale"])
+
+_LIP_INDICES = MOUTH_OUTER_POINTS_INDICES + MOUTH_INNER_POINTS_INDICES
+_LEFT_CORNER, _RIGHT_CORNER = 61, 291
+
+
+def make_crop_spec(size=CROP_SIZE, color="gray", scale=CROP_SCALE):
+    if size < 8 or color not in CROP_COLORS or scale <= 0:
+        raise ValueError(f"Hibás kivágás beállítás: {size} px, {color}, scale {scale}")
+    return MouthCropSpec(int(size), color, float(scale))
+
+
+def crop_shape(spec):
+    return (spec.size, spec.size) if spec.color == "gray" else (spec.size, spec.size, 3)
+
+
+def crop_row_bytes(spec):
+    return int(np.prod(crop_shape(spec)))
+
+
+def crops_path(output_csv):
+    """mouth_data.csv(.gz) -> mouth_data.crops.npy"""
+    return os.path.splitext(strip_compression_suffix(output_csv))[0] + CROPS_SUFFIX
+
+
+def crops_meta_path(output_csv):
+    return os.path.splitext(strip_compression_suffix(output_csv))[0] + CROPS_META_SUFFIX
+
+
+def mouth_crop(frame, landmark_array, spec, color="bgr"):
+    """
+    Egy frame száj kivágása.
+
+    Args:
+        frame: a dekódolt képkocka (H x W x 3, uint8)
+        landmark_array: a detect_raw() normalizált landmarkjai (478 x 3)
+        spec: MouthCropSpec
+        color: a frame színsorrendje ("bgr": opencv, "rgb": ffmpeg / pyav)
+
+    Returns:
+        numpy.ndarray: uint8 (size x size) vagy (size x size x 3, RGB)
+    """
+    height, width = frame.shape[:2]
+    points = np.asarray(landmark_array, dtype=np.float64)[:, :2] * (width, height)
+    # Ugyanaz a (kerekített) középpont, ami a CSV mouth_center oszlopába kerül
+    center = np.mean(points[_LIP_INDICES], axis=0).astype(int)
+    mouth_width = float(np.linalg.norm(points[_LEFT_CORNER] - points[_RIGHT_CORNER]))
+    scale = spec.size / max(mouth_width * spec.scale, 1.0)
+    # Nagyítás / kicsinyítés a középpont körül, a középpont a kivágás közepére kerül
+    matrix = np.array([[scale, 0.0, spec.size / 2 - scale * center[0]],
+                       [0.0, scale, spec.size / 2 - scale * center[1]]])
+    crop = cv2.warpAffine(frame, matrix, (spec.size, spec.size), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+    if spec.color == "gray":
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY if color == "bgr" else cv2.COLOR_RGB2GRAY)
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB) if color == "bgr" else crop
+
+
+class MouthCropRecorder:
+    """Egy videó kivágásai, a kiírt rekordokkal azonos sorrendben (lásd iter_video_records)."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.crops = []
+
+    def add(self, crop):
+        self.crops.append(crop)
+
+    def to_array(self):
+        if not self.crops:
+            return np.empty((0,) + crop_shape(self.spec), dtype=np.uint8)
+        return np.stack(self.crops)
+
+
+# -------------------- Videónkénti részek és összefűzés --------------------
+def part_crops_path(part_csv):
+    return part_csv + PART_CROPS_SUFFIX
+
+
+def write_part_crops(part_csv, crops):
+    """Egy videó kivágásainak atomikus mentése a temp CSV mellé (a CSV rename előtt)."""
+    path = part_crops_path(part_csv)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(np.ascontiguousarray(crops, dtype=np.uint8).tobytes())
+    os.replace(tmp_path, path)
+
+
+def part_crops_complete(part_csv, rows, spec):
+    """Van-e a temp CSV-nek a beállításnak megfelelő kivágás fájlja (soronként crop_row_bytes byte)."""
+    path = part_crops_path(part_csv)
+    return os.path.exists(path) and os.path.getsize(path) == rows * crop_row_bytes(spec)
+
+
+def npy_header(shape, dtype=np.uint8):
+    """Egy .npy fájl fejléce; utána a tömb byte-jai C sorrendben folyamatosan írhatók."""
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                   "fortran_order": False, "shape": tuple(shape)})
+    return buffer.getvalue()
+
+
+def open_crops_writer(output_csv, rows, spec):
+    """
+    A kimenet (rows, ...) uint8 .npy tömbje, a CSV-vel azonos háttérszálas, pufferelt íróval:
+    a fejléc után a videók kivágásai a merge sorrendjében, blokkonként (writer.write) jönnek.
+    """
+    writer = BackgroundWriter(crops_path(output_csv))
+    writer.write(npy_header((rows,) + crop_shape(spec)))
+    return writer
+
+
+def write_crops_meta(output_csv, rows, spec, extra=None):
+    meta = {"rows": rows, "size": spec.size, "color": spec.color, "scale": spec.scale,
+            "shape": [rows] + list(crop_shape(spec)), "csv": os.path.basename(output_csv), **(extra or {})}
+    with open(crops_meta_path(output_csv), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_crops(output_csv, mmap=True):
+    """A CSV sorokkal egyező sorrendű kivágások (memória-mappelt uint8 tömb), vagy None, ha nincs."""
+    path = crops_path(output_csv)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def _parse_rows(text, total):
+    start, _, stop = text.partition(":")
+    return range(int(start or 0), min(int(stop) if stop else total, total))
+
+
+def write_preview(crops, rows, output, columns=16):
+    """Kivágások egy rácsba rendezve (ellenőrzéshez)."""
+    images = [np.asarray(crops[i]) for i in rows]
+    if not images:
+        raise ValueError("Nincs megjeleníthető sor")
+    images = [cv2.cvtColor(image, cv2.COLOR_RGB2BGR) if image.ndim == 3 else image for image in images]
+    blank = np.zeros_like(images[0])
+    images += [blank] * (-len(images) % columns)
+    grid = np.vstack([np.hstack(images[i:i + columns]) for i in range(0, len(images), columns)])
+    cv2.imwrite(output, grid)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Száj ROI kivágások (<csv>.crops.npy)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    info_parser = subparsers.add_parser("info", help="A kivágás tömb alakja és beállításai")
+    info_parser.add_argument("csv")
+    preview_parser = subparsers.add_parser("preview", help="Kivágások rácsba rendezve, képként")
+    preview_parser.add_argument("csv")
+    preview_parser.add_argument("--rows", default="0:64", help="Sorok (start:stop)")
+    preview_parser.add_argument("--columns", type=int, default=16)
+    preview_parser.add_argument("--output", default="crops.png")
+    args = parser.parse_args()
+
+    crops = load_crops(args.csv)
+    if crops is None:
+        raise SystemExit(f"❌ Nincs kivágás fájl: {crops_path(args.csv)}")
+    if args.command == "info":
+        meta_path = crops_meta_path(args.csv)
+        meta = json.load(open(meta_path, encoding="utf-8")) if os.path.exists(meta_path) else {}
+        print(f"🖼️  {crops_path(args.csv)}: {crops.shape} {crops.dtype}, {crops.nbytes / 1e6:.1f} MB"
+              + (f" ({meta['color']}, scale {meta['scale']})" if meta else ""))
+    else:
+        write_preview(crops, _parse_rows(args.rows, len(crops)), args.output, columns=args.columns)
+        print(f"✅ {args.output}")
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Vektorizált száj geometria jellemzők teljes klipekre / shardokra
+
+Egy (frames, 478, 3) landmark tömbből néhány NumPy lépésben számolja:
+    - mouth_width:      szájszélesség (61 - 291 sarokpontok távolsága)
+    - lip_aperture:     belső ajaknyílás (13 - 14 távolsága)
+    - outer_lip_height: külső ajakmagasság (0 - 17 távolsága)
+    - inner_lip_area:   belső ajak poligon területe (shoelace)
+    - outer_lip_area:   külső ajak poligon területe (shoelace)
+    - lip_protrusion:   ajak előreállás z-ben (arc átlag z - külső ajak átlag z)
+és ezek frame-enkénti sebességét (véges differencia klipen belül).
+
+Használat:
+    python mouth_features.py mouth_columnar/             # jellemző oszlop hozzáadása
+    python mouth_features.py --csv mouth_data.csv --output mouth_features.npz
+"""
+
+import os
+import csv
+import json
+import argparse
+import numpy as np
+
+from frame_processor import MOUTH_OUTER_POINTS_INDICES, MOUTH_INNER_POINTS_INDICES
+from dataset_io import CSV_DELIMITER
+from compressed_io import open_text_input
+
+# A pontok indexei a MOUTH_*_POINTS_INDICES listákon belül
+_OUTER_LEFT_CORNER = MOUTH_OUTER_POINTS_INDICES.index(61)
+_OUTER_RIGHT_CORNER = MOUTH_OUTER_POINTS_INDICES.index(291)
+_OUTER_TOP = MOUTH_OUTER_POINTS_INDICES.index(0)
+_OUTER_BOTTOM = MOUTH_OUTER_POINTS_INDICES.index(17)
+_INNER_TOP = MOUTH_INNER_POINTS_INDICES.index(13)
+_INNER_BOTTOM = MOUTH_INNER_POINTS_INDICES.index(14)
+
+GEOMETRY_FEATURE_NAMES = [
+    "mouth_width", "lip_aperture", "outer_lip_height",
+    "inner_lip_area", "outer_lip_area", "lip_protrusion",
+]
+MOUTH_FEATURE_NAMES = GEOMETRY_FEATURE_NAMES + [f"{name}_velocity" for name in GEOMETRY_FEATURE_NAMES]
+
+
+def polygon_area(points):
+    """
+    Shoelace terület (N, K, 2) poligonokra, egyszerre az összes frame-re.
+    A MOUTH_*_POINTS_INDICES sorrendje körbejárja az ajkat, így zárt poligon.
+    """
+    x = points[..., 0]
+    y = points[..., 1]
+    return 0.5 * np.abs(np.sum(x * np.roll(y, -1, axis=-1) - np.roll(x, -1, axis=-1) * y, axis=-1))
+
+
+def _distance(a, b):
+    return np.sqrt(np.sum((a - b) ** 2, axis=-1))
+
+
+def finite_difference(values, frame_idx=None, group_ids=None):
+    """
+    Frame-enkénti változás (érték / frame) csoportonként (klipenként).
+    Minden klip első frame-jén a sebesség 0; kihagyott frame-eknél a frame_idx különbséggel osztunk.
+
+    Args:
+        values: (N, ...) tömb, időrendben
+        frame_idx: (N,) frame sorszámok (None = egymást követő frame-ek)
+        group_ids: (N,) klip azonosítók (pl. speaker/videó); a határokon nincs differencia
+    """
+    values = np.asarray(values, dtype=np.float32)
+    velocity = np.zeros_like(values)
+    if len(values) < 2:
+        return velocity
+    valid = np.ones(len(values) - 1, dtype=bool)
+    dt = np.ones(len(values) - 1, dtype=np.float32)
+    if frame_idx is not None:
+        dt = np.diff(np.asarray(frame_idx)).astype(np.float32)
+        valid &= dt > 0
+    if group_ids is not None:
+        group_ids = np.asarray(group_ids)
+        valid &= group_ids[1:] == group_ids[:-1]
+    diff = np.diff(values, axis=0)
+    dt = dt.reshape((-1,) + (1,) * (values.ndim - 1))
+    velocity[1:][valid] = (diff / np.where(dt > 0, dt, 1.0))[valid]
+    return velocity
+
+
+def compute_mouth_features(landmarks, frame_size=None, frame_idx=None, group_ids=None):
+    """
+    Száj geometria jellemzők egy teljes klipre / shardra.
+
+    Args:
+        landmarks: (N, 478, 3) landmarkok. x, y normalizált (0..1) vagy pixel; z normalizált.
+        frame_size: (width, height) - ha meg van adva, a normalizált x, y pixelre skálázódik
+        frame_idx: (N,) frame sorszámok a sebességhez
+        group_ids: (N,) klip azonosítók, a sebesség nem lép át klip határon
+
+    Returns:
+        numpy.ndarray: (N, len(MOUTH_FEATURE_NAMES)) float32
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    outer = landmarks[:, MOUTH_OUTER_POINTS_INDICES, :]
+    inner = landmarks[:, MOUTH_INNER_POINTS_INDICES, :]
+    outer_xy = outer[..., :2]
+    inner_xy = inner[..., :2]
+    if frame_size is not None:
+        scale = np.asarray(frame_size, dtype=np.float32)
+        outer_xy = outer_xy * scale
+        inner_xy = inner_xy * scale
+
+    geometry = np.empty((len(landmarks), len(GEOMETRY_FEATURE_NAMES)), dtype=np.float32)
+    geometry[:, 0] = _distance(outer_xy[:, _OUTER_LEFT_CORNER], outer_xy[:, _OUTER_RIGHT_CORNER])
+    geometry[:, 1] = _distance(inner_xy[:, _INNER_TOP], inner_xy[:, _INNER_BOTTOM])
+    geometry[:, 2] = _distance(outer_xy[:, _OUTER_TOP], outer_xy[:, _OUTER_BOTTOM])
+    geometry[:, 3] = polygon_area(inner_xy)
+    geometry[:, 4] = polygon_area(outer_xy)
+    # MediaPipe z: kisebb érték = közelebb a kamerához, így a pozitív érték előreálló ajkat jelent
+    geometry[:, 5] = landmarks[:, :, 2].mean(axis=1) - outer[:, :, 2].mean(axis=1)
+
+    velocity = finite_difference(geometry, frame_idx=frame_idx, group_ids=group_ids)
+    return np.concatenate([geometry, velocity], axis=1)
+
+
+def clip_group_ids(speakers, videos):
+    """(speaker, videó) párokból klip azonosító tömb a finite_difference-hez."""
+    return np.char.add(np.char.add(np.asarray(speakers, dtype=str), "/"), np.asarray(videos, dtype=str))
+
+
+def columnar_mouth_features(arrays, previous=None):
+    """
+    Jellemzők egy oszlopos chunkhoz (pixel_landmarks x, y + 3d_landmarks z).
+
+    Args:
+        arrays: oszlopnév -> tömb (speaker, video, frame_idx, pixel_landmarks, 3d_landmarks)
+        previous: az előző chunk utolsó sora (dict ugyanezekkel az oszlopokkal, 1 hosszú),
+                  hogy a partok határán átnyúló klip sebessége is helyes legyen
+    """
+    columns = ["speaker", "video", "frame_idx", "pixel_landmarks", "3d_landmarks"]
+    if previous is not None:
+        arrays = {name: np.concatenate([previous[name], arrays[name]]) for name in columns}
+    landmarks = np.concatenate([arrays["pixel_landmarks"][..., :2], arrays["3d_landmarks"][..., 2:]], axis=-1)
+    features = compute_mouth_features(landmarks, frame_idx=arrays["frame_idx"],
+                                      group_ids=clip_group_ids(arrays["speaker"], arrays["video"]))
+    return features[1:] if previous is not None else features
+
+
+def add_features_to_columnar(dataset_dir):
+    """
+    mouth_features oszlop hozzáadása egy meglévő oszlopos datasethez (partonként, mmap-pel).
+    """
+    from columnar_dataset import read_manifest, load_part, MANIFEST_FILE
+    manifest = read_manifest(dataset_dir)
+    columns = ["speaker", "video", "frame_idx", "pixel_landmarks", "3d_landmarks"]
+    previous = None
+    total = 0
+    for part in manifest["parts"]:
+        arrays = load_part(dataset_dir, part["name"], columns=columns)
+        features = columnar_mouth_features(arrays, previous=previous)
+        np.save(os.path.join(dataset_dir, part["name"], "mouth_features.npy"), features)
+        previous = {name: np.asarray(arrays[name][-1:]) for name in columns}
+        total += len(features)
+        print(f"   ✓ {part['name']}: {len(features)} sor")
+
+    manifest["columns"]["mouth_features"] = {"dtype": "float32", "shape": [len(MOUTH_FEATURE_NAMES)]}
+    manifest["mouth_feature_names"] = MOUTH_FEATURE_NAMES
+    with open(os.path.join(dataset_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return total
+
+
+def csv_mouth_features(csv_path, output_path, chunk_rows=20000):
+    """
+    Jellemzők a régi mouth_data.csv-ből: a JSON oszlopokat chunkonként tömbbé alakítja,
+    a geometriát vektorizáltan számolja. Kimenet: .npz (speaker, video, frame_idx, features).
+    """
+    csv.field_size_limit(1 << 30)
+    keys, frame_ids, feature_chunks = [], [], []
+    previous = None
+
+    def flush(rows):
+        nonlocal previous
+        arrays = {
+            "speaker": np.array([r[0] for r in rows], dtype=str),
+            "video": np.array([r[1] for r in rows], dtype=str),
+            "frame_idx": np.array([int(r[2]) for r in rows], dtype=np.int32),
+            "pixel_landmarks": np.array([json.loads(r[3]) for r in rows], dtype=np.float32),
+            "3d_landmarks": np.array([json.loads(r[4]) for r in rows], dtype=np.float32),
+        }
+        feature_chunks.append(columnar_mouth_features(arrays, previous=previous))
+        keys.append(clip_group_ids(arrays["speaker"], arrays["video"]))
+        frame_ids.append(arrays["frame_idx"])
+        previous = {name: arrays[name][-1:] for name in arrays}
+
+    with open_text_input(csv_path) as f:
+        reader = csv.reader(f, delimiter=CSV_DELIMITER)
+        header = next(reader)
+        wanted = [header.index(name) for name in
+                  ("speaker", "video", "frame_idx", "pixel_landmarks", "3d_landmarks")]
+        rows = []
+        for row in reader:
+            rows.append([row[i] for i in wanted])
+            if len(rows) >= chunk_rows:
+                flush(rows)
+                rows = []
+        if rows:
+            flush(rows)
+
+    features = np.concatenate(feature_chunks) if feature_chunks else np.zeros((0, len(MOUTH_FEATURE_NAMES)), np.float32)
+    np.savez(output_path, clip=np.concatenate(keys) if keys else np.array([], dtype=str),
+             frame_idx=np.concatenate(frame_ids) if frame_ids else np.array([], dtype=np.int32),
+             features=features, feature_names=np.array(MOUTH_FEATURE_NAMES))
+    return len(features)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Száj geometria jellemzők számolása")
+    parser.add_argument("dataset", nargs="?", help="Oszlopos dataset könyvtár (mouth_features oszlop hozzáadása)")
+    parser.add_argument("--csv", default=None, help="Régi mouth_data.csv bemenet")
+    parser.add_argument("--output", default="mouth_features.npz", help="--csv esetén a kimeneti .npz")
+    args = parser.parse_args()
+
+    if args.csv:
+        n = csv_mouth_features(args.csv, args.output)
+        print(f"✅ {n} sor -> {args.output}")
+    elif args.dataset:
+        n = add_features_to_columnar(args.dataset)
+        print(f"✅ mouth_features oszlop hozzáadva: {n} sor")
+    else:
+        parser.error("Adj meg egy oszlopos datasetet vagy --csv fájlt")
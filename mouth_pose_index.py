@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Legközelebbi szomszéd keresés száj pózokra a teljes corpuson (IVF index)
+
+Minden frame-hez egy tömör float32 póz vektor készül:
+    - a külső + belső ajak relatív pontjai, középre tolva és a szájszélességgel
+      (61 - 291 sarokpontok) normálva, így a fej mérete / távolsága nem számít
+    - a mouth_blend_shapes értékei
+Az index egy IVF-szerű durva kvantáló: k-means centroidok (lista középpontok), a
+vektorok a legközelebbi centroid listájába kerülnek, listánként folytonosan tárolva.
+Lekérdezéskor csak a query-hez legközelebbi nprobe lista vektorait nézzük végig
+(memória-mappelve), így a top-k találat milliszekundumok alatt megvan.
+
+A bemenet oszlopos dataset (columnar_dataset.py / csv_to_columnar.py kimenete).
+Az index inkrementálisan bővíthető: a build csak a még nem indexelt partokat
+(pl. újonnan hozzáadott shardokat) dolgozza fel, a meglévő centroidokkal.
+
+Használat:
+    python mouth_pose_index.py build pose_index/ mouth_columnar/ shard1_columnar/
+    python mouth_pose_index.py query pose_index/ --frame s1/bbaf2n.mpg/12 -k 10 --words bin,blue
+    python mouth_pose_index.py info pose_index/
+"""
+
+import os
+import json
+import time
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from frame_processor import MOUTH_OUTER_POINTS_INDICES, MOUTH_INNER_POINTS_INDICES, MOUTH_BLEND_SHAPE_NAMES
+from columnar_dataset import read_manifest, load_part
+
+INDEX_FILE = "index.json"
+CENTROIDS_FILE = "centroids.npy"
+INDEX_FORMAT = "mouth_pose_ivf"
+INDEX_VERSION = 1
+
+# A póz vektorhoz szükséges oszlopok
+POSE_COLUMNS = ["speaker", "video", "frame_idx", "word",
+                "outer_lip_relative_points", "inner_lip_relative_points", "mouth_blend_shapes"]
+POSE_DIM = 2 * (len(MOUTH_OUTER_POINTS_INDICES) + len(MOUTH_INNER_POINTS_INDICES)) + len(MOUTH_BLEND_SHAPE_NAMES)
+
+DEFAULT_NPROBE = 8
+# Ennyi sor gyűlik össze egy index batch-be (a memóriahasználat felső korlátja a build alatt)
+BATCH_ROWS = 500000
+TRAIN_SAMPLE_ROWS = 200000
+
+_OUTER_LEFT_CORNER = MOUTH_OUTER_POINTS_INDICES.index(61)
+_OUTER_RIGHT_CORNER = MOUTH_OUTER_POINTS_INDICES.index(291)
+
+# Egy találat; a distance a súlyozott póz vektorok euklideszi távolsága
+PoseMatch = namedtuple("PoseMatch", ["speaker", "video", "frame_idx", "word", "distance"])
+
+
+def pose_vectors(arrays, lip_weight=1.0, blend_weight=1.0):
+    """
+    Póz vektorok egy oszlopos chunkból.
+
+    Returns:
+        numpy.ndarray: (N, POSE_DIM) float32
+    """
+    outer = np.asarray(arrays["outer_lip_relative_points"], dtype=np.float32)
+    inner = np.asarray(arrays["inner_lip_relative_points"], dtype=np.float32)
+    lips = np.concatenate([outer, inner], axis=1)
+    lips = lips - lips.mean(axis=1, keepdims=True)
+    width = np.linalg.norm(outer[:, _OUTER_RIGHT_CORNER] - outer[:, _OUTER_LEFT_CORNER], axis=-1)
+    lips /= np.maximum(width, 1e-6)[:, None, None]
+    blend = np.asarray(arrays["mouth_blend_shapes"], dtype=np.float32)
+    return np.concatenate([lips.reshape(len(lips), -1) * lip_weight, blend * blend_weight],
+                          axis=1).astype(np.float32)
+
+
+# -------------------- Durva kvantáló (k-means) --------------------
+def _squared_distances(vectors, centroids):
+    return (np.einsum("ij,ij->i", vectors, vectors)[:, None] - 2 * vectors @ centroids.T
+            + np.einsum("ij,ij->i", centroids, centroids)[None, :])
+
+
+def assign_lists(vectors, centroids, chunk_rows=65536):
+    """Minden vektor legközelebbi centroidja (chunkonként, hogy a távolság mátrix kicsi maradjon)."""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_rows):
+        chunk = np.asarray(vectors[start:start + chunk_rows], dtype=np.float32)
+        labels[start:start + len(chunk)] = np.argmin(_squared_distances(chunk, centroids), axis=1)
+    return labels
+
+
+def train_coarse_quantizer(sample, nlist, iterations=20, seed=0):
+    """
+    Lloyd k-means a mintán. Az üres listák centroidját egy véletlen mintavektorra tesszük.
+
+    Returns:
+        numpy.ndarray: (nlist, dim) float32 centroidok
+    """
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(sample, dtype=np.float32)
+    nlist = min(nlist, len(sample))
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign_lists(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0) / counts[filled, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+    return centroids
+
+
+def default_nlist(num_rows):
+    """Listák száma: ~4 * sqrt(N), 16 és 4096 között."""
+    return int(np.clip(4 * np.sqrt(max(num_rows, 1)), 16, 4096))
+
+
+# -------------------- Build --------------------
+def _read_index(index_dir):
+    with open(os.path.join(index_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_index(index_dir, meta):
+    path = os.path.join(index_dir, INDEX_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _new_parts(dataset_dirs, indexed):
+    """A még nem indexelt (dataset, part) párok; a dataset-nek tartalmaznia kell a póz oszlopokat."""
+    parts = []
+    for dataset_dir in dataset_dirs:
+        manifest = read_manifest(dataset_dir)
+        missing = [name for name in POSE_COLUMNS if name not in manifest["columns"]]
+        if missing:
+            raise ValueError(f"{dataset_dir}: hiányzó oszlopok a póz indexhez: {', '.join(missing)}")
+        source = os.path.abspath(dataset_dir)
+        for part in manifest["parts"]:
+            key = f"{source}::{part['name']}"
+            if key not in indexed:
+                parts.append((dataset_dir, part["name"], part["rows"], key))
+    return parts
+
+
+def _training_sample(parts, sample_rows, lip_weight, blend_weight, seed=0):
+    # Partonként arányos véletlen minta, hogy minden speaker / shard szerepeljen benne
+    rng = np.random.default_rng(seed)
+    total = sum(rows for _, _, rows, _ in parts)
+    rate = min(1.0, sample_rows / max(total, 1))
+    chunks = []
+    for dataset_dir, part_name, rows, _ in parts:
+        take = np.sort(rng.choice(rows, size=max(1, int(round(rows * rate))), replace=False)) if rows else []
+        if len(take):
+            arrays = load_part(dataset_dir, part_name, columns=POSE_COLUMNS[4:])
+            chunks.append(pose_vectors({name: arrays[name][take] for name in arrays}, lip_weight, blend_weight))
+    return np.concatenate(chunks)
+
+
+def _vocabulary_codes(values, vocabulary):
+    # Új nevek a szótár végére kerülnek, így a régi batch-ek kódjai érvényesek maradnak
+    positions = {name: i for i, name in enumerate(vocabulary)}
+    unique, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    for name in unique.tolist():
+        if name not in positions:
+            positions[name] = len(vocabulary)
+            vocabulary.append(name)
+    return np.array([positions[name] for name in unique.tolist()], dtype=np.int32)[inverse]
+
+
+def _write_batch(index_dir, name, vectors, keys, centroids):
+    """Egy batch kiírása listánként rendezve: a lekérdezés egy listát egyetlen folytonos szeletként olvas."""
+    labels = assign_lists(vectors, centroids)
+    order = np.argsort(labels, kind="stable")
+    offsets = np.searchsorted(labels[order], np.arange(len(centroids) + 1)).astype(np.int64)
+    batch_dir = os.path.join(index_dir, name)
+    os.makedirs(batch_dir, exist_ok=True)
+    np.save(os.path.join(batch_dir, "vectors.npy"), vectors[order])
+    np.save(os.path.join(batch_dir, "list_offsets.npy"), offsets)
+    for column, values in keys.items():
+        np.save(os.path.join(batch_dir, f"{column}.npy"), values[order])
+
+
+def build_index(index_dir, dataset_dirs, nlist=None, lip_weight=1.0, blend_weight=1.0,
+                sample_rows=TRAIN_SAMPLE_ROWS, batch_rows=BATCH_ROWS, seed=0):
+    """
+    Póz index építése, vagy egy meglévő bővítése az új partokkal.
+    Új indexnél a centroidok az első build partjainak mintájából tanulnak; bővítéskor a
+    meglévő centroidok maradnak (a súlyok és a listák száma az index.json-ból jön).
+
+    Returns:
+        dict: az index metaadatai
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    if os.path.exists(os.path.join(index_dir, INDEX_FILE)):
+        meta = _read_index(index_dir)
+        centroids = np.load(os.path.join(index_dir, CENTROIDS_FILE))
+        parts = _new_parts(dataset_dirs, set(meta["sources"]))
+        print(f"↩️  Meglévő index: {meta['total_rows']} sor, {meta['nlist']} lista; {len(parts)} új part")
+    else:
+        parts = _new_parts(dataset_dirs, set())
+        if not parts:
+            raise ValueError("Nincs indexelhető part")
+        total = sum(rows for _, _, rows, _ in parts)
+        nlist = nlist or default_nlist(total)
+        print(f"🧮 Kvantáló tanítása: {nlist} lista, {min(total, sample_rows)} mintasor")
+        sample = _training_sample(parts, sample_rows, lip_weight, blend_weight, seed=seed)
+        centroids = train_coarse_quantizer(sample, nlist, seed=seed)
+        np.save(os.path.join(index_dir, CENTROIDS_FILE), centroids)
+        meta = {"format": INDEX_FORMAT, "version": INDEX_VERSION, "dim": POSE_DIM, "nlist": len(centroids),
+                "lip_weight": lip_weight, "blend_weight": blend_weight,
+                "speakers": [], "words": [], "sources": [], "batches": [], "total_rows": 0}
+        _write_index(index_dir, meta)
+
+    pending, pending_keys, pending_rows = [], [], 0
+
+    def flush():
+        nonlocal pending, pending_keys, pending_rows
+        if not pending_rows:
+            return
+        name = f"batch-{len(meta['batches']):05d}"
+        vectors = np.concatenate([chunk["vectors"] for chunk in pending])
+        keys = {"speaker_codes": _vocabulary_codes(np.concatenate([c["speaker"] for c in pending]), meta["speakers"]),
+                "word_codes": _vocabulary_codes(np.concatenate([c["word"] for c in pending]), meta["words"]),
+                "video": np.concatenate([c["video"] for c in pending]),
+                "frame_idx": np.concatenate([c["frame_idx"] for c in pending]).astype(np.int32)}
+        # Előbb a batch, utána az index.json: egy félbeszakadt build batch-e nem kerül be
+        _write_batch(index_dir, name, vectors, keys, centroids)
+        meta["batches"].append({"name": name, "rows": int(len(vectors))})
+        meta["sources"].extend(pending_keys)
+        meta["total_rows"] += int(len(vectors))
+        _write_index(index_dir, meta)
+        print(f"   ✓ {name}: {len(vectors)} sor (összesen {meta['total_rows']})")
+        pending, pending_keys, pending_rows = [], [], 0
+
+    for dataset_dir, part_name, rows, key in parts:
+        arrays = load_part(dataset_dir, part_name, columns=POSE_COLUMNS)
+        pending.append({"vectors": pose_vectors(arrays, meta["lip_weight"], meta["blend_weight"]),
+                        **{name: np.asarray(arrays[name]) for name in POSE_COLUMNS[:4]}})
+        pending_keys.append(key)
+        pending_rows += rows
+        if pending_rows >= batch_rows:
+            flush()
+    flush()
+    return meta
+
+
+# -------------------- Lekérdezés --------------------
+class MouthPoseIndex:
+    """
+    Az index memória-mappelt, csak olvasható nézete.
+
+        index = MouthPoseIndex("pose_index/")
+        for match in index.search_frame("s1", "bbaf2n.mpg", 12, k=10, words=["bin"]):
+            print(match.speaker, match.video, match.frame_idx, match.word, match.distance)
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.meta = _read_index(index_dir)
+        self.centroids = np.load(os.path.join(index_dir, CENTROIDS_FILE))
+        self.speakers = self.meta["speakers"]
+        self.words = self.meta["words"]
+        self.batches = []
+        for batch in self.meta["batches"]:
+            batch_dir = os.path.join(index_dir, batch["name"])
+            self.batches.append({name: np.load(os.path.join(batch_dir, f"{name}.npy"), mmap_mode="r")
+                                 for name in ("vectors", "list_offsets", "speaker_codes", "word_codes",
+                                              "video", "frame_idx")})
+
+    def __len__(self):
+        return self.meta["total_rows"]
+
+    def vectorize(self, arrays):
+        """Póz vektor(ok) az index súlyaival (pl. egy CSV sorból / oszlopos chunkból)."""
+        return pose_vectors(arrays, self.meta["lip_weight"], self.meta["blend_weight"])
+
+    def frame_vector(self, speaker, video, frame_idx):
+        """Egy indexelt frame póz vektora (None, ha nincs az indexben)."""
+        if speaker not in self.speakers:
+            return None
+        code = self.speakers.index(speaker)
+        for batch in self.batches:
+            rows = np.flatnonzero((batch["speaker_codes"] == code) & (batch["frame_idx"] == frame_idx))
+            rows = rows[np.asarray(batch["video"][rows]) == video]
+            if len(rows):
+                return np.array(batch["vectors"][rows[0]])
+        return None
+
+    def _codes(self, names, vocabulary):
+        if not names:
+            return None
+        return np.array([vocabulary.index(name) for name in names if name in vocabulary], dtype=np.int32)
+
+    def search(self, vector, k=10, nprobe=DEFAULT_NPROBE, speakers=None, words=None, exclude_video=None):
+        """
+        A k legközelebbi frame a póz vektorhoz.
+
+        Args:
+            nprobe: ennyi legközelebbi listát nézünk meg; ha a szűrés után kevesebb mint k
+                    találat van, további listákkal bővítünk (végső esetben mindet átnézzük)
+            speakers / words: csak ezek a speakerek / szavak (None = mind)
+            exclude_video: (speaker, video) - ennek a klipnek a frame-jei kimaradnak
+
+        Returns:
+            list: PoseMatch-ek távolság szerint növekvő sorrendben
+        """
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        speaker_codes = self._codes(speakers, self.speakers)
+        word_codes = self._codes(words, self.words)
+        if (speaker_codes is not None and not len(speaker_codes)) or (word_codes is not None and not len(word_codes)):
+            return []
+        exclude = None
+        if exclude_video is not None and exclude_video[0] in self.speakers:
+            exclude = (self.speakers.index(exclude_video[0]), exclude_video[1])
+
+        list_order = np.argsort(_squared_distances(vector[None, :], self.centroids)[0])
+        found_distances, found_rows = [], []
+        found = 0
+        probed = 0
+        step = max(nprobe, 1)
+        while probed < len(list_order) and found < k:
+            for list_id in list_order[probed:probed + step]:
+                for batch_id, batch in enumerate(self.batches):
+                    start, end = int(batch["list_offsets"][list_id]), int(batch["list_offsets"][list_id + 1])
+                    if start == end:
+                        continue
+                    mask = np.ones(end - start, dtype=bool)
+                    if speaker_codes is not None:
+                        mask &= np.isin(batch["speaker_codes"][start:end], speaker_codes)
+                    if word_codes is not None:
+                        mask &= np.isin(batch["word_codes"][start:end], word_codes)
+                    if exclude is not None:
+                        mask &= ~((batch["speaker_codes"][start:end] == exclude[0])
+                                  & (batch["video"][start:end] == exclude[1]))
+                    rows = np.flatnonzero(mask) + start
+                    if not len(rows):
+                        continue
+                    vectors = batch["vectors"][start:end][rows - start]
+                    found_distances.append(np.einsum("ij,ij->i", vectors - vector, vectors - vector))
+                    found_rows.append(np.stack([np.full(len(rows), batch_id), rows], axis=1))
+                    found += len(rows)
+            probed += step
+            step *= 2
+
+        if not found:
+            return []
+        distances = np.concatenate(found_distances)
+        rows = np.concatenate(found_rows)
+        top = np.argpartition(distances, min(k, len(distances)) - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        matches = []
+        for i in top:
+            batch = self.batches[rows[i, 0]]
+            row = rows[i, 1]
+            matches.append(PoseMatch(self.speakers[int(batch["speaker_codes"][row])], str(batch["video"][row]),
+                                     int(batch["frame_idx"][row]), self.words[int(batch["word_codes"][row])],
+                                     float(np.sqrt(max(distances[i], 0.0)))))
+        return matches
+
+    def search_frame(self, speaker, video, frame_idx, k=10, exclude_same_video=True, **kwargs):
+        """Az indexelt (speaker, video, frame_idx) frame-hez legközelebbi pózok."""
+        vector = self.frame_vector(speaker, video, frame_idx)
+        if vector is None:
+            raise KeyError(f"A frame nincs az indexben: {speaker}/{video}/{frame_idx}")
+        return self.search(vector, k=k, exclude_video=(speaker, video) if exclude_same_video else None, **kwargs)
+
+
+def _split_names(value):
+    return [name.strip() for name in value.split(",") if name.strip()] if value else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Száj póz legközelebbi szomszéd index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Index építése / bővítése oszlopos datasetekből")
+    build_parser.add_argument("index", help="Index könyvtár")
+    build_parser.add_argument("datasets", nargs="+", help="Oszlopos dataset könyvtárak (shardok)")
+    build_parser.add_argument("--nlist", type=int, default=None, help="Listák száma (alapból ~4*sqrt(N))")
+    build_parser.add_argument("--lip-weight", type=float, default=1.0, help="Az ajak pontok súlya")
+    build_parser.add_argument("--blend-weight", type=float, default=1.0, help="A blend shape-ek súlya")
+    build_parser.add_argument("--sample-rows", type=int, default=TRAIN_SAMPLE_ROWS,
+                              help="A kvantáló tanításához használt sorok")
+
+    query_parser = subparsers.add_parser("query", help="Legközelebbi pózok egy indexelt frame-hez")
+    query_parser.add_argument("index", help="Index könyvtár")
+    query_parser.add_argument("--frame", required=True, help="SPEAKER/VIDEO/FRAME_IDX, pl. s1/bbaf2n.mpg/12")
+    query_parser.add_argument("-k", type=int, default=10)
+    query_parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    query_parser.add_argument("--speakers", default=None, help="Csak ezek a speakerek (vesszővel)")
+    query_parser.add_argument("--words", default=None, help="Csak ezek a szavak (vesszővel)")
+    query_parser.add_argument("--include-same-video", action="store_true",
+                              help="A query klipjének frame-jei is szerepelhetnek")
+
+    info_parser = subparsers.add_parser("info", help="Az index összesítése")
+    info_parser.add_argument("index", help="Index könyvtár")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        try:
+            meta = build_index(args.index, args.datasets, nlist=args.nlist, lip_weight=args.lip_weight,
+                               blend_weight=args.blend_weight, sample_rows=args.sample_rows)
+        except ValueError as e:
+            print(f"❌ {e}")
+            raise SystemExit(1)
+        print(f"✅ Index kész: {meta['total_rows']} sor, {len(meta['speakers'])} speaker, "
+              f"{len(meta['words'])} szó, {meta['nlist']} lista -> {args.index}")
+
+    elif args.command == "query":
+        speaker, video, frame_idx = args.frame.rsplit("/", 2)
+        index = MouthPoseIndex(args.index)
+        started = time.perf_counter()
+        try:
+            matches = index.search_frame(speaker, video, int(frame_idx), k=args.k, nprobe=args.nprobe,
+                                         speakers=_split_names(args.speakers), words=_split_names(args.words),
+                                         exclude_same_video=not args.include_same_video)
+        except KeyError as e:
+            print(f"❌ {e.args[0]}")
+            raise SystemExit(1)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"\n🔎 {args.frame}: {len(matches)} találat ({elapsed_ms:.1f} ms)")
+        for rank, match in enumerate(matches, 1):
+            label = f"{match.speaker}/{match.video}/{match.frame_idx}"
+            print(f"   {rank:3d}. {label:<28} {match.word:<10} {match.distance:.4f}")
+
+    elif args.command == "info":
+        meta = _read_index(args.index)
+        print(f"📦 {args.index}: {meta['total_rows']} sor, {meta['nlist']} lista, dim {meta['dim']}, "
+              f"{len(meta['batches'])} batch, {len(meta['sources'])} part")
+        print(f"   Speakerek ({len(meta['speakers'])}): {', '.join(meta['speakers'])}")
+        print(f"   Szavak: {len(meta['words'])}, súlyok: ajak {meta['lip_weight']}, blend {meta['blend_weight']}")
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Nyers landmarker kimenetek tartalom-címzett tára (content-addressed store)
+
+Az extractor videónként elmenti a Face Landmarker nyers kimenetét
+(normalizált landmarkok, blend shape-ek, detektálás flag). A kulcs a videó
+tartalmának, a modell fájlnak és a landmarker beállításainak hash-e, így ha
+ezek nem változnak, a MediaPipe-ot nem kell újra futtatni.
+
+Ha a kimeneti séma változik (új oszlop, más normalizálás, stb.), a dataset
+a tárból újraépíthető, az összes CPU magon:
+
+    python raw_store.py export --format csv --output mouth_data.csv
+    python raw_store.py export --format columnar --output mouth_columnar/
+    python raw_store.py export --format clips --output mouth_clips/
+"""
+
+import os
+import csv
+import json
+import hashlib
+import argparse
+import threading
+import numpy as np
+from functools import partial
+from multiprocessing import Pool, cpu_count
+
+from frame_processor import build_mouth_data, resolve_landmark_indices
+from dataset_io import (
+    CSV_DELIMITER, FEATURE_SETS, DEFAULT_CSV_DECIMALS, parse_align_file, find_word_for_frame, mouth_data_to_csv_row,
+    make_output_selection, csv_header, find_align_path
+)
+from corpus_archive import open_input, split_member_path
+
+# -------------------- Beállítások --------------------
+RAW_STORE_DIR = "D:/MestInt/word_tomoutmap/raw_store"
+ALIGN_BASE = "D:/MestInt/datasets/gridcorpus/align"
+
+STORE_FORMAT_VERSION = 1
+
+_file_hash_cache = {}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Egy fájl tartalmának SHA-256 hash-e (hex)."""
+    h = hashlib.sha256()
+    # Archívum tag is lehet: a hash ugyanaz, mint a kicsomagolt fájlé, így a tár kulcsok nem változnak
+    with open_input(path) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_identity(path):
+    """
+    (abszolút útvonal, méret, mtime_ns) - ha nem változik, a tartalom hash-e sem.
+    Archívum tagnál az archívum fájl mérete / ideje, a tag névvel együtt.
+    """
+    archive_path, member = split_member_path(path)
+    stat = os.stat(archive_path)
+    name = os.path.abspath(archive_path) + (f"::{member}" if member else "")
+    return name, stat.st_size, stat.st_mtime_ns
+
+
+def cached_file_sha256(path):
+    """file_sha256, processzenként cache-elve (a modell fájlhoz)."""
+    cache_key = file_identity(path)
+    if cache_key not in _file_hash_cache:
+        _file_hash_cache[cache_key] = file_sha256(path)
+    return _file_hash_cache[cache_key]
+
+
+def landmarker_options_fingerprint(options):
+    """
+    A FaceLandmarkerOptions eredményt befolyásoló mezői JSON-kompatibilis dict-ként.
+    """
+    running_mode = getattr(options, "running_mode", None)
+    return {
+        "running_mode": getattr(running_mode, "name", str(running_mode)),
+        "num_faces": getattr(options, "num_faces", None),
+        "min_face_detection_confidence": getattr(options, "min_face_detection_confidence", None),
+        "min_face_presence_confidence": getattr(options, "min_face_presence_confidence", None),
+        "min_tracking_confidence": getattr(options, "min_tracking_confidence", None),
+        "output_face_blendshapes": getattr(options, "output_face_blendshapes", None),
+    }
+
+
+def _store_key(video_digest, model_path, fingerprint, extra):
+    h = hashlib.sha256()
+    h.update(f"v{STORE_FORMAT_VERSION}\n".encode())
+    h.update(video_digest.encode())
+    h.update(cached_file_sha256(model_path).encode())
+    h.update(json.dumps(fingerprint, sort_keys=True).encode())
+    if extra:
+        h.update(json.dumps(extra, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def compute_store_key(video_path, model_path, options, extra=None, store=None):
+    """
+    Tár kulcs: hash(videó tartalom + modell fájl + landmarker beállítások).
+    extra: egyéb, az eredményt befolyásoló beállítások (pl. AdaptiveDetector.settings()).
+    store: ha meg van adva, a videó hash-e a tár digest cache-éből jön (RawResultStore.file_digest).
+    """
+    video_digest = store.file_digest(video_path) if store is not None else file_sha256(video_path)
+    return _store_key(video_digest, model_path, landmarker_options_fingerprint(options), extra)
+
+
+def lookup_store_key(store, video_path, model_path, options, extra=None):
+    """
+    (kulcs, van-e a tárban) a kéréshez. Blend shape-ek nélküli kérést (pl. --columns lips) egy
+    blend shape-ekkel készült bejegyzés is kiszolgál: a landmarkok ugyanazok, a felesleges blend
+    shape-eket az újraépítés eldobja. Ha egyik sincs meg, a kéréshez tartozó (mentendő) kulcs jön.
+    """
+    video_digest = store.file_digest(video_path)
+    fingerprint = landmarker_options_fingerprint(options)
+    key = _store_key(video_digest, model_path, fingerprint, extra)
+    if store.has(key):
+        return key, True
+    if not fingerprint["output_face_blendshapes"]:
+        full_key = _store_key(video_digest, model_path, dict(fingerprint, output_face_blendshapes=True), extra)
+        if store.has(full_key):
+            return full_key, True
+    return key, False
+
+
+class RawVideoRecorder:
+    """
+    Egy videó nyers landmarker kimeneteit gyűjti, frame-enként sorrendben.
+    """
+
+    def __init__(self, width=0, height=0, fps=0.0):
+        self.set_video_info(width, height, fps)
+        self.landmarks = []
+        self.detected = []
+        self.blend_scores = []
+        self.blend_shape_names = None
+
+    def set_video_info(self, width, height, fps):
+        """A videó méretei és fps-e (ha a recorder a videó megnyitása előtt készül)."""
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps)
+
+    def add(self, raw):
+        """
+        Args:
+            raw: a detect_raw() kimenete, vagy None ha nem volt arc.
+        """
+        if raw is None:
+            self.landmarks.append(None)
+            self.detected.append(False)
+            self.blend_scores.append(None)
+            return
+
+        landmark_array, blend_shape_values = raw
+        if self.blend_shape_names is None and blend_shape_values:
+            self.blend_shape_names = list(blend_shape_values.keys())
+        self.landmarks.append(np.asarray(landmark_array, dtype=np.float32))
+        self.detected.append(True)
+        self.blend_scores.append(blend_shape_values)
+
+    def to_arrays(self):
+        """A gyűjtött adatok tömör numpy formában (a tárba mentéshez)."""
+        num_frames = len(self.detected)
+        names = self.blend_shape_names or []
+        num_landmarks = next((lm.shape[0] for lm in self.landmarks if lm is not None), 0)
+
+        landmarks = np.full((num_frames, num_landmarks, 3), np.nan, dtype=np.float32)
+        blend_shapes = np.zeros((num_frames, len(names)), dtype=np.float32)
+        for i, (lm, scores) in enumerate(zip(self.landmarks, self.blend_scores)):
+            if lm is None:
+                continue
+            landmarks[i] = lm
+            if names:
+                blend_shapes[i] = [scores.get(name, 0.0) for name in names]
+
+        return {
+            "landmarks": landmarks,
+            "detected": np.asarray(self.detected, dtype=bool),
+            "blend_shapes": blend_shapes,
+            "blend_shape_names": np.array(names, dtype=str),
+            "frame_size": np.array([self.width, self.height], dtype=np.int32),
+            "fps": np.array(self.fps, dtype=np.float64),
+        }
+
+
+class RawResultStore:
+    """
+    Tartalom-címzett tár a nyers landmarker kimenetekhez.
+
+    Szerkezet:
+        <root>/objects/<kulcs[:2]>/<kulcs>.npz   - a nyers tömbök
+        <root>/sources/<speaker>/<video>.json    - corpus hely -> kulcs
+        <root>/digests/<id[:2]>/<id>.txt         - videó (útvonal, méret, mtime_ns) -> tartalom hash
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "sources"), exist_ok=True)
+        os.makedirs(os.path.join(root, "digests"), exist_ok=True)
+
+    def file_digest(self, path):
+        """
+        file_sha256, futások között cache-elve: amíg a fájl útvonala, mérete és mtime_ns-e nem
+        változik, a videót nem olvassuk végig újra.
+        """
+        identity = hashlib.sha256(json.dumps(file_identity(path)).encode()).hexdigest()
+        digest_path = os.path.join(self.root, "digests", identity[:2], f"{identity}.txt")
+        if os.path.exists(digest_path):
+            with open(digest_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        digest = file_sha256(path)
+        os.makedirs(os.path.dirname(digest_path), exist_ok=True)
+        tmp_path = f"{digest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(digest)
+        os.replace(tmp_path, digest_path)
+        return digest
+
+    def path_for(self, key):
+        return os.path.join(self.root, "objects", key[:2], f"{key}.npz")
+
+    def has(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def save(self, key, recorder):
+        """A recorder tartalmának atomikus mentése a kulcs alá."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Szálas módban több szál is menthet ugyanabból a processből
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **recorder.to_arrays())
+        os.replace(tmp_path, path)
+
+    def load(self, key):
+        """A tárolt nyers kimenet betöltése dict-ként."""
+        with np.load(self.path_for(key), allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    def register_source(self, key, speaker, video_file):
+        """Feljegyzi, hogy a corpus adott videójához melyik kulcs tartozik."""
+        source_dir = os.path.join(self.root, "sources", speaker)
+        os.makedirs(source_dir, exist_ok=True)
+        path = os.path.join(source_dir, f"{video_file}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"speaker": speaker, "video": video_file, "key": key}, f)
+
+    def source_key(self, speaker, video_file):
+        """A corpus adott videójához feljegyzett kulcs (None, ha nincs, vagy az objektum hiányzik)."""
+        path = os.path.join(self.root, "sources", speaker, f"{video_file}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            key = json.load(f)["key"]
+        return key if self.has(key) else None
+
+    def source_videos(self, speaker):
+        """Az adott speaker tárba feljegyzett videói (halmaz, a sources fájlnevekből)."""
+        speaker_dir = os.path.join(self.root, "sources", speaker)
+        if not os.path.isdir(speaker_dir):
+            return set()
+        return {name[:-len(".json")] for name in os.listdir(speaker_dir) if name.endswith(".json")}
+
+    def iter_sources(self):
+        """
+        Yield: (speaker, video_file, key), speaker és videó szerint rendezve.
+        """
+        sources_dir = os.path.join(self.root, "sources")
+        for speaker in sorted(os.listdir(sources_dir)):
+            speaker_dir = os.path.join(sources_dir, speaker)
+            if not os.path.isdir(speaker_dir):
+                continue
+            for name in sorted(os.listdir(speaker_dir)):
+                if not name.endswith(".json"):
+                    continue
+                with open(os.path.join(speaker_dir, name), "r", encoding="utf-8") as f:
+                    source = json.load(f)
+                if self.has(source["key"]):
+                    yield source["speaker"], source["video"], source["key"]
+
+
+def iter_stored_mouth_data(record, selection=None, as_arrays=False):
+    """
+    A tárolt nyers kimenetből frame-enként újraszámolja a mouth_data-t.
+    selection: OutputSelection - csak a kiválasztott mezők / landmarkok készülnek el.
+    Yield: (frame_idx, mouth_data) - csak a detektált frame-ekre
+    """
+    fields = selection.fields if selection is not None else None
+    landmark_indices = selection.landmark_indices if selection is not None else None
+    width, height = (int(v) for v in record["frame_size"])
+    names = [str(name) for name in record["blend_shape_names"]]
+    landmarks = record["landmarks"]
+    blend_shapes = record["blend_shapes"]
+    for frame_idx in np.flatnonzero(record["detected"]):
+        blend_shape_values = dict(zip(names, blend_shapes[frame_idx].tolist()))
+        yield int(frame_idx), build_mouth_data(
+            landmarks[frame_idx], blend_shape_values, width, height,
+            fields=fields, landmark_indices=landmark_indices, as_arrays=as_arrays)
+
+
+def rebuild_video_records(record, speaker, video_file, word_list, selection=None, as_arrays=False):
+    """
+    Ugyanazok a (speaker, video, frame_idx, word, mouth_data) rekordok, amiket
+    a process_speaker írna ki, csak inferencia nélkül.
+    """
+    fps = float(record["fps"])
+    records = []
+    for frame_idx, mouth_data in iter_stored_mouth_data(record, selection=selection, as_arrays=as_arrays):
+        word = find_word_for_frame(word_list, frame_idx, fps)
+        if word is None:
+            continue
+        records.append((speaker, video_file, frame_idx, word, mouth_data))
+    return records
+
+
+# -------------------- Export (worker függvények) --------------------
+def _load_video_records(task, as_arrays=False):
+    store_root, align_base, speaker, video_file, key, selection = task
+    align_path = find_align_path(align_base, speaker, video_file)
+    if align_path is None:
+        print(f"[{speaker}] Missing align file for {video_file}, skipping...")
+        return []
+    record = RawResultStore(store_root).load(key)
+    return rebuild_video_records(record, speaker, video_file, parse_align_file(align_path),
+                                 selection=selection, as_arrays=as_arrays)
+
+
+def _export_csv_rows(task, decimals=None):
+    selection = task[5]
+    return [mouth_data_to_csv_row(*rec, selection=selection, decimals=decimals)
+            for rec in _load_video_records(task, as_arrays=decimals is not None)]
+
+
+def _export_columns(task):
+    from columnar_dataset import records_to_columns
+    records = _load_video_records(task)
+    return records_to_columns(records, selection=task[5]) if records else None
+
+
+def _export_clip(task):
+    from columnar_dataset import records_to_columns
+    with_mouth_features, output_dir = task[-2:]
+    records = _load_video_records(task[:-2])
+    if not records:
+        return 0
+    speaker, video_file = task[2], task[3]
+    clip_dir = os.path.join(output_dir, speaker)
+    os.makedirs(clip_dir, exist_ok=True)
+    clip_path = os.path.join(clip_dir, os.path.splitext(video_file)[0] + ".npz")
+    arrays = records_to_columns(records, selection=task[5])
+    if with_mouth_features:
+        from mouth_features import columnar_mouth_features
+        arrays["mouth_features"] = columnar_mouth_features(arrays)
+    np.savez(clip_path, **arrays)
+    return len(records)
+
+
+def export_dataset(store_root, align_base, output, fmt="csv", workers=None, with_mouth_features=False,
+                   selection=None, decimals=None):
+    """
+    A dataset újraépítése a tárból, MediaPipe futtatása nélkül.
+
+    Args:
+        fmt: "csv" (mouth_data.csv formátum), "columnar" vagy "clips" (videónként egy .npz)
+        with_mouth_features: columnar / clips esetén a mouth_features oszlop is elkészül
+        selection: OutputSelection (--columns / --landmarks), None = minden oszlop
+        decimals: csv esetén a gyors, fix tizedesjegyű JSON írás (lásd mouth_data_to_csv_row)
+    Returns:
+        int: a kiírt sorok száma
+    """
+    store = RawResultStore(store_root)
+    tasks = [(store_root, align_base, speaker, video_file, key, selection)
+             for speaker, video_file, key in store.iter_sources()]
+    workers = workers or cpu_count()
+    print(f"📦 {len(tasks)} videó a tárban, export: {fmt} -> {output} ({workers} process)")
+
+    total_rows = 0
+    with Pool(processes=workers) as pool:
+        if fmt == "csv":
+            with open(output, "w", newline="", encoding="utf-8") as csvfile:
+                writer = csv.writer(csvfile, delimiter=CSV_DELIMITER)
+                writer.writerow(csv_header(selection))
+                export_rows = partial(_export_csv_rows, decimals=decimals)
+                for rows in pool.imap(export_rows, tasks, chunksize=4):
+                    writer.writerows(rows)
+                    total_rows += len(rows)
+        elif fmt == "columnar":
+            from columnar_dataset import ColumnarWriter, selection_columns
+            with ColumnarWriter(output, columns=selection_columns(selection),
+                                with_mouth_features=with_mouth_features,
+                                landmark_indices=selection.landmark_indices if selection else None) as writer:
+                for arrays in pool.imap(_export_columns, tasks, chunksize=4):
+                    if arrays is not None:
+                        writer.append_columns(arrays)
+            total_rows = writer.total_rows
+        elif fmt == "clips":
+            os.makedirs(output, exist_ok=True)
+            clip_tasks = [task + (with_mouth_features, output) for task in tasks]
+            for count in pool.imap_unordered(_export_clip, clip_tasks, chunksize=4):
+                total_rows += count
+        else:
+            raise ValueError(f"Ismeretlen export formátum: {fmt}")
+
+    print(f"✅ Export kész: {total_rows} sor")
+    return total_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nyers landmarker tár kezelése")
+    parser.add_argument("--store", default=RAW_STORE_DIR, help="A tár gyökérkönyvtára")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Dataset újraépítése a tárból")
+    export_parser.add_argument("--format", choices=["csv", "columnar", "clips"], default="csv")
+    export_parser.add_argument("--output", required=True)
+    export_parser.add_argument("--align-base", default=ALIGN_BASE)
+    export_parser.add_argument("--workers", type=int, default=None)
+    export_parser.add_argument("--with-features", action="store_true",
+                               help="mouth_features oszlop (száj geometria + sebesség) columnar / clips exporthoz")
+    export_parser.add_argument("--columns", default=None,
+                               help="Csak ezek az oszlopok / csoportok, pl. mouth,3d_landmarks "
+                                    f"(csoportok: {', '.join(FEATURE_SETS)})")
+    export_parser.add_argument("--landmarks", default=None,
+                               help="Landmark részhalmaz a landmark oszlopokhoz (lips, lips_jaw vagy indexek)")
+    export_parser.add_argument("--fast-csv", action="store_true",
+                               help="Gyors CSV írás fix tizedesjegyekkel (DEFAULT_CSV_DECIMALS), json.loads-kompatibilis")
+    export_parser.add_argument("--csv-decimals", type=int, default=None,
+                               help="--fast-csv: minden oszlop ennyi tizedessel")
+
+    subparsers.add_parser("info", help="A tár tartalmának összesítése")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        try:
+            selection = None
+            if args.columns or args.landmarks:
+                selection = make_output_selection(args.columns, resolve_landmark_indices(args.landmarks))
+        except ValueError as e:
+            parser.error(str(e))
+        if args.with_features and selection is not None and (
+                selection.landmark_indices is not None
+                or not {"3d_landmarks", "pixel_landmarks"} <= set(selection.columns)):
+            parser.error("--with-features needs all 478 points of 3d_landmarks and pixel_landmarks")
+        export_dataset(args.store, args.align_base, args.output,
+                       fmt=args.format, workers=args.workers, with_mouth_features=args.with_features,
+                       selection=selection,
+                       decimals=args.csv_decimals if args.csv_decimals is not None
+                       else (DEFAULT_CSV_DECIMALS if args.fast_csv else None))
+    elif args.command == "info":
+        sources = list(RawResultStore(args.store).iter_sources())
+        speakers = sorted({speaker for speaker, _, _ in sources})
+        print(f"📦 {args.store}: {len(sources)} videó, {len(speakers)} speaker")
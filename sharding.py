@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Determinisztikus corpus sharding több gépre
+
+A videókat (nem a speakereket!) frame szám szerint kiegyensúlyozva osztjuk
+N shardra. Ugyanazon a corpuson minden gép ugyanazt a kiosztást kapja, így
+elég mindegyiken a saját --shard-index-szel elindítani a feldolgozást:
+
+    python dataset_processor_multithread.py --num-shards 4 --shard-index 0
+    python dataset_processor_multithread.py --num-shards 4 --shard-index 1
+    ...
+
+Minden shard külön CSV-t és manifestet ír. A végén:
+
+    python sharding.py verify --num-shards 4
+    python sharding.py merge --num-shards 4 --output mouth_data.csv
+
+A verify jelzi a hiányzó (egyik shardban sincs) és duplikált (több shardban
+is szerepel) videókat, illetve a hiányzó/befejezetlen shardokat.
+"""
+
+import os
+import csv
+import json
+import hashlib
+import argparse
+
+import numpy as np
+
+from dataset_io import CSV_HEADER, CSV_DELIMITER, iter_corpus_videos
+from compressed_io import COMPRESSIONS, BackgroundWriter, compressed_path, open_text_input, resolve_input_path
+
+# -------------------- Beállítások --------------------
+VIDEO_BASE = "D:/MestInt/datasets/gridcorpus/video"
+ALIGN_BASE = "D:/MestInt/datasets/gridcorpus/align"
+OUTPUT_CSV = "D:/MestInt/word_tomoutmap/mouth_data.csv"
+
+PLAN_VERSION = 1
+
+
+def count_video_frames(video_path):
+    """Frame szám a konténer metaadataiból (dekódolás nélkül); archívum tagra is (corpus_archive)."""
+    # Lusta import: a merge / manifest parancsokhoz nem kell mediapipe (video_stream -> frame_processor)
+    from video_stream import VideoFrameReader
+    with VideoFrameReader(video_path) as reader:
+        return max(reader.frame_count, 0)
+
+
+def assign_shards(videos, num_shards):
+    """
+    Videók kiosztása shardokra frame szám szerint kiegyensúlyozva (LPT mohó algoritmus).
+
+    Args:
+        videos: [(speaker, video_file, frame_count), ...]
+    Returns:
+        list: shard index -> [(speaker, video_file, frame_count), ...] (rendezve)
+    """
+    shards = [[] for _ in range(num_shards)]
+    loads = [0] * num_shards
+    # Csökkenő frame szám, holtversenynél név szerint - így determinisztikus
+    for speaker, video_file, frame_count in sorted(videos, key=lambda v: (-v[2], v[0], v[1])):
+        target = min(range(num_shards), key=lambda i: (loads[i], i))
+        shards[target].append((speaker, video_file, frame_count))
+        loads[target] += frame_count
+    return [sorted(shard) for shard in shards]
+
+
+def build_shard_plan(video_base, align_base, num_shards, speakers=None):
+    """
+    A teljes corpus kiosztási terve (minden gépen ugyanaz az eredmény).
+    """
+    videos = [(speaker, video_file, count_video_frames(video_path))
+              for speaker, video_file, video_path, _ in
+              iter_corpus_videos(video_base, align_base, speakers=speakers, verbose=False)]
+    shards = assign_shards(videos, num_shards)
+    plan = {
+        "version": PLAN_VERSION,
+        "num_shards": num_shards,
+        "shards": [
+            {
+                "shard_index": i,
+                "frames": sum(v[2] for v in shard),
+                "videos": [{"speaker": s, "video": v, "frames": f} for s, v, f in shard],
+            }
+            for i, shard in enumerate(shards)
+        ],
+    }
+    plan["fingerprint"] = plan_fingerprint(plan)
+    return plan
+
+
+def plan_fingerprint(plan):
+    """A kiosztás hash-e - a merge ellenőrzi, hogy minden shard ugyanazzal a tervvel futott."""
+    h = hashlib.sha256()
+    for shard in plan["shards"]:
+        for video in shard["videos"]:
+            h.update(f"{shard['shard_index']}/{video['speaker']}/{video['video']}\n".encode())
+    return h.hexdigest()[:16]
+
+
+def load_or_build_plan(plan_path, video_base, align_base, num_shards):
+    """
+    Ha van előre elkészített terv fájl (python sharding.py plan), azt használjuk,
+    különben minden gép maga számolja ki ugyanazt.
+    """
+    if plan_path and os.path.exists(plan_path):
+        with open(plan_path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        if plan["num_shards"] != num_shards:
+            raise ValueError(f"A terv {plan['num_shards']} shardra készült, nem {num_shards}-ra: {plan_path}")
+        return plan
+    return build_shard_plan(video_base, align_base, num_shards)
+
+
+def shard_videos_by_speaker(plan, shard_index):
+    """
+    Egy shard videói speakerenként csoportosítva: {speaker: [video_file, ...]}
+    """
+    by_speaker = {}
+    for video in plan["shards"][shard_index]["videos"]:
+        by_speaker.setdefault(video["speaker"], []).append(video["video"])
+    return by_speaker
+
+
+def shard_output_path(output_csv, shard_index, num_shards):
+    """mouth_data.csv -> mouth_data.shard-00001-of-00004.csv"""
+    base, ext = os.path.splitext(output_csv)
+    return f"{base}.shard-{shard_index:05d}-of-{num_shards:05d}{ext}"
+
+
+def shard_manifest_path(output_csv, shard_index, num_shards):
+    return shard_output_path(output_csv, shard_index, num_shards) + ".manifest.json"
+
+
+def write_shard_manifest(output_csv, plan, shard_index, video_rows):
+    """
+    A shard manifestje: mely videók kerültek bele, hány sorral.
+
+    Args:
+        video_rows: [(speaker, video_file, rows), ...]
+    """
+    num_shards = plan["num_shards"]
+    manifest = {
+        "num_shards": num_shards,
+        "shard_index": shard_index,
+        "plan_fingerprint": plan["fingerprint"],
+        "output": os.path.basename(shard_output_path(output_csv, shard_index, num_shards)),
+        "videos": [{"speaker": s, "video": v, "rows": r} for s, v, r in video_rows],
+        "total_rows": sum(r for _, _, r in video_rows),
+        "complete": True,
+    }
+    path = shard_manifest_path(output_csv, shard_index, num_shards)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def verify_shards(output_csv, num_shards, plan=None):
+    """
+    A shard manifestek ellenőrzése.
+
+    Returns:
+        dict: {"ok", "missing_shards", "missing_videos", "duplicate_videos", "unexpected_videos", "total_rows"}
+    """
+    missing_shards = []
+    fingerprints = set()
+    seen = {}
+    total_rows = 0
+    for shard_index in range(num_shards):
+        path = shard_manifest_path(output_csv, shard_index, num_shards)
+        if not os.path.exists(path):
+            missing_shards.append(shard_index)
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if not manifest.get("complete"):
+            missing_shards.append(shard_index)
+            continue
+        fingerprints.add(manifest["plan_fingerprint"])
+        total_rows += manifest["total_rows"]
+        for video in manifest["videos"]:
+            seen.setdefault((video["speaker"], video["video"]), []).append(shard_index)
+
+    duplicate_videos = sorted(key for key, shards in seen.items() if len(shards) > 1)
+    missing_videos = []
+    unexpected_videos = []
+    if plan is not None:
+        expected = {(v["speaker"], v["video"]) for shard in plan["shards"] for v in shard["videos"]}
+        missing_videos = sorted(expected - set(seen))
+        unexpected_videos = sorted(set(seen) - expected)
+        fingerprints.add(plan["fingerprint"])
+
+    report = {
+        "ok": not (missing_shards or missing_videos or duplicate_videos or unexpected_videos)
+              and len(fingerprints) <= 1,
+        "missing_shards": missing_shards,
+        "missing_videos": missing_videos,
+        "duplicate_videos": duplicate_videos,
+        "unexpected_videos": unexpected_videos,
+        "plan_fingerprints": sorted(fingerprints),
+        "total_rows": total_rows,
+    }
+    return report
+
+
+def print_verify_report(report):
+    print(f"\n{'='*70}")
+    print(f"{'✅' if report['ok'] else '❌'} Shard ellenőrzés: {report['total_rows']} sor")
+    if report["missing_shards"]:
+        print(f"   Hiányzó / befejezetlen shardok: {report['missing_shards']}")
+    if len(report["plan_fingerprints"]) > 1:
+        print(f"   Eltérő kiosztási tervek: {report['plan_fingerprints']}")
+    for label, key in (("Hiányzó videók", "missing_videos"),
+                       ("Duplikált videók", "duplicate_videos"),
+                       ("Nem várt videók", "unexpected_videos")):
+        if report[key]:
+            print(f"   {label}: {len(report[key])}")
+            for speaker, video_file in report[key][:20]:
+                print(f"      {speaker}/{video_file}")
+    print(f"{'='*70}\n")
+
+
+def merge_shards(output_csv, num_shards, merged_csv=None, compression=None, level=None):
+    """
+    A shard CSV-k összefűzése egyetlen mouth_data.csv-be (shard sorrendben).
+    A (tömörített) shardokat a végződésük / tartalmuk alapján olvassuk; compression esetén a kimenet is tömörített.
+    """
+    merged_csv = compressed_path(merged_csv or output_csv, compression)
+    header = None
+    with BackgroundWriter(merged_csv, compression=compression, level=level) as writer:
+        for shard_index in range(num_shards):
+            shard_csv = resolve_input_path(shard_output_path(output_csv, shard_index, num_shards))
+            with open_text_input(shard_csv) as infile:
+                reader = csv.reader(infile, delimiter=CSV_DELIMITER)
+                # A fejléc a shardokból jön (--columns esetén nem a teljes CSV_HEADER)
+                shard_header = next(reader, None) or CSV_HEADER
+                if header is None:
+                    header = shard_header
+                    writer.writerow(header)
+                elif shard_header != header:
+                    raise ValueError(f"A shard oszlopai eltérnek: {shard_csv}")
+                for row in reader:
+                    writer.writerow(row)
+            print(f"Merged shard {shard_index}")
+
+    # A shardok jellemző statisztikái (ha készültek) is összevonhatók, a merge-elt CSV mellé
+    from feature_stats import state_path, merge_state_files
+    states = [state_path(shard_output_path(output_csv, shard_index, num_shards)) for shard_index in range(num_shards)]
+    states = [path for path in states if os.path.exists(path)]
+    if states:
+        merge_state_files(states).save(state_path(merged_csv))
+        print(f"Merged feature stats of {len(states)}/{num_shards} shards -> {state_path(merged_csv)}")
+
+    # Száj kivágások (--mouth-crops): csak ha minden shardnak van, különben a sorok elcsúsznának
+    from mouth_crops import crops_path, load_crops, npy_header
+    shard_crops = [load_crops(shard_output_path(output_csv, shard_index, num_shards))
+                   for shard_index in range(num_shards)]
+    if all(crops is not None for crops in shard_crops):
+        rows = sum(len(crops) for crops in shard_crops)
+        with BackgroundWriter(crops_path(merged_csv)) as writer:
+            writer.write(npy_header((rows,) + shard_crops[0].shape[1:]))
+            for crops in shard_crops:
+                for start in range(0, len(crops), 4096):
+                    writer.write(np.ascontiguousarray(crops[start:start + 4096]))
+        print(f"Merged mouth crops of {num_shards} shards ({rows} rows) -> {crops_path(merged_csv)}")
+    elif any(crops is not None for crops in shard_crops):
+        print("⚠️  Nem minden shardnak van kivágás fájlja, a kivágások nincsenek összefűzve")
+    return merged_csv
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corpus sharding: terv, ellenőrzés, összefűzés")
+    parser.add_argument("command", choices=["plan", "verify", "merge"])
+    parser.add_argument("--num-shards", type=int, required=True)
+    parser.add_argument("--output-csv", default=OUTPUT_CSV,
+                        help="A shardolt futás alap kimenete (ebből képződnek a shard fájlnevek)")
+    parser.add_argument("--output", default=None, help="merge: az összefűzött CSV (alapból --output-csv)")
+    parser.add_argument("--plan", default=None, help="Kiosztási terv JSON fájl")
+    parser.add_argument("--video-base", default=VIDEO_BASE)
+    parser.add_argument("--align-base", default=ALIGN_BASE)
+    parser.add_argument("--force", action="store_true", help="merge hibás ellenőrzés esetén is")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="none",
+                        help="merge: az összefűzött CSV tömörítése")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        plan = build_shard_plan(args.video_base, args.align_base, args.num_shards)
+        plan_path = args.plan or os.path.splitext(args.output_csv)[0] + ".shard_plan.json"
+        with open(plan_path, "w", encoding="utf-8") as f:
+            json.dump(plan, f, indent=2)
+        for shard in plan["shards"]:
+            print(f"   shard {shard['shard_index']}: {len(shard['videos'])} videó, {shard['frames']} frame")
+        print(f"✅ Terv mentve: {plan_path} ({plan['fingerprint']})")
+    else:
+        plan = None
+        if args.plan or os.path.isdir(args.video_base):
+            plan = load_or_build_plan(args.plan, args.video_base, args.align_base, args.num_shards)
+        report = verify_shards(args.output_csv, args.num_shards, plan=plan)
+        print_verify_report(report)
+        if args.command == "merge":
+            if not report["ok"] and not args.force:
+                print("❌ A shardok hiányosak, merge kihagyva (--force a kényszerítéshez)")
+                raise SystemExit(1)
+            merged = merge_shards(args.output_csv, args.num_shards, merged_csv=args.output,
+                                  compression=args.compression)
+            print(f"✅ Összefűzve: {merged}")
+        raise SystemExit(0 if report["ok"] else 1)
@@ -0,0 +1,15 @@
+# A tesztek a repo gyökerében lévő modulokat importálják (nincs csomag / telepítés)
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def synthetic_clips(tmp_path_factory):
+    """Kevés, rövid szintetikus klip (verify_equivalence.make_synthetic_clips) - modell és corpus nélkül."""
+    from verify_equivalence import make_synthetic_clips
+    root = tmp_path_factory.mktemp("synthetic")
+    return str(root), make_synthetic_clips(str(root), num_clips=2, num_frames=40)
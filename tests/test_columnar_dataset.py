@@ -0,0 +1,39 @@
+import numpy as np
+
+from columnar_dataset import ColumnarWriter, read_manifest, load_part, selection_columns
+from dataset_io import make_output_selection, parse_align_file
+from verify_equivalence import SyntheticLandmarker
+from video_stream import iter_video_records
+
+
+def _write(tmp_path, clips, selection, **writer_kwargs):
+    output = str(tmp_path / "columnar")
+    speaker, video_file, video_path, align_path = clips[0]
+    records = list(iter_video_records(speaker, video_file, video_path, parse_align_file(align_path, sample_rate=25000),
+                                      SyntheticLandmarker(), selection=selection))
+    with ColumnarWriter(output, chunk_rows=16, **writer_kwargs) as writer:
+        for record in records:
+            writer.append(*record)
+    return output, len(records)
+
+
+def test_append_writes_only_selected_columns(tmp_path, synthetic_clips):
+    _, clips = synthetic_clips
+    selection = make_output_selection("mouth_center_x,mouth_center_y,blend_shapes")
+    output, rows = _write(tmp_path, clips, selection, columns=selection_columns(selection))
+    manifest = read_manifest(output)
+    assert manifest["total_rows"] == rows
+    part = load_part(output, manifest["parts"][0]["name"])
+    assert sorted(part) == sorted(["speaker", "video", "frame_idx", "word", "mouth_center", "blend_shapes"])
+    assert part["mouth_center"].shape[1:] == (2,)
+
+
+def test_append_keeps_landmark_subset(tmp_path, synthetic_clips):
+    _, clips = synthetic_clips
+    indices = [0, 13, 14, 61]
+    selection = make_output_selection("pixel_landmarks", landmark_indices=indices)
+    output, _ = _write(tmp_path, clips, selection, columns=selection_columns(selection), landmark_indices=indices)
+    manifest = read_manifest(output)
+    part = load_part(output, manifest["parts"][0]["name"])
+    assert part["pixel_landmarks"].shape[1:] == (len(indices), 2)
+    assert np.isfinite(part["pixel_landmarks"]).all()
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from feature_stats import RunningMoments, QuantileSketch, RELATIVE_ACCURACY
+
+
+@pytest.fixture
+def batches():
+    rng = np.random.default_rng(7)
+    return [rng.normal(loc, scale, size=(size, 3))
+            for loc, scale, size in ((0.0, 1.0, 50), (5.0, 0.1, 7), (-2.0, 3.0, 200))]
+
+
+def _moments(*parts):
+    moments = RunningMoments(3)
+    for part in parts:
+        moments.update(part)
+    return moments
+
+
+def _assert_moments_equal(a, b):
+    assert a.count == b.count
+    for name in ("mean", "m2", "min", "max"):
+        np.testing.assert_allclose(getattr(a, name), getattr(b, name), rtol=1e-12, atol=1e-12)
+
+
+def test_running_moments_match_numpy(batches):
+    values = np.concatenate(batches)
+    moments = _moments(*batches)
+    np.testing.assert_allclose(moments.mean, values.mean(axis=0))
+    np.testing.assert_allclose(moments.variance(ddof=1), values.var(axis=0, ddof=1))
+    np.testing.assert_array_equal(moments.min, values.min(axis=0))
+    np.testing.assert_array_equal(moments.max, values.max(axis=0))
+
+
+def test_running_moments_merge_is_associative(batches):
+    a, b, c = (_moments(part) for part in batches)
+    left = _moments(batches[0])
+    left.merge(b)
+    left.merge(c)
+    inner = _moments(batches[1])
+    inner.merge(c)
+    right = _moments(batches[0])
+    right.merge(inner)
+    _assert_moments_equal(left, right)
+    _assert_moments_equal(left, _moments(np.concatenate(batches)))
+
+
+def test_running_moments_merge_empty(batches):
+    moments = _moments(batches[0])
+    moments.merge(RunningMoments(3))
+    _assert_moments_equal(moments, _moments(batches[0]))
+    empty = RunningMoments(3)
+    empty.merge(moments)
+    _assert_moments_equal(empty, moments)
+    assert np.isnan(RunningMoments(3).variance(ddof=1)).all()
+
+
+def _sketch(*parts):
+    sketch = QuantileSketch(3)
+    for part in parts:
+        sketch.update(part)
+    return sketch
+
+
+def test_quantile_sketch_merge_is_associative_and_exact(batches):
+    left = _sketch(batches[0])
+    left.merge(_sketch(batches[1]))
+    left.merge(_sketch(batches[2]))
+    inner = _sketch(batches[1])
+    inner.merge(_sketch(batches[2]))
+    right = _sketch(batches[0])
+    right.merge(inner)
+    whole = _sketch(np.concatenate(batches))
+    for sketch in (right, whole):
+        np.testing.assert_array_equal(left.keys, sketch.keys)
+        np.testing.assert_array_equal(left.counts, sketch.counts)
+
+
+def test_quantile_sketch_relative_accuracy():
+    values = np.random.default_rng(3).lognormal(0.0, 1.0, size=(5000, 3)) * np.array([1.0, -1.0, 10.0])
+    qs = (0.01, 0.25, 0.5, 0.75, 0.99)
+    estimate = _sketch(values).quantiles(qs)
+    # Az estimate egy valódi minta bucketjéből jön: a rang szerinti mintához viszonyítva
+    exact = np.sort(values, axis=0)[(np.asarray(qs) * (len(values) - 1)).astype(int)]
+    np.testing.assert_allclose(estimate, exact, rtol=RELATIVE_ACCURACY * 1.01)
+
+
+def test_quantile_sketch_rejects_different_parameters():
+    with pytest.raises(ValueError):
+        QuantileSketch(3).merge(QuantileSketch(3, relative_accuracy=0.05))
+    assert np.isnan(QuantileSketch(2).quantiles((0.5,))).all()
@@ -0,0 +1,108 @@
+import csv
+import json
+
+import pytest
+
+from dataset_io import CSV_DELIMITER
+from sharding import (
+    assign_shards, build_shard_plan, plan_fingerprint, shard_videos_by_speaker, shard_output_path,
+    write_shard_manifest, verify_shards, merge_shards
+)
+
+VIDEOS = [("s1", f"v{i}.mpg", frames) for i, frames in enumerate((75, 75, 60, 90, 30, 75, 75, 10))]
+
+
+def test_assign_shards_covers_every_video_once_and_balances():
+    shards = assign_shards(VIDEOS, 3)
+    assigned = [video for shard in shards for video in shard]
+    assert sorted(assigned) == sorted(VIDEOS)
+    loads = [sum(frames for _, _, frames in shard) for shard in shards]
+    assert max(loads) - min(loads) <= max(frames for _, _, frames in VIDEOS)
+    assert all(shard == sorted(shard) for shard in shards)
+
+
+def test_assign_shards_is_deterministic():
+    assert assign_shards(VIDEOS, 3) == assign_shards(list(reversed(VIDEOS)), 3)
+    assert len(assign_shards(VIDEOS[:2], 4)) == 4
+
+
+def test_build_shard_plan_on_synthetic_corpus(synthetic_clips):
+    root, clips = synthetic_clips
+    plan = build_shard_plan(f"{root}/video", f"{root}/align", 2)
+    videos = {(video["speaker"], video["video"]) for shard in plan["shards"] for video in shard["videos"]}
+    assert videos == {(speaker, video_file) for speaker, video_file, _, _ in clips}
+    assert sum(shard["frames"] for shard in plan["shards"]) == 40 * len(clips)
+    assert plan["fingerprint"] == plan_fingerprint(plan)
+    by_speaker = shard_videos_by_speaker(plan, 0)
+    assert sum(len(files) for files in by_speaker.values()) == len(plan["shards"][0]["videos"])
+
+
+def _plan(num_shards):
+    shards = assign_shards(VIDEOS, num_shards)
+    plan = {"version": 1, "num_shards": num_shards,
+            "shards": [{"shard_index": i, "frames": sum(v[2] for v in shard),
+                        "videos": [{"speaker": s, "video": v, "frames": f} for s, v, f in shard]}
+                       for i, shard in enumerate(shards)]}
+    plan["fingerprint"] = plan_fingerprint(plan)
+    return plan
+
+
+def _write_shard(output_csv, plan, shard_index, header=("speaker", "video_file", "frame_idx", "word")):
+    videos = plan["shards"][shard_index]["videos"]
+    with open(shard_output_path(output_csv, shard_index, plan["num_shards"]), "w", newline="") as f:
+        writer = csv.writer(f, delimiter=CSV_DELIMITER)
+        writer.writerow(header)
+        for video in videos:
+            writer.writerow([video["speaker"], video["video"], 0, "bin"])
+    write_shard_manifest(output_csv, plan, shard_index,
+                         [(video["speaker"], video["video"], 1) for video in videos])
+
+
+def test_verify_and_merge_shards(tmp_path):
+    output_csv = str(tmp_path / "mouth_data.csv")
+    plan = _plan(3)
+    for shard_index in range(2):
+        _write_shard(output_csv, plan, shard_index)
+
+    report = verify_shards(output_csv, 3, plan=plan)
+    assert not report["ok"]
+    assert report["missing_shards"] == [2]
+    assert len(report["missing_videos"]) == len(plan["shards"][2]["videos"])
+
+    _write_shard(output_csv, plan, 2)
+    report = verify_shards(output_csv, 3, plan=plan)
+    assert report["ok"] and report["total_rows"] == len(VIDEOS)
+
+    merged = merge_shards(output_csv, 3)
+    with open(merged, newline="") as f:
+        rows = list(csv.reader(f, delimiter=CSV_DELIMITER))
+    assert rows[0] == ["speaker", "video_file", "frame_idx", "word"]
+    assert [row[1] for row in rows[1:]] == [video["video"] for shard in plan["shards"] for video in shard["videos"]]
+
+
+def test_verify_reports_duplicates_and_foreign_plans(tmp_path):
+    output_csv = str(tmp_path / "mouth_data.csv")
+    plan = _plan(2)
+    _write_shard(output_csv, plan, 0)
+    _write_shard(output_csv, plan, 1)
+    path = shard_output_path(output_csv, 1, 2) + ".manifest.json"
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["videos"].append(dict(manifest["videos"][0], video=plan["shards"][0]["videos"][0]["video"]))
+    manifest["plan_fingerprint"] = "other"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    report = verify_shards(output_csv, 2, plan=plan)
+    assert not report["ok"]
+    assert report["duplicate_videos"] == [("s1", plan["shards"][0]["videos"][0]["video"])]
+    assert len(report["plan_fingerprints"]) == 2
+
+
+def test_merge_rejects_mismatched_headers(tmp_path):
+    output_csv = str(tmp_path / "mouth_data.csv")
+    plan = _plan(2)
+    _write_shard(output_csv, plan, 0)
+    _write_shard(output_csv, plan, 1, header=("speaker", "video_file", "frame_idx", "word", "extra"))
+    with pytest.raises(ValueError):
+        merge_shards(output_csv, 2)
@@ -0,0 +1,92 @@
+import pytest
+
+from dataset_io import CSV_HEADER
+from verify_equivalence import (
+    DEFAULT_TOLERANCES, SyntheticLandmarker, run_reference, run_fast_path, compare_rows, check_regressions,
+    parse_tolerances
+)
+
+
+@pytest.fixture(scope="module")
+def reference(synthetic_clips):
+    _, clips = synthetic_clips
+    rows, _ = run_reference(clips, SyntheticLandmarker())
+    return rows
+
+
+def _problems(reference_rows, candidate_rows, tolerances=DEFAULT_TOLERANCES):
+    comparison = compare_rows(CSV_HEADER, reference_rows, CSV_HEADER, candidate_rows)
+    return comparison, check_regressions(comparison, tolerances)
+
+
+def test_reference_has_rows_and_skips_faceless_frames(reference):
+    # 2 x 40 frame, ebből klipenként 2 fekete (frame_idx % 17 == 16)
+    assert len(reference) == 2 * (40 - 2)
+    assert all(len(row) == len(CSV_HEADER) for row in reference)
+
+
+@pytest.mark.parametrize("paths", [["store"], ["fast-csv"]])
+def test_fast_paths_match_reference(synthetic_clips, reference, paths):
+    _, clips = synthetic_clips
+    candidate, _ = run_fast_path(clips, SyntheticLandmarker(), paths)
+    comparison, problems = _problems(reference, candidate)
+    assert problems == []
+    assert comparison["common_rows"] == len(reference)
+
+
+def test_store_with_fast_csv_adds_float32_error_to_rounding(synthetic_clips, reference):
+    # A tár float32-ben ment, a kerekítés fél tizedese mellé ennek hibája is hozzáadódik
+    _, clips = synthetic_clips
+    candidate, _ = run_fast_path(clips, SyntheticLandmarker(), ["store", "fast-csv"])
+    tolerances = {column: 1.1 * tolerance for column, tolerance in DEFAULT_TOLERANCES.items()}
+    _, problems = _problems(reference, candidate, tolerances)
+    assert problems == []
+
+
+def test_adaptive_path_within_adaptive_tolerances(synthetic_clips, reference):
+    _, clips = synthetic_clips
+    candidate, _ = run_fast_path(clips, SyntheticLandmarker(), ["adaptive"])
+    _, problems = _problems(reference, candidate, parse_tolerances(None, adaptive=True))
+    assert problems == []
+
+
+def test_unknown_or_conflicting_paths_are_rejected(synthetic_clips):
+    _, clips = synthetic_clips
+    with pytest.raises(ValueError):
+        run_fast_path(clips, SyntheticLandmarker(), ["nope"])
+    with pytest.raises(ValueError):
+        run_fast_path(clips, SyntheticLandmarker(), ["ffmpeg", "pyav"])
+
+
+def test_compare_rows_reports_dropped_rows_and_word_mismatches(reference):
+    word_col = CSV_HEADER.index("word")
+    candidate = [list(row) for row in reference[1:]]
+    candidate[0][word_col] = "other"
+    comparison, problems = _problems(reference, candidate)
+    assert comparison["dropped_rows"] == [[reference[0][0], reference[0][1], int(reference[0][2])]]
+    assert len(comparison["word_mismatches"]) == 1
+    assert len(problems) == 2
+
+
+def test_check_regressions_flags_column_deviation(reference):
+    column = CSV_HEADER.index("face_center_pixel")
+    candidate = [list(row) for row in reference]
+    candidate[3][column] = "[1000.0, 1000.0]"
+    comparison, problems = _problems(reference, candidate)
+    assert comparison["columns"]["face_center_pixel"]["max_abs"] > 100
+    assert [problem.split(":")[0] for problem in problems] == ["face_center_pixel"]
+    assert check_regressions(comparison, dict(DEFAULT_TOLERANCES, face_center_pixel=1e6)) == []
+
+
+def test_compare_rows_reports_frame_order(reference):
+    comparison, problems = _problems(reference, reference[::-1])
+    assert comparison["frame_order_mismatches"] > 0
+    assert any("sorrend" in problem for problem in problems)
+
+
+def test_parse_tolerances():
+    tolerances = parse_tolerances(["blend_shapes=0.5"])
+    assert tolerances["blend_shapes"] == 0.5
+    assert parse_tolerances(None, adaptive=True)["pixel_landmarks"] >= 1.0
+    with pytest.raises(ValueError):
+        parse_tolerances(["unknown_column=1"])
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Gyorsított kinyerési utak ellenőrzése a referencia úttal szemben
+
+Referencia: frame-enként process_frame_full_mouth + find_word_for_frame + a régi
+CSV író (mouth_data_to_csv_row, json.dumps teljes pontossággal). Ugyanazokon a
+klipeken lefut egy (vagy több, kombinált) gyors út is, majd összevetjük:
+    - oszloponként a legnagyobb és az átlagos abszolút eltérés (tolerancia oszloponként)
+    - szó hozzárendelés eltérések (ugyanaz a frame, más szó)
+    - frame sorrend eltérések (a közös frame-ek más sorrendben jönnek)
+    - hozzáadott / elhagyott sorok (pl. az adaptív detektálás máshol talál arcot)
+    - gyorsulás (referencia idő / gyors út idő)
+Regresszió esetén a kilépési kód 1.
+
+Gyors utak (vesszővel kombinálhatók, pl. --fast adaptive,fast-csv):
+    store     - nyers kimenet mentése + újraépítés a tárból (raw_store, float32 kerekítés)
+    adaptive  - AdaptiveDetector (ROI / kicsinyített / natív / kontrasztjavított; ~1 px eltérés, ADAPTIVE_TOLERANCES)
+    fast-csv  - fix tizedesjegyű CSV író (DEFAULT_CSV_DECIMALS)
+    ffmpeg    - ffmpeg pipe dekóder, közvetlenül RGB (cvtColor nélkül)
+    pyav      - PyAV dekóder, közvetlenül RGB (cvtColor nélkül)
+
+A --synthetic mód modell és corpus nélkül fut: generált klipeken (világos "arc"
+ellipszis sötét háttéren) egy determinisztikus SyntheticLandmarker dolgozik, ami a
+képen látható arc dobozba helyezi a landmarkokat, így a kivágás / kicsinyítés is
+ugyanazt a (frame-hez normalizált) eredményt kell adja.
+
+Két kész CSV is összevethető (pl. migráció vagy új serializer után):
+    python verify_equivalence.py --reference-csv mouth_data.csv --candidate-csv mouth_data_fast.csv
+
+Használat:
+    python verify_equivalence.py --fast fast-csv --speakers s1 --limit 5
+    python verify_equivalence.py --synthetic --fast adaptive --max-row-diff 0.05
+
+A szintetikus összevetés a tests/ alatt pytest tesztként is fut (python -m pytest -q).
+"""
+
+import os
+import csv
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+from frame_processor import (
+    create_landmarker, process_frame_full_mouth, AdaptiveDetector, BLEND_SHAPE_NAMES
+)
+from dataset_io import (
+    CSV_DELIMITER, CSV_HEADER, KEY_COLUMNS, DEFAULT_CSV_DECIMALS,
+    parse_align_file, find_word_for_frame, iter_corpus_videos, mouth_data_to_csv_row
+)
+from video_stream import VideoFrameReader, DECODER_BACKENDS, iter_video_records
+from raw_store import RawVideoRecorder, rebuild_video_records
+from compressed_io import open_text_input, resolve_input_path
+
+# -------------------- Beállítások --------------------
+VIDEO_BASE = "D:/MestInt/datasets/gridcorpus/video"
+ALIGN_BASE = "D:/MestInt/datasets/gridcorpus/align"
+MODEL_PATH = "face_landmarker.task"
+
+FAST_PATHS = ["store", "adaptive", "fast-csv", "ffmpeg", "pyav"]
+
+# Alapértelmezett tolerancia: a --fast-csv kerekítése (fél utolsó tizedes) még belefér,
+# a mouth_center egész pixel, annak egyeznie kell
+DEFAULT_TOLERANCES = dict({column: 0.5 * 10 ** -places for column, places in DEFAULT_CSV_DECIMALS.items()},
+                          mouth_center_x=0.0, mouth_center_y=0.0)
+# Az adaptive út a kicsinyített képen is elfogad arcot: ott a landmarkok ~1 natív pixelen belül
+# térnek el (pixel oszlopok), a normalizált / blend shape értékek ennek megfelelően kicsit
+ADAPTIVE_TOLERANCES = dict({column: 2.0 for column in (
+    "mouth_center_x", "mouth_center_y", "outer_lip_relative_points", "inner_lip_relative_points",
+    "pixel_landmarks", "relative_landmarks", "face_center_pixel")},
+    **{column: 0.01 for column in (
+        "blend_shapes", "mouth_blend_shapes", "eyes_blend_shapes", "brow_blend_shapes",
+        "face_shape_blend_shapes", "3d_landmarks", "face_center_3d")})
+# Lebegőpontos zaj a tolerancia határán (pl. 0.005 kerekítési hiba float-ban)
+TOLERANCE_EPS = 1e-9
+
+
+# -------------------- Szintetikus klipek --------------------
+class _Point:
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+class _Category:
+    def __init__(self, category_name, score):
+        self.category_name, self.score = category_name, score
+
+
+class _Result:
+    def __init__(self, face_landmarks, face_blendshapes):
+        self.face_landmarks, self.face_blendshapes = face_landmarks, face_blendshapes
+
+
+class SyntheticLandmarker:
+    """
+    A FaceLandmarker.detect() felületét utánzó, determinisztikus landmarker a szintetikus klipekhez.
+    Az arc a kép világos (> threshold) pixeleinek befoglaló doboza; a 478 pont egy rögzített
+    sablonból kerül bele, a képhez normalizálva. A blend shape-ek a doboz arányából jönnek.
+    """
+
+    def __init__(self, threshold=128, seed=0):
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.template = rng.random((478, 3))
+        self.blend_weights = rng.random(len(BLEND_SHAPE_NAMES))
+
+    def detect(self, mp_image):
+        image = mp_image.numpy_view()
+        mask = image.max(axis=2) > self.threshold
+        ys = np.flatnonzero(mask.any(axis=1))
+        xs = np.flatnonzero(mask.any(axis=0))
+        if len(xs) < 2 or len(ys) < 2:
+            return _Result([], [])
+        height, width = mask.shape
+        x0, x1 = xs[0] / width, (xs[-1] + 1) / width
+        y0, y1 = ys[0] / height, (ys[-1] + 1) / height
+        points = [_Point(x0 + tx * (x1 - x0), y0 + ty * (y1 - y0), (tz - 0.5) * (x1 - x0) * 0.1)
+                  for tx, ty, tz in self.template]
+        aspect = ((ys[-1] - ys[0]) / max(xs[-1] - xs[0], 1)) % 1.0
+        blend = [_Category(name, float(weight * aspect))
+                 for name, weight in zip(BLEND_SHAPE_NAMES, self.blend_weights)]
+        return _Result([points], [blend])
+
+    def close(self):
+        pass
+
+
+def make_synthetic_clips(root, num_clips=4, num_frames=75, width=360, height=288, fps=25):
+    """
+    Szintetikus GRID-szerű klipek + align fájlok: mozgó, méretét változtató világos ellipszis,
+    néhány arc nélküli (fekete) frame-mel.
+
+    Returns:
+        list: [(speaker, video_file, video_path, align_path), ...]
+    """
+    clips = []
+    for clip in range(num_clips):
+        speaker = f"s{clip % 2 + 1}"
+        video_file = f"synthetic{clip}.mp4"
+        video_dir = os.path.join(root, "video", speaker, speaker)
+        align_dir = os.path.join(root, "align", speaker, "align")
+        os.makedirs(video_dir, exist_ok=True)
+        os.makedirs(align_dir, exist_ok=True)
+        video_path = os.path.join(video_dir, video_file)
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        for frame_idx in range(num_frames):
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            if frame_idx % 17 != 16:
+                phase = frame_idx / num_frames * 2 * np.pi
+                center = (int(width / 2 + width * 0.1 * np.sin(phase + clip)),
+                          int(height / 2 + height * 0.05 * np.cos(phase)))
+                axes = (int(width * 0.18), int(height * (0.28 + 0.04 * np.sin(3 * phase))))
+                cv2.ellipse(frame, center, axes, 0, 0, 360, (200, 210, 220), -1)
+            writer.write(frame)
+        writer.release()
+
+        # GRID align: 25000 minta / másodperc, a klip elején és végén csend
+        align_path = os.path.join(align_dir, os.path.splitext(video_file)[0] + ".align")
+        samples = int(num_frames / fps * 25000)
+        bounds = np.linspace(0, samples, 6).astype(int)
+        words = ["sil", "bin", "blue", "at", "sil"]
+        with open(align_path, "w", encoding="utf-8") as f:
+            for word, start, end in zip(words, bounds[:-1], bounds[1:]):
+                f.write(f"{start} {end} {word}\n")
+        clips.append((speaker, video_file, video_path, align_path))
+    return clips
+
+
+# -------------------- Kinyerési utak --------------------
+def _csv_cells(row):
+    # A csv.writer is így alakítja szöveggé a cellákat
+    return [cell if isinstance(cell, str) else str(cell) for cell in row]
+
+
+def run_reference(clips, landmarker):
+    """A referencia út: process_frame_full_mouth frame-enként + a régi CSV író."""
+    rows = []
+    started = time.perf_counter()
+    for speaker, video_file, video_path, align_path in clips:
+        word_list = parse_align_file(align_path, sample_rate=25000)
+        with VideoFrameReader(video_path) as reader:
+            for frame_idx, frame in reader:
+                mouth_data = process_frame_full_mouth(frame, landmarker)
+                if mouth_data is None:
+                    continue
+                word = find_word_for_frame(word_list, frame_idx, reader.fps)
+                if word is None:
+                    continue
+                rows.append(_csv_cells(mouth_data_to_csv_row(speaker, video_file, frame_idx, word, mouth_data)))
+    return rows, time.perf_counter() - started
+
+
+def run_fast_path(clips, landmarker, paths):
+    """A kiválasztott gyors utak (kombinálva) ugyanazokon a klipeken."""
+    unknown = [path for path in paths if path not in FAST_PATHS]
+    if unknown:
+        raise ValueError(f"Ismeretlen gyors út: {', '.join(unknown)} (választható: {', '.join(FAST_PATHS)})")
+    decoders = [path for path in paths if path in DECODER_BACKENDS]
+    if len(decoders) > 1:
+        raise ValueError(f"Egyszerre csak egy dekóder választható: {', '.join(decoders)}")
+    decoder = decoders[0] if decoders else "opencv"
+    decimals = DEFAULT_CSV_DECIMALS if "fast-csv" in paths else None
+    as_arrays = decimals is not None
+    if "adaptive" in paths:
+        landmarker = AdaptiveDetector(landmarker)
+
+    rows = []
+    started = time.perf_counter()
+    for speaker, video_file, video_path, align_path in clips:
+        word_list = parse_align_file(align_path, sample_rate=25000)
+        if "store" in paths:
+            recorder = RawVideoRecorder()
+            for _ in iter_video_records(speaker, video_file, video_path, word_list, landmarker,
+                                        recorder=recorder, decoder=decoder):
+                pass
+            records = rebuild_video_records(recorder.to_arrays(), speaker, video_file, word_list,
+                                            as_arrays=as_arrays)
+        else:
+            records = iter_video_records(speaker, video_file, video_path, word_list, landmarker,
+                                         as_arrays=as_arrays, decoder=decoder)
+        rows.extend(_csv_cells(mouth_data_to_csv_row(*record, decimals=decimals)) for record in records)
+    return rows, time.perf_counter() - started
+
+
+def read_csv_rows(path):
+    csv.field_size_limit(1 << 30)
+    with open_text_input(resolve_input_path(path)) as f:
+        reader = csv.reader(f, delimiter=CSV_DELIMITER)
+        header = next(reader)
+        return header, [row for row in reader if row]
+
+
+# -------------------- Összevetés --------------------
+def _cell_values(cell, keys=None):
+    """Egy cella számai laposítva; dict (blend shape) esetén a referencia kulcs sorrendjében."""
+    value = json.loads(cell)
+    if isinstance(value, dict):
+        if keys is None:
+            keys = list(value)
+        return np.array([value.get(key, np.nan) for key in keys], dtype=np.float64), keys
+    return np.asarray(value, dtype=np.float64).ravel(), None
+
+
+def compare_rows(reference_header, reference_rows, candidate_header, candidate_rows):
+    """
+    Returns:
+        dict: oszloponkénti eltérések, sor / szó / sorrend eltérések
+    """
+    key_count = len(KEY_COLUMNS)
+    word_col = KEY_COLUMNS.index("word")
+    columns = [name for name in reference_header[key_count:] if name in candidate_header]
+    ref_pos = {name: i for i, name in enumerate(reference_header)}
+    cand_pos = {name: i for i, name in enumerate(candidate_header)}
+
+    def row_key(row):
+        return row[0], row[1], int(row[2])
+
+    reference = {row_key(row): row for row in reference_rows}
+    candidate = {row_key(row): row for row in candidate_rows}
+    common = [key for key in reference if key in candidate]
+    candidate_order = [key for key in candidate if key in reference]
+
+    stats = {name: {"max": 0.0, "sum": 0.0, "count": 0, "shape_mismatches": 0} for name in columns}
+    word_mismatches = []
+    for key in common:
+        ref_row, cand_row = reference[key], candidate[key]
+        if ref_row[word_col] != cand_row[word_col]:
+            word_mismatches.append({"speaker": key[0], "video": key[1], "frame_idx": key[2],
+                                    "reference": ref_row[word_col], "candidate": cand_row[word_col]})
+        for name in columns:
+            ref_values, keys = _cell_values(ref_row[ref_pos[name]])
+            cand_values, _ = _cell_values(cand_row[cand_pos[name]], keys)
+            column = stats[name]
+            if ref_values.shape != cand_values.shape:
+                column["shape_mismatches"] += 1
+                continue
+            both_nan = np.isnan(ref_values) & np.isnan(cand_values)
+            deviation = np.where(both_nan, 0.0, np.abs(ref_values - cand_values))
+            # Csak az egyik oldalon NaN (pl. hiányzó blend shape): végtelen eltérés
+            deviation = np.nan_to_num(deviation, nan=np.inf)
+            if deviation.size:
+                column["max"] = max(column["max"], float(deviation.max()))
+                column["sum"] += float(deviation.sum())
+                column["count"] += deviation.size
+
+    return {
+        "reference_rows": len(reference_rows),
+        "candidate_rows": len(candidate_rows),
+        "common_rows": len(common),
+        "dropped_rows": [list(key) for key in reference if key not in candidate],
+        "added_rows": [list(key) for key in candidate if key not in reference],
+        "word_mismatches": word_mismatches,
+        "frame_order_mismatches": sum(a != b for a, b in zip(common, candidate_order)),
+        "missing_columns": [name for name in reference_header[key_count:] if name not in candidate_header],
+        "columns": {name: {"max_abs": column["max"],
+                           "mean_abs": column["sum"] / column["count"] if column["count"] else 0.0,
+                           "shape_mismatches": column["shape_mismatches"]}
+                    for name, column in stats.items()},
+    }
+
+
+def check_regressions(comparison, tolerances, max_row_diff=0.0, max_word_mismatches=0, allow_missing_columns=False):
+    """
+    A tolerancián kívüli eltérések listája (üres = nincs regresszió).
+    max_row_diff: a hozzáadott + elhagyott sorok megengedett aránya a referencia sorokhoz.
+    """
+    problems = []
+    for name, column in comparison["columns"].items():
+        tolerance = tolerances.get(name, 0.0)
+        column["tolerance"] = tolerance
+        column["ok"] = column["max_abs"] <= tolerance + TOLERANCE_EPS and not column["shape_mismatches"]
+        if not column["ok"]:
+            problems.append(f"{name}: max eltérés {column['max_abs']:.6g} > {tolerance:.6g}"
+                            + (f", {column['shape_mismatches']} alak eltérés" if column["shape_mismatches"] else ""))
+    row_diff = len(comparison["added_rows"]) + len(comparison["dropped_rows"])
+    if row_diff > max_row_diff * max(comparison["reference_rows"], 1):
+        problems.append(f"{len(comparison['dropped_rows'])} elhagyott + {len(comparison['added_rows'])} "
+                        f"hozzáadott sor (megengedett: {max_row_diff:.1%})")
+    if len(comparison["word_mismatches"]) > max_word_mismatches:
+        problems.append(f"{len(comparison['word_mismatches'])} szó hozzárendelés eltérés")
+    if comparison["frame_order_mismatches"]:
+        problems.append(f"{comparison['frame_order_mismatches']} frame sorrend eltérés")
+    if comparison["missing_columns"] and not allow_missing_columns:
+        problems.append(f"Hiányzó oszlopok: {', '.join(comparison['missing_columns'])}")
+    return problems
+
+
+def print_comparison(comparison, problems):
+    print(f"\n📏 Sorok: referencia {comparison['reference_rows']}, gyors {comparison['candidate_rows']}, "
+          f"közös {comparison['common_rows']} "
+          f"(-{len(comparison['dropped_rows'])} / +{len(comparison['added_rows'])})")
+    print(f"   Szó eltérés: {len(comparison['word_mismatches'])}, "
+          f"frame sorrend eltérés: {comparison['frame_order_mismatches']}")
+    print(f"\n   {'oszlop':<28}{'max':>12}{'átlag':>12}{'tolerancia':>12}")
+    for name, column in comparison["columns"].items():
+        mark = "✓" if column.get("ok", True) else "✗"
+        print(f" {mark} {name:<28}{column['max_abs']:>12.3g}{column['mean_abs']:>12.3g}"
+              f"{column.get('tolerance', 0.0):>12.3g}")
+    if comparison.get("speedup") is not None:
+        print(f"\n⏱️  Referencia {comparison['reference_seconds']:.2f}s, gyors {comparison['candidate_seconds']:.2f}s "
+              f"-> {comparison['speedup']:.2f}x")
+    if problems:
+        print(f"\n❌ Regresszió:")
+        for problem in problems:
+            print(f"   {problem}")
+    else:
+        print(f"\n✅ Egyenértékű (a toleranciákon belül)")
+
+
+def parse_tolerances(specs, adaptive=False):
+    tolerances = dict(DEFAULT_TOLERANCES, **(ADAPTIVE_TOLERANCES if adaptive else {}))
+    for spec in specs or []:
+        name, _, value = spec.partition("=")
+        if name not in CSV_HEADER or not value:
+            raise ValueError(f"Hibás --tolerance: {spec} (oszlop=érték)")
+        tolerances[name] = float(value)
+    return tolerances
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gyors kinyerési utak ellenőrzése a referencia úttal szemben")
+    parser.add_argument("--fast", default="store",
+                        help=f"Gyors út(ak) vesszővel: {', '.join(FAST_PATHS)}")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Generált klipek + SyntheticLandmarker (nem kell modell és corpus)")
+    parser.add_argument("--clips", type=int, default=4, help="--synthetic: klipek száma")
+    parser.add_argument("--video-base", default=VIDEO_BASE)
+    parser.add_argument("--align-base", default=ALIGN_BASE)
+    parser.add_argument("--speakers", default=None, help="Vesszővel elválasztott speakerek (alapból mind)")
+    parser.add_argument("--limit", type=int, default=5, help="Legfeljebb ennyi videó (0 = mind)")
+    parser.add_argument("--reference-csv", default=None, help="Kész referencia CSV (kinyerés helyett)")
+    parser.add_argument("--candidate-csv", default=None, help="Kész összevetendő CSV")
+    parser.add_argument("--tolerance", action="append", default=None, metavar="OSZLOP=ÉRTÉK",
+                        help="Oszloponkénti max abszolút eltérés (többször megadható)")
+    parser.add_argument("--max-row-diff", type=float, default=0.0,
+                        help="Hozzáadott + elhagyott sorok megengedett aránya (pl. 0.02)")
+    parser.add_argument("--max-word-mismatches", type=int, default=0)
+    parser.add_argument("--allow-missing-columns", action="store_true",
+                        help="A gyors kimenetből hiányzó oszlop (pl. --columns) nem hiba")
+    parser.add_argument("--report", default=None, help="Részletes JSON riport ide")
+    args = parser.parse_args()
+
+    try:
+        tolerances = parse_tolerances(args.tolerance, adaptive=not args.reference_csv and "adaptive" in
+                                      [path.strip() for path in args.fast.split(",")])
+    except ValueError as e:
+        parser.error(str(e))
+
+    timings = {}
+    if args.reference_csv or args.candidate_csv:
+        if not (args.reference_csv and args.candidate_csv):
+            parser.error("--reference-csv és --candidate-csv együtt adandó meg")
+        reference_header, reference_rows = read_csv_rows(args.reference_csv)
+        candidate_header, candidate_rows = read_csv_rows(args.candidate_csv)
+        fast = []
+    else:
+        fast = [path.strip() for path in args.fast.split(",") if path.strip()]
+        synthetic_root = None
+        if args.synthetic:
+            synthetic_root = tempfile.mkdtemp(prefix="equivalence_")
+            clips = make_synthetic_clips(synthetic_root, num_clips=args.clips)
+            landmarker = SyntheticLandmarker()
+        else:
+            speakers = args.speakers.split(",") if args.speakers else None
+            clips = list(iter_corpus_videos(args.video_base, args.align_base, speakers=speakers, verbose=False))
+            if args.limit:
+                clips = clips[:args.limit]
+            landmarker = create_landmarker(MODEL_PATH)
+        print(f"🔍 {len(clips)} klip, gyors út: {', '.join(fast)}" + (" (szintetikus)" if args.synthetic else ""))
+
+        try:
+            reference_rows, timings["reference_seconds"] = run_reference(clips, landmarker)
+            candidate_rows, timings["candidate_seconds"] = run_fast_path(clips, landmarker, fast)
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            landmarker.close()
+            if synthetic_root is not None:
+                shutil.rmtree(synthetic_root, ignore_errors=True)
+        reference_header = candidate_header = CSV_HEADER
+
+    comparison = compare_rows(reference_header, reference_rows, candidate_header, candidate_rows)
+    if timings:
+        comparison.update(timings, speedup=timings["reference_seconds"] / max(timings["candidate_seconds"], 1e-9))
+    problems = check_regressions(comparison, tolerances, max_row_diff=args.max_row_diff,
+                                 max_word_mismatches=args.max_word_mismatches,
+                                 allow_missing_columns=args.allow_missing_columns)
+    print_comparison(comparison, problems)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(dict(comparison, fast_paths=fast, problems=problems), f, indent=2)
+        print(f"   Riport: {args.report}")
+    raise SystemExit(1 if problems else 0)
@@ -0,0 +1,370 @@
+# video_stream.py
+# Streaming API: videó -> frame-ek -> rekordok, köztes CSV nélkül
+#
+# Példa (trainer / elemző job):
+#
+#     from video_stream import iter_corpus_records
+#     for record in iter_corpus_records(VIDEO_BASE, ALIGN_BASE, "face_landmarker.task"):
+#         print(record.speaker, record.video, record.frame_idx, record.word,
+#               record.mouth_data["mouth_blend_shapes"])
+#
+# A memóriahasználat konstans: egyszerre legfeljebb `prefetch` videó eredménye van a memóriában.
+
+import asyncio
+import subprocess
+from collections import deque, namedtuple
+from multiprocessing import Pool, cpu_count
+
+import cv2
+import numpy as np
+
+try:
+    import av
+except ImportError:
+    av = None
+
+from frame_processor import detect_raw, build_mouth_data, create_landmarker, AdaptiveDetector
+from dataset_io import parse_align_file, find_word_for_frame, iter_corpus_videos, selection_needs_blend_shapes
+from mouth_crops import mouth_crop
+from corpus_archive import is_member_path, MemberFile
+
+# Egy kimeneti rekord; a mouth_data ugyanaz a dict, amit a process_frame_full_mouth ad vissza.
+# Tuple-ként kicsomagolva megegyezik a (speaker, video, frame_idx, word, mouth_data) alakkal.
+FrameRecord = namedtuple("FrameRecord", ["speaker", "video", "frame_idx", "word", "mouth_data"])
+
+# Dekóder backendek: az opencv BGR frame-eket ad (a landmarker előtt cvtColor kell),
+# az ffmpeg (subprocess pipe) és a pyav (PyAV) közvetlenül RGB24-et
+DECODER_BACKENDS = ["opencv", "ffmpeg", "pyav"]
+FFMPEG_BINARY = "ffmpeg"
+
+
+class VideoFrameReader:
+    """
+    cv2.VideoCapture burkoló: fps / méret lekérdezés és frame iterálás, automatikus release-szel.
+
+        with VideoFrameReader(path) as reader:
+            for frame_idx, frame in reader:
+                ...
+    """
+    color = "bgr"
+    member = None
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.cap = cv2.VideoCapture(self._open_source(video_path))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def __iter__(self):
+        frame_idx = 0
+        while True:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            yield frame_idx, frame
+            frame_idx += 1
+
+    def _open_source(self, video_path):
+        """
+        A dekóder által megnyitható útvonal: archívum tag ("<archívum>::<tag>") esetén
+        a byte-ok egy memfd-be / temp fájlba kerülnek (corpus_archive.MemberFile), amit a release zár le.
+        """
+        if not is_member_path(video_path):
+            return video_path
+        self.member = MemberFile(video_path)
+        return self.member.path
+
+    def _close_source(self):
+        if self.member is not None:
+            self.member.close()
+            self.member = None
+
+    def release(self):
+        self.cap.release()
+        self._close_source()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def _probe_video(video_path):
+    # fps / méret / frame szám ugyanúgy, mint az opencv backendnél (így a szó hozzárendelés is azonos)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return (cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        cap.release()
+
+
+class FfmpegFrameReader(VideoFrameReader):
+    """
+    ffmpeg subprocess dekóder: a frame-ek RGB24-ként (opcionálisan átméretezve) jönnek a pipe-on,
+    egyetlen előre lefoglalt bufferbe olvasva. A kiadott frame a következő lépésben felülíródik,
+    tehát aki meg akarja tartani, másolja le.
+
+    threads: ffmpeg dekóder szálak (0 = automatikus)
+    size: (width, height) kimeneti felbontás (None = natív)
+    """
+    color = "rgb"
+
+    def __init__(self, video_path, size=None, threads=0):
+        self.video_path = video_path
+        self.source = self._open_source(video_path)
+        self.fps, self.width, self.height, self.frame_count = _probe_video(self.source)
+        self.scaled = size is not None and tuple(size) != (self.width, self.height)
+        if size is not None:
+            self.width, self.height = (int(v) for v in size)
+        self.threads = threads
+        self.frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.proc = None
+
+    def _command(self):
+        command = [FFMPEG_BINARY, "-v", "error", "-nostdin", "-threads", str(self.threads), "-i", self.source]
+        if self.scaled:
+            command += ["-vf", f"scale={self.width}:{self.height}:flags=area"]
+        # -vsync 0: nincs frame duplikálás / eldobás, ugyanazok a frame-ek, mint az opencv-nél
+        return command + ["-vsync", "0", "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+
+    def __iter__(self):
+        if self.width <= 0 or self.height <= 0:
+            return
+        # Archívum tagnál a memfd-t a gyerek process is megkapja (ugyanazon a /proc/self/fd/N útvonalon)
+        self.proc = subprocess.Popen(self._command(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                     bufsize=self.frame.nbytes, pass_fds=self.member.fds if self.member else ())
+        buffer = memoryview(self.frame.reshape(-1))
+        frame_idx = 0
+        while True:
+            filled = 0
+            while filled < len(buffer):
+                n = self.proc.stdout.readinto(buffer[filled:])
+                if not n:
+                    break
+                filled += n
+            if filled < len(buffer):
+                break
+            yield frame_idx, self.frame
+            frame_idx += 1
+        self.release()
+
+    def release(self):
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                self.proc.kill()
+            self.proc.stdout.close()
+            self.proc.wait()
+            self.proc = None
+        self._close_source()
+
+
+class PyAVFrameReader(VideoFrameReader):
+    """
+    PyAV (libav) dekóder többszálú dekódolással, RGB24 kimenettel, előre lefoglalt bufferbe másolva
+    (a kiadott frame a következő lépésben felülíródik).
+
+    threads: dekóder szálak (0 = a PyAV / libav automatikus beállítása)
+    size: (width, height) kimeneti felbontás (None = natív)
+    """
+    color = "rgb"
+
+    def __init__(self, video_path, size=None, threads=0):
+        if av is None:
+            raise ImportError("A pyav dekóderhez a PyAV csomag kell (pip install av)")
+        self.video_path = video_path
+        source = self._open_source(video_path)
+        self.fps, self.width, self.height, self.frame_count = _probe_video(source)
+        if size is not None:
+            self.width, self.height = (int(v) for v in size)
+        self.threads = threads
+        self.frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.container = av.open(source)
+
+    def __iter__(self):
+        stream = self.container.streams.video[0]
+        stream.thread_type = "AUTO"
+        if self.threads:
+            stream.codec_context.thread_count = self.threads
+        row_bytes = self.width * 3
+        for frame_idx, frame in enumerate(self.container.decode(stream)):
+            plane = frame.reformat(width=self.width, height=self.height, format="rgb24").planes[0]
+            # A plane sorai igazítás miatt hosszabbak lehetnek (line_size), csak a képet másoljuk
+            rows = np.frombuffer(plane, dtype=np.uint8).reshape(self.height, plane.line_size)
+            np.copyto(self.frame, rows[:, :row_bytes].reshape(self.height, self.width, 3))
+            yield frame_idx, self.frame
+
+    def release(self):
+        self.container.close()
+        self._close_source()
+
+
+def open_video(video_path, decoder="opencv", size=None, threads=0):
+    """
+    Videó megnyitása a választott dekóderrel. A reader .color attribútuma ("bgr" / "rgb")
+    mondja meg, kell-e a landmarker előtt színkonverzió (detect_raw(..., rgb=...)).
+    """
+    if decoder == "opencv":
+        if size is not None:
+            raise ValueError("Az opencv dekóder nem méretez át (size csak ffmpeg / pyav esetén)")
+        return VideoFrameReader(video_path)
+    if decoder == "ffmpeg":
+        return FfmpegFrameReader(video_path, size=size, threads=threads)
+    if decoder == "pyav":
+        return PyAVFrameReader(video_path, size=size, threads=threads)
+    raise ValueError(f"Ismeretlen dekóder: {decoder} (választható: {', '.join(DECODER_BACKENDS)})")
+
+
+def iter_video_frames(video_path):
+    """
+    Egy videó frame-jei (BGR).
+    Yield: (frame_idx, frame)
+    """
+    with VideoFrameReader(video_path) as reader:
+        yield from reader
+
+
+def iter_video_records(speaker, video_file, video_path, word_list, landmarker, recorder=None, selection=None,
+                       as_arrays=False, decoder="opencv", crop_recorder=None):
+    """
+    Egy videó kimeneti rekordjai, pontosan úgy, ahogy a dataset processzorok írják:
+    csak azok a frame-ek, ahol van arc és az align szerint szóhoz tartoznak.
+
+    Args:
+        word_list: a parse_align_file() kimenete
+        landmarker: FaceLandmarker (IMAGE mód) vagy AdaptiveDetector (a számlálói videónként nullázódnak)
+        recorder: opcionális RawVideoRecorder, ami minden frame nyers kimenetét megkapja
+        selection: OutputSelection - csak a kiválasztott mezők / landmarkok számolódnak ki
+        as_arrays: a mouth_data mezői numpy tömbök (gyors CSV íráshoz)
+        decoder: "opencv" (BGR) / "ffmpeg" / "pyav" (közvetlenül RGB, a cvtColor elmarad)
+        crop_recorder: opcionális MouthCropRecorder; minden kiadott rekordhoz a száj kivágását kapja
+                       (ugyanabból a dekódolt frame-ből, a rekordokkal azonos sorrendben)
+    Yield:
+        FrameRecord
+    """
+    if isinstance(landmarker, AdaptiveDetector):
+        landmarker.start_video()
+    fields = selection.fields if selection is not None else None
+    landmark_indices = selection.landmark_indices if selection is not None else None
+
+    with open_video(video_path, decoder) as reader:
+        if recorder is not None:
+            recorder.set_video_info(reader.width, reader.height, reader.fps)
+        rgb = reader.color == "rgb"
+
+        for frame_idx, frame in reader:
+            raw = detect_raw(frame, landmarker, rgb=rgb)
+            if recorder is not None:
+                recorder.add(raw)
+            if raw is None:
+                continue
+
+            # Szó meghatározása az aktuális frame idő alapján
+            word_for_frame = find_word_for_frame(word_list, frame_idx, reader.fps)
+            if word_for_frame is None:
+                continue
+
+            image_height, image_width = frame.shape[:2]
+            mouth_data = build_mouth_data(raw[0], raw[1], image_width, image_height,
+                                          fields=fields, landmark_indices=landmark_indices,
+                                          as_arrays=as_arrays)
+            if crop_recorder is not None:
+                crop_recorder.add(mouth_crop(frame, raw[0], crop_recorder.spec, reader.color))
+            yield FrameRecord(speaker, video_file, frame_idx, word_for_frame, mouth_data)
+
+
+def iter_video_crops(video_path, landmarks, frame_indices, spec, decoder="opencv"):
+    """
+    Száj kivágások a megadott frame-ekre, tárolt (raw_store) landmarkokkal - inferencia nélkül.
+    A tárból újraépített videóknál ez az egyetlen dekódolás.
+
+    Args:
+        landmarks: (frames, 478, 3) normalizált landmarkok (a tár "landmarks" tömbje)
+        frame_indices: a kiírt rekordok frame indexei, növekvő sorrendben
+    Yield:
+        numpy.ndarray: a kivágás (frame_indices sorrendjében)
+    """
+    wanted = iter(frame_indices)
+    next_frame = next(wanted, None)
+    if next_frame is None:
+        return
+    with open_video(video_path, decoder) as reader:
+        for frame_idx, frame in reader:
+            if frame_idx != next_frame:
+                continue
+            yield mouth_crop(frame, landmarks[frame_idx], spec, reader.color)
+            next_frame = next(wanted, None)
+            if next_frame is None:
+                return
+    raise ValueError(f"{video_path}: a {next_frame}. frame nem dekódolható (rövidebb videó, mint a tárolt)")
+
+
+# -------------------- Corpus szintű stream (worker pool) --------------------
+_worker_landmarker = None
+
+
+def _init_stream_worker(model_path, output_face_blendshapes=True):
+    # Minden process saját FaceLandmarker objektumot hoz létre
+    global _worker_landmarker
+    _worker_landmarker = create_landmarker(model_path, output_face_blendshapes=output_face_blendshapes)
+
+
+def _process_video_task(task):
+    speaker, video_file, video_path, align_path, selection = task
+    word_list = parse_align_file(align_path, sample_rate=25000)
+    return list(iter_video_records(speaker, video_file, video_path, word_list, _worker_landmarker,
+                                   selection=selection))
+
+
+def iter_corpus_records(video_base, align_base, model_path, speakers=None, workers=None, prefetch=None,
+                        selection=None):
+    """
+    A teljes corpus rekordjai, worker process-ekkel párhuzamosan feldolgozva.
+
+    A videók sorrendje determinisztikus (speaker, majd videó szerint rendezve).
+    Egyszerre legfeljebb `prefetch` videó van feldolgozás alatt vagy kész, de még
+    nem elfogyasztva, így a memóriahasználat a corpus méretétől független.
+    selection (OutputSelection) esetén a landmarker és a feldolgozás is csak a kért oszlopokat számolja.
+
+    Yield:
+        FrameRecord
+    """
+    workers = workers or cpu_count()
+    prefetch = prefetch or 2 * workers
+    videos = iter_corpus_videos(video_base, align_base, speakers=speakers, verbose=False)
+
+    initargs = (model_path, selection_needs_blend_shapes(selection))
+    with Pool(processes=workers, initializer=_init_stream_worker, initargs=initargs) as pool:
+        pending = deque()
+        for task in videos:
+            pending.append(pool.apply_async(_process_video_task, (task + (selection,),)))
+            if len(pending) >= prefetch:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+async def aiter_corpus_records(video_base, align_base, model_path, speakers=None, workers=None, prefetch=None,
+                               selection=None):
+    """
+    Az iter_corpus_records async változata: a blokkoló lépéseket executorban futtatja,
+    így az event loop nem áll meg, amíg a workerek dolgoznak.
+
+        async for record in aiter_corpus_records(...):
+            ...
+    """
+    loop = asyncio.get_running_loop()
+    records = iter_corpus_records(video_base, align_base, model_path, speakers=speakers,
+                                  workers=workers, prefetch=prefetch, selection=selection)
+    done = object()
+    try:
+        while True:
+            record = await loop.run_in_executor(None, next, records, done)
+            if record is done:
+                break
+            yield record
+    finally:
+        await loop.run_in_executor(None, records.close)
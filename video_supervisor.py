@@ -0,0 +1,327 @@
+# video_supervisor.py
+# Videónkénti felügyelt feldolgozás: timeout, hibaizoláció, újrapróbálás friss workerben
+#
+# A multiprocessing.Pool-lal egy lefagyott vagy összeomlott worker az egész futást
+# megakaszthatja. Itt minden worker saját bemeneti sort kap, így a felügyelő mindig
+# tudja, melyik worker melyik videón dolgozik:
+#   - ha egy videó túllépi a timeoutot, a workert leállítjuk és újat indítunk
+#   - ha kivétel történik vagy a worker összeomlik, a videót friss workerben újrapróbáljuk
+#   - max_retries után a videó karanténba kerül (quarantine.jsonl), a többi fut tovább
+#   - a workereket max_tasks_per_child videó után újraindítjuk (memóriaszivárgás ellen)
+#
+# Szálas mód: a worker process threads_per_worker szálat indít, mindegyik saját contexttel
+# (saját FaceLandmarker) - a MediaPipe inferencia és az OpenCV dekódolás a GIL nélkül fut,
+# így kevesebb process (interpreter + NumPy + OpenCV + MediaPipe + model példány) is elég.
+# A run_threaded ugyanezt a fő processben, worker processek nélkül csinálja.
+
+import json
+import time
+import queue
+import threading
+import traceback
+import multiprocessing as mp
+from collections import deque
+
+
+def _worker_loop(slot, worker_init, init_args, worker_fn, inbox, result_queue, reinit_on_error=False):
+    try:
+        context = worker_init(*init_args)
+    except Exception:
+        result_queue.put(("init_error", slot, None, traceback.format_exc()))
+        return
+
+    while True:
+        item = inbox.get()
+        if item is None:
+            break
+        task_id, task = item
+        try:
+            result = worker_fn(context, task)
+        except Exception:
+            result_queue.put(("error", slot, task_id, traceback.format_exc()))
+            if not reinit_on_error:
+                # Hiba után a worker kilép, az újrapróbálás friss processben történik
+                return
+            # Szálas módban csak ez a szál kap friss contextet (új landmarkert), a többi fut tovább
+            try:
+                context = worker_init(*init_args)
+            except Exception:
+                result_queue.put(("init_error", slot, None, traceback.format_exc()))
+                return
+            continue
+        result_queue.put(("done", slot, task_id, result))
+
+
+def _worker_main(slot, worker_init, init_args, worker_fn, inbox, result_queue, threads=1):
+    if threads <= 1:
+        _worker_loop(slot, worker_init, init_args, worker_fn, inbox, result_queue)
+        return
+    loops = [threading.Thread(target=_worker_loop, name=f"worker-{slot}-{i}",
+                              args=(slot, worker_init, init_args, worker_fn, inbox, result_queue, True),
+                              daemon=True)
+             for i in range(threads)]
+    for loop in loops:
+        loop.start()
+    for loop in loops:
+        loop.join()
+
+
+class _Worker:
+    def __init__(self, slot, process, inbox, threads=1):
+        self.slot = slot
+        self.process = process
+        self.inbox = inbox
+        self.threads = threads
+        self.tasks = {}         # task_id -> indítás ideje (szálas módban egyszerre több is)
+        self.tasks_done = 0
+        self.retiring = False
+
+    def free(self):
+        return not self.retiring and len(self.tasks) < self.threads
+
+    def shutdown(self):
+        for _ in range(self.threads):
+            self.inbox.put(None)
+
+
+class SupervisorReport:
+    """A felügyelt futás eredménye."""
+
+    def __init__(self):
+        self.results = {}       # task_id -> worker_fn eredménye
+        self.failures = {}      # task_id -> utolsó hiba rekord (karanténba került)
+        self.attempts = {}      # task_id -> próbálkozások száma
+        self.retried = 0
+        self.workers_started = 0
+
+
+def _record_failure(report, tasks, task_id, kind, detail, max_retries, quarantine_path, describe,
+                    retry_in="a fresh worker"):
+    """
+    Egy sikertelen próbálkozás könyvelése.
+
+    Returns:
+        bool: True, ha a feladatot újra kell próbálni; különben karanténba került
+    """
+    report.attempts[task_id] = report.attempts.get(task_id, 0) + 1
+    record = {"kind": kind, "attempts": report.attempts[task_id],
+              "error": detail, "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if describe is not None:
+        record.update(describe(tasks[task_id]))
+    label = f"{record['speaker']}/{record['video']}" if "video" in record else task_id
+    if report.attempts[task_id] <= max_retries:
+        report.retried += 1
+        print(f"⚠️  {kind} ({label}), retry "
+              f"{report.attempts[task_id]}/{max_retries} in {retry_in}")
+        return True
+    report.failures[task_id] = record
+    print(f"❌ {kind} ({label}), quarantined after "
+          f"{report.attempts[task_id]} attempts")
+    if quarantine_path:
+        with open(quarantine_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return False
+
+
+def run_supervised(tasks, worker_init, worker_fn, processes, init_args=(),
+                   timeout=None, max_retries=2, max_tasks_per_child=None,
+                   quarantine_path=None, describe=None, threads_per_worker=1):
+    """
+    Feladatok párhuzamos futtatása felügyelt worker processekkel.
+
+    Args:
+        tasks: feladatok listája (picklelhető)
+        worker_init: worker_init(*init_args) -> context, workerenként egyszer fut
+        worker_fn: worker_fn(context, task) -> eredmény (legyen kicsi, pl. sorok száma)
+        timeout: videónkénti falióra időkorlát másodpercben (None = nincs)
+        max_retries: ennyiszer próbáljuk újra friss workerben a karantén előtt
+        max_tasks_per_child: worker újraindítása ennyi feladat után (None = soha)
+        quarantine_path: JSON lines fájl, ide kerülnek a végleg hibás feladatok
+        describe: describe(task) -> dict, a karantén rekordba kerül
+        threads_per_worker: szálak workerenként, mindegyik saját contexttel (hibrid mód, ha > 1).
+            Timeoutnál / összeomlásnál az egész worker leáll: a többi szálon futó feladatok
+            próbálkozás számlálás nélkül visszakerülnek a sorba (összeomlásnál mind hibásnak számít,
+            mert nem tudni, melyik okozta).
+
+    Returns:
+        SupervisorReport
+    """
+    report = SupervisorReport()
+    threads_per_worker = max(threads_per_worker, 1)
+    pending = deque(range(len(tasks)))
+    result_queue = mp.Queue()
+    workers = {}
+    next_slot = 0
+
+    def spawn():
+        nonlocal next_slot
+        inbox = mp.Queue()
+        process = mp.Process(target=_worker_main,
+                             args=(next_slot, worker_init, init_args, worker_fn, inbox, result_queue,
+                                   threads_per_worker),
+                             daemon=True)
+        process.start()
+        workers[next_slot] = _Worker(next_slot, process, inbox, threads_per_worker)
+        next_slot += 1
+        report.workers_started += 1
+
+    def fail(task_id, kind, detail):
+        # Szálas workerben egy kivétel után csak a szál kap új landmarkert, a process marad
+        retry_in = "a fresh landmarker" if kind == "error" and threads_per_worker > 1 else "a fresh worker"
+        if _record_failure(report, tasks, task_id, kind, detail, max_retries, quarantine_path, describe,
+                           retry_in=retry_in):
+            pending.append(task_id)
+
+    def stop(worker, interrupted=(), exiting=False):
+        """
+        Worker leállítása; az interrupted feladatok (más szálak ártatlan videói) újra sorba kerülnek.
+        exiting: a worker magától lép ki (hiba után) - előbb kivárjuk, mert ha a result_queue
+        író lockját fogó feeder szálát terminate() öli meg, a többi worker put()-ja örökre elakad.
+        """
+        if exiting:
+            worker.process.join(timeout=5)
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout=5)
+        del workers[worker.slot]
+        for task_id in interrupted:
+            pending.appendleft(task_id)
+
+    try:
+        while pending or any(w.tasks for w in workers.values()):
+            # Worker pool feltöltése
+            active = [w for w in workers.values() if not w.retiring]
+            needed = -(-len(pending) // threads_per_worker)
+            for _ in range(min(processes - len(active), needed)):
+                spawn()
+
+            # Szabad workerek (szálak) kapnak feladatot
+            for worker in list(workers.values()):
+                while worker.free() and pending:
+                    task_id = pending.popleft()
+                    worker.tasks[task_id] = time.monotonic()
+                    worker.inbox.put((task_id, tasks[task_id]))
+
+            # Eredmények (az összes beérkezett üzenet, mielőtt a halott workereket keresnénk)
+            messages = []
+            try:
+                messages.append(result_queue.get(timeout=0.5))
+                while True:
+                    messages.append(result_queue.get_nowait())
+            except queue.Empty:
+                pass
+            for kind, slot, task_id, payload in messages:
+                if slot not in workers:
+                    continue
+                worker = workers[slot]
+                if kind == "done":
+                    report.results[task_id] = payload
+                    worker.tasks.pop(task_id, None)
+                    worker.tasks_done += 1
+                    if max_tasks_per_child and worker.tasks_done >= max_tasks_per_child and not worker.retiring:
+                        worker.retiring = True
+                        worker.shutdown()
+                elif kind == "error":
+                    worker.tasks.pop(task_id, None)
+                    if threads_per_worker == 1:
+                        stop(worker, exiting=True)
+                    fail(task_id, "error", payload)
+                elif kind == "init_error":
+                    task_ids = list(worker.tasks)
+                    stop(worker, exiting=threads_per_worker == 1)
+                    for task_id in task_ids:
+                        fail(task_id, "init_error", payload)
+
+            # Timeoutok és összeomlott / kilépett workerek
+            now = time.monotonic()
+            for worker in list(workers.values()):
+                expired = [task_id for task_id, started in worker.tasks.items()
+                           if timeout and now - started > timeout]
+                if expired:
+                    stop(worker, interrupted=[task_id for task_id in worker.tasks if task_id not in expired])
+                    for task_id in expired:
+                        fail(task_id, "timeout", f"no result after {timeout}s")
+                elif not worker.process.is_alive():
+                    task_ids = list(worker.tasks)
+                    exitcode = worker.process.exitcode
+                    stop(worker)
+                    for task_id in task_ids:
+                        fail(task_id, "crash", f"worker exited with code {exitcode}")
+    finally:
+        for worker in list(workers.values()):
+            if not worker.tasks and not worker.retiring and worker.process.is_alive():
+                worker.shutdown()
+        for worker in list(workers.values()):
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    return report
+
+
+def run_threaded(tasks, worker_init, worker_fn, threads, init_args=(), max_retries=2,
+                 quarantine_path=None, describe=None):
+    """
+    Feladatok futtatása a fő processben, szálanként saját contexttel (worker process nélkül).
+
+    Ugyanaz a worker_init / worker_fn pár, mint a run_supervised-nál; hiba után a szál friss
+    contextet kap és a feladat újra sorba kerül. Timeout nincs (egy szálat nem lehet leállítani),
+    és egy natív összeomlás az egész futást viszi: ezekhez a process / hibrid mód való.
+
+    Returns:
+        SupervisorReport
+    """
+    report = SupervisorReport()
+    inbox = queue.Queue()
+    result_queue = queue.Queue()
+    for task_id, task in enumerate(tasks):
+        inbox.put((task_id, task))
+    loops = [threading.Thread(target=_worker_loop, name=f"worker-{i}",
+                              args=(i, worker_init, init_args, worker_fn, inbox, result_queue, True),
+                              daemon=True)
+             for i in range(max(min(threads, len(tasks)), 1))]
+    for loop in loops:
+        loop.start()
+    report.workers_started = len(loops)
+
+    remaining = set(range(len(tasks)))
+    alive = len(loops)
+    try:
+        while remaining and alive:
+            try:
+                kind, _, task_id, payload = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if kind == "done":
+                report.results[task_id] = payload
+                remaining.discard(task_id)
+            elif kind == "error":
+                if _record_failure(report, tasks, task_id, "error", payload, max_retries, quarantine_path,
+                                   describe, retry_in="a fresh landmarker"):
+                    inbox.put((task_id, tasks[task_id]))
+                else:
+                    remaining.discard(task_id)
+            elif kind == "init_error":
+                alive -= 1
+                print(f"⚠️  worker thread init failed ({alive} left):\n{payload}")
+        # Ha minden szál elhalt, a maradék feladat nem futhat le
+        for task_id in sorted(remaining):
+            _record_failure(report, tasks, task_id, "init_error", "no worker thread left", 0,
+                            quarantine_path, describe)
+    finally:
+        for _ in loops:
+            inbox.put(None)
+        for loop in loops:
+            loop.join(timeout=5)
+    return report
+
+
+def write_failure_report(report, tasks, path, describe):
+    """
+    A végleg hibás feladatok listája JSON-ban, hogy külön újra lehessen futtatni őket.
+    """
+    failed = [dict(describe(tasks[task_id]), **{k: v for k, v in record.items() if k in ("kind", "attempts")})
+              for task_id, record in sorted(report.failures.items())]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"failed_videos": failed, "count": len(failed)}, f, indent=2, ensure_ascii=False)
+    return failed
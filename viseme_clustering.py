@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Adatvezérelt viséma osztályok: mini-batch k-means a száj pózokon, streamelve
+
+A bemenet a régi ';'-es JSON cellás mouth_data.csv vagy egy oszlopos dataset.
+Az adatot fix sorszámú chunkokban olvassuk; a worker processek chunkonként
+kiszámolják a póz vektorokat (mouth_pose_index.pose_vectors: normált ajak pontok
++ mouth_blend_shapes), a legközelebbi centroidot és klaszterenként az összegeket.
+A fő process ezekből mini-batch k-means lépést tesz (centroidonként 1/darabszám
+tanulási rátával). A memóriahasználat a chunk mérettől és a prefetch-től függ,
+nem a dataset méretétől.
+
+Minden chunk után a centroidok és az állapot (epoch, chunk, darabszámok) a
+kimeneti könyvtárba kerül, így a futás a mentett centroidoktól folytatható.
+A tanítás után egy hozzárendelő menet minden frame-hez klaszter azonosítót ír:
+    - oszlopos dataset: viseme_cluster oszlop a partokban
+    - CSV: cluster_ids.npy a CSV sorrendjében
+és szavanként klaszter hisztogramot készít (word_histograms.json).
+
+Használat:
+    python viseme_clustering.py mouth_data.csv visemes/ -k 16 --epochs 2
+    python viseme_clustering.py mouth_columnar/ visemes/ -k 24 --workers 8
+    python viseme_clustering.py mouth_data.csv visemes/ --restart     # elölről
+"""
+
+import os
+import csv
+import json
+import shutil
+import argparse
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from columnar_dataset import read_manifest, MANIFEST_FILE
+from csv_to_columnar import iter_source_chunks, load_source_chunk
+from mouth_pose_index import pose_vectors, assign_lists
+
+STATE_FILE = "state.json"
+CENTROIDS_FILE = "centroids.npy"
+CLUSTER_IDS_FILE = "cluster_ids.npy"
+HISTOGRAMS_FILE = "word_histograms.json"
+CLUSTER_COLUMN = "viseme_cluster"
+
+# A klaszterezéshez beolvasott oszlopok
+CLUSTER_COLUMNS = ["word", "outer_lip_relative_points", "inner_lip_relative_points", "mouth_blend_shapes"]
+
+
+# -------------------- Chunkok --------------------
+def _chunk_vectors(chunk, weights):
+    arrays = load_source_chunk(chunk, CLUSTER_COLUMNS)
+    return pose_vectors(arrays, *weights), arrays["word"]
+
+
+def _cluster_sums(vectors, labels, k):
+    order = np.argsort(labels, kind="stable")
+    counts = np.bincount(labels, minlength=k)
+    sums = np.zeros((k, vectors.shape[1]), dtype=np.float64)
+    filled = np.flatnonzero(counts)
+    if len(filled):
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        sums[filled] = np.add.reduceat(vectors[order].astype(np.float64), starts, axis=0)
+    return counts, sums
+
+
+def _batch_statistics(task):
+    """Worker: egy chunk klaszterenkénti darabszámai / összegei az aktuális centroidokkal."""
+    chunk, centroids, weights = task
+    vectors, _ = _chunk_vectors(chunk, weights)
+    labels = assign_lists(vectors, centroids)
+    counts, sums = _cluster_sums(vectors, labels, len(centroids))
+    inertia = float(np.sum((vectors - centroids[labels]) ** 2))
+    return counts, sums, inertia
+
+
+def _assign_chunk(task):
+    """Worker: egy chunk klaszter azonosítói és szavai."""
+    chunk, centroids, weights = task
+    vectors, words = _chunk_vectors(chunk, weights)
+    return assign_lists(vectors, centroids).astype(np.int16), np.asarray(words, dtype=str)
+
+
+def init_centroids(vectors, k, seed=0):
+    """k-means++ kezdőpontok egy (első) chunkból."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = [vectors[rng.integers(len(vectors))]]
+    closest = np.sum((vectors - centroids[0]) ** 2, axis=1)
+    for _ in range(1, k):
+        total = closest.sum()
+        index = rng.choice(len(vectors), p=closest / total) if total > 0 else rng.integers(len(vectors))
+        centroids.append(vectors[index])
+        closest = np.minimum(closest, np.sum((vectors - vectors[index]) ** 2, axis=1))
+    return np.array(centroids, dtype=np.float32)
+
+
+# -------------------- Állapot --------------------
+def _save_json(path, data):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _save_checkpoint(output_dir, centroids, state):
+    # A centroidok az állapottal együtt, egy atomikus írással mentődnek (a darabszámokkal összetartoznak);
+    # a centroids.npy csak a kész eredmény másolata
+    state["centroids"] = centroids.tolist()
+    _save_json(os.path.join(output_dir, STATE_FILE), state)
+    np.save(os.path.join(output_dir, CENTROIDS_FILE), centroids)
+
+
+def _load_state(output_dir, settings):
+    path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None, None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if any(state.get(key) != value for key, value in settings.items()):
+        raise ValueError(f"A {path} más beállításokkal készült (--restart az újrakezdéshez)")
+    return state, np.array(state["centroids"], dtype=np.float32)
+
+
+# -------------------- Tanítás + hozzárendelés --------------------
+def train_visemes(source, output_dir, k=16, epochs=2, chunk_rows=20000, workers=None, prefetch=None,
+                  lip_weight=1.0, blend_weight=1.0, seed=0, restart=False):
+    """
+    Streamelt mini-batch k-means, chunkonként mentett, folytatható állapottal.
+
+    Returns:
+        (centroids, state)
+    """
+    workers = workers or cpu_count()
+    prefetch = prefetch or 2 * workers
+    if restart and os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    weights = (lip_weight, blend_weight)
+    settings = {"source": os.path.abspath(source), "k": k, "chunk_rows": chunk_rows,
+                "lip_weight": lip_weight, "blend_weight": blend_weight}
+
+    state, centroids = _load_state(output_dir, settings)
+    if state is None:
+        state = dict(settings, epoch=0, chunk=0, counts=[0] * k, epochs=[])
+    elif state["epoch"] < epochs:
+        print(f"↩️  Folytatás: epoch {state['epoch'] + 1}, chunk {state['chunk']}")
+    counts = np.array(state["counts"], dtype=np.int64)
+
+    with Pool(processes=workers) as pool:
+        for epoch in range(state["epoch"], epochs):
+            print(f"\n🔄 Epoch {epoch + 1}/{epochs} ({k} klaszter, {chunk_rows} sor / chunk, {workers} process)")
+            pending = deque()
+            epoch_inertia = state.get("epoch_inertia", 0.0)
+            epoch_rows = state.get("epoch_rows", 0)
+
+            def commit(chunk_id, result):
+                nonlocal centroids, counts, epoch_inertia, epoch_rows
+                batch_counts, batch_sums, inertia = result.get()
+                counts = counts + batch_counts
+                filled = np.flatnonzero(batch_counts)
+                # Mini-batch lépés: a centroid a batch átlaga felé mozdul, 1 / összes darabszám rátával
+                updated = centroids.astype(np.float64)
+                updated[filled] += (batch_sums[filled] - batch_counts[filled, None] * updated[filled]) \
+                    / counts[filled, None]
+                centroids = updated.astype(np.float32)
+                epoch_inertia += inertia
+                epoch_rows += int(batch_counts.sum())
+                state.update(chunk=chunk_id + 1, counts=counts.tolist(),
+                             epoch_inertia=epoch_inertia, epoch_rows=epoch_rows)
+                _save_checkpoint(output_dir, centroids, state)
+                if (chunk_id + 1) % 10 == 0:
+                    print(f"   ✓ chunk {chunk_id + 1}: {epoch_rows} sor, "
+                          f"átlagos négyzetes távolság {epoch_inertia / max(epoch_rows, 1):.4f}")
+
+            for chunk_id, chunk in enumerate(iter_source_chunks(source, chunk_rows, required=CLUSTER_COLUMNS)):
+                if chunk_id < state["chunk"]:
+                    continue
+                if centroids is None:
+                    vectors, _ = _chunk_vectors(chunk, weights)
+                    centroids = init_centroids(vectors, k, seed=seed)
+                pending.append((chunk_id, pool.apply_async(_batch_statistics, ((chunk, centroids.copy(), weights),))))
+                if len(pending) >= prefetch:
+                    commit(*pending.popleft())
+            while pending:
+                commit(*pending.popleft())
+
+            state["epochs"].append({"rows": epoch_rows, "mean_sq_distance": epoch_inertia / max(epoch_rows, 1)})
+            state.update(epoch=epoch + 1, chunk=0, epoch_inertia=0.0, epoch_rows=0)
+            _save_checkpoint(output_dir, centroids, state)
+            print(f"   Epoch {epoch + 1}: {epoch_rows} sor, átlagos négyzetes távolság "
+                  f"{state['epochs'][-1]['mean_sq_distance']:.4f}")
+    return centroids, state
+
+
+def assign_visemes(source, output_dir, centroids, state, workers=None, prefetch=None):
+    """
+    Klaszter azonosító minden frame-hez + szavankénti hisztogram.
+
+    Returns:
+        dict: szó -> klaszterenkénti darabszám lista
+    """
+    workers = workers or cpu_count()
+    prefetch = prefetch or 2 * workers
+    k = len(centroids)
+    weights = (state["lip_weight"], state["blend_weight"])
+    columnar = os.path.isdir(source)
+    histograms = {}
+
+    cluster_ids = None
+    if not columnar:
+        rows = state["epochs"][-1]["rows"]
+        cluster_ids = np.lib.format.open_memmap(os.path.join(output_dir, CLUSTER_IDS_FILE), mode="w+",
+                                                dtype=np.int16, shape=(rows,))
+    position = 0
+    part_labels = {}
+
+    def commit(chunk, result):
+        nonlocal position
+        labels, words = result.get()
+        for word in np.unique(words).tolist():
+            counts = np.bincount(labels[words == word], minlength=k)
+            histograms[word] = (np.array(histograms.get(word, [0] * k)) + counts).tolist()
+        if columnar:
+            # A part chunkjai sorban jönnek; ha a part kész, kiírjuk az oszlopát
+            _, dataset_dir, part_name, start, end = chunk
+            part_labels.setdefault(part_name, []).append(labels)
+            part_rows = next(part["rows"] for part in manifest["parts"] if part["name"] == part_name)
+            if end == part_rows:
+                np.save(os.path.join(dataset_dir, part_name, f"{CLUSTER_COLUMN}.npy"),
+                        np.concatenate(part_labels.pop(part_name)))
+        else:
+            cluster_ids[position:position + len(labels)] = labels
+        position += len(labels)
+
+    manifest = read_manifest(source) if columnar else None
+    with Pool(processes=workers) as pool:
+        pending = deque()
+        for chunk in iter_source_chunks(source, state["chunk_rows"], required=CLUSTER_COLUMNS):
+            pending.append((chunk, pool.apply_async(_assign_chunk, ((chunk, centroids, weights),))))
+            if len(pending) >= prefetch:
+                commit(*pending.popleft())
+        while pending:
+            commit(*pending.popleft())
+
+    if columnar:
+        manifest["columns"][CLUSTER_COLUMN] = {"dtype": "int16", "shape": []}
+        manifest["viseme_clusters"] = k
+        _save_json(os.path.join(source, MANIFEST_FILE), manifest)
+    else:
+        cluster_ids.flush()
+        del cluster_ids
+
+    _save_json(os.path.join(output_dir, HISTOGRAMS_FILE),
+               {"k": k, "rows": position, "words": dict(sorted(histograms.items()))})
+    return histograms
+
+
+def print_word_histograms(histograms, top=3):
+    print(f"\n📊 Szavankénti klaszterek (a {top} leggyakoribb):")
+    for word, counts in sorted(histograms.items()):
+        counts = np.array(counts)
+        total = max(counts.sum(), 1)
+        best = np.argsort(counts)[::-1][:top]
+        print(f"   {word:<10} {total:8d} frame  "
+              + ", ".join(f"#{cluster} {100 * counts[cluster] / total:.0f}%" for cluster in best if counts[cluster]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Viséma klaszterezés streamelt mini-batch k-means-szel")
+    parser.add_argument("source", help="mouth_data.csv vagy oszlopos dataset könyvtár")
+    parser.add_argument("output", help="Kimeneti könyvtár (centroidok, állapot, hisztogramok)")
+    parser.add_argument("-k", type=int, default=16, help="Klaszterek (visémák) száma")
+    parser.add_argument("--epochs", type=int, default=2, help="Ennyiszer megyünk végig az adaton")
+    parser.add_argument("--chunk-rows", type=int, default=20000, help="Mini-batch méret (sor)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processek (alapból cpu_count)")
+    parser.add_argument("--prefetch", type=int, default=None, help="Egyszerre feldolgozás alatt álló chunkok")
+    parser.add_argument("--lip-weight", type=float, default=1.0, help="Az ajak pontok súlya")
+    parser.add_argument("--blend-weight", type=float, default=1.0, help="A blend shape-ek súlya")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--restart", action="store_true", help="A mentett állapot törlése, újrakezdés")
+    parser.add_argument("--skip-assign", action="store_true", help="Csak tanítás, klaszter oszlop nélkül")
+    args = parser.parse_args()
+
+    csv.field_size_limit(1 << 30)
+    try:
+        centroids, state = train_visemes(args.source, args.output, k=args.k, epochs=args.epochs,
+                                         chunk_rows=args.chunk_rows, workers=args.workers, prefetch=args.prefetch,
+                                         lip_weight=args.lip_weight, blend_weight=args.blend_weight,
+                                         seed=args.seed, restart=args.restart)
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    print(f"\n✅ Centroidok: {os.path.join(args.output, CENTROIDS_FILE)}")
+
+    if not args.skip_assign:
+        histograms = assign_visemes(args.source, args.output, centroids, state,
+                                    workers=args.workers, prefetch=args.prefetch)
+        print_word_histograms(histograms)
+        target = (f"{CLUSTER_COLUMN} oszlop: {args.source}" if os.path.isdir(args.source)
+                  else os.path.join(args.output, CLUSTER_IDS_FILE))
+        print(f"\n✅ Klaszter azonosítók: {target}, hisztogramok: {os.path.join(args.output, HISTOGRAMS_FILE)}")